@@ -69,6 +69,21 @@ if not app.config.get('TESTING') and not hasattr(app, '_db_initialized'):
         print("[DB] App will start; /api/health may report degraded until DB is fixed.")
         app._db_initialized = False
 
+# Return stock held by abandoned carts (expired inventory reservations) in the background
+if not app.config.get('TESTING'):
+    from utils.reservation_sweeper import start_reservation_sweeper
+    start_reservation_sweeper(app)
+
+# Reprice products at the daily rollover and after Sale changes in the background
+if not app.config.get('TESTING'):
+    from utils.sale_engine import start_reprice_worker
+    start_reprice_worker(app)
+
+# Send queued outbound email (email_outbox) in the background
+if not app.config.get('TESTING'):
+    from utils.email_outbox import start_email_worker
+    start_email_worker(app)
+
 # Enable CORS for React frontend with credentials support for sessions
 CORS(app, resources={
     r"/api/*": {
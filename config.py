@@ -67,9 +67,48 @@ class Config:
     SECRET_KEY = os.getenv('SECRET_KEY', JWT_SECRET)
     DEBUG = os.getenv('DEBUG', 'False').lower() == 'true'
     
+    # HTTP caching for public catalog GET endpoints (Cache-Control max-age, seconds)
+    HTTP_CACHE_MAX_AGE = int(os.getenv('HTTP_CACHE_MAX_AGE', '60'))
+    
+    # Variation stock held by a cart line is returned after this long without cart activity (minutes)
+    CART_RESERVATION_TTL_MINUTES = int(os.getenv('CART_RESERVATION_TTL_MINUTES', '1440'))
+    # How often each worker's background sweeper releases expired cart holds (seconds, 0 = off)
+    RESERVATION_SWEEP_INTERVAL_SECONDS = int(os.getenv('RESERVATION_SWEEP_INTERVAL_SECONDS', '300'))
+    # How often each worker's background job reprices products not priced for today (seconds, 0 = off)
+    REPRICE_INTERVAL_SECONDS = int(os.getenv('REPRICE_INTERVAL_SECONDS', '600'))
+    
+    # Guest carts live server-side, keyed by a session token: 'sql' (shared by all workers) or 'memory' (one process)
+    GUEST_CART_BACKEND = os.getenv('GUEST_CART_BACKEND', 'sql').lower()
+    GUEST_CART_TTL_HOURS = int(os.getenv('GUEST_CART_TTL_HOURS', '168'))
+    
+    # Outbound email is queued in the email_outbox table and sent by a background worker
+    EMAIL_WORKER_INTERVAL_SECONDS = int(os.getenv('EMAIL_WORKER_INTERVAL_SECONDS', '30'))  # 0 = off
+    EMAIL_MAX_ATTEMPTS = int(os.getenv('EMAIL_MAX_ATTEMPTS', '6'))
+    # Retry n waits EMAIL_RETRY_BASE_SECONDS * 2**(n-1)
+    EMAIL_RETRY_BASE_SECONDS = int(os.getenv('EMAIL_RETRY_BASE_SECONDS', '60'))
+    
+    # AI chat decision-engine answers cached per normalized message + context (0 = off)
+    LLM_CACHE_TTL_SECONDS = int(os.getenv('LLM_CACHE_TTL_SECONDS', '600'))
+    LLM_CACHE_MAX_ENTRIES = int(os.getenv('LLM_CACHE_MAX_ENTRIES', '1000'))
+    # Keep-alive connections pooled per LLM provider and process (match the gunicorn --threads count)
+    LLM_HTTP_POOL_SIZE = int(os.getenv('LLM_HTTP_POOL_SIZE', '8'))
+    # LLM API timeouts (seconds); LLM_TIMEOUT_<PROVIDER> overrides the read timeout per provider
+    LLM_CONNECT_TIMEOUT_SECONDS = int(os.getenv('LLM_CONNECT_TIMEOUT_SECONDS', '5'))
+    LLM_TIMEOUT_SECONDS = int(os.getenv('LLM_TIMEOUT_SECONDS', '60'))
+    # AI provider config (selected provider, decrypted keys) is cached per process; admin changes
+    # invalidate it at once in the worker that made them, other workers pick them up within this TTL
+    AI_PROVIDER_CONFIG_TTL_SECONDS = int(os.getenv('AI_PROVIDER_CONFIG_TTL_SECONDS', '300'))
+    
     # Vector Database Configuration
     VECTOR_DB_PATH = os.getenv('VECTOR_DB_PATH', './vector_db')
     EMBEDDING_MODEL = os.getenv('EMBEDDING_MODEL', 'all-MiniLM-L6-v2')
+    # Shopper query embeddings kept in memory (LRU); document embeddings are cached on disk under VECTOR_DB_PATH
+    EMBEDDING_QUERY_CACHE_SIZE = int(os.getenv('EMBEDDING_QUERY_CACHE_SIZE', '1024'))
+    EMBEDDING_BATCH_SIZE = int(os.getenv('EMBEDDING_BATCH_SIZE', '64'))
+    # AI product search fuses full-text and vector results with reciprocal-rank fusion (1 / (k + rank));
+    # the vector query runs on one of HYBRID_SEARCH_WORKERS threads while SQL runs on the request thread
+    HYBRID_RRF_K = int(os.getenv('HYBRID_RRF_K', '60'))
+    HYBRID_SEARCH_WORKERS = int(os.getenv('HYBRID_SEARCH_WORKERS', '4'))
     
     # Payment Configuration (Stripe or similar)
     STRIPE_SECRET_KEY = os.getenv('STRIPE_SECRET_KEY', '')
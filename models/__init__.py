@@ -10,6 +10,11 @@ from .product_relation import ProductRelation
 from .review import Review
 from .return_model import Return
 from .shipment import Shipment
+from .daily_stat import DailyStat
+from .inventory_reservation import InventoryReservation
+from .guest_cart_line import GuestCartLine
+from .email_outbox import EmailOutbox
+from .vector_index import VectorIndexEntry, VectorSyncState
 
-__all__ = ['db', 'init_db', 'User', 'Product', 'CartItem', 'Order', 'OrderItem', 'Payment', 'PaymentLog', 'Sale', 'ProductRelation', 'Review', 'Return', 'Shipment']
+__all__ = ['db', 'init_db', 'User', 'Product', 'CartItem', 'Order', 'OrderItem', 'Payment', 'PaymentLog', 'Sale', 'ProductRelation', 'Review', 'Return', 'Shipment', 'DailyStat', 'InventoryReservation', 'GuestCartLine', 'EmailOutbox', 'VectorIndexEntry', 'VectorSyncState']
 
@@ -20,10 +20,10 @@ class CartItem(db.Model):
     product = db.relationship('Product', lazy='joined')
     variation = db.relationship('ProductVariation', lazy='joined', foreign_keys=[variation_id])
     
-    def to_dict(self):
-        """Convert cart item to dictionary."""
+    def to_dict(self, sale_prices=None):
+        """Convert cart item to dictionary. sale_prices: optional map from utils.sale_engine.price_products."""
         try:
-            product_dict = self.product.to_dict() if self.product else None
+            product_dict = self.product.to_dict(sale_prices) if self.product else None
         except Exception:
             # If to_dict fails, create basic product dict
             if self.product:
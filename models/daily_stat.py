@@ -0,0 +1,23 @@
+"""Daily rollup of orders, revenue, reviews and new users for the admin dashboard and charts."""
+from models.database import db
+from datetime import datetime
+
+
+class DailyStat(db.Model):
+    __tablename__ = 'daily_stats'
+
+    day = db.Column(db.Date, primary_key=True)  # UTC date of created_at
+    orders_count = db.Column(db.Integer, default=0, nullable=False)
+    revenue = db.Column(db.Numeric(12, 2), default=0, nullable=False)  # Sum of Order.total
+    reviews_count = db.Column(db.Integer, default=0, nullable=False)
+    users_count = db.Column(db.Integer, default=0, nullable=False)  # New registrations
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False)
+
+    def to_dict(self):
+        return {
+            'date': self.day.isoformat(),
+            'orders': int(self.orders_count or 0),
+            'revenue': float(self.revenue or 0),
+            'reviews': int(self.reviews_count or 0),
+            'new_users': int(self.users_count or 0),
+        }
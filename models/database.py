@@ -1,10 +1,38 @@
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import event
+from sqlalchemy.orm import Session
 from config import Config
 import os
 
 db = SQLAlchemy()
 
 
+def call_after_commit(session, callback):
+    """
+    Run callback() once the session's current transaction commits; a rollback drops it. Write
+    events use it to invalidate process caches: invalidating at flush lets another thread rebuild
+    the cache from the old committed rows and keep them under the new version. Each callback runs
+    once per commit however many writes queued it.
+    """
+    session.info.setdefault('after_commit', {})[callback] = None
+
+
+@event.listens_for(Session, 'after_commit')
+def _run_after_commit(session):
+    for callback in session.info.pop('after_commit', {}):
+        try:
+            callback()
+        except Exception as e:
+            print(f"[DB] after-commit callback {getattr(callback, '__name__', callback)} failed: {e}")
+
+
+@event.listens_for(Session, 'after_transaction_end')
+def _drop_after_commit(session, transaction):
+    """Outermost transaction ended without a commit (after_commit already ran the callbacks)."""
+    if transaction.parent is None:
+        session.info.pop('after_commit', None)
+
+
 def ensure_postgres_database(uri):
     """
     If URI is PostgreSQL, ensure the target database exists by connecting to
@@ -78,6 +106,11 @@ def init_db(app):
         from models.payment import Payment
         from models.payment_log import PaymentLog
         from models.review import Review
+        from models.daily_stat import DailyStat
+        from models.inventory_reservation import InventoryReservation
+        from models.guest_cart_line import GuestCartLine
+        from models.email_outbox import EmailOutbox
+        from models.vector_index import VectorIndexEntry, VectorSyncState
         try:
             from models.sale import Sale
         except ImportError:
@@ -214,9 +247,80 @@ def init_db(app):
                     conn.execute(text("ALTER TABLE products ADD COLUMN sale_percentage NUMERIC(5,2)"))
                     conn.commit()
                     print("[OK] Added column products.sale_percentage")
+                # Index for the product-level "on sale" filter (utils.sale_engine.on_sale_clause)
+                conn.execute(text(
+                    "CREATE INDEX IF NOT EXISTS idx_product_sale_window ON products (sale_enabled, sale_start, sale_end)"
+                ))
+                conn.commit()
         except Exception as e:
             print(f"[WARNING] Could not add product sale columns: {e}")
 
+        # Add Product materialized pricing columns if missing (effective_price, discount_percentage, sale_source, priced_on, index_dirty_at)
+        try:
+            from sqlalchemy import text
+            dialect_name = db.engine.dialect.name
+            with db.engine.connect() as conn:
+                for col, col_type in (
+                    ('effective_price', 'NUMERIC(10,2)'),
+                    ('discount_percentage', 'NUMERIC(5,2)'),
+                    ('sale_source', 'VARCHAR(20)'),
+                    ('priced_on', 'DATE'),
+                    ('index_dirty_at', 'TIMESTAMP'),
+                ):
+                    if not _table_has_column(conn, 'products', col, dialect_name):
+                        conn.execute(text(f"ALTER TABLE products ADD COLUMN {col} {col_type}"))
+                        conn.commit()
+                        print(f"[OK] Added column products.{col}")
+                conn.execute(text(
+                    "CREATE INDEX IF NOT EXISTS idx_is_active_effective_price ON products (is_active, effective_price)"
+                ))
+                conn.execute(text("CREATE INDEX IF NOT EXISTS ix_products_effective_price ON products (effective_price)"))
+                conn.execute(text("CREATE INDEX IF NOT EXISTS ix_products_priced_on ON products (priced_on)"))
+                conn.execute(text("CREATE INDEX IF NOT EXISTS ix_products_index_dirty_at ON products (index_dirty_at)"))
+                conn.commit()
+        except Exception as e:
+            print(f"[WARNING] Could not add product pricing columns: {e}")
+
+        # Index layout version for the vector index sync; existing rows get 0, so the next sync rebuilds the index
+        try:
+            from sqlalchemy import text
+            dialect_name = db.engine.dialect.name
+            with db.engine.connect() as conn:
+                if not _table_has_column(conn, 'vector_sync_state', 'index_version', dialect_name):
+                    conn.execute(text("ALTER TABLE vector_sync_state ADD COLUMN index_version INTEGER NOT NULL DEFAULT 0"))
+                    conn.commit()
+                    print("[OK] Added column vector_sync_state.index_version")
+        except Exception as e:
+            print(f"[WARNING] Could not add vector_sync_state.index_version: {e}")
+
+        # Keyset index for the incremental vector index sync (utils/vector_db.py) on existing databases
+        try:
+            from sqlalchemy import text
+            with db.engine.connect() as conn:
+                conn.execute(text("CREATE INDEX IF NOT EXISTS idx_products_updated_at_id ON products (updated_at, id)"))
+                conn.commit()
+        except Exception as e:
+            print(f"[WARNING] Could not create products updated_at index: {e}")
+
+        # Full-text product search index (SQLite FTS5 / PostgreSQL tsvector) for existing databases
+        try:
+            from utils.search_index import ensure_search_index
+            with db.engine.connect() as conn:
+                if ensure_search_index(conn):
+                    conn.commit()
+        except Exception as e:
+            print(f"[WARNING] Could not create product search index: {e}")
+
+        # Backfill the daily_stats rollup (admin dashboard) once for databases that predate it
+        try:
+            from utils.admin_stats import rebuild_daily_stats
+            if DailyStat.query.first() is None and (Order.query.first() is not None or User.query.first() is not None):
+                days = rebuild_daily_stats()
+                print(f"[OK] Backfilled daily_stats ({days} days)")
+        except Exception as e:
+            db.session.rollback()
+            print(f"[WARNING] Could not backfill daily_stats: {e}")
+
         # Add Product.size_stock column if missing (per-size quantity: JSON object)
         try:
             from sqlalchemy import text
@@ -244,6 +348,24 @@ def init_db(app):
         except Exception as e:
             print(f"[WARNING] Could not add cart_items.variation_id column: {e}")
 
+        # Cart lines from before inventory_reservations held variation stock without a record:
+        # give them reservations once so removal and expiry return that stock
+        try:
+            from utils.inventory import reservation_expiry
+            if InventoryReservation.query.first() is None:
+                held = CartItem.query.filter(CartItem.variation_id.isnot(None), CartItem.quantity > 0).all()
+                for item in held:
+                    db.session.add(InventoryReservation(
+                        variation_id=item.variation_id, product_id=item.product_id, user_id=item.user_id,
+                        quantity=item.quantity, expires_at=reservation_expiry(),
+                    ))
+                if held:
+                    db.session.commit()
+                    print(f"[OK] Backfilled inventory reservations for {len(held)} cart lines")
+        except Exception as e:
+            db.session.rollback()
+            print(f"[WARNING] Could not backfill inventory reservations: {e}")
+
         # Add User.is_superadmin column if missing (existing databases)
         try:
             from sqlalchemy import text
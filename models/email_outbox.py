@@ -0,0 +1,43 @@
+"""Outbound email waiting for (or done with) delivery by the outbox worker (utils/email_outbox.py)."""
+from models.database import db
+from datetime import datetime
+
+EMAIL_PENDING = 'pending'  # Waiting for its next attempt (next_attempt_at)
+EMAIL_SENDING = 'sending'  # Claimed by a worker
+EMAIL_SENT = 'sent'
+EMAIL_FAILED = 'failed'    # Gave up after EMAIL_MAX_ATTEMPTS
+
+
+class EmailOutbox(db.Model):
+    __tablename__ = 'email_outbox'
+
+    id = db.Column(db.Integer, primary_key=True)
+    to_address = db.Column(db.String(255), nullable=False)
+    subject = db.Column(db.String(500), nullable=False)
+    html_body = db.Column(db.Text, nullable=False)
+    text_body = db.Column(db.Text, nullable=True)
+    reply_to = db.Column(db.String(255), nullable=True)
+    status = db.Column(db.String(20), default=EMAIL_PENDING, nullable=False)
+    attempts = db.Column(db.Integer, default=0, nullable=False)
+    next_attempt_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    last_error = db.Column(db.Text, nullable=True)
+    sent_at = db.Column(db.DateTime, nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False)
+
+    __table_args__ = (
+        db.Index('idx_email_outbox_status_next', 'status', 'next_attempt_at'),
+    )
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'to_address': self.to_address,
+            'subject': self.subject,
+            'status': self.status,
+            'attempts': self.attempts,
+            'next_attempt_at': self.next_attempt_at.isoformat() if self.next_attempt_at else None,
+            'last_error': self.last_error,
+            'sent_at': self.sent_at.isoformat() if self.sent_at else None,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+        }
@@ -0,0 +1,33 @@
+"""Server-side guest cart line, keyed by the session's cart token (see utils/guest_cart_store.py)."""
+from models.database import db
+from datetime import datetime
+
+
+class GuestCartLine(db.Model):
+    __tablename__ = 'guest_cart_lines'
+
+    id = db.Column(db.Integer, primary_key=True)
+    cart_token = db.Column(db.String(64), nullable=False, index=True)
+    line_key = db.Column(db.String(255), nullable=False)  # product_id|color|size (one line per variation)
+    product_id = db.Column(db.Integer, db.ForeignKey('products.id', ondelete='CASCADE'), nullable=False)
+    variation_id = db.Column(db.Integer, db.ForeignKey('product_variations.id', ondelete='SET NULL'), nullable=True)
+    quantity = db.Column(db.Integer, default=1, nullable=False)
+    selected_color = db.Column(db.String(100), nullable=True)
+    selected_size = db.Column(db.String(50), nullable=True)
+    expires_at = db.Column(db.DateTime, nullable=False, index=True)  # Whole cart expires GUEST_CART_TTL_HOURS after its last change
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False)
+
+    __table_args__ = (
+        db.UniqueConstraint('cart_token', 'line_key', name='uq_guest_cart_line'),
+    )
+
+    def to_line(self):
+        """Line dict in the shape utils.guest_cart returns."""
+        return {
+            'product_id': self.product_id,
+            'variation_id': self.variation_id,
+            'quantity': self.quantity,
+            'selected_color': self.selected_color,
+            'selected_size': self.selected_size,
+        }
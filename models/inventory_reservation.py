@@ -0,0 +1,41 @@
+"""Stock held by a cart line (one row per cart owner and variation) until checkout, removal or expiry."""
+from models.database import db
+from datetime import datetime
+
+RESERVATION_HELD = 'held'
+RESERVATION_COMMITTED = 'committed'  # Turned into an order; the stock is sold
+RESERVATION_RELEASED = 'released'    # Returned to stock (removed from cart or expired)
+RESERVATION_MERGED = 'merged'        # Folded into the owner's other hold on the variation (stock stays held)
+
+
+class InventoryReservation(db.Model):
+    __tablename__ = 'inventory_reservations'
+
+    id = db.Column(db.Integer, primary_key=True)
+    variation_id = db.Column(db.Integer, db.ForeignKey('product_variations.id', ondelete='CASCADE'), nullable=False, index=True)
+    product_id = db.Column(db.Integer, db.ForeignKey('products.id', ondelete='CASCADE'), nullable=False, index=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), nullable=True, index=True)
+    cart_token = db.Column(db.String(64), nullable=True, index=True)  # Guest cart owner (see utils.guest_cart)
+    quantity = db.Column(db.Integer, default=0, nullable=False)
+    status = db.Column(db.String(20), default=RESERVATION_HELD, nullable=False)
+    expires_at = db.Column(db.DateTime, nullable=False)
+    order_id = db.Column(db.Integer, db.ForeignKey('orders.id', ondelete='SET NULL'), nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False)
+
+    __table_args__ = (
+        db.Index('idx_reservation_status_expires', 'status', 'expires_at'),
+    )
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'variation_id': self.variation_id,
+            'product_id': self.product_id,
+            'user_id': self.user_id,
+            'quantity': self.quantity,
+            'status': self.status,
+            'expires_at': self.expires_at.isoformat() if self.expires_at else None,
+            'order_id': self.order_id,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+        }
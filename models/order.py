@@ -1,5 +1,6 @@
 from models.database import db
 from datetime import datetime
+from sqlalchemy import event, inspect
 import uuid
 
 class Order(db.Model):
@@ -47,9 +48,43 @@ class Order(db.Model):
         """Generate a unique order number."""
         return f"ORD-{datetime.utcnow().strftime('%Y%m%d')}-{str(uuid.uuid4())[:8].upper()}"
     
-    def to_dict(self):
-        """Convert order to dictionary."""
-        return {
+    @staticmethod
+    def items_loader():
+        """Query option loading orders' items and their products in two IN-queries (no per-order lazy loads)."""
+        from sqlalchemy.orm import selectinload
+        return selectinload(Order.items).selectinload(OrderItem.product)
+
+    @classmethod
+    def serialize_many(cls, orders, summary=False):
+        """
+        Serialize a list of orders. Full dicts price every item's product in one sale-engine pass
+        (load orders with items_loader()); summary dicts skip items and carry item_count from one
+        grouped query.
+        """
+        orders = list(orders)
+        if not orders:
+            return []
+        if summary:
+            from sqlalchemy import func
+            rows = db.session.query(
+                OrderItem.order_id, func.coalesce(func.sum(OrderItem.quantity), 0)
+            ).filter(OrderItem.order_id.in_([o.id for o in orders])).group_by(OrderItem.order_id).all()
+            counts = {order_id: int(units) for order_id, units in rows}
+            return [o.to_dict(summary=True, item_count=counts.get(o.id, 0)) for o in orders]
+        from utils.sale_engine import price_products
+        products = {item.product.id: item.product for o in orders for item in o.items if item.product}
+        try:
+            sale_prices = price_products(list(products.values())) if products else {}
+        except Exception:
+            sale_prices = None
+        return [o.to_dict(sale_prices=sale_prices) for o in orders]
+
+    def to_dict(self, summary=False, item_count=None, sale_prices=None):
+        """
+        Convert order to dictionary. summary: leave out items (list views); item_count is then
+        the units ordered when known. sale_prices: {product_id: sale_data} for the items' products.
+        """
+        data = {
             'id': self.id,
             'order_number': self.order_number,
             'user_id': self.user_id,
@@ -67,10 +102,15 @@ class Order(db.Model):
             'total': float(self.total) if self.total else 0.0,
             'currency': getattr(self, 'currency', 'USD'),
             'status': self.status,
-            'items': [item.to_dict() for item in self.items],
             'created_at': self.created_at.isoformat() if self.created_at else None,
             'updated_at': self.updated_at.isoformat() if self.updated_at else None
         }
+        if summary:
+            if item_count is not None:
+                data['item_count'] = item_count
+        else:
+            data['items'] = [item.to_dict(sale_prices) for item in self.items]
+        return data
 
 class OrderItem(db.Model):
     __tablename__ = 'order_items'
@@ -81,10 +121,10 @@ class OrderItem(db.Model):
     quantity = db.Column(db.Integer, nullable=False)
     price = db.Column(db.Numeric(10, 2), nullable=False)  # Price at time of order
     
-    def to_dict(self):
-        """Convert order item to dictionary."""
+    def to_dict(self, sale_prices=None):
+        """Convert order item to dictionary. sale_prices: optional {product_id: sale_data} (see Order.serialize_many)."""
         try:
-            product_dict = self.product.to_dict() if self.product else None
+            product_dict = self.product.to_dict(sale_prices) if self.product else None
         except Exception:
             product_dict = {'id': self.product_id, 'name': 'Product', 'price': float(self.price) if self.price else 0.0} if self.product_id else None
         if product_dict is None and self.product_id:
@@ -98,3 +138,31 @@ class OrderItem(db.Model):
             'subtotal': float(self.price * self.quantity) if self.price else 0.0
         }
 
+
+def _rollup_order_insert(mapper, connection, target):
+    """Count new orders and revenue in the daily_stats rollup."""
+    from utils.admin_stats import record_daily_stat
+    record_daily_stat(connection, target.created_at.date() if target.created_at else None,
+                      orders=1, revenue=target.total or 0)
+
+
+def _rollup_order_update(mapper, connection, target):
+    """Keep rollup revenue in step when an order total changes."""
+    history = inspect(target).attrs.total.history
+    if not history.has_changes() or not history.deleted:
+        return
+    from utils.admin_stats import record_daily_stat
+    old_total = history.deleted[0] or 0
+    record_daily_stat(connection, target.created_at.date() if target.created_at else None,
+                      revenue=(target.total or 0) - old_total)
+
+
+def _rollup_order_delete(mapper, connection, target):
+    from utils.admin_stats import record_daily_stat
+    record_daily_stat(connection, target.created_at.date() if target.created_at else None,
+                      orders=-1, revenue=-(target.total or 0))
+
+
+event.listen(Order, 'after_insert', _rollup_order_insert)
+event.listen(Order, 'after_update', _rollup_order_update)
+event.listen(Order, 'after_delete', _rollup_order_delete)
@@ -1,7 +1,6 @@
 from models.database import db
 from datetime import datetime
-from sqlalchemy import Index
-import json
+from sqlalchemy import Index, event
 
 # Predefined brands; use 'other' for custom brand name (stored in brand_other).
 BRAND_CHOICES = {
@@ -51,6 +50,14 @@ class Product(db.Model):
     sale_end = db.Column(db.Date, nullable=True)    # Sale valid until this date (inclusive)
     sale_percentage = db.Column(db.Numeric(5, 2), nullable=True)  # e.g. 25.00 for 25% off
     
+    # Materialized pricing (maintained by utils.sale_engine; used for price filters, sorts and /price-range)
+    effective_price = db.Column(db.Numeric(10, 2), nullable=True, index=True)  # Sale price if on sale, else price
+    discount_percentage = db.Column(db.Numeric(5, 2), nullable=True)  # Applied discount, None if not on sale
+    sale_source = db.Column(db.String(20), nullable=True)  # 'product', 'sale:<id>' or None
+    priced_on = db.Column(db.Date, nullable=True, index=True)  # Date the pricing above was computed for
+    # Set when repricing changed the sale price (keeps updated_at); cleared by the vector index sync
+    index_dirty_at = db.Column(db.DateTime, nullable=True, index=True)
+    
     # Ratings
     rating = db.Column(db.Numeric(3, 2), default=0.0, nullable=False)  # Average rating (0.00 to 5.00)
     review_count = db.Column(db.Integer, default=0, nullable=False)  # Number of reviews
@@ -79,6 +86,9 @@ class Product(db.Model):
         Index('idx_category_season', 'category', 'season'),
         Index('idx_clothing_category', 'clothing_category'),
         Index('idx_brand', 'brand'),
+        Index('idx_product_sale_window', 'sale_enabled', 'sale_start', 'sale_end'),
+        Index('idx_is_active_effective_price', 'is_active', 'effective_price'),
+        Index('idx_products_updated_at_id', 'updated_at', 'id'),  # Incremental vector index sync
     )
     
     def _is_product_sale_active(self, check_date=None):
@@ -92,55 +102,10 @@ class Product(db.Model):
         except Exception:
             return False
 
-    def get_sale_price(self):
+    def get_sale_price(self, on_date=None):
         """Get the sale price if product is on sale (product-level or global sale), otherwise return None."""
-        from datetime import date
-        current_date = date.today()
-        original_price = float(self.price) if self.price else 0.0
-
-        # 1) Product-level sale takes precedence
-        if self._is_product_sale_active(current_date) and self.sale_percentage is not None:
-            try:
-                pct = float(self.sale_percentage)
-                if 0 < pct <= 100:
-                    sale_price = original_price * (1 - pct / 100)
-                    return {
-                        'original_price': original_price,
-                        'sale_price': round(sale_price, 2),
-                        'discount_percentage': pct,
-                        'sale': None  # product-level, no Sale row
-                    }
-            except (TypeError, ValueError):
-                pass
-
-        # 2) Global Sale table (filter-based sales)
-        try:
-            from models.sale import Sale
-            active_sales = Sale.query.filter_by(is_active=True).all()
-        except Exception:
-            return None
-
-        best_discount = 0.0
-        sale_info = None
-        for sale in active_sales:
-            try:
-                if sale.is_currently_active(current_date) and sale.matches_product(self):
-                    discount = float(sale.discount_percentage) if sale.discount_percentage else 0.0
-                    if discount > best_discount:
-                        best_discount = discount
-                        sale_info = sale
-            except Exception:
-                continue
-
-        if best_discount > 0:
-            sale_price = original_price * (1 - best_discount / 100)
-            return {
-                'original_price': original_price,
-                'sale_price': round(sale_price, 2),
-                'discount_percentage': best_discount,
-                'sale': sale_info.to_dict() if sale_info else None
-            }
-        return None
+        from utils.sale_engine import price_product
+        return price_product(self, on_date)
 
     def _resolved_image_url(self):
         """Return the product's stored image_url (no overwriting)."""
@@ -152,94 +117,12 @@ class Product(db.Model):
             return (self.brand_other or '').strip()
         return BRAND_CHOICES.get(self.brand, self.brand or 'Other')
     
-    def to_dict(self):
-        """Convert product to dictionary."""
-        # Parse available colors and sizes from JSON
-        available_colors_list = []
-        available_sizes_list = []
-        size_stock_dict = {}
-        try:
-            if self.available_colors:
-                available_colors_list = json.loads(self.available_colors) if isinstance(self.available_colors, str) else self.available_colors
-            if self.available_sizes:
-                available_sizes_list = json.loads(self.available_sizes) if isinstance(self.available_sizes, str) else self.available_sizes
-            if self.size_stock:
-                raw = json.loads(self.size_stock) if isinstance(self.size_stock, str) else self.size_stock
-                size_stock_dict = raw if isinstance(raw, dict) else {}
-            if self.images_by_color:
-                raw_img = json.loads(self.images_by_color) if isinstance(self.images_by_color, str) else self.images_by_color
-                images_by_color_dict = raw_img if isinstance(raw_img, dict) else {}
-            else:
-                images_by_color_dict = {}
-        except:
-            # Fallback to single color/size if JSON parsing fails
-            if self.color:
-                available_colors_list = [self.color]
-            if self.size:
-                available_sizes_list = [self.size]
-            size_stock_dict = {}
-            images_by_color_dict = {}
-        
-        # Get sale price if on sale (with error handling)
-        sale_data = None
-        try:
-            sale_data = self.get_sale_price()
-        except Exception:
-            # If get_sale_price fails (e.g., Sale table doesn't exist), continue without sale
-            pass
-        
-        original_price = float(self.price) if self.price else 0.0
-        current_price = sale_data['sale_price'] if sale_data else original_price
-        
-        result = {
-            'id': self.id,
-            'name': self.name,
-            'description': self.description,
-            'price': current_price,  # Current price (sale price if on sale)
-            'original_price': original_price,  # Always include original price
-            'category': self.category,
-            'color': self.color,
-            'size': self.size,
-            'available_colors': available_colors_list if available_colors_list else ([self.color] if self.color else []),
-            'available_sizes': available_sizes_list if available_sizes_list else ([self.size] if self.size else []),
-            'size_stock': size_stock_dict if size_stock_dict else None,
-            'fabric': self.fabric,
-            'clothing_type': self.clothing_type,
-            'clothing_category': self.clothing_category or 'other',
-            'dress_style': self.dress_style,
-            'occasion': self.occasion,
-            'age_group': self.age_group,
-            'season': self.season or 'all_season',
-            'brand': self.brand or 'other',
-            'brand_other': self.brand_other,
-            'display_brand': self.get_display_brand(),
-            'image_url': self._resolved_image_url(),
-            'images_by_color': images_by_color_dict if images_by_color_dict else None,
-            'stock_quantity': int(self.stock_quantity) if self.stock_quantity is not None else 0,
-            'is_active': self.is_active,
-            'rating': float(self.rating) if self.rating else 0.0,
-            'review_count': self.review_count,
-            'slug': self.slug,
-            'meta_title': self.meta_title,
-            'meta_description': self.meta_description,
-            'created_at': self.created_at.isoformat() if self.created_at else None
-        }
-        
-        # Add sale information if on sale
-        if sale_data and isinstance(sale_data, dict):
-            result['on_sale'] = True
-            result['discount_percentage'] = sale_data.get('discount_percentage', 0)
-            result['sale'] = sale_data.get('sale')
-        else:
-            result['on_sale'] = False
-
-        # Per-product sale fields (for admin CRUD)
-        result['sale_enabled'] = bool(self.sale_enabled)
-        result['sale_start'] = self.sale_start.isoformat() if self.sale_start else None
-        result['sale_end'] = self.sale_end.isoformat() if self.sale_end else None
-        result['sale_percentage'] = float(self.sale_percentage) if self.sale_percentage is not None else None
-
-        return result
+    def to_dict(self, sale_prices=None):
+        """Convert product to dictionary. sale_prices: optional {product_id: sale_data} from
+        utils.sale_engine.price_products, so list endpoints price all products in one pass.
+        Lists should use ProductSerializer.serialize_many (utils/product_serializer.py)."""
+        from utils.product_serializer import ProductSerializer
+        return ProductSerializer.serialize(self, sale_prices)
     
     def to_dict_for_ai(self):
         """Convert product to dictionary with full details for AI agent, including reviews and ratings."""
@@ -281,3 +164,46 @@ class Product(db.Model):
             }
         }
 
+
+def _reprice_on_write(mapper, connection, target):
+    """Keep the materialized pricing columns current when a product is inserted or updated."""
+    from sqlalchemy import inspect
+    from utils.sale_engine import apply_pricing
+    if inspect(target).attrs.priced_on.history.has_changes():
+        return  # Already priced in this flush (e.g. by reprice_stale for a given date)
+    try:
+        apply_pricing(target)
+    except Exception as e:
+        # Leave the row stale (priced_on unchanged); the rollover reprices it later
+        print(f"[Sale engine] Could not price product {target.id}: {e}")
+
+
+for _event_name in ('before_insert', 'before_update'):
+    event.listen(Product, _event_name, _reprice_on_write)
+
+
+def _bump_catalog_version(mapper, connection, target):
+    """Any product write invalidates the cached catalog facets (once the write commits)."""
+    from sqlalchemy.orm import object_session
+    from models.database import call_after_commit
+    from utils.catalog_cache import bump_catalog_version
+    call_after_commit(object_session(target), bump_catalog_version)
+
+
+for _event_name in ('after_insert', 'after_update', 'after_delete'):
+    event.listen(Product, _event_name, _bump_catalog_version)
+
+
+def _create_search_index(target, connection, **kw):
+    """Create the full-text search index (FTS5 / tsvector) together with the products table."""
+    from utils.search_index import ensure_search_index
+    ensure_search_index(connection)
+
+
+def _drop_search_index(target, connection, **kw):
+    from utils.search_index import drop_search_index
+    drop_search_index(connection)
+
+
+event.listen(Product.__table__, 'after_create', _create_search_index)
+event.listen(Product.__table__, 'before_drop', _drop_search_index)
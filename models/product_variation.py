@@ -1,7 +1,7 @@
 """Product variation: stock per (product_id, size, color) combination."""
 from models.database import db
 from datetime import datetime
-from sqlalchemy import UniqueConstraint
+from sqlalchemy import UniqueConstraint, event
 
 class ProductVariation(db.Model):
     __tablename__ = 'product_variations'
@@ -32,3 +32,15 @@ class ProductVariation(db.Model):
             'created_at': self.created_at.isoformat() if self.created_at else None,
             'updated_at': self.updated_at.isoformat() if self.updated_at else None,
         }
+
+
+def _bump_catalog_version(mapper, connection, target):
+    """Variation stock decides which products are listed, so writes invalidate the cached facets (on commit)."""
+    from sqlalchemy.orm import object_session
+    from models.database import call_after_commit
+    from utils.catalog_cache import bump_catalog_version
+    call_after_commit(object_session(target), bump_catalog_version)
+
+
+for _event_name in ('after_insert', 'after_update', 'after_delete'):
+    event.listen(ProductVariation, _event_name, _bump_catalog_version)
@@ -1,5 +1,6 @@
 from models.database import db
 from datetime import datetime
+from sqlalchemy import event
 
 class Review(db.Model):
     __tablename__ = 'reviews'
@@ -39,3 +40,26 @@ class Review(db.Model):
             'updated_at': self.updated_at.isoformat() if self.updated_at else None
         }
 
+
+def _bump_review_version(mapper, connection, target):
+    """Any review write invalidates cached review responses (ETags), once it commits."""
+    from sqlalchemy.orm import object_session
+    from models.database import call_after_commit
+    from utils.http_cache import bump_review_version
+    call_after_commit(object_session(target), bump_review_version)
+
+
+for _event_name in ('after_insert', 'after_update', 'after_delete'):
+    event.listen(Review, _event_name, _bump_review_version)
+
+
+def _rollup_review(delta):
+    def listener(mapper, connection, target):
+        """Count reviews per day in the daily_stats rollup."""
+        from utils.admin_stats import record_daily_stat
+        record_daily_stat(connection, target.created_at.date() if target.created_at else None, reviews=delta)
+    return listener
+
+
+event.listen(Review, 'after_insert', _rollup_review(1))
+event.listen(Review, 'after_delete', _rollup_review(-1))
@@ -2,7 +2,7 @@
 
 from models.database import db
 from datetime import datetime, date
-from sqlalchemy import Index
+from sqlalchemy import Index, event
 
 class Sale(db.Model):
     __tablename__ = 'sales'
@@ -139,3 +139,27 @@ class Sale(db.Model):
         
         return True
 
+
+def _invalidate_sale_engine(mapper, connection, target):
+    """
+    Any write to the sales table marks the products it can affect for repricing (same transaction)
+    and, once it commits, drops the compiled sales, reprices those products and drops the cached facets.
+    """
+    from sqlalchemy import inspect
+    from sqlalchemy.orm import object_session
+    from models.database import call_after_commit
+    from utils.catalog_cache import bump_catalog_version
+    from utils.sale_engine import invalidate_sale_cache, mark_sale_products_stale, reprice_after_sale_write
+    filter_sets = [target.product_filters]
+    # Products matched by the previous filters may lose the discount
+    filter_sets.extend(inspect(target).attrs.product_filters.history.deleted or [])
+    mark_sale_products_stale(connection, filter_sets)
+    session = object_session(target)
+    call_after_commit(session, invalidate_sale_cache)
+    call_after_commit(session, reprice_after_sale_write)
+    # Sale prices feed the cached facets (price range, on-sale counts)
+    call_after_commit(session, bump_catalog_version)
+
+
+for _event_name in ('after_insert', 'after_update', 'after_delete'):
+    event.listen(Sale, _event_name, _invalidate_sale_engine)
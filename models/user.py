@@ -1,5 +1,6 @@
 from models.database import db
 from datetime import datetime
+from sqlalchemy import event
 import uuid
 
 class User(db.Model):
@@ -79,3 +80,14 @@ class User(db.Model):
             'created_at': self.created_at.isoformat() if self.created_at else None
         }
 
+
+def _rollup_user(delta):
+    def listener(mapper, connection, target):
+        """Count new registrations per day in the daily_stats rollup."""
+        from utils.admin_stats import record_daily_stat
+        record_daily_stat(connection, target.created_at.date() if target.created_at else None, users=delta)
+    return listener
+
+
+event.listen(User, 'after_insert', _rollup_user(1))
+event.listen(User, 'after_delete', _rollup_user(-1))
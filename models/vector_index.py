@@ -0,0 +1,27 @@
+"""Change tracking for the product vector index (utils/vector_db.py): what is indexed, and how far sync got."""
+from models.database import db
+from datetime import datetime
+
+
+class VectorIndexEntry(db.Model):
+    """One row per product document in the vector index, with the hash of the document it was indexed with."""
+    __tablename__ = 'vector_index_entries'
+
+    product_id = db.Column(db.Integer, primary_key=True)
+    content_hash = db.Column(db.String(64), nullable=False)  # sha256 of document text + metadata
+    indexed_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+
+
+class VectorSyncState(db.Model):
+    """
+    Single row: the (updated_at, id) position of the last product the incremental sync processed,
+    and the document layout (utils.vector_db.INDEX_SCHEMA_VERSION) the index was built with.
+    """
+    __tablename__ = 'vector_sync_state'
+
+    id = db.Column(db.Integer, primary_key=True)
+    watermark_updated_at = db.Column(db.DateTime, nullable=True)
+    watermark_product_id = db.Column(db.Integer, default=0, nullable=False)
+    index_version = db.Column(db.Integer, default=0, nullable=False)
+    last_completed_at = db.Column(db.DateTime, nullable=True)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False)
@@ -10,8 +10,10 @@ from models.review import Review
 from models.ai_assistant_config import AiAssistantConfig
 from routes.auth import require_auth
 from utils.fashion_kb import FASHION_KNOWLEDGE_BASE
+from utils.product_serializer import ProductSerializer
+from utils.pagination import keyset_paginate, pagination_info, InvalidCursor
 from utils.seasonal_events import get_upcoming_holidays, get_current_holidays_and_events
-from utils.vector_db import add_product_to_vector_db, update_product_in_vector_db, delete_product_from_vector_db, get_chromadb_status
+from utils.vector_db import add_product_to_vector_db, update_product_in_vector_db, delete_product_from_vector_db, get_chromadb_status, get_vector_backend
 from functools import wraps
 from datetime import date, datetime, timedelta
 import json
@@ -306,13 +308,15 @@ def get_payment_logs():
         if user_id:
             query = query.filter_by(user_id=user_id)
         
-        # Get total count
-        total = query.count()
-        
-        # Paginate
-        logs = query.order_by(PaymentLog.created_at.desc()).paginate(
-            page=page, per_page=per_page, error_out=False
-        )
+        # Paginate (?cursor= switches to keyset pagination with a cached total)
+        cursor = request.args.get('cursor')
+        if cursor is not None:
+            logs = keyset_paginate(query, PaymentLog.id, cursor, per_page, sort_column=PaymentLog.created_at)
+        else:
+            logs = query.order_by(PaymentLog.created_at.desc()).paginate(
+                page=page, per_page=per_page, error_out=False
+            )
+        total = logs.total
         
         # Get related orders and users for additional context
         logs_data = []
@@ -339,12 +343,7 @@ def get_payment_logs():
         return jsonify({
             'success': True,
             'payment_logs': logs_data,
-            'pagination': {
-                'page': page,
-                'per_page': per_page,
-                'total': total,
-                'pages': logs.pages
-            },
+            'pagination': pagination_info(logs, page, per_page),
             'summary': {
                 'total_logs': total,
                 'completed': PaymentLog.query.filter_by(status='completed').count(),
@@ -353,6 +352,8 @@ def get_payment_logs():
             }
         }), 200
         
+    except InvalidCursor as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -401,28 +402,24 @@ def list_products():
             query = query.filter_by(category=category)
         
         if search:
-            from sqlalchemy import or_
-            query = query.filter(
-                or_(
-                    Product.name.ilike(f'%{search}%'),
-                    Product.description.ilike(f'%{search}%')
-                )
-            )
+            from utils.search_index import apply_text_search
+            query = apply_text_search(query, search, rank=False)
         
-        pagination = query.order_by(Product.created_at.desc()).paginate(
-            page=page, per_page=per_page, error_out=False
-        )
+        cursor = request.args.get('cursor')
+        if cursor is not None:
+            pagination = keyset_paginate(query, Product.id, cursor, per_page, sort_column=Product.created_at)
+        else:
+            pagination = query.order_by(Product.created_at.desc()).paginate(
+                page=page, per_page=per_page, error_out=False
+            )
         
         return jsonify({
             'success': True,
-            'products': [p.to_dict() for p in pagination.items],
-            'pagination': {
-                'page': page,
-                'per_page': per_page,
-                'total': pagination.total,
-                'pages': pagination.pages
-            }
+            'products': ProductSerializer.serialize_many(pagination.items, include_variation_stock=False),
+            'pagination': pagination_info(pagination, page, per_page)
         }), 200
+    except InvalidCursor as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -588,7 +585,10 @@ def _chromadb_unavailable_message():
     available, reason = get_chromadb_status()
     if available:
         return None
-    base = "ChromaDB is not available. AI search uses keyword and filter search (categories, sale, etc.)."
+    if get_vector_backend() == 'numpy':
+        return None
+    base = ("ChromaDB is not available and the built-in vector index has no embedding model (pip install sentence-transformers). "
+            "AI search uses keyword and filter search (categories, sale, etc.).")
     if reason and "No module named" in reason:
         fix = "Install with: pip install numpy==1.26.4 chromadb==0.4.18 (requires C++ Build Tools on Windows). Use the same Python that runs the backend, then restart the backend."
     elif reason:
@@ -601,15 +601,16 @@ def _chromadb_unavailable_message():
 @admin_bp.route('/products/sync-vector-db', methods=['POST'])
 @require_admin
 def sync_products_to_vector_db():
-    """Sync all active products from SQL to ChromaDB so they appear in AI search. Works without ChromaDB (reports status)."""
+    """Sync all active products from SQL to the vector index (ChromaDB, else the NumPy fallback) so they appear in AI search."""
     try:
         from utils.vector_db import sync_all_products_from_sql
-        synced, chromadb_available = sync_all_products_from_sql()
-        if chromadb_available:
+        synced, vector_db_available = sync_all_products_from_sql()
+        if vector_db_available:
             return jsonify({
                 'success': True,
                 'message': f'Synced {synced} product(s) to AI search.',
-                'synced': synced
+                'synced': synced,
+                'backend': get_vector_backend()
             }), 200
         msg = _chromadb_unavailable_message()
         return jsonify({
@@ -825,7 +826,12 @@ def list_orders():
         user_id = request.args.get('user_id', None, type=int)
         search = request.args.get('search', None)
         
+        # List rows are summaries; include_items=true returns full orders (items loaded in bulk)
+        include_items = request.args.get('include_items', 'false').lower() == 'true'
+        
         query = Order.query
+        if include_items:
+            query = query.options(Order.items_loader())
         
         if status:
             query = query.filter_by(status=status)
@@ -840,20 +846,21 @@ def list_orders():
                 )
             )
         
-        pagination = query.order_by(Order.created_at.desc()).paginate(
-            page=page, per_page=per_page, error_out=False
-        )
+        cursor = request.args.get('cursor')
+        if cursor is not None:
+            pagination = keyset_paginate(query, Order.id, cursor, per_page, sort_column=Order.created_at)
+        else:
+            pagination = query.order_by(Order.created_at.desc()).paginate(
+                page=page, per_page=per_page, error_out=False
+            )
         
         return jsonify({
             'success': True,
-            'orders': [order.to_dict() for order in pagination.items],
-            'pagination': {
-                'page': page,
-                'per_page': per_page,
-                'total': pagination.total,
-                'pages': pagination.pages
-            }
+            'orders': Order.serialize_many(pagination.items, summary=not include_items),
+            'pagination': pagination_info(pagination, page, per_page)
         }), 200
+    except InvalidCursor as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -934,6 +941,8 @@ def delete_user(user_id):
         
         # Delete related data (cascade will handle most)
         from models.cart import CartItem
+        from utils.inventory import release_holds
+        release_holds(user_id=user_id)
         CartItem.query.filter_by(user_id=user_id).delete()
         
         db.session.delete(user)
@@ -976,105 +985,44 @@ def reset_user_password(user_id):
 @admin_bp.route('/statistics', methods=['GET'])
 @require_admin
 def get_statistics():
-    """Get database statistics (admin only)."""
-    from sqlalchemy import func
-    from datetime import datetime, timedelta, time
-
-    def _today_start():
-        """Start of today in UTC for DateTime comparison."""
-        return datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
-
-    def _safe_scalar(q):
-        try:
-            return float(q.scalar() or 0)
-        except Exception:
-            return 0.0
-
-    stats = {}
+    """Get database statistics (admin only). Cached briefly; ?refresh=1 recomputes."""
+    from utils.admin_stats import get_statistics as get_admin_statistics
+    refresh = request.args.get('refresh', '').strip().lower() in ('1', 'true', 'yes')
+    return jsonify({
+        'success': True,
+        'statistics': get_admin_statistics(refresh=refresh)
+    }), 200
 
-    # Users
+@admin_bp.route('/statistics/timeseries', methods=['GET'])
+@require_admin
+def get_statistics_timeseries():
+    """Per-day orders, revenue, reviews and new users for charts (admin only). ?days=30 (max 366)."""
     try:
-        stats['users'] = {
-            'total': User.query.count(),
-            'admins': User.query.filter_by(is_admin=True).count(),
-            'superadmins': User.query.filter_by(is_superadmin=True).count(),
-            'active': User.query.filter_by(is_verified=True).count()
-        }
+        from utils.admin_stats import get_timeseries
+        days = request.args.get('days', 30, type=int)
+        return jsonify({
+            'success': True,
+            'series': get_timeseries(days)
+        }), 200
     except Exception as e:
-        stats['users'] = {'total': 0, 'admins': 0, 'superadmins': 0, 'active': 0}
-
-    # Products
-    try:
-        stats['products'] = {
-            'total': Product.query.count(),
-            'active': Product.query.filter_by(is_active=True).count(),
-            'inactive': Product.query.filter_by(is_active=False).count(),
-            'low_stock': Product.query.filter(Product.stock_quantity < 10).count(),
-            'out_of_stock': Product.query.filter(Product.stock_quantity == 0).count()
-        }
-    except Exception:
-        stats['products'] = {'total': 0, 'active': 0, 'inactive': 0, 'low_stock': 0, 'out_of_stock': 0}
-
-    # Orders (use datetime for created_at comparison)
-    try:
-        today_start = _today_start()
-        week_ago = datetime.utcnow() - timedelta(days=7)
-        month_ago = datetime.utcnow() - timedelta(days=30)
-        stats['orders'] = {
-            'total': Order.query.count(),
-            'pending': Order.query.filter_by(status='pending').count(),
-            'processing': Order.query.filter_by(status='processing').count(),
-            'shipped': Order.query.filter_by(status='shipped').count(),
-            'delivered': Order.query.filter_by(status='delivered').count(),
-            'cancelled': Order.query.filter_by(status='cancelled').count(),
-            'today': Order.query.filter(Order.created_at >= today_start).count(),
-            'this_week': Order.query.filter(Order.created_at >= week_ago).count(),
-            'this_month': Order.query.filter(Order.created_at >= month_ago).count()
-        }
-    except Exception:
-        stats['orders'] = {
-            'total': 0, 'pending': 0, 'processing': 0, 'shipped': 0, 'delivered': 0,
-            'cancelled': 0, 'today': 0, 'this_week': 0, 'this_month': 0
-        }
-
-    # Sales (table may not exist in some setups)
-    try:
-        stats['sales'] = {
-            'total': Sale.query.count(),
-            'active': Sale.query.filter_by(is_active=True).count(),
-            'inactive': Sale.query.filter_by(is_active=False).count()
-        }
-    except Exception:
-        stats['sales'] = {'total': 0, 'active': 0, 'inactive': 0}
-
-    # Reviews
-    try:
-        today_start = _today_start()
-        stats['reviews'] = {
-            'total': Review.query.count(),
-            'today': Review.query.filter(Review.created_at >= today_start).count()
-        }
-    except Exception:
-        stats['reviews'] = {'total': 0, 'today': 0}
+        return jsonify({'error': str(e)}), 500
 
-    # Revenue
+@admin_bp.route('/cache-stats', methods=['GET'])
+@require_admin
+def get_cache_stats():
+    """HTTP cache (ETag / 304), AI decision cache and embedding cache hit ratios for this worker (admin only)."""
     try:
-        today_start = _today_start()
-        week_ago = datetime.utcnow() - timedelta(days=7)
-        month_ago = datetime.utcnow() - timedelta(days=30)
-        stats['revenue'] = {
-            'total': _safe_scalar(db.session.query(func.sum(Order.total))),
-            'today': _safe_scalar(db.session.query(func.sum(Order.total)).filter(Order.created_at >= today_start)),
-            'this_week': _safe_scalar(db.session.query(func.sum(Order.total)).filter(Order.created_at >= week_ago)),
-            'this_month': _safe_scalar(db.session.query(func.sum(Order.total)).filter(Order.created_at >= month_ago))
-        }
-    except Exception:
-        stats['revenue'] = {'total': 0.0, 'today': 0.0, 'this_week': 0.0, 'this_month': 0.0}
-
-    return jsonify({
-        'success': True,
-        'statistics': stats
-    }), 200
+        from utils.embeddings import get_embedding_stats
+        from utils.http_cache import get_http_cache_stats
+        from utils.llm_cache import get_llm_cache_stats
+        return jsonify({
+            'success': True,
+            'http_cache': get_http_cache_stats(),
+            'llm_cache': get_llm_cache_stats(),
+            'embeddings': get_embedding_stats()
+        }), 200
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
 
 # ==================== CART MANAGEMENT ROUTES ====================
 
@@ -1084,36 +1032,29 @@ def list_carts():
     """List all user carts (admin only)."""
     try:
         from models.cart import CartItem
-        from sqlalchemy import func
-        
-        # Get carts with item counts and totals
-        # Use product.to_dict() to get sale prices if applicable
-        carts_query = db.session.query(
-            CartItem.user_id,
-            func.count(CartItem.id).label('item_count')
-        ).group_by(CartItem.user_id).all()
-        
+        from utils.cart_pricer import CartPricer
+        
+        # Load every cart line once and price them in one pass (sale prices, no serialization)
+        cart_items = CartItem.query.all()
+        pricer = CartPricer.for_cart_items(cart_items, active_only=False)
+        totals = {}
+        item_counts = {}
+        for item in cart_items:
+            item_counts[item.user_id] = item_counts.get(item.user_id, 0) + 1
+        for line in pricer.lines:
+            user_id = line.source.user_id
+            totals[user_id] = totals.get(user_id, 0) + line.subtotal
+        
+        users = {u.id: u for u in User.query.filter(User.id.in_(item_counts)).all()} if item_counts else {}
         carts_data = []
-        for cart in carts_query:
-            user = User.query.get(cart.user_id)
+        for user_id, item_count in item_counts.items():
+            user = users.get(user_id)
             if user:
-                # Calculate total using sale prices
-                cart_items = CartItem.query.filter_by(user_id=cart.user_id).all()
-                total = 0.0
-                for item in cart_items:
-                    if item.product:
-                        try:
-                            product_dict = item.product.to_dict()
-                            current_price = product_dict.get('price', float(item.product.price) if item.product.price else 0.0)
-                        except Exception:
-                            current_price = float(item.product.price) if item.product.price else 0.0
-                        total += current_price * item.quantity
-                
                 carts_data.append({
-                    'user_id': cart.user_id,
+                    'user_id': user_id,
                     'user_email': user.email,
-                    'item_count': cart.item_count,
-                    'estimated_total': total
+                    'item_count': item_count,
+                    'estimated_total': float(totals.get(user_id, 0))
                 })
         
         return jsonify({
@@ -1147,6 +1088,8 @@ def clear_user_cart(user_id):
     """Clear a user's cart (admin only)."""
     try:
         from models.cart import CartItem
+        from utils.inventory import release_holds
+        release_holds(user_id=user_id)
         CartItem.query.filter_by(user_id=user_id).delete()
         db.session.commit()
         
@@ -1177,9 +1120,13 @@ def list_reviews():
         if user_id:
             query = query.filter_by(user_id=user_id)
         
-        pagination = query.order_by(Review.created_at.desc()).paginate(
-            page=page, per_page=per_page, error_out=False
-        )
+        cursor = request.args.get('cursor')
+        if cursor is not None:
+            pagination = keyset_paginate(query, Review.id, cursor, per_page, sort_column=Review.created_at)
+        else:
+            pagination = query.order_by(Review.created_at.desc()).paginate(
+                page=page, per_page=per_page, error_out=False
+            )
         
         # Get related product and user info
         reviews_data = []
@@ -1195,13 +1142,10 @@ def list_reviews():
         return jsonify({
             'success': True,
             'reviews': reviews_data,
-            'pagination': {
-                'page': page,
-                'per_page': per_page,
-                'total': pagination.total,
-                'pages': pagination.pages
-            }
+            'pagination': pagination_info(pagination, page, per_page)
         }), 200
+    except InvalidCursor as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -1421,6 +1365,8 @@ def patch_ai_provider(provider):
             else:
                 config.is_enabled = bool(val)
         db.session.commit()
+        from routes.ai_agent import invalidate_provider_config
+        invalidate_provider_config()
         return jsonify({
             'success': True,
             'message': 'Provider updated',
@@ -1439,7 +1385,7 @@ def test_ai_provider(provider):
     if provider not in FIXED_PROVIDERS:
         return jsonify({'error': 'Invalid provider'}), 400
     try:
-        from routes.ai_agent import test_provider_latency
+        from routes.ai_agent import invalidate_provider_config, test_provider_latency
         from datetime import datetime
 
         config = AiAssistantConfig.query.filter_by(provider=provider).first()
@@ -1478,6 +1424,7 @@ def test_ai_provider(provider):
         if data.get('region') is not None:
             config.region = (data.get('region') or '').strip() or None
         db.session.commit()
+        invalidate_provider_config()
 
         if err:
             return jsonify({
@@ -1497,6 +1444,20 @@ def test_ai_provider(provider):
         return jsonify({'error': str(e)}), 500
 
 
+@admin_bp.route('/ai-assistant/latency', methods=['GET'])
+@require_admin
+def get_ai_provider_latency():
+    """LLM provider API latency histograms for this worker (pooled HTTP client, utils/llm_http.py)."""
+    try:
+        from utils.llm_http import get_llm_latency_stats
+        return jsonify({
+            'success': True,
+            'providers': get_llm_latency_stats()
+        }), 200
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
 @admin_bp.route('/ai-assistant/selected-provider', methods=['GET'])
 @require_admin
 def get_selected_provider():
@@ -1526,6 +1487,8 @@ def put_selected_provider():
         else:
             row.provider = provider
         db.session.commit()
+        from routes.ai_agent import invalidate_provider_config
+        invalidate_provider_config()
         return jsonify({
             'success': True,
             'selected_provider': row.provider,
@@ -5,6 +5,7 @@ from models.database import db
 from models.sale import Sale
 from routes.admin import require_admin
 from utils.seasonal_events import get_upcoming_holidays, get_current_holidays_and_events
+from utils.sale_engine import invalidate_sale_cache
 from datetime import date, datetime
 import json
 
@@ -52,6 +53,7 @@ def create_sale():
         
         db.session.add(sale)
         db.session.commit()
+        invalidate_sale_cache()
         
         return jsonify({
             'success': True,
@@ -91,6 +93,7 @@ def update_sale(sale_id):
             sale.auto_activate = data['auto_activate']
         
         db.session.commit()
+        invalidate_sale_cache()
         
         return jsonify({
             'success': True,
@@ -108,6 +111,7 @@ def delete_sale(sale_id):
         sale = Sale.query.get_or_404(sale_id)
         db.session.delete(sale)
         db.session.commit()
+        invalidate_sale_cache()
         
         return jsonify({'success': True}), 200
     except Exception as e:
@@ -139,6 +143,7 @@ def run_sale_automation():
         
         with db.session.begin():
             results = run_sale_automation()
+        invalidate_sale_cache()
         
         return jsonify({
             'success': True,
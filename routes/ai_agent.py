@@ -1,13 +1,17 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, Response, request, jsonify, g, has_request_context, stream_with_context
 from models.database import db
 from models.product import Product
 from models.ai_assistant_config import AiAssistantConfig, AISelectedProvider, FIXED_PROVIDERS
 from utils.vector_db import search_products_vector
+from utils.product_serializer import ProductSerializer
+from utils.search_index import apply_text_search
 from utils.fashion_kb import get_fashion_knowledge_base_text, get_color_matching_advice, get_fabric_info, get_occasion_advice
 from utils.spelling_tolerance import normalize_clothing_type, normalize_category, normalize_color_spelling
 from utils.fashion_match_rules import find_matching_products, get_match_explanation
 from utils.seasonal_events import get_seasonal_context_text, get_current_season, get_upcoming_holidays, get_seasonal_recommendations
 from utils.product_relations import ensure_product_relations, get_related_clothing_types
+from utils.llm_cache import prompt_version
+from utils import llm_http
 from routes.auth import require_auth, get_current_user_optional
 from config import Config
 import boto3
@@ -210,15 +214,15 @@ def _normalize_llm_error(exc):
 
 DEFAULT_SYSTEM_PROMPT = """You are a professional shopping assistant for InsightShop. Be helpful, concise, and clear. Use a polite, business-appropriate tone. Answer only what the user asked; do not recommend or suggest products unless they explicitly asked for recommendations or suggestions. When listing products they asked for, state Product #ID, name, and price. Do not use excessive exclamation points, slang, or overly casual language."""
 
-# Decision engine: AI must return ONLY valid JSON with action, parameters, message, confidence. No free text outside JSON.
+# Decision engine: AI must return ONLY valid JSON with action, parameters, confidence, message. No free text outside JSON.
 DECISION_ENGINE_SYSTEM_PROMPT = """You are the decision engine for InsightShop. You are NOT a casual chatbot. For EVERY user message you MUST respond with exactly one JSON object and nothing else. No markdown, no explanation, no text before or after the JSON.
 
-Required JSON shape (use exactly these keys):
+Required JSON shape (use exactly these keys, in this order):
 {
   "action": "<REQUIRED>",
   "parameters": { },
-  "message": "<REQUIRED>",
-  "confidence": <number between 0 and 1>
+  "confidence": <number between 0 and 1>,
+  "message": "<REQUIRED>"
 }
 
 Allowed actions:
@@ -245,6 +249,9 @@ Rules:
 # Minimum confidence required to execute SEARCH_PRODUCTS; below this we treat as clarification (no search).
 SEARCH_CONFIDENCE_THRESHOLD = 0.85
 
+# Part of every decision-cache key: editing the prompt invalidates cached answers
+DECISION_ENGINE_PROMPT_VERSION = prompt_version(DECISION_ENGINE_SYSTEM_PROMPT)
+
 
 
 def _env_api_key(provider):
@@ -268,13 +275,12 @@ def _env_api_key(provider):
     return None
 
 
-def get_effective_api_key_for_provider(provider):
-    """Return (api_key, source) for a provider. source is 'admin' or 'env'. Decrypts stored keys."""
+def _resolve_api_key(provider, stored_key):
+    """Return (api_key, source) for a provider given its stored (encrypted) admin key, or None."""
     try:
-        c = AiAssistantConfig.query.filter_by(provider=provider).first()
-        if c and c.api_key:
+        if stored_key:
             from utils.secret_storage import decrypt_ciphertext
-            return decrypt_ciphertext(c.api_key), 'admin'
+            return decrypt_ciphertext(stored_key), 'admin'
         if provider == 'openai':
             key = _env_api_key('openai')
             if key:
@@ -303,45 +309,142 @@ def get_effective_api_key_for_provider(provider):
     return None, 'env'
 
 
-def get_config_for_provider(provider):
-    """Return internal dict for a provider with effective api_key (for call_llm)."""
+def _build_provider_config(provider, c):
+    """Internal dict for a provider from its row (or None), without the api_key (see _with_api_key)."""
     try:
-        c = AiAssistantConfig.query.filter_by(provider=provider).first()
-        api_key, source = get_effective_api_key_for_provider(provider)
         base = c.to_internal_dict() if c else {'provider': provider, 'model_id': None, 'region': None, 'is_enabled': False}
-        base['api_key'] = api_key
-        base['source'] = source
+        base['stored_key'] = base.pop('api_key', None)
         if 'is_enabled' not in base:
             base['is_enabled'] = getattr(c, 'is_enabled', False) if c else False
         return base
     except Exception:
-        return {'provider': provider, 'api_key': None, 'model_id': None, 'region': None, 'is_enabled': False}
-
-
-def get_selected_provider():
-    """Return selected provider: 'auto' or one of openai, gemini, anthropic, vertex."""
+        return {'provider': provider, 'stored_key': None, 'model_id': None, 'region': None, 'is_enabled': False}
+
+
+# Provider configuration is read on every chat turn but changes only from the admin panel. A
+# snapshot of it - the selected provider and each fixed provider's config - is kept per process,
+# so resolving the provider costs no query. Admin changes call invalidate_provider_config(), which
+# bumps the version stamp: the next lookup rebuilds, and a rebuild that started before the change
+# is not kept. Other processes refresh after AI_PROVIDER_CONFIG_TTL_SECONDS.
+# API keys are resolved only for a provider that is about to be used (never for disabled ones) and
+# cached by (provider, stored ciphertext), so a rebuild does not decrypt again or call AWS Secrets
+# Manager; a provider without a key is looked up again after the TTL.
+_provider_config_lock = threading.Lock()
+_provider_config_version = 0
+_provider_config_snapshot = None  # {'version', 'expires_at', 'selected', 'providers': {provider: config}}
+_api_key_cache = {}  # (provider, stored_key) -> (api_key, source, expires_at or None)
+
+
+def invalidate_provider_config():
+    """Drop the cached provider configuration (call after committing an admin change)."""
+    global _provider_config_version, _provider_config_snapshot
+    with _provider_config_lock:
+        _provider_config_version += 1
+        _provider_config_snapshot = None
+        _api_key_cache.clear()
+
+
+def _provider_api_key(provider, stored_key):
+    """(api_key, source) for a provider, resolved on first use and cached."""
+    cache_key = (provider, stored_key)
+    cached = _api_key_cache.get(cache_key)
+    if cached is not None and (cached[2] is None or cached[2] > time.monotonic()):
+        return cached[0], cached[1]
+    version = _provider_config_version
+    api_key, source = _resolve_api_key(provider, stored_key)
+    if Config.AI_PROVIDER_CONFIG_TTL_SECONDS > 0:
+        expires_at = None if api_key else time.monotonic() + Config.AI_PROVIDER_CONFIG_TTL_SECONDS
+        with _provider_config_lock:
+            if _provider_config_version == version:
+                _api_key_cache[cache_key] = (api_key, source, expires_at)
+    return api_key, source
+
+
+def _with_api_key(cfg):
+    """Copy of a provider config with its effective api_key and source (for call_llm)."""
+    result = {k: v for k, v in cfg.items() if k != 'stored_key'}
+    result['api_key'], result['source'] = _provider_api_key(cfg['provider'], cfg.get('stored_key'))
+    return result
+
+
+def _load_provider_snapshot(version):
+    """Read the selected provider and all provider configs (2 queries). Returns (snapshot, complete)."""
+    complete = True
     try:
         row = AISelectedProvider.query.first()
         selected = (row.provider if row else 'auto')
-        # Legacy: if DB had 'bedrock' selected, treat as auto (Bedrock removed)
-        if selected == 'bedrock':
-            return 'auto'
-        return selected
     except Exception:
-        return 'auto'
+        selected, complete = 'auto', False
+    try:
+        rows = {c.provider: c for c in AiAssistantConfig.query.filter(AiAssistantConfig.provider.in_(FIXED_PROVIDERS)).all()}
+    except Exception:
+        rows, complete = {}, False
+    # Legacy: if DB had 'bedrock' selected, treat as auto (Bedrock removed)
+    if selected == 'bedrock':
+        selected = 'auto'
+    snapshot = {
+        'version': version,
+        'expires_at': time.monotonic() + Config.AI_PROVIDER_CONFIG_TTL_SECONDS,
+        'selected': selected,
+        'providers': {p: _build_provider_config(p, rows.get(p)) for p in FIXED_PROVIDERS},
+    }
+    return snapshot, complete
+
+
+def _provider_snapshot():
+    """Cached provider configuration, rebuilt when invalidated or expired."""
+    global _provider_config_snapshot
+    snapshot = _provider_config_snapshot
+    if snapshot is not None and snapshot['version'] == _provider_config_version and snapshot['expires_at'] > time.monotonic():
+        return snapshot
+    version = _provider_config_version
+    snapshot, complete = _load_provider_snapshot(version)
+    # A failed read (e.g. tables not created yet) is used once but not kept
+    if complete and Config.AI_PROVIDER_CONFIG_TTL_SECONDS > 0:
+        with _provider_config_lock:
+            if _provider_config_version == version:
+                _provider_config_snapshot = snapshot
+    return snapshot
+
+
+def get_effective_api_key_for_provider(provider):
+    """Return (api_key, source) for a provider. source is 'admin' or 'env'. Decrypts stored keys."""
+    cfg = get_config_for_provider(provider)
+    return cfg.get('api_key'), cfg.get('source') or 'env'
+
+
+def _provider_config(provider, snapshot=None):
+    """Provider config without the api_key, from the snapshot (or its row for a non-fixed provider)."""
+    cfg = (snapshot or _provider_snapshot())['providers'].get(provider)
+    if cfg is None:
+        try:
+            c = AiAssistantConfig.query.filter_by(provider=provider).first()
+        except Exception:
+            c = None
+        cfg = _build_provider_config(provider, c)
+    return cfg
+
+
+def get_config_for_provider(provider):
+    """Return internal dict for a provider with effective api_key (for call_llm)."""
+    return _with_api_key(_provider_config(provider))
+
+
+def get_selected_provider():
+    """Return selected provider: 'auto' or one of openai, gemini, anthropic, vertex."""
+    return _provider_snapshot()['selected']
 
 
 def get_effective_provider_config():
     """Return internal dict for the provider to use. Only enabled providers with an API key are used."""
-    selected = get_selected_provider()
-    if selected != 'auto':
-        cfg = get_config_for_provider(selected)
-        if cfg.get('is_enabled') and cfg.get('api_key'):
-            return cfg
-        return None
-    for p in FIXED_PROVIDERS:
-        cfg = get_config_for_provider(p)
-        if cfg.get('is_enabled') and cfg.get('api_key'):
+    snapshot = _provider_snapshot()
+    selected = snapshot['selected']
+    for p in (FIXED_PROVIDERS if selected == 'auto' else (selected,)):
+        cfg = _provider_config(p, snapshot)
+        if not cfg.get('is_enabled'):
+            continue  # Disabled: its key is never resolved
+        cfg = _with_api_key(cfg)
+        if cfg.get('api_key'):
             return cfg
     return None
 
@@ -418,17 +521,11 @@ def get_product_sample_for_ai(limit=20):
 
 def get_products_on_sale(limit=20):
     """Return products that are currently on sale (product-level or global sale), for AI and search."""
-    products = Product.query.filter_by(is_active=True).order_by(Product.id).all()
-    on_sale = []
-    for p in products:
-        if len(on_sale) >= limit:
-            break
-        try:
-            if p.get_sale_price() is not None:
-                on_sale.append(p)
-        except Exception:
-            continue
-    return [p.to_dict() for p in on_sale], [p.id for p in on_sale]
+    from utils.sale_engine import on_sale_clause
+    on_sale = Product.query.filter(
+        Product.is_active == True, on_sale_clause()
+    ).order_by(Product.id).limit(limit).all()
+    return ProductSerializer.serialize_many(on_sale), [p.id for p in on_sale]
 
 def search_products_by_criteria(criteria):
     """Search products by various criteria."""
@@ -455,28 +552,19 @@ def search_products_by_criteria(criteria):
     if criteria.get('age_group'):
         query = query.filter_by(age_group=criteria['age_group'])
     
-    if criteria.get('min_price'):
-        query = query.filter(Product.price >= criteria['min_price'])
-    
-    if criteria.get('max_price'):
-        query = query.filter(Product.price <= criteria['max_price'])
+    if criteria.get('min_price') or criteria.get('max_price'):
+        from utils.sale_engine import price_range_clause
+        query = query.filter(price_range_clause(criteria.get('min_price') or None, criteria.get('max_price') or None))
     
     if criteria.get('search'):
-        search_term = criteria['search']
-        query = query.filter(
-            or_(
-                Product.name.ilike(f'%{search_term}%'),
-                Product.description.ilike(f'%{search_term}%'),
-                Product.clothing_type.ilike(f'%{search_term}%')
-            )
-        )
+        query = apply_text_search(query, criteria['search'], columns=('name', 'description', 'clothing_type'))
     
     return [p.to_dict() for p in query.limit(50).all()]
 
-def _call_openai(internal, prompt, system_prompt, timeout=60, temperature=0.3):
+def _call_openai(internal, prompt, system_prompt, timeout=None, temperature=0.3):
     api_key = internal.get('api_key')
     model_id = internal.get('model_id') or 'gpt-4o-mini'
-    resp = requests.post(
+    resp = llm_http.post('openai',
         'https://api.openai.com/v1/chat/completions',
         headers={'Authorization': f'Bearer {api_key}', 'Content-Type': 'application/json'},
         json={
@@ -513,7 +601,7 @@ def _call_openai_with_tools(internal, messages, tools_openai, system_prompt, tim
     if tools_openai:
         payload['tools'] = tools_openai
         payload['tool_choice'] = 'auto'
-    resp = requests.post(
+    resp = llm_http.post('openai',
         'https://api.openai.com/v1/chat/completions',
         headers={'Authorization': f'Bearer {api_key}', 'Content-Type': 'application/json'},
         json=payload,
@@ -535,7 +623,7 @@ def _call_openai_with_tools(internal, messages, tools_openai, system_prompt, tim
     return (content.strip() or None, out_tool_calls)
 
 
-def _call_gemini(internal, prompt, system_prompt, timeout=60, temperature=0.3):
+def _call_gemini(internal, prompt, system_prompt, timeout=None, temperature=0.3):
     api_key = internal.get('api_key')
     model_id = (internal.get('model_id') or 'gemini-2.0-flash').strip()
     if not model_id.startswith('models/'):
@@ -550,7 +638,7 @@ def _call_gemini(internal, prompt, system_prompt, timeout=60, temperature=0.3):
     for attempt in range(3):
         _gemini_throttle()
         try:
-            r = requests.post(url, json=body, headers={'Content-Type': 'application/json'}, timeout=timeout)
+            r = llm_http.post('gemini', url, json=body, headers={'Content-Type': 'application/json'}, timeout=timeout)
             r.raise_for_status()
             data = r.json()
             candidates = data.get('candidates') or []
@@ -586,10 +674,10 @@ def _call_gemini(internal, prompt, system_prompt, timeout=60, temperature=0.3):
     return 'No response from AI'
 
 
-def _call_anthropic(internal, prompt, system_prompt, timeout=60, temperature=0.3):
+def _call_anthropic(internal, prompt, system_prompt, timeout=None, temperature=0.3):
     api_key = internal.get('api_key')
     model_id = internal.get('model_id') or 'claude-3-5-sonnet-20241022'
-    r = requests.post(
+    r = llm_http.post('anthropic',
         'https://api.anthropic.com/v1/messages',
         headers={
             'x-api-key': api_key,
@@ -665,7 +753,7 @@ def _vertex_use_api_key(api_key):
     return True
 
 
-def _call_vertex(internal, prompt, system_prompt, timeout=60, temperature=0.3):
+def _call_vertex(internal, prompt, system_prompt, timeout=None, temperature=0.3):
     api_key = (internal.get('api_key') or '').strip()
     model_id = (internal.get('model_id') or 'gemini-2.5-flash-lite').strip()
     body = {
@@ -676,7 +764,7 @@ def _call_vertex(internal, prompt, system_prompt, timeout=60, temperature=0.3):
     if _vertex_use_api_key(api_key):
         # Vertex AI with API key: global endpoint (per Google Cloud quickstart; use GOOGLE_API_KEY or VERTEX_API_KEY)
         url = f'https://aiplatform.googleapis.com/v1/publishers/google/models/{model_id}:generateContent?key={api_key}'
-        r = requests.post(url, json=body, headers={'Content-Type': 'application/json'}, timeout=timeout)
+        r = llm_http.post('vertex', url, json=body, headers={'Content-Type': 'application/json'}, timeout=timeout)
         r.raise_for_status()
         data = r.json()
     else:
@@ -689,7 +777,7 @@ def _call_vertex(internal, prompt, system_prompt, timeout=60, temperature=0.3):
             f'https://{region}-aiplatform.googleapis.com/v1/projects/{project_id}/locations/{region}'
             f'/publishers/google/models/{model_id}:generateContent'
         )
-        r = requests.post(
+        r = llm_http.post('vertex',
             url,
             json=body,
             headers={'Authorization': f'Bearer {token}', 'Content-Type': 'application/json'},
@@ -773,24 +861,228 @@ def call_llm(prompt, system_prompt=None, config=None, temperature=0.3):
     return {'content': f'Unknown provider: {provider}. Use openai, gemini, anthropic, or vertex in Admin → AI Assistant.'}
 
 
-def _run_decision_engine(message, config, history=None, last_filters=None):
+def _iter_sse_data(response):
+    """Yield the decoded JSON of each data: line of a provider's server-sent event stream."""
+    for line in response.iter_lines(decode_unicode=True):
+        if not line or not line.startswith('data:'):
+            continue
+        data = line[5:].strip()
+        if data == '[DONE]':
+            return
+        try:
+            yield json.loads(data)
+        except json.JSONDecodeError:
+            continue
+
+
+def _stream_openai(internal, prompt, system_prompt, temperature=0.3):
+    r = llm_http.post('openai',
+        'https://api.openai.com/v1/chat/completions',
+        headers={'Authorization': f"Bearer {internal.get('api_key')}", 'Content-Type': 'application/json'},
+        json={
+            'model': internal.get('model_id') or 'gpt-4o-mini',
+            'messages': [
+                {'role': 'system', 'content': system_prompt or DEFAULT_SYSTEM_PROMPT},
+                {'role': 'user', 'content': prompt},
+            ],
+            'max_tokens': 1024,
+            'temperature': temperature,
+            'stream': True,
+        },
+        stream=True,
+    )
+    with r:
+        r.raise_for_status()
+        for event in _iter_sse_data(r):
+            text = ((event.get('choices') or [{}])[0].get('delta') or {}).get('content')
+            if text:
+                yield text
+
+
+def _stream_anthropic(internal, prompt, system_prompt, temperature=0.3):
+    r = llm_http.post('anthropic',
+        'https://api.anthropic.com/v1/messages',
+        headers={
+            'x-api-key': internal.get('api_key'),
+            'anthropic-version': '2023-06-01',
+            'Content-Type': 'application/json',
+        },
+        json={
+            'model': internal.get('model_id') or 'claude-3-5-sonnet-20241022',
+            'max_tokens': 1024,
+            'temperature': temperature,
+            'system': system_prompt or DEFAULT_SYSTEM_PROMPT,
+            'messages': [{'role': 'user', 'content': prompt}],
+            'stream': True,
+        },
+        stream=True,
+    )
+    with r:
+        r.raise_for_status()
+        for event in _iter_sse_data(r):
+            if event.get('type') == 'content_block_delta':
+                text = (event.get('delta') or {}).get('text')
+                if text:
+                    yield text
+
+
+def _iter_gemini_text(r):
+    """Text parts of a Gemini / Vertex streamGenerateContent?alt=sse response."""
+    with r:
+        r.raise_for_status()
+        for event in _iter_sse_data(r):
+            for candidate in (event.get('candidates') or [])[:1]:
+                for part in (candidate.get('content') or {}).get('parts') or []:
+                    if part.get('text'):
+                        yield part['text']
+
+
+def _stream_gemini(internal, prompt, system_prompt, temperature=0.3):
+    api_key = internal.get('api_key')
+    model_id = (internal.get('model_id') or 'gemini-2.0-flash').strip()
+    if not model_id.startswith('models/'):
+        model_id = f'models/{model_id}' if model_id else 'models/gemini-2.0-flash'
+    url = f'https://generativelanguage.googleapis.com/v1beta/{model_id}:streamGenerateContent?alt=sse&key={api_key}'
+    body = {
+        'contents': [{'role': 'user', 'parts': [{'text': prompt}]}],
+        'systemInstruction': {'parts': [{'text': system_prompt or DEFAULT_SYSTEM_PROMPT}]},
+        'generationConfig': {'maxOutputTokens': 1024, 'temperature': temperature},
+    }
+    _gemini_throttle()
+    r = llm_http.post('gemini', url, json=body, headers={'Content-Type': 'application/json'}, stream=True)
+    yield from _iter_gemini_text(r)
+
+
+def _stream_vertex(internal, prompt, system_prompt, temperature=0.3):
+    api_key = (internal.get('api_key') or '').strip()
+    model_id = (internal.get('model_id') or 'gemini-2.5-flash-lite').strip()
+    body = {
+        'contents': [{'role': 'user', 'parts': [{'text': prompt}]}],
+        'systemInstruction': {'parts': [{'text': system_prompt or DEFAULT_SYSTEM_PROMPT}]},
+        'generationConfig': {'maxOutputTokens': 1024, 'temperature': temperature},
+    }
+    if _vertex_use_api_key(api_key):
+        url = f'https://aiplatform.googleapis.com/v1/publishers/google/models/{model_id}:streamGenerateContent?alt=sse&key={api_key}'
+        headers = {'Content-Type': 'application/json'}
+    else:
+        region = (internal.get('region') or 'us-central1').strip()
+        project_id, token = _get_vertex_credentials(api_key)
+        if not project_id or not token:
+            raise RuntimeError('Vertex service account JSON must include project_id and private_key (or use an API key).')
+        url = (
+            f'https://{region}-aiplatform.googleapis.com/v1/projects/{project_id}/locations/{region}'
+            f'/publishers/google/models/{model_id}:streamGenerateContent?alt=sse'
+        )
+        headers = {'Authorization': f'Bearer {token}', 'Content-Type': 'application/json'}
+    r = llm_http.post('vertex', url, json=body, headers=headers, stream=True)
+    yield from _iter_gemini_text(r)
+
+
+_STREAM_CALLS = {
+    'openai': _stream_openai,
+    'gemini': _stream_gemini,
+    'anthropic': _stream_anthropic,
+    'vertex': _stream_vertex,
+}
+
+
+def stream_llm(prompt, system_prompt=None, config=None, temperature=0.3):
     """
-    Run the LLM as a decision engine. Returns (action_json_dict, raw_content).
-    action_json_dict is always a dict with action, parameters, message, confidence.
-    On parse failure returns fallback NONE dict.
+    Like call_llm, but yields the reply text in pieces as the provider's streaming API produces them.
+    A provider error before any text yields the same user-facing message call_llm would return;
+    without a usable config or key the whole call_llm reply is yielded as one piece.
     """
-    from utils.ai_action_executor import parse_llm_json_response
+    if system_prompt is None:
+        system_prompt = DEFAULT_SYSTEM_PROMPT
+    if config is None:
+        config = get_effective_provider_config()
+    internal = (config if isinstance(config, dict) else getattr(config, 'to_internal_dict', lambda: config)()) if config else {}
+    provider = (internal.get('provider') or 'openai').strip().lower()
+    stream_call = _STREAM_CALLS.get(provider)
+    if not stream_call or not internal.get('api_key'):
+        yield call_llm(prompt, system_prompt=system_prompt, config=config, temperature=temperature).get('content') or ''
+        return
+    produced = False
+    try:
+        for text in stream_call(internal, prompt, system_prompt, temperature=temperature):
+            produced = True
+            yield text
+    except Exception as e:
+        print(f"Error streaming from {provider}: {e}")
+        if not produced:
+            yield _normalize_llm_error(e)
+
+
+def _decision_prompt(message, history=None, last_filters=None):
+    """Decision-engine user prompt. Returns (prompt, recent_user_messages)."""
     prompt_parts = []
     if last_filters and isinstance(last_filters, dict) and any(v is not None and v != '' for v in last_filters.values()):
         prompt_parts.append("Previous search filters from context (use or merge with new request): " + json.dumps(last_filters))
+    recent_texts = []
     if history and isinstance(history, list):
         recent = [h for h in history[-6:] if (h.get('role') or '').lower() in ('user', 'customer') and (h.get('content') or '').strip()]
+        recent_texts = [(h.get('content') or '').strip() for h in recent]
         if recent:
-            prompt_parts.append("Recent messages:\n" + "\n".join((h.get('content') or '').strip() for h in recent))
+            prompt_parts.append("Recent messages:\n" + "\n".join(recent_texts))
     prompt_parts.append("Current user message: " + (message or '').strip())
-    prompt = "\n\n".join(prompt_parts)
+    return "\n\n".join(prompt_parts), recent_texts
+
+
+def _decision_key(message, config, last_filters, recent_texts):
+    """decision_cache key for one decision-engine call."""
+    from utils.llm_cache import decision_cache_key
+    internal = config if isinstance(config, dict) else (config.to_internal_dict() if hasattr(config, 'to_internal_dict') else {})
+    return decision_cache_key(
+        message, last_filters, recent_texts, internal.get('provider'), internal.get('model_id'),
+        DECISION_ENGINE_PROMPT_VERSION, 0.2,
+    )
+
+
+def _run_decision_engine(message, config, history=None, last_filters=None):
+    """
+    Run the LLM as a decision engine. Returns (action_json_dict, raw_content).
+    action_json_dict is always a dict with action, parameters, message, confidence.
+    On parse failure returns fallback NONE dict.
+    """
+    from utils.llm_cache import decision_cache
+    prompt, recent_texts = _decision_prompt(message, history, last_filters)
+    # Identical requests (same normalized message and context) share one upstream call
+    (parsed_ok, result), status = decision_cache.get_or_compute(
+        _decision_key(message, config, last_filters, recent_texts),
+        lambda: _decide(prompt, config),
+        cacheable=lambda value: value[0],
+        bypass=_ai_cache_bypassed(),
+    )
+    if has_request_context():
+        g.ai_cache_status = status
+    return result
+
+
+def _ai_cache_bypassed():
+    """True when the request asks to skip the decision cache (X-AI-Cache: bypass)."""
+    from utils.llm_cache import BYPASS_HEADER, BYPASS_VALUES
+    return has_request_context() and (request.headers.get(BYPASS_HEADER) or '').strip().lower() in BYPASS_VALUES
+
+
+@ai_agent_bp.after_request
+def _add_ai_cache_header(response):
+    """Report how the decision engine was served (hit / miss / coalesced / bypass)."""
+    status = g.pop('ai_cache_status', None)
+    if status:
+        response.headers['X-AI-Cache'] = status
+    return response
+
+
+def _decide(prompt, config):
+    """One decision-engine LLM call. Returns (parsed_ok, (action_json_dict, raw_content))."""
     result = call_llm(prompt, system_prompt=DECISION_ENGINE_SYSTEM_PROMPT, config=config, temperature=0.2)
-    raw = (result.get('content') or '').strip()
+    return _parse_decision(result.get('content'))
+
+
+def _parse_decision(raw):
+    """Parse a decision-engine reply. Returns (parsed_ok, (action_json_dict, raw_content))."""
+    from utils.ai_action_executor import parse_llm_json_response
+    raw = (raw or '').strip()
     parsed = parse_llm_json_response(raw)
     if parsed and isinstance(parsed.get('action'), str):
         if not isinstance(parsed.get('parameters'), dict):
@@ -799,7 +1091,7 @@ def _run_decision_engine(message, config, history=None, last_filters=None):
             parsed['message'] = ''
         if 'confidence' not in parsed:
             parsed['confidence'] = 0.7
-        return parsed, raw
+        return True, (parsed, raw)
     # Parse failed: LLM may have returned free-form text (e.g. styling advice). Use it as the message
     # so the user sees the actual response instead of a generic fallback.
     # Do NOT use raw if it contains incomplete JSON (e.g. "Sure, I can {\"action\": ") — would expose internals.
@@ -823,7 +1115,7 @@ def _run_decision_engine(message, config, history=None, last_filters=None):
         'message': fallback_message,
         'confidence': 0.3,
     }
-    return fallback, raw
+    return False, (fallback, raw)
 
 
 def _normalize_parameters(parameters):
@@ -1221,7 +1513,7 @@ def call_llm_vision(config, prompt, image_base64, system_prompt=None, media_type
         try:
             content = [{'type': 'text', 'text': prompt}]
             content.append({'type': 'image_url', 'image_url': {'url': f'data:{media_type};base64,{image_base64}'}})
-            r = requests.post(
+            r = llm_http.post('openai',
                 'https://api.openai.com/v1/chat/completions',
                 headers={'Authorization': f'Bearer {api_key}', 'Content-Type': 'application/json'},
                 json={
@@ -1263,7 +1555,7 @@ def call_llm_vision(config, prompt, image_base64, system_prompt=None, media_type
             for attempt in range(3):
                 _gemini_throttle()
                 try:
-                    r = requests.post(url, json=body, headers={'Content-Type': 'application/json'}, timeout=90)
+                    r = llm_http.post('gemini', url, json=body, headers={'Content-Type': 'application/json'}, timeout=90)
                     r.raise_for_status()
                     data = r.json()
                     candidates = data.get('candidates') or []
@@ -1301,7 +1593,7 @@ def call_llm_vision(config, prompt, image_base64, system_prompt=None, media_type
 
     if provider == 'anthropic' and api_key:
         try:
-            r = requests.post(
+            r = llm_http.post('anthropic',
                 'https://api.anthropic.com/v1/messages',
                 headers={'x-api-key': api_key, 'anthropic-version': '2023-06-01', 'Content-Type': 'application/json'},
                 json={
@@ -1345,7 +1637,7 @@ def call_llm_vision(config, prompt, image_base64, system_prompt=None, media_type
                 body['systemInstruction'] = {'parts': [{'text': system_prompt}]}
             if _vertex_use_api_key(key_stripped):
                 url = f'https://aiplatform.googleapis.com/v1/publishers/google/models/{mid}:generateContent?key={key_stripped}'
-                r = requests.post(url, json=body, headers={'Content-Type': 'application/json'}, timeout=90)
+                r = llm_http.post('vertex', url, json=body, headers={'Content-Type': 'application/json'}, timeout=90)
             else:
                 project_id, token = _get_vertex_credentials(key_stripped)
                 if not project_id or not token:
@@ -1355,7 +1647,7 @@ def call_llm_vision(config, prompt, image_base64, system_prompt=None, media_type
                     f'https://{region}-aiplatform.googleapis.com/v1/projects/{project_id}/locations/{region}'
                     f'/publishers/google/models/{mid}:generateContent'
                 )
-                r = requests.post(
+                r = llm_http.post('vertex',
                     url,
                     json=body,
                     headers={'Authorization': f'Bearer {token}', 'Content-Type': 'application/json'},
@@ -1459,11 +1751,178 @@ For ADMIN product flows (only when you have admin tools), follow these rules:
 For all other admin tasks (orders, sales, carts, reviews), use the corresponding tools and then write a short response for the admin to see."""
 
 
+def _confidence_value(confidence):
+    """Decision confidence clamped to [0, 1]; 0.5 when missing or not a number."""
+    try:
+        return max(0.0, min(1.0, float(confidence)))
+    except (TypeError, ValueError):
+        return 0.5
+
+
+def _decision_outcome(message, action_json, current_user, search_result=None):
+    """
+    Turn a decision-engine answer into what the chat replies: infers the action when the LLM gave
+    none, applies the search confidence threshold and executes the action. search_result:
+    (parameters, result) of a SEARCH_PRODUCTS already executed (streaming chat searches early);
+    it is reused when the final parameters are the same. Returns a dict of action, parameters, msg_text, confidence,
+    response_text, suggested_products, redirect_path, exec_error.
+    """
+    from utils.ai_action_executor import execute_action, get_product_attribute_response
+    action = (action_json.get('action') or 'NONE').strip()
+    parameters = _normalize_parameters(action_json.get('parameters'))
+    msg_text = (action_json.get('message') or '').strip()
+    # When LLM returns NONE (e.g. rate limit) or RESPONSE, infer the correct action from the user message
+    inferred_redirect = None
+    if action.upper() in ('RESPONSE', 'NONE'):
+        inferred_action, inferred_params = _infer_action_when_none(message)
+        if inferred_action:
+            action = inferred_action
+            parameters = inferred_params if inferred_params is not None else {}
+            if action.startswith('VIEW_'):
+                inferred_redirect = action
+    confidence = _confidence_value(action_json.get('confidence'))
+    response_text = _sanitize_response_text(msg_text, action)
+    suggested_products = []
+    redirect_path = None
+    exec_error = None
+    # CLARIFY: no backend action; show LLM message only.
+    if action.upper() == 'CLARIFY':
+        response_text = _sanitize_response_text(msg_text or "Could you tell me a bit more about what you're looking for?", action)
+    # Only execute SEARCH_PRODUCTS when LLM explicitly chose it and confidence is high enough.
+    elif action.upper() == 'SEARCH_PRODUCTS':
+        if confidence < SEARCH_CONFIDENCE_THRESHOLD:
+            response_text = _sanitize_response_text(msg_text or "Could you give me a bit more detail—for example category, color, or price range?", action)
+        else:
+            if search_result is not None and search_result[0] == parameters:
+                result = search_result[1]
+            else:
+                result = execute_action(
+                    action,
+                    parameters,
+                    current_user=current_user,
+                    flask_request=request,
+                )
+            if result.get('message_override'):
+                response_text = result['message_override']
+            if not result.get('success'):
+                exec_error = result.get('error') or 'Action failed'
+                response_text = exec_error
+            elif result.get('data') is not None:
+                raw_list = (result.get('data') or {}).get('products')
+                suggested_products = list(raw_list) if raw_list is not None else []
+            if result.get('redirect_path'):
+                redirect_path = result.get('redirect_path')
+    elif action.upper() not in ('RESPONSE', 'NONE'):
+        result = execute_action(
+            action,
+            parameters,
+            current_user=current_user,
+            flask_request=request,
+        )
+        if result.get('message_override'):
+            response_text = result['message_override']
+        if not result.get('success'):
+            exec_error = result.get('error') or 'Action failed'
+            response_text = exec_error
+        if action.upper() == 'SEARCH_PRODUCTS' and result.get('data') is not None:
+            raw_list = (result.get('data') or {}).get('products')
+            suggested_products = list(raw_list) if raw_list is not None else []
+        elif result.get('data') and isinstance(result['data'], dict) and result['data'].get('products'):
+            suggested_products = result['data']['products']
+        if result.get('redirect_path'):
+            redirect_path = result['redirect_path']
+    else:
+        response_text = _sanitize_response_text(response_text, action)
+        if _is_attribute_query(message):
+            has_product_criteria = parameters and any(parameters.get(k) for k in ("category", "color", "clothing_type", "search", "product_id"))
+            att_params = (parameters or {}) if has_product_criteria else _infer_criteria_from_attribute_message(message)
+            if att_params:
+                try:
+                    att_msg = get_product_attribute_response(att_params, message)
+                    if att_msg:
+                        response_text = att_msg
+                except Exception:
+                    pass
+    if inferred_redirect and redirect_path and not exec_error:
+        friendly = _redirect_friendly_message(inferred_redirect)
+        if friendly:
+            response_text = friendly
+    # Override with actual product details when user asked for sizes, colors, brand, description, etc.
+    if action.upper() == 'SEARCH_PRODUCTS' and suggested_products and not exec_error:
+        product_info = _build_product_info_response(message, suggested_products)
+        if product_info:
+            response_text = product_info
+    return {
+        'action': action,
+        'parameters': parameters,
+        'msg_text': msg_text,
+        'confidence': confidence,
+        'response_text': response_text,
+        'suggested_products': suggested_products,
+        'redirect_path': redirect_path,
+        'exec_error': exec_error,
+    }
+
+
+def _chat_response_fields(message, outcome):
+    """Log the exchange and build the response fields shared by /chat, /chat-with-tools and the final streamed event."""
+    action = outcome['action']
+    parameters = outcome['parameters']
+    msg_text = outcome['msg_text']
+    confidence = outcome['confidence']
+    response_text = outcome['response_text']
+    suggested_products = outcome['suggested_products']
+    redirect_path = outcome['redirect_path']
+    exec_error = outcome['exec_error']
+    action_json_for_log = {'action': action, 'parameters': parameters, 'message': msg_text, 'confidence': confidence}
+    append_ai_debug_log(message, response_text, action_json_for_log, exec_error)
+    mj = build_message_json(
+        True,
+        action,
+        exec_error,
+        response_text,
+        'error' if exec_error else 'success',
+        filters=parameters,
+        confidence=confidence,
+    )
+    mj['redirect_path'] = redirect_path
+    mj['suggested_product_ids'] = [p.get('id') for p in suggested_products if p.get('id')]
+    response_action = None
+    structured_response = None
+    # Only send search_results when we have products; otherwise no empty result block.
+    if suggested_products and not exec_error:
+        response_action = 'search_results'
+        structured_response = {
+            'type': 'product_preview',
+            'title': 'Search results',
+            'products': suggested_products,
+            'preview_limit': 5,
+            'show_view_all': True,
+        }
+    elif action.upper() == 'SEARCH_PRODUCTS' and not exec_error and not suggested_products:
+        response_action = None
+        response_text = response_text or _build_no_results_message(parameters)
+        structured_response = {
+            'type': 'no_results',
+            'message': response_text,
+        }
+    elif action.upper() in ('ADD_TO_CART', 'REMOVE_FROM_CART', 'UPDATE_CART_ITEM', 'CLEAR_CART', 'ADD_WISHLIST_TO_CART') and not exec_error:
+        response_action = 'agent_executed'
+    return {
+        'response': response_text,
+        'suggested_products': list(suggested_products) if suggested_products else [],
+        'suggested_product_ids': mj['suggested_product_ids'],
+        'redirect_path': redirect_path,
+        'action': response_action,
+        'structured_response': structured_response,
+        'message_json': mj,
+    }
+
+
 @ai_agent_bp.route('/chat-with-tools', methods=['POST'])
 def chat_with_tools():
     '''Decision-engine chat (authenticated): same as /chat but requires auth. Every message produces structured JSON; backend executes actions. Logs to docs/ai_debug.csv.'''
     try:
-        from utils.ai_action_executor import execute_action, get_product_attribute_response
         user = get_current_user_optional()
         data = request.get_json() or {}
         message = (data.get('message') or '').strip()
@@ -1494,136 +1953,8 @@ def chat_with_tools():
         history = data.get('history') or data.get('conversation_history') or []
         last_filters = data.get('last_filters') or data.get('filters') or {}
         action_json, _ = _run_decision_engine(message, config, history=history, last_filters=last_filters)
-        action = (action_json.get('action') or 'NONE').strip()
-        parameters = _normalize_parameters(action_json.get('parameters'))
-        msg_text = (action_json.get('message') or '').strip()
-        # When LLM returns NONE (e.g. rate limit) or RESPONSE, infer the correct action from the user message
-        inferred_redirect = None
-        if action.upper() in ('RESPONSE', 'NONE'):
-            inferred_action, inferred_params = _infer_action_when_none(message)
-            if inferred_action:
-                action = inferred_action
-                parameters = inferred_params if inferred_params is not None else {}
-                if action.startswith('VIEW_'):
-                    inferred_redirect = action
-        confidence = action_json.get('confidence')
-        try:
-            confidence = max(0.0, min(1.0, float(confidence)))
-        except (TypeError, ValueError):
-            confidence = 0.5
-        response_text = _sanitize_response_text(msg_text, action)
-        suggested_products = []
-        redirect_path = None
-        exec_error = None
-        # CLARIFY: no backend action; show LLM message only.
-        if action.upper() == 'CLARIFY':
-            response_text = _sanitize_response_text(msg_text or "Could you tell me a bit more about what you're looking for?", action)
-        # Only execute SEARCH_PRODUCTS when LLM explicitly chose it and confidence is high enough.
-        elif action.upper() == 'SEARCH_PRODUCTS':
-            if confidence < SEARCH_CONFIDENCE_THRESHOLD:
-                response_text = _sanitize_response_text(msg_text or "Could you give me a bit more detail—for example category, color, or price range?", action)
-            else:
-                result = execute_action(
-                    action,
-                    parameters,
-                    current_user=user,
-                    flask_request=request,
-                )
-                if result.get('message_override'):
-                    response_text = result['message_override']
-                if not result.get('success'):
-                    exec_error = result.get('error') or 'Action failed'
-                    response_text = exec_error
-                elif result.get('data') is not None:
-                    raw_list = (result.get('data') or {}).get('products')
-                    suggested_products = list(raw_list) if raw_list is not None else []
-                if result.get('redirect_path'):
-                    redirect_path = result.get('redirect_path')
-        elif action.upper() not in ('RESPONSE', 'NONE'):
-            result = execute_action(
-                action,
-                parameters,
-                current_user=user,
-                flask_request=request,
-            )
-            if result.get('message_override'):
-                response_text = result['message_override']
-            if not result.get('success'):
-                exec_error = result.get('error') or 'Action failed'
-                response_text = exec_error
-            if action.upper() == 'SEARCH_PRODUCTS' and result.get('data') is not None:
-                raw_list = (result.get('data') or {}).get('products')
-                suggested_products = list(raw_list) if raw_list is not None else []
-            elif result.get('data') and isinstance(result['data'], dict) and result['data'].get('products'):
-                suggested_products = result['data']['products']
-            if result.get('redirect_path'):
-                redirect_path = result['redirect_path']
-        else:
-            response_text = _sanitize_response_text(response_text, action)
-            if _is_attribute_query(message):
-                has_product_criteria = parameters and any(parameters.get(k) for k in ("category", "color", "clothing_type", "search", "product_id"))
-                att_params = (parameters or {}) if has_product_criteria else _infer_criteria_from_attribute_message(message)
-                if att_params:
-                    try:
-                        att_msg = get_product_attribute_response(att_params, message)
-                        if att_msg:
-                            response_text = att_msg
-                    except Exception:
-                        pass
-        if inferred_redirect and redirect_path and not exec_error:
-            friendly = _redirect_friendly_message(inferred_redirect)
-            if friendly:
-                response_text = friendly
-        # Override with actual product details when user asked for sizes, colors, brand, description, etc.
-        if action.upper() == 'SEARCH_PRODUCTS' and suggested_products and not exec_error:
-            product_info = _build_product_info_response(message, suggested_products)
-            if product_info:
-                response_text = product_info
-        action_json_for_log = {'action': action, 'parameters': parameters, 'message': msg_text, 'confidence': confidence}
-        append_ai_debug_log(message, response_text, action_json_for_log, exec_error)
-        mj = build_message_json(
-            True,
-            action,
-            exec_error,
-            response_text,
-            'error' if exec_error else 'success',
-            filters=parameters,
-            confidence=confidence,
-        )
-        mj['redirect_path'] = redirect_path
-        mj['suggested_product_ids'] = [p.get('id') for p in suggested_products if p.get('id')]
-        response_action = None
-        structured_response = None
-        # Only send search_results when we have products; otherwise no empty result block.
-        if suggested_products and not exec_error:
-            response_action = 'search_results'
-            structured_response = {
-                'type': 'product_preview',
-                'title': 'Search results',
-                'products': suggested_products,
-                'preview_limit': 5,
-                'show_view_all': True,
-            }
-        elif action.upper() == 'SEARCH_PRODUCTS' and not exec_error and not suggested_products:
-            response_action = None
-            response_text = response_text or _build_no_results_message(parameters)
-            structured_response = {
-                'type': 'no_results',
-                'message': response_text,
-            }
-        elif action.upper() in ('ADD_TO_CART', 'REMOVE_FROM_CART', 'UPDATE_CART_ITEM', 'CLEAR_CART', 'ADD_WISHLIST_TO_CART') and not exec_error:
-            response_action = 'agent_executed'
-        return jsonify({
-            'success': True,
-            'response': response_text,
-            'selected_provider': provider,
-            'action': response_action,
-            'structured_response': structured_response,
-            'suggested_products': list(suggested_products) if suggested_products else [],
-            'suggested_product_ids': mj['suggested_product_ids'],
-            'redirect_path': redirect_path,
-            'message_json': mj,
-        }), 200
+        outcome = _decision_outcome(message, action_json, user)
+        return jsonify(dict(_chat_response_fields(message, outcome), success=True, selected_provider=provider)), 200
     except Exception as e:
         import traceback
         traceback.print_exc()
@@ -1641,7 +1972,6 @@ def chat_with_tools():
 def chat():
     '''Decision-engine chat: every message produces structured JSON (action, parameters, message, confidence). Backend executes actions and returns response + optional products/redirect. Logs every exchange to docs/ai_debug.csv.'''
     try:
-        from utils.ai_action_executor import execute_action, get_product_attribute_response
         data = request.get_json() or {}
         message = (data.get('message') or '').strip()
         if not message:
@@ -1663,135 +1993,8 @@ def chat():
         history = data.get('history') or data.get('conversation_history') or []
         last_filters = data.get('last_filters') or data.get('filters') or {}
         action_json, raw_content = _run_decision_engine(message, config, history=history, last_filters=last_filters)
-        action = (action_json.get('action') or 'NONE').strip()
-        parameters = _normalize_parameters(action_json.get('parameters'))
-        msg_text = (action_json.get('message') or '').strip()
-        # When LLM returns NONE (e.g. rate limit) or RESPONSE, infer the correct action from the user message
-        inferred_redirect = None
-        if action.upper() in ('RESPONSE', 'NONE'):
-            inferred_action, inferred_params = _infer_action_when_none(message)
-            if inferred_action:
-                action = inferred_action
-                parameters = inferred_params if inferred_params is not None else {}
-                if action.startswith('VIEW_'):
-                    inferred_redirect = action
-        confidence = action_json.get('confidence')
-        try:
-            confidence = max(0.0, min(1.0, float(confidence)))
-        except (TypeError, ValueError):
-            confidence = 0.5
-        response_text = _sanitize_response_text(msg_text, action)
-        suggested_products = []
-        redirect_path = None
-        exec_error = None
-        # CLARIFY: no backend action; show LLM message only.
-        if action.upper() == 'CLARIFY':
-            response_text = _sanitize_response_text(msg_text or "Could you tell me a bit more about what you're looking for?", action)
-        # Only execute SEARCH_PRODUCTS when LLM explicitly chose it and confidence is high enough.
-        elif action.upper() == 'SEARCH_PRODUCTS':
-            if confidence < SEARCH_CONFIDENCE_THRESHOLD:
-                response_text = _sanitize_response_text(msg_text or "Could you give me a bit more detail—for example category, color, or price range?", action)
-            else:
-                result = execute_action(
-                    action,
-                    parameters,
-                    current_user=get_current_user_optional(),
-                    flask_request=request,
-                )
-                if result.get('message_override'):
-                    response_text = result['message_override']
-                if not result.get('success'):
-                    exec_error = result.get('error') or 'Action failed'
-                    response_text = exec_error
-                elif result.get('data') is not None:
-                    raw_list = (result.get('data') or {}).get('products')
-                    suggested_products = list(raw_list) if raw_list is not None else []
-                if result.get('redirect_path'):
-                    redirect_path = result.get('redirect_path')
-        elif action.upper() not in ('RESPONSE', 'NONE'):
-            result = execute_action(
-                action,
-                parameters,
-                current_user=get_current_user_optional(),
-                flask_request=request,
-            )
-            if result.get('message_override'):
-                response_text = result['message_override']
-            if not result.get('success'):
-                exec_error = result.get('error') or 'Action failed'
-                response_text = exec_error
-            if action.upper() == 'SEARCH_PRODUCTS' and result.get('data') is not None:
-                raw_list = (result.get('data') or {}).get('products')
-                suggested_products = list(raw_list) if raw_list is not None else []
-            elif result.get('data') and isinstance(result['data'], dict) and result['data'].get('products'):
-                suggested_products = result['data']['products']
-            if result.get('redirect_path'):
-                redirect_path = result['redirect_path']
-        else:
-            response_text = _sanitize_response_text(response_text, action)
-            if _is_attribute_query(message):
-                has_product_criteria = parameters and any(parameters.get(k) for k in ("category", "color", "clothing_type", "search", "product_id"))
-                att_params = (parameters or {}) if has_product_criteria else _infer_criteria_from_attribute_message(message)
-                if att_params:
-                    try:
-                        att_msg = get_product_attribute_response(att_params, message)
-                        if att_msg:
-                            response_text = att_msg
-                    except Exception:
-                        pass
-        if inferred_redirect and redirect_path and not exec_error:
-            friendly = _redirect_friendly_message(inferred_redirect)
-            if friendly:
-                response_text = friendly
-        # Override with actual product details when user asked for sizes, colors, brand, description, etc.
-        if action.upper() == 'SEARCH_PRODUCTS' and suggested_products and not exec_error:
-            product_info = _build_product_info_response(message, suggested_products)
-            if product_info:
-                response_text = product_info
-        action_json_for_log = {'action': action, 'parameters': parameters, 'message': msg_text, 'confidence': confidence}
-        append_ai_debug_log(message, response_text, action_json_for_log, exec_error)
-        mj = build_message_json(
-            True,
-            action,
-            exec_error,
-            response_text,
-            'error' if exec_error else 'success',
-            filters=parameters,
-            confidence=confidence,
-        )
-        mj['redirect_path'] = redirect_path
-        mj['suggested_product_ids'] = [p.get('id') for p in suggested_products if p.get('id')]
-        response_action = None
-        structured_response = None
-        # Only send search_results when we have products; otherwise no empty result block.
-        if suggested_products and not exec_error:
-            response_action = 'search_results'
-            structured_response = {
-                'type': 'product_preview',
-                'title': 'Search results',
-                'products': suggested_products,
-                'preview_limit': 5,
-                'show_view_all': True,
-            }
-        elif action.upper() == 'SEARCH_PRODUCTS' and not exec_error and not suggested_products:
-            response_action = None
-            response_text = response_text or _build_no_results_message(parameters)
-            structured_response = {
-                'type': 'no_results',
-                'message': response_text,
-            }
-        elif action.upper() in ('ADD_TO_CART', 'REMOVE_FROM_CART', 'UPDATE_CART_ITEM', 'CLEAR_CART', 'ADD_WISHLIST_TO_CART') and not exec_error:
-            response_action = 'agent_executed'
-        return jsonify({
-            'response': response_text,
-            'suggested_products': list(suggested_products) if suggested_products else [],
-            'suggested_product_ids': mj['suggested_product_ids'],
-            'redirect_path': redirect_path,
-            'selected_provider': selected_provider,
-            'action': response_action,
-            'structured_response': structured_response,
-            'message_json': mj,
-        }), 200
+        outcome = _decision_outcome(message, action_json, get_current_user_optional())
+        return jsonify(dict(_chat_response_fields(message, outcome), selected_provider=selected_provider)), 200
     except Exception as e:
         import traceback
         traceback.print_exc()
@@ -1803,6 +2006,99 @@ def chat():
         }), 500
 
 
+@ai_agent_bp.route('/chat/stream', methods=['POST'])
+def chat_stream():
+    '''Streaming /chat (text/event-stream). Events: decision {action, filters} as soon as the decision engine's
+    action and parameters parse; products {suggested_products} (for SEARCH_PRODUCTS, searched as soon as its
+    confidence is known to be at least SEARCH_CONFIDENCE_THRESHOLD - before the text when the model writes
+    confidence ahead of message as prompted, otherwise once the reply is complete; never for a low-confidence search);
+    token {text} as the assistant message streams from the provider; done with the full /chat response body,
+    message_json included, which is authoritative (it reflects confidence gating and action results the
+    earlier events could not); error {error, message_json} on failure.'''
+    from utils.ai_action_executor import execute_action
+    from utils.llm_cache import decision_cache
+    from utils.llm_stream import DecisionStreamParser, sse_event
+    data = request.get_json() or {}
+    message = (data.get('message') or '').strip()
+    if not message:
+        append_ai_debug_log('', None, None, 'Message is required')
+        return jsonify({
+            'error': 'Message is required',
+            'message_json': build_message_json(False, 'NONE', 'Message is required', '', 'error', confidence=0),
+        }), 400
+    ai_config = get_active_ai_config()
+    selected_provider = get_selected_provider()
+    if not ai_config:
+        append_ai_debug_log(message, None, None, 'No AI provider is available.')
+        return jsonify({
+            'error': "No AI provider is available. Set an API key in Admin → AI Assistant.",
+            'selected_provider': selected_provider,
+            'message_json': build_message_json(False, 'NONE', 'No AI provider available', '', 'error', confidence=0),
+        }), 503
+    config = ai_config.to_internal_dict() if hasattr(ai_config, 'to_internal_dict') else ai_config
+    history = data.get('history') or data.get('conversation_history') or []
+    last_filters = data.get('last_filters') or data.get('filters') or {}
+    current_user = get_current_user_optional()
+    prompt, recent_texts = _decision_prompt(message, history, last_filters)
+    key = _decision_key(message, config, last_filters, recent_texts)
+    bypass = _ai_cache_bypassed()
+    cached = None if bypass else decision_cache.get(key)
+    g.ai_cache_status = 'bypass' if bypass else ('hit' if cached is not None else 'miss')
+
+    def generate():
+        try:
+            search_result = None
+            products_sent = tokens_sent = False
+            if cached is not None:
+                action_json = cached[1][0]
+                yield sse_event('decision', {'action': action_json.get('action'), 'filters': action_json.get('parameters') or {}})
+            else:
+                parser = DecisionStreamParser()
+                for chunk in stream_llm(prompt, DECISION_ENGINE_SYSTEM_PROMPT, config, temperature=0.2):
+                    head, delta = parser.feed(chunk)
+                    if head:
+                        yield sse_event('decision', {'action': head['action'], 'filters': head['parameters']})
+                        if head['action'].strip().upper() == 'SEARCH_PRODUCTS' \
+                                and _confidence_value(head.get('confidence')) >= SEARCH_CONFIDENCE_THRESHOLD:
+                            parameters = _normalize_parameters(head['parameters'])
+                            result = execute_action('SEARCH_PRODUCTS', parameters, current_user=current_user, flask_request=request)
+                            search_result = (parameters, result)
+                            products = (result.get('data') or {}).get('products') if result.get('success') else None
+                            if products is not None:
+                                products_sent = True
+                                yield sse_event('products', {'suggested_products': list(products)})
+                    if delta:
+                        tokens_sent = True
+                        yield sse_event('token', {'text': delta})
+                decision = _parse_decision(parser.text)
+                if decision[0] and not bypass:
+                    decision_cache.put(key, decision)
+                action_json = decision[1][0]
+                if parser.head is None:
+                    yield sse_event('decision', {'action': action_json.get('action'), 'filters': action_json.get('parameters') or {}})
+            outcome = _decision_outcome(message, action_json, current_user, search_result=search_result)
+            fields = _chat_response_fields(message, outcome)
+            if fields['suggested_products'] and not products_sent:
+                yield sse_event('products', {'suggested_products': fields['suggested_products']})
+            if fields['response'] and not tokens_sent:
+                yield sse_event('token', {'text': fields['response']})
+            yield sse_event('done', dict(fields, selected_provider=selected_provider))
+        except Exception as e:
+            import traceback
+            traceback.print_exc()
+            append_ai_debug_log(message, None, None, str(e))
+            yield sse_event('error', {
+                'error': str(e),
+                'message_json': build_message_json(False, 'NONE', str(e), '', 'error', confidence=0),
+            })
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'},
+    )
+
+
 @ai_agent_bp.route('/search', methods=['POST'])
 def ai_search():
     """AI-powered product search."""
@@ -1823,12 +2119,9 @@ def ai_search():
             ordered_products = [products_dict[pid] for pid in product_ids if pid in products_dict]
         else:
             # Fallback to regular search
-            products = Product.query.filter(
-                or_(
-                    Product.name.ilike(f'%{query}%'),
-                    Product.description.ilike(f'%{query}%')
-                )
-            ).filter_by(is_active=True).limit(20).all()
+            products = apply_text_search(
+                Product.query.filter_by(is_active=True), query, columns=('name', 'description')
+            ).limit(20).all()
             ordered_products = [p.to_dict() for p in products]
         
         return jsonify({
@@ -1871,8 +2164,8 @@ def compare_products():
         if len(products) != len(product_ids):
             return jsonify({'error': 'Some products not found'}), 404
         
-        # Convert to dict while session is active
-        products_dict = [p.to_dict() for p in products]
+        # Convert to dict while session is active (one variation-stock and sale pass for all)
+        products_dict = ProductSerializer.serialize_many(products)
         
         return jsonify({
             'products': products_dict,
@@ -2767,16 +3060,11 @@ def find_matches_for_image():
                         search_terms = matched_product_name.lower().split()
                         query = Product.query.filter_by(is_active=True)
                         
-                        # Try to find products matching the suggested item
-                        for term in search_terms:
-                            if len(term) > 2:  # Skip very short terms
-                                query = query.filter(
-                                    or_(
-                                        Product.name.ilike(f'%{term}%'),
-                                        Product.clothing_type.ilike(f'%{term}%'),
-                                        Product.description.ilike(f'%{term}%')
-                                    )
-                                )
+                        # Try to find products matching the suggested item (skip very short terms)
+                        query = apply_text_search(
+                            query, ' '.join(t for t in search_terms if len(t) > 2),
+                            columns=('name', 'clothing_type', 'description')
+                        )
                         
                         matching_products = query.limit(2).all()
                         
@@ -2807,14 +3095,9 @@ def find_matches_for_image():
                     search_terms = matched_product_name.lower().split()
                     query = Product.query.filter_by(is_active=True)
                     
-                    for term in search_terms:
-                        if len(term) > 2:
-                            query = query.filter(
-                                or_(
-                                    Product.name.ilike(f'%{term}%'),
-                                    Product.clothing_type.ilike(f'%{term}%')
-                                )
-                            )
+                    query = apply_text_search(
+                        query, ' '.join(t for t in search_terms if len(t) > 2), columns=('name', 'clothing_type')
+                    )
                     
                     matching_products = query.limit(2).all()
                     existing_ids = {p['id'] for p in matched_products}
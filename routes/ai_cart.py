@@ -124,6 +124,7 @@ def ai_add_to_cart():
                 return jsonify({'error': 'Insufficient stock'}), 400
             quantity = min(quantity, product.stock_quantity - current_in_cart)
             add_to_guest_cart(final_product_id, quantity, color, size)
+            db.session.commit()
         
         return jsonify({
             'message': f'Added {quantity} {product.name} to cart',
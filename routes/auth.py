@@ -2,7 +2,8 @@ from flask import Blueprint, request, jsonify
 from flask_jwt_extended import create_access_token, jwt_required, get_jwt_identity
 from models.database import db
 from models.user import User
-from utils.email import send_activation_email, send_email
+from utils.email import send_email
+from utils.email_outbox import notify_email_worker, queue_activation_email
 from config import Config
 import bcrypt
 import requests
@@ -104,10 +105,10 @@ def register():
         verification_token = user.generate_verification_token()
         
         db.session.add(user)
+        # Activation email is queued with the account and sent by the outbox worker
+        queue_activation_email(email, first_name, verification_token)
         db.session.commit()
-        
-        # Send activation email
-        send_activation_email(email, first_name, verification_token)
+        notify_email_worker()
         
         return jsonify({
             'message': 'Registration successful. Please check your email to activate your account.',
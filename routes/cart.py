@@ -7,14 +7,36 @@ from routes.auth import require_auth
 from sqlalchemy.orm import joinedload
 from config import Config
 from utils.guest_cart import (
-    get_guest_cart, add_to_guest_cart, update_guest_cart_item,
+    get_guest_cart, get_guest_cart_token, add_to_guest_cart, update_guest_cart_item,
     remove_from_guest_cart, clear_guest_cart
 )
+from utils.inventory import InsufficientStock, hold_stock, release_hold, release_holds, set_hold
+from utils.cart_merge import merge_guest_cart
 from utils.product_relations import get_related_products_for_cart
 from utils.cart_matching_pairs import get_matching_pairs_for_cart
+from utils.cart_pricer import CartPricer
 
 cart_bp = Blueprint('cart', __name__)
 
+def _find_variation(product_id, selected_color, selected_size):
+    """The product's variation for a size and color, or None."""
+    if selected_size is None or selected_color is None:
+        return None
+    return ProductVariation.query.filter_by(
+        product_id=product_id,
+        size=(selected_size or '').strip(),
+        color=(selected_color or '').strip()
+    ).first()
+
+def _move_hold(old_variation_id, old_quantity, new_variation, quantity, user_id=None, cart_token=None):
+    """
+    A cart line changed size/color: return the old variation's hold and hold quantity of the new
+    one, in the request's transaction. Raises InsufficientStock.
+    """
+    if old_variation_id:
+        release_hold(old_variation_id, old_quantity, user_id=user_id, cart_token=cart_token)
+    hold_stock(new_variation, quantity, user_id=user_id, cart_token=cart_token)
+
 @cart_bp.route('', methods=['GET'])
 def get_cart():
     """Get cart items (authenticated or guest)."""
@@ -34,120 +56,62 @@ def get_cart():
                     user = User.query.get(payload.get('sub') or payload.get('user_id'))
                     if user:
                         # Merge guest cart into user cart if session has guest items (e.g. after login)
+                        merge_report = None
                         guest_cart = get_guest_cart()
                         if guest_cart:
-                            for g in guest_cart:
-                                product_id = g.get('product_id')
-                                quantity = int(g.get('quantity', 1))
-                                selected_color = g.get('selected_color')
-                                selected_size = g.get('selected_size')
-                                variation_id = g.get('variation_id')
-                                product = Product.query.get(product_id) if product_id else None
-                                if not product or not product.is_active or quantity < 1:
-                                    continue
-                                variation = None
-                                if variation_id:
-                                    variation = ProductVariation.query.get(variation_id)
-                                if not variation and (selected_size or selected_color):
-                                    variation = ProductVariation.query.filter_by(
-                                        product_id=product_id,
-                                        size=selected_size or '',
-                                        color=selected_color or ''
-                                    ).first()
-                                if variation:
-                                    existing = CartItem.query.filter_by(
-                                        user_id=user.id,
-                                        product_id=product_id,
-                                        variation_id=variation.id
-                                    ).first()
-                                    if existing:
-                                        old_qty = existing.quantity
-                                        new_qty = min(old_qty + quantity, variation.stock_quantity)
-                                        variation.stock_quantity -= (new_qty - old_qty)
-                                        existing.quantity = new_qty
-                                    else:
-                                        qty = min(quantity, variation.stock_quantity)
-                                        if qty > 0:
-                                            variation.stock_quantity -= qty
-                                            db.session.add(CartItem(
-                                                user_id=user.id,
-                                                product_id=product_id,
-                                                variation_id=variation.id,
-                                                quantity=qty,
-                                                selected_color=variation.color,
-                                                selected_size=variation.size
-                                            ))
-                                else:
-                                    existing = CartItem.query.filter_by(
-                                        user_id=user.id,
-                                        product_id=product_id,
-                                        selected_color=selected_color,
-                                        selected_size=selected_size
-                                    ).first()
-                                    if existing:
-                                        new_qty = min(existing.quantity + quantity, product.stock_quantity)
-                                        existing.quantity = new_qty
-                                    else:
-                                        qty = min(quantity, product.stock_quantity)
-                                        if qty > 0:
-                                            db.session.add(CartItem(
-                                                user_id=user.id,
-                                                product_id=product_id,
-                                                quantity=qty,
-                                                selected_color=selected_color,
-                                                selected_size=selected_size
-                                            ))
                             try:
+                                merge_report = merge_guest_cart(user.id, guest_cart, get_guest_cart_token())
+                                clear_guest_cart()
                                 db.session.commit()
-                            except Exception:
+                            except Exception as e:
                                 db.session.rollback()
-                            clear_guest_cart()
+                                print(f"Error merging guest cart into user {user.id}: {e}")
+                                merge_report = {'error': 'Guest cart could not be merged'}
 
                         cart_items = CartItem.query.filter_by(user_id=user.id).all()
-                        # Calculate total using sale prices if available
-                        total = 0.0
+                        # Price all cart lines in one pass, then serialize them with the same prices
+                        pricer = CartPricer.for_cart_items(cart_items, active_only=False)
+                        items = []
                         for item in cart_items:
-                            if item.product:
-                                try:
-                                    product_dict = item.product.to_dict()
-                                    current_price = product_dict.get('price', float(item.product.price) if item.product.price else 0.0)
-                                except Exception:
-                                    current_price = float(item.product.price) if item.product.price else 0.0
-                                total += current_price * item.quantity
-                        return jsonify({
-                            'items': [item.to_dict() for item in cart_items],
-                            'total': float(total),
+                            item_dict = item.to_dict(pricer.sale_prices)
+                            line = pricer.line_for(item)
+                            if line is not None:
+                                item_dict['subtotal'] = float(line.subtotal)
+                            items.append(item_dict)
+                        response = {
+                            'items': items,
+                            'total': float(pricer.subtotal),
                             'is_guest': False
-                        }), 200
+                        }
+                        if merge_report is not None:
+                            response['merge'] = merge_report
+                        return jsonify(response), 200
             except:
                 pass
         
         # Guest cart
         guest_cart = get_guest_cart()
         items = []
-        total = 0.0
+        pricer = CartPricer.for_guest_cart(guest_cart)
         
         for index, cart_item in enumerate(guest_cart):
-            product = Product.query.get(cart_item['product_id'])
-            if product and product.is_active:
+            line = pricer.line_for(cart_item)
+            if line is not None:
+                product = line.product
                 try:
-                    product_dict = product.to_dict()
-                    current_price = product_dict.get('price', float(product.price) if product.price else 0.0)
+                    product_dict = product.to_dict(pricer.sale_prices)
                 except Exception:
                     # If to_dict fails, use basic product info
                     product_dict = {
                         'id': product.id,
                         'name': product.name,
-                        'price': float(product.price) if product.price else 0.0,
-                        'original_price': float(product.price) if product.price else 0.0,
-                        'on_sale': False,
+                        'price': float(line.unit_price),
+                        'original_price': float(line.original_price),
+                        'on_sale': line.on_sale,
                         'image_url': product.image_url,
                         'stock_quantity': getattr(product, 'stock_quantity', 0)
                     }
-                    current_price = float(product.price) if product.price else 0.0
-                
-                item_total = current_price * cart_item['quantity']
-                total += item_total
+                item_total = float(line.subtotal)
                 
                 # Create unique ID that includes product_id, color, size, and index
                 # This ensures each cart item has a unique identifier
@@ -168,7 +132,7 @@ def get_cart():
         
         return jsonify({
             'items': items,
-            'total': total,
+            'total': float(pricer.subtotal),
             'is_guest': True
         }), 200
         
@@ -197,12 +161,8 @@ def add_to_cart():
         variation = None
         if variation_id:
             variation = ProductVariation.query.filter_by(id=variation_id, product_id=product_id).first()
-        if not variation and (selected_size is not None and selected_color is not None):
-            variation = ProductVariation.query.filter_by(
-                product_id=product_id,
-                size=(selected_size or '').strip(),
-                color=(selected_color or '').strip()
-            ).first()
+        if not variation:
+            variation = _find_variation(product_id, selected_color, selected_size)
 
         # If product has any variations, we require a valid variation
         has_variations = ProductVariation.query.filter_by(product_id=product_id).count() > 0
@@ -237,16 +197,15 @@ def add_to_cart():
                                 product_id=product_id,
                                 variation_id=variation.id
                             ).first()
+                            try:
+                                hold_stock(variation, quantity, user_id=user.id)
+                            except InsufficientStock:
+                                db.session.rollback()
+                                return jsonify({'error': 'Insufficient stock for this variation'}), 400
+                            remaining_stock = variation.stock_quantity
                             if existing_item:
-                                new_total = existing_item.quantity + quantity
-                                if new_total > variation.stock_quantity:
-                                    return jsonify({'error': 'Insufficient stock for this variation'}), 400
-                                existing_item.quantity = new_total
-                                variation.stock_quantity -= quantity
-                                remaining_stock = variation.stock_quantity
+                                existing_item.quantity += quantity
                             else:
-                                variation.stock_quantity -= quantity
-                                remaining_stock = variation.stock_quantity
                                 db.session.add(CartItem(
                                     user_id=user.id,
                                     product_id=product_id,
@@ -286,26 +245,13 @@ def add_to_cart():
 
         # Guest cart
         if has_variations:
-            guest_cart = get_guest_cart()
-            current_in_cart = sum(
-                item.get('quantity', 0)
-                for item in guest_cart
-                if (item.get('product_id') == product_id and item.get('variation_id') == variation.id)
-            )
-            if not current_in_cart:
-                current_in_cart = sum(
-                    item.get('quantity', 0)
-                    for item in guest_cart
-                    if (item.get('product_id') == product_id
-                        and item.get('selected_color') == selected_color
-                        and item.get('selected_size') == selected_size)
-                )
-            if current_in_cart + quantity > variation.stock_quantity:
+            try:
+                hold_stock(variation, quantity, cart_token=get_guest_cart_token())
+            except InsufficientStock:
+                db.session.rollback()
                 return jsonify({'error': 'Insufficient stock for this variation'}), 400
-            quantity_to_add = min(quantity, variation.stock_quantity - current_in_cart)
-            variation.stock_quantity -= quantity_to_add
+            add_to_guest_cart(product_id, quantity, selected_color, selected_size, variation_id=variation.id)
             db.session.commit()
-            add_to_guest_cart(product_id, quantity_to_add, selected_color, selected_size, variation_id=variation.id)
             remaining_stock = variation.stock_quantity
         else:
             guest_cart = get_guest_cart()
@@ -320,6 +266,7 @@ def add_to_cart():
                 return jsonify({'error': 'Insufficient stock'}), 400
             quantity_to_add = min(quantity, product.stock_quantity - current_in_cart)
             add_to_guest_cart(product_id, quantity_to_add, selected_color, selected_size)
+            db.session.commit()
             remaining_stock = product.stock_quantity - (current_in_cart + quantity_to_add)
         return jsonify({'message': 'Item added to cart', 'remaining_stock': remaining_stock}), 200
 
@@ -386,17 +333,51 @@ def update_cart_item(item_id):
                 print(f"Insufficient stock: requested {quantity}, available {product.stock_quantity}")
                 return jsonify({'error': 'Insufficient stock'}), 400
             
+            search_color = old_color if old_color is not None else selected_color
+            search_size = old_size if old_size is not None else selected_size
+            line = next((
+                item for item in get_guest_cart()
+                if item.get('product_id') == product_id
+                and (not search_color or item.get('selected_color') == search_color)
+                and (not search_size or item.get('selected_size') == search_size)
+            ), None)
+            new_variation_id = None
+            if line and line.get('variation_id'):
+                cart_token = get_guest_cart_token()
+                new_color = selected_color if selected_color is not None else line.get('selected_color')
+                new_size = selected_size if selected_size is not None else line.get('selected_size')
+                try:
+                    if (new_color, new_size) == (line.get('selected_color'), line.get('selected_size')):
+                        # Keeping its size/color: hold exactly the new quantity
+                        variation = ProductVariation.query.get(line['variation_id'])
+                        if variation:
+                            set_hold(variation, quantity, cart_token=cart_token)
+                    else:
+                        # Changing size/color: move the hold to the new variation
+                        variation = _find_variation(product_id, new_color, new_size)
+                        if not variation:
+                            db.session.rollback()
+                            return jsonify({'error': 'Please select a valid size and color'}), 400
+                        _move_hold(line['variation_id'], line.get('quantity', 0), variation, quantity,
+                                   cart_token=cart_token)
+                        new_variation_id = variation.id
+                except InsufficientStock:
+                    db.session.rollback()
+                    return jsonify({'error': 'Insufficient stock for this variation'}), 400
+            
             # For guest cart, we need to find the item by product_id, color, and size
             # The update function will handle finding and updating the correct item
             print(f"Calling update_guest_cart_item with product_id={product_id}, quantity={quantity}, color={selected_color}, size={selected_size}, old_color={old_color}, old_size={old_size}")
-            success = update_guest_cart_item(product_id, quantity, selected_color, selected_size, old_color, old_size)
+            success = update_guest_cart_item(product_id, quantity, selected_color, selected_size, old_color, old_size,
+                                             variation_id=new_variation_id)
             if success:
+                db.session.commit()
                 print("Guest cart item updated successfully")
                 return jsonify({'message': 'Cart item updated'}), 200
             else:
+                db.session.rollback()
                 print("Guest cart item not found")
                 # Debug: show current cart contents
-                from utils.guest_cart import get_guest_cart
                 current_cart = get_guest_cart()
                 print(f"Current cart has {len(current_cart)} items:")
                 for idx, item in enumerate(current_cart):
@@ -421,16 +402,38 @@ def update_cart_item(item_id):
         
         cart_item = CartItem.query.filter_by(id=int(item_id), user_id=user.id).first_or_404()
         product = Product.query.get(cart_item.product_id)
-        if cart_item.variation_id:
+        new_color = selected_color if selected_color is not None else cart_item.selected_color
+        new_size = selected_size if selected_size is not None else cart_item.selected_size
+        if cart_item.variation_id and (new_color, new_size) != (cart_item.selected_color, cart_item.selected_size):
+            # Changing size/color: move the hold to the new variation
+            variation = _find_variation(cart_item.product_id, new_color, new_size)
+            if not variation:
+                return jsonify({'error': 'Please select a valid size and color'}), 400
+            try:
+                _move_hold(cart_item.variation_id, cart_item.quantity, variation, quantity, user_id=user.id)
+            except InsufficientStock:
+                db.session.rollback()
+                return jsonify({'error': 'Insufficient stock for this variation'}), 400
+            existing_item = CartItem.query.filter(
+                CartItem.user_id == user.id, CartItem.variation_id == variation.id, CartItem.id != cart_item.id
+            ).first()
+            if existing_item:
+                # Already in the cart: merge the lines (its hold already covers its own quantity)
+                existing_item.quantity += quantity
+                db.session.delete(cart_item)
+                db.session.commit()
+                return jsonify({'message': 'Cart item updated', 'item': existing_item.to_dict()}), 200
+            cart_item.variation_id = variation.id
+            cart_item.selected_color = variation.color
+            cart_item.selected_size = variation.size
+        elif cart_item.variation_id:
             variation = ProductVariation.query.get(cart_item.variation_id)
             if variation:
-                old_qty = cart_item.quantity
-                variation.stock_quantity += old_qty
-                if quantity > variation.stock_quantity:
-                    variation.stock_quantity -= old_qty
+                try:
+                    set_hold(variation, quantity, user_id=user.id)
+                except InsufficientStock:
                     db.session.rollback()
                     return jsonify({'error': 'Insufficient stock for this variation'}), 400
-                variation.stock_quantity -= quantity
         else:
             if product and product.stock_quantity < quantity:
                 return jsonify({'error': 'Insufficient stock'}), 400
@@ -504,13 +507,8 @@ def remove_from_cart(item_id):
             
             result = remove_from_guest_cart(product_id, selected_color, selected_size)
             if variation_id_to_restore and removed_qty > 0:
-                variation = ProductVariation.query.get(variation_id_to_restore)
-                if variation:
-                    variation.stock_quantity += removed_qty
-                    try:
-                        db.session.commit()
-                    except Exception:
-                        db.session.rollback()
+                release_hold(variation_id_to_restore, removed_qty, cart_token=get_guest_cart_token())
+            db.session.commit()
             
             return jsonify({'message': 'Item removed from cart', 'removed': result}), 200
         
@@ -527,6 +525,7 @@ def remove_from_cart(item_id):
                 selected_color = data.get('selected_color')
                 selected_size = data.get('selected_size')
                 remove_from_guest_cart(product_id, selected_color, selected_size)
+                db.session.commit()
                 return jsonify({'message': 'Item removed from cart'}), 200
             except (ValueError, TypeError):
                 return jsonify({'error': 'Authentication required'}), 401
@@ -544,9 +543,7 @@ def remove_from_cart(item_id):
         
         cart_item = CartItem.query.filter_by(id=int(item_id), user_id=user.id).first_or_404()
         if cart_item.variation_id:
-            variation = ProductVariation.query.get(cart_item.variation_id)
-            if variation:
-                variation.stock_quantity += cart_item.quantity
+            release_hold(cart_item.variation_id, cart_item.quantity, user_id=user.id)
         db.session.delete(cart_item)
         db.session.commit()
         
@@ -574,31 +571,17 @@ def clear_cart():
                     from models.user import User
                     user = User.query.get(payload.get('sub') or payload.get('user_id'))
                     if user:
-                        for item in CartItem.query.filter_by(user_id=user.id).all():
-                            if item.variation_id:
-                                v = ProductVariation.query.get(item.variation_id)
-                                if v:
-                                    v.stock_quantity += item.quantity
+                        release_holds(user_id=user.id)
                         CartItem.query.filter_by(user_id=user.id).delete()
                         db.session.commit()
                         return jsonify({'message': 'Cart cleared'}), 200
             except:
                 pass
         
-        # Guest cart: restore variation stock for each item then clear
-        guest_cart = get_guest_cart()
-        for item in guest_cart:
-            vid = item.get('variation_id')
-            qty = int(item.get('quantity', 0))
-            if vid and qty > 0:
-                v = ProductVariation.query.get(vid)
-                if v:
-                    v.stock_quantity += qty
-        try:
-            db.session.commit()
-        except Exception:
-            db.session.rollback()
+        # Guest cart: return the stock its lines hold and clear them in one transaction
+        release_holds(cart_token=get_guest_cart_token())
         clear_guest_cart()
+        db.session.commit()
         return jsonify({'message': 'Cart cleared'}), 200
         
     except Exception as e:
@@ -1,4 +1,5 @@
 from flask import Blueprint, request, jsonify
+from sqlalchemy import case, func
 from models.database import db
 from models.order import Order
 from models.payment import Payment
@@ -14,10 +15,10 @@ def get_member_orders():
     try:
         user = request.current_user
         
-        orders = Order.query.filter_by(user_id=user.id).order_by(Order.created_at.desc()).all()
+        orders = Order.query.options(Order.items_loader()).filter_by(user_id=user.id).order_by(Order.created_at.desc()).all()
         
         return jsonify({
-            'orders': [order.to_dict() for order in orders],
+            'orders': Order.serialize_many(orders),
             'total_orders': len(orders)
         }), 200
         
@@ -31,12 +32,10 @@ def get_member_payments():
     try:
         user = request.current_user
         
-        # Get all user orders
-        orders = Order.query.filter_by(user_id=user.id).all()
-        order_ids = [order.id for order in orders]
-        
-        # Get all payments for those orders
-        payments = Payment.query.filter(Payment.order_id.in_(order_ids)).order_by(Payment.created_at.desc()).all()
+        # Get all payments for the user's orders
+        payments = Payment.query.join(Order, Payment.order_id == Order.id).filter(
+            Order.user_id == user.id
+        ).order_by(Payment.created_at.desc()).all()
         
         # Get all payment logs for this user (includes all attempts, successful or not)
         payment_logs = PaymentLog.query.filter_by(user_id=user.id).order_by(PaymentLog.created_at.desc()).all()
@@ -67,28 +66,32 @@ def get_member_dashboard():
     try:
         user = request.current_user
         
-        # Get orders
-        orders = Order.query.filter_by(user_id=user.id).order_by(Order.created_at.desc()).all()
-        
-        # Get payments
-        order_ids = [order.id for order in orders]
-        payments = Payment.query.filter(Payment.order_id.in_(order_ids)).all()
+        # Calculate statistics with aggregates (one row each, whatever the order history size)
+        counts = db.session.query(
+            func.count(Order.id),
+            func.coalesce(func.sum(case((Order.status.in_(['pending', 'processing']), 1), else_=0)), 0),
+            func.coalesce(func.sum(case((Order.status == 'delivered', 1), else_=0)), 0)
+        ).filter(Order.user_id == user.id).one()
+        total_spent = db.session.query(func.coalesce(func.sum(Payment.amount), 0)).join(
+            Order, Payment.order_id == Order.id
+        ).filter(Order.user_id == user.id, Payment.status == 'completed').scalar()
         
-        # Calculate statistics
-        total_spent = sum(float(p.amount) for p in payments if p.status == 'completed')
-        total_orders = len(orders)
-        pending_orders = len([o for o in orders if o.status in ['pending', 'processing']])
+        # Recent orders as summaries (items are served by /orders)
+        recent_orders = Order.query.filter_by(user_id=user.id).order_by(Order.created_at.desc()).limit(5).all()
+        recent_payments = Payment.query.join(Order, Payment.order_id == Order.id).filter(
+            Order.user_id == user.id
+        ).order_by(Payment.created_at.desc()).limit(5).all()
         
         return jsonify({
             'user': user.to_dict(),
             'statistics': {
-                'total_orders': total_orders,
-                'pending_orders': pending_orders,
-                'total_spent': total_spent,
-                'completed_orders': len([o for o in orders if o.status == 'delivered'])
+                'total_orders': int(counts[0]),
+                'pending_orders': int(counts[1]),
+                'total_spent': float(total_spent),
+                'completed_orders': int(counts[2])
             },
-            'recent_orders': [order.to_dict() for order in orders[:5]],
-            'recent_payments': [payment.to_dict() for payment in payments[:5]]
+            'recent_orders': Order.serialize_many(recent_orders, summary=True),
+            'recent_payments': [payment.to_dict() for payment in recent_payments]
         }), 200
         
     except Exception as e:
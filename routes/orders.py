@@ -4,13 +4,22 @@ from models.order import Order, OrderItem
 from models.cart import CartItem
 from models.user import User
 from routes.auth import require_auth
-from utils.guest_cart import get_guest_cart
-from utils.email import send_order_confirmation_email
-from decimal import Decimal
+from utils.guest_cart import get_guest_cart, get_guest_cart_token
+from utils.email_outbox import notify_email_worker, queue_order_confirmation_email
+from utils.cart_pricer import CartPricer
+from utils.inventory import InsufficientStock, checkout_stock
 import bcrypt
 
 orders_bp = Blueprint('orders', __name__)
 
+
+def _line_variation_id(line):
+    """Variation of a priced cart line (CartItem or guest cart dict), or None."""
+    if isinstance(line.source, dict):
+        return line.source.get('variation_id')
+    return line.source.variation_id
+
+
 @orders_bp.route('', methods=['POST'])
 def create_order():
     """Create a new order from cart (authenticated or guest)."""
@@ -34,46 +43,15 @@ def create_order():
             except:
                 pass
         
-        # Get cart items and calculate prices using sale prices
-        cart_items_data = []
+        # Price all cart lines in one pass (sale prices, Decimal totals)
         if user and not is_guest:
             # Authenticated user
-            cart_items = CartItem.query.filter_by(user_id=user.id).all()
-            for cart_item in cart_items:
-                if cart_item.product and cart_item.product.is_active:
-                    # Get sale price if available
-                    try:
-                        product_dict = cart_item.product.to_dict()
-                        current_price = product_dict.get('price', float(cart_item.product.price) if cart_item.product.price else 0.0)
-                    except Exception:
-                        current_price = float(cart_item.product.price) if cart_item.product.price else 0.0
-                    
-                    cart_items_data.append({
-                        'product': cart_item.product,
-                        'quantity': cart_item.quantity,
-                        'price': Decimal(str(current_price))  # Use sale price if on sale
-                    })
+            pricer = CartPricer.for_cart_items(CartItem.query.filter_by(user_id=user.id).all())
         else:
             # Guest cart
-            from models.product import Product
-            guest_cart = get_guest_cart()
-            for cart_item in guest_cart:
-                product = Product.query.get(cart_item['product_id'])
-                if product and product.is_active:
-                    # Get sale price if available
-                    try:
-                        product_dict = product.to_dict()
-                        current_price = product_dict.get('price', float(product.price) if product.price else 0.0)
-                    except Exception:
-                        current_price = float(product.price) if product.price else 0.0
-                    
-                    cart_items_data.append({
-                        'product': product,
-                        'quantity': cart_item['quantity'],
-                        'price': Decimal(str(current_price))  # Use sale price if on sale
-                    })
-        
-        if not cart_items_data:
+            pricer = CartPricer.for_guest_cart(get_guest_cart())
+        
+        if not pricer.lines:
             return jsonify({'error': 'Cart is empty'}), 400
         
         # Shipping information
@@ -89,43 +67,34 @@ def create_order():
         if not all([shipping_name, shipping_address, shipping_city, shipping_state, shipping_zip]):
             return jsonify({'error': 'Shipping information is required'}), 400
         
-        # Calculate totals using sale prices
-        subtotal = Decimal('0.00')
-        order_items_data = []
+        # Stock to take: product stock for every line, variation stock beyond what the cart holds
+        product_quantities = {}
+        variation_quantities = {}
+        for line in pricer.lines:
+            product_quantities[line.product.id] = product_quantities.get(line.product.id, 0) + line.quantity
+            variation_id = _line_variation_id(line)
+            if variation_id:
+                variation_quantities[variation_id] = variation_quantities.get(variation_id, 0) + line.quantity
         
-        for item_data in cart_items_data:
-            product = item_data['product']
-            quantity = item_data['quantity']
-            price = item_data['price']  # Already includes sale price if applicable
-            
-            if product.stock_quantity < quantity:
-                return jsonify({'error': f'Insufficient stock for {product.name}'}), 400
-            
-            item_total = price * quantity
-            subtotal += item_total
+        order_items_data = []
+        for line in pricer.lines:
+            if line.product.stock_quantity < product_quantities[line.product.id]:
+                return jsonify({'error': f'Insufficient stock for {line.product.name}'}), 400
             
             order_items_data.append({
-                'product': product,
-                'quantity': quantity,
-                'price': price  # Store sale price at time of order
+                'product': line.product,
+                'quantity': line.quantity,
+                'price': line.unit_price  # Store sale price at time of order
             })
         
-        # Calculate tax (8% example)
-        tax = subtotal * Decimal('0.08')
-        
-        # Calculate shipping - use API if shipping method provided, otherwise use default
+        # Shipping - use API rate if shipping method provided, otherwise default (free over $50, otherwise $5)
         shipping_method = data.get('shipping_method', 'Standard Shipping')
         shipping_carrier = data.get('shipping_carrier', 'Standard')
-        shipping_cost_input = data.get('shipping_cost')
-        
-        if shipping_cost_input is not None:
-            # Use provided shipping cost from API
-            shipping_cost = Decimal(str(shipping_cost_input))
-        else:
-            # Fallback to default calculation (free over $50, otherwise $5)
-            shipping_cost = Decimal('0.00') if subtotal >= Decimal('50.00') else Decimal('5.00')
-        
-        total = subtotal + tax + shipping_cost
+        totals = pricer.totals(data.get('shipping_cost'))
+        subtotal = totals['subtotal']
+        tax = totals['tax']
+        shipping_cost = totals['shipping']
+        total = totals['total']
         
         # Create order
         order = Order(
@@ -147,7 +116,24 @@ def create_order():
         db.session.add(order)
         db.session.flush()  # Get order ID
         
-        # Create order items and update stock
+        # Take all stock in one batch of conditional updates (fails instead of overselling)
+        try:
+            checkout_stock(
+                variations=variation_quantities,
+                products=product_quantities,
+                user_id=user.id if user else None,
+                cart_token=None if user else get_guest_cart_token(),
+                order_id=order.id
+            )
+        except InsufficientStock as e:
+            db.session.rollback()
+            short = next((
+                line.product.name for line in pricer.lines
+                if line.product.id in e.product_ids or _line_variation_id(line) in e.variation_ids
+            ), 'an item')
+            return jsonify({'error': f'Insufficient stock for {short}'}), 400
+        
+        # Create order items
         for item_data in order_items_data:
             order_item = OrderItem(
                 order_id=order.id,
@@ -156,24 +142,20 @@ def create_order():
                 price=item_data['price']
             )
             db.session.add(order_item)
-            
-            # Update product stock
-            item_data['product'].stock_quantity -= item_data['quantity']
         
         # Cart is cleared only after successful payment (see routes/payments.py)
         
-        db.session.commit()
+        # Queue the confirmation email with the order; the outbox worker sends it after commit
+        db.session.flush()
+        queue_order_confirmation_email(email, shipping_name, order)
         
-        # Send order confirmation email
-        try:
-            send_order_confirmation_email(email, shipping_name, order)
-        except Exception as e:
-            print(f"Error sending order confirmation email: {e}")
+        db.session.commit()
+        notify_email_worker()
         
         return jsonify({
             'message': 'Order created successfully',
             'order': order.to_dict(),
-            'email_sent': True
+            'email_queued': True
         }), 201
         
     except Exception as e:
@@ -186,10 +168,10 @@ def get_orders():
     """Get user's orders."""
     try:
         user = request.current_user
-        orders = Order.query.filter_by(user_id=user.id).order_by(Order.created_at.desc()).all()
+        orders = Order.query.options(Order.items_loader()).filter_by(user_id=user.id).order_by(Order.created_at.desc()).all()
         
         return jsonify({
-            'orders': [order.to_dict() for order in orders]
+            'orders': Order.serialize_many(orders)
         }), 200
         
     except Exception as e:
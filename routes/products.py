@@ -3,11 +3,18 @@ from models.database import db
 from models.product import Product
 from models.product_variation import ProductVariation
 from routes.auth import require_auth
+from utils.sale_engine import price_products, on_sale_clause, price_range_clause
+from utils.product_serializer import ProductSerializer, parse_fields
+from utils.catalog_cache import get_facet_snapshot, FACET_FIELDS
+from utils.http_cache import http_cached
+from utils.search_index import apply_text_search
+from utils.pagination import keyset_paginate, InvalidCursor
 from sqlalchemy import or_, func, desc, asc
 
 products_bp = Blueprint('products', __name__)
 
 @products_bp.route('', methods=['GET'])
+@http_cached('catalog', 'sales')
 def get_products():
     """Get all products with optional filters."""
     try:
@@ -19,6 +26,8 @@ def get_products():
         search = request.args.get('search', '')
         page = int(request.args.get('page', 1))
         per_page = int(request.args.get('per_page', 20))
+        # Optional projection: ?fields=card (grid views) or comma-separated field names
+        fields = parse_fields(request.args.get('fields'))
         
         # Support filtering by product IDs (for AI results)
         product_ids_param = request.args.get('ids', '')
@@ -47,18 +56,7 @@ def get_products():
                     product_dict = {p.id: p for p in products}
                     ordered_products = [product_dict[id] for id in product_ids if id in product_dict]
                     # Enrich with variation stock so variable products don't show as out of stock
-                    from sqlalchemy import func
-                    var_totals = db.session.query(
-                        ProductVariation.product_id,
-                        func.coalesce(func.sum(ProductVariation.stock_quantity), 0).label('total_stock')
-                    ).filter(ProductVariation.product_id.in_([p.id for p in ordered_products])).group_by(ProductVariation.product_id).all()
-                    var_stock = {r.product_id: int(r.total_stock) for r in var_totals}
-                    product_list = []
-                    for p in ordered_products:
-                        d = p.to_dict()
-                        if p.id in var_stock:
-                            d['stock_quantity'] = var_stock[p.id]
-                        product_list.append(d)
+                    product_list = ProductSerializer.serialize_many(ordered_products, fields=fields)
                     return jsonify({
                         'products': product_list,
                         'total': len(product_list),
@@ -98,18 +96,8 @@ def get_products():
         query = query.filter(or_(no_variations, has_stock))
         
         if on_sale_only:
-            # Filter to products currently on sale (product-level sale active now)
-            today = __import__('datetime').date.today()
-            from sqlalchemy import and_
-            product_sale = and_(
-                Product.sale_enabled == True,
-                Product.sale_start.isnot(None),
-                Product.sale_end.isnot(None),
-                Product.sale_percentage.isnot(None),
-                Product.sale_start <= today,
-                Product.sale_end >= today
-            )
-            query = query.filter(product_sale)
+            # Filter to products currently on sale (product-level sale or matching global Sale)
+            query = query.filter(on_sale_clause())
         
         if category:
             query = query.filter_by(category=category)
@@ -133,70 +121,37 @@ def get_products():
         if clothing_category:
             query = query.filter_by(clothing_category=clothing_category)
         
+        # Price filters apply to the current (sale) price
         min_price = request.args.get('min_price', '')
-        if min_price:
-            try:
-                query = query.filter(Product.price >= float(min_price))
-            except ValueError:
-                pass
-        
         max_price = request.args.get('max_price', '')
-        if max_price:
-            try:
-                query = query.filter(Product.price <= float(max_price))
-            except ValueError:
-                pass
+        try:
+            min_price = float(min_price) if min_price else None
+        except ValueError:
+            min_price = None
+        try:
+            max_price = float(max_price) if max_price else None
+        except ValueError:
+            max_price = None
+        if min_price is not None or max_price is not None:
+            query = query.filter(price_range_clause(min_price, max_price))
+        
+        # ?cursor= (empty for the first page) switches to keyset pagination on id for infinite scroll
+        cursor = request.args.get('cursor')
         
         if search:
-            query = query.filter(
-                or_(
-                    Product.name.ilike(f'%{search}%'),
-                    Product.description.ilike(f'%{search}%')
-                )
-            )
+            query = apply_text_search(query, search, rank=cursor is None)
+        
+        if cursor is not None:
+            keyset_page = keyset_paginate(query, Product.id, cursor, per_page, descending=False)
+            return jsonify({
+                'products': ProductSerializer.serialize_many(keyset_page.items, fields=fields),
+                **keyset_page.to_dict()
+            }), 200
         
         pagination = query.paginate(page=page, per_page=per_page, error_out=False)
 
-        # For variable products, compute display stock from variations so cards don't all show "Out of stock"
-        product_ids = [p.id for p in pagination.items]
-        from sqlalchemy import func
-        variation_totals = db.session.query(
-            ProductVariation.product_id,
-            func.coalesce(func.sum(ProductVariation.stock_quantity), 0).label('total_stock')
-        ).filter(ProductVariation.product_id.in_(product_ids)).group_by(ProductVariation.product_id).all()
-        variation_stock_by_id = {row.product_id: int(row.total_stock) for row in variation_totals}
-
-        # Convert products to dict with error handling
-        products_list = []
-        for p in pagination.items:
-            try:
-                d = p.to_dict()
-                if p.id in variation_stock_by_id:
-                    d['stock_quantity'] = variation_stock_by_id[p.id]
-                products_list.append(d)
-            except Exception as e:
-                # If to_dict fails (e.g., Sale table issue), create basic dict
-                import traceback
-                print(f"Error converting product {p.id} to dict: {e}")
-                print(traceback.format_exc())
-                # Return basic product info without sale data
-                fallback = {
-                    'id': p.id,
-                    'name': p.name,
-                    'description': p.description,
-                    'price': float(p.price) if p.price else 0.0,
-                    'original_price': float(p.price) if p.price else 0.0,
-                    'on_sale': False,
-                    'category': p.category,
-                    'color': p.color,
-                    'season': getattr(p, 'season', None),
-                    'clothing_category': getattr(p, 'clothing_category', 'other'),
-                    'image_url': p.image_url,
-                    'is_active': p.is_active
-                }
-                if p.id in variation_stock_by_id:
-                    fallback['stock_quantity'] = variation_stock_by_id[p.id]
-                products_list.append(fallback)
+        # Variation stock totals and sale prices are computed once for the whole page
+        products_list = ProductSerializer.serialize_many(pagination.items, fields=fields)
         
         return jsonify({
             'products': products_list,
@@ -206,6 +161,8 @@ def get_products():
             'pages': pagination.pages
         }), 200
         
+    except InvalidCursor as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         import traceback
         print(f"Error in get_products: {e}")
@@ -213,34 +170,18 @@ def get_products():
         return jsonify({'error': str(e)}), 500
 
 @products_bp.route('/special-offers', methods=['GET'])
+@http_cached('catalog', 'sales')
 def get_special_offers():
     """Get products currently on sale (product-level or global sale), for the Special offers section."""
     try:
         limit = min(int(request.args.get('limit', 20)), 50)
-        all_active = Product.query.filter_by(is_active=True).limit(300).all()
-        sale_products = []
-        product_ids = []
-        for p in all_active:
-            try:
-                if p.get_sale_price():
-                    sale_products.append(p)
-                    product_ids.append(p.id)
-                    if len(sale_products) >= limit:
-                        break
-            except Exception:
-                continue
-        from sqlalchemy import func
-        var_totals = db.session.query(
-            ProductVariation.product_id,
-            func.coalesce(func.sum(ProductVariation.stock_quantity), 0).label('total_stock')
-        ).filter(ProductVariation.product_id.in_(product_ids)).group_by(ProductVariation.product_id).all()
-        var_stock = {r.product_id: int(r.total_stock) for r in var_totals}
-        result = []
-        for p in sale_products:
-            d = p.to_dict()
-            if p.id in var_stock:
-                d['stock_quantity'] = var_stock[p.id]
-            result.append(d)
+        sale_products = Product.query.filter(
+            Product.is_active == True, on_sale_clause()
+        ).order_by(Product.id).limit(limit).all()
+        sale_prices = price_products(sale_products)
+        result = ProductSerializer.serialize_many(
+            sale_products, fields=parse_fields(request.args.get('fields')), sale_prices=sale_prices
+        )
         return jsonify({
             'products': result,
             'total': len(result)
@@ -253,13 +194,13 @@ def get_special_offers():
 
 
 # IMPORTANT: Specific routes must come BEFORE the dynamic route to avoid conflicts
+# Facet endpoints read from the process-local facet cache (utils.catalog_cache), not the database
 @products_bp.route('/categories', methods=['GET'])
 def get_categories():
     """Get all product categories."""
     try:
-        categories = db.session.query(Product.category).distinct().all()
         return jsonify({
-            'categories': [cat[0] for cat in categories if cat[0]]
+            'categories': get_facet_snapshot().distinct('category', active_only=False)
         }), 200
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -268,12 +209,8 @@ def get_categories():
 def get_colors():
     """Get all product colors."""
     try:
-        colors = db.session.query(Product.color).distinct().filter(
-            Product.color.isnot(None),
-            Product.is_active == True
-        ).all()
         return jsonify({
-            'colors': [color[0] for color in colors if color[0]]
+            'colors': get_facet_snapshot().distinct('color')
         }), 200
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -282,12 +219,7 @@ def get_colors():
 def get_sizes():
     """Get all available sizes."""
     try:
-        sizes = db.session.query(Product.size).distinct().filter(
-            Product.size.isnot(None),
-            Product.is_active == True
-        ).all()
-        sizes_list = [size[0] for size in sizes if size[0]]
-        return jsonify({'sizes': sorted(sizes_list)}), 200
+        return jsonify({'sizes': get_facet_snapshot().distinct('size')}), 200
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -295,12 +227,7 @@ def get_sizes():
 def get_fabrics():
     """Get all available fabrics."""
     try:
-        fabrics = db.session.query(Product.fabric).distinct().filter(
-            Product.fabric.isnot(None),
-            Product.is_active == True
-        ).all()
-        fabrics_list = [fabric[0] for fabric in fabrics if fabric[0]]
-        return jsonify({'fabrics': sorted(fabrics_list)}), 200
+        return jsonify({'fabrics': get_facet_snapshot().distinct('fabric')}), 200
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -308,12 +235,7 @@ def get_fabrics():
 def get_seasons():
     """Get all product seasons."""
     try:
-        seasons = db.session.query(Product.season).distinct().filter(
-            Product.season.isnot(None),
-            Product.is_active == True
-        ).all()
-        seasons_list = [s[0] for s in seasons if s[0]]
-        return jsonify({'seasons': sorted(seasons_list)}), 200
+        return jsonify({'seasons': get_facet_snapshot().distinct('season')}), 200
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -321,40 +243,44 @@ def get_seasons():
 def get_clothing_categories():
     """Get all product clothing categories (pants, shirts, jackets, etc.)."""
     try:
-        categories = db.session.query(Product.clothing_category).distinct().filter(
-            Product.clothing_category.isnot(None),
-            Product.is_active == True
-        ).all()
-        categories_list = [c[0] for c in categories if c[0]]
-        return jsonify({'clothing_categories': sorted(categories_list)}), 200
+        return jsonify({'clothing_categories': get_facet_snapshot().distinct('clothing_category')}), 200
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 @products_bp.route('/price-range', methods=['GET'])
 def get_price_range():
-    """Get min and max price range."""
+    """Get min and max current (sale) price of active products."""
     try:
-        from sqlalchemy import func
-        result = db.session.query(
-            func.min(Product.price).label('min'),
-            func.max(Product.price).label('max')
-        ).filter(Product.is_active == True).first()
-        
-        if result:
-            min_price = float(result.min) if result.min is not None else 0
-            max_price = float(result.max) if result.max is not None else 1000
-        else:
-            min_price = 0
-            max_price = 1000
-        
+        min_price, max_price = get_facet_snapshot().price_range()
         return jsonify({
-            'min': min_price,
-            'max': max_price
+            'min': min_price if min_price is not None else 0,
+            'max': max_price if max_price is not None else 1000
         }), 200
     except Exception as e:
         print(f"Error in get_price_range: {e}")
         return jsonify({'error': str(e)}), 500
 
+@products_bp.route('/facets', methods=['GET'])
+@http_cached('catalog', 'sales')
+def get_facets():
+    """
+    All facets in one response, with counts for the current selection (same filter params as
+    GET /api/products: category, color, size, fabric, season, clothing_category, min_price,
+    max_price, on_sale). Supports If-None-Match.
+    """
+    try:
+        selection = {f: request.args.get(f, '').strip() for f in FACET_FIELDS}
+        for key in ('min_price', 'max_price'):
+            try:
+                selection[key] = float(request.args[key]) if request.args.get(key) else None
+            except ValueError:
+                selection[key] = None
+        selection['on_sale'] = request.args.get('on_sale', '').strip().lower() in ('1', 'true', 'yes')
+        return jsonify(get_facet_snapshot().facets(selection)), 200
+    except Exception as e:
+        print(f"Error in get_facets: {e}")
+        return jsonify({'error': str(e)}), 500
+
 @products_bp.route('/search', methods=['POST'])
 def search_products():
     """
@@ -400,29 +326,22 @@ def search_products():
         if max_price is not None:
             try:
                 max_price_float = float(max_price)
-                query = query.filter(Product.price <= max_price_float)
+                query = query.filter(price_range_clause(max_price=max_price_float))
             except (ValueError, TypeError):
                 pass
         
-        # Apply search query
+        # Apply search query (full-text index; ranked by relevance for the default sort)
         if query_text:
-            query = query.filter(
-                or_(
-                    Product.name.ilike(f'%{query_text}%'),
-                    Product.description.ilike(f'%{query_text}%'),
-                    Product.clothing_type.ilike(f'%{query_text}%'),
-                    Product.color.ilike(f'%{query_text}%')
-                )
-            )
+            query = apply_text_search(query, query_text, rank=(sort_by == 'relevance'))
         
         # Apply sorting
         if sort_by == 'rating' or 'review' in query_text.lower() or 'best rated' in query_text.lower():
             # Sort by rating (highest first), then by review count
             query = query.order_by(desc(Product.rating), desc(Product.review_count))
         elif sort_by == 'price_low':
-            query = query.order_by(asc(Product.price))
+            query = query.order_by(asc(Product.effective_price))
         elif sort_by == 'price_high':
-            query = query.order_by(desc(Product.price))
+            query = query.order_by(desc(Product.effective_price))
         else:
             # Default: relevance (by rating if available, otherwise by name)
             query = query.order_by(desc(Product.rating), Product.name)
@@ -431,15 +350,16 @@ def search_products():
         products = query.limit(50).all()
         
         # Format results for AI agent
+        sale_prices = price_products(products)
         results = []
         for product in products:
-            product_dict = product.to_dict()
+            sale_data = sale_prices.get(product.id)
             results.append({
                 'id': product.id,
                 'name': product.name,
-                'price': float(product.price) if product.price else 0.0,
-                'original_price': product_dict.get('original_price', float(product.price) if product.price else 0.0),
-                'on_sale': product_dict.get('on_sale', False),
+                'price': sale_data['sale_price'] if sale_data else (float(product.price) if product.price else 0.0),
+                'original_price': float(product.price) if product.price else 0.0,
+                'on_sale': bool(sale_data),
                 'image_url': product.image_url or '',
                 'category': product.category,
                 'rating': float(product.rating) if product.rating else 0.0,
@@ -507,6 +427,7 @@ def get_product_variation(product_id):
         return jsonify({'error': str(e)}), 500
 
 @products_bp.route('/<int:product_id>', methods=['GET'])
+@http_cached('catalog', 'sales')
 def get_product(product_id):
     """Get a single product by ID. Includes variation_availability (size, color, stock_quantity) when product has variations."""
     try:
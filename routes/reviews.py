@@ -4,6 +4,8 @@ from models.review import Review
 from models.product import Product
 from models.user import User
 from routes.auth import require_auth
+from utils.http_cache import http_cached
+from utils.pagination import keyset_paginate, pagination_info, InvalidCursor
 from sqlalchemy import func
 from functools import wraps
 
@@ -25,6 +27,7 @@ def get_current_user_optional():
     return None
 
 @reviews_bp.route('/products/<int:product_id>/reviews', methods=['GET'])
+@http_cached('reviews')
 def get_product_reviews(product_id):
     """Get all reviews for a product."""
     try:
@@ -35,19 +38,21 @@ def get_product_reviews(product_id):
         page = request.args.get('page', 1, type=int)
         per_page = request.args.get('per_page', 20, type=int)
         
-        pagination = Review.query.filter_by(product_id=product_id).order_by(
-            Review.created_at.desc()
-        ).paginate(page=page, per_page=per_page, error_out=False)
+        query = Review.query.filter_by(product_id=product_id)
+        cursor = request.args.get('cursor')
+        if cursor is not None:
+            pagination = keyset_paginate(query, Review.id, cursor, per_page, sort_column=Review.created_at)
+        else:
+            pagination = query.order_by(
+                Review.created_at.desc()
+            ).paginate(page=page, per_page=per_page, error_out=False)
         
         return jsonify({
             'reviews': [review.to_dict() for review in pagination.items],
-            'pagination': {
-                'page': page,
-                'per_page': per_page,
-                'total': pagination.total,
-                'pages': pagination.pages
-            }
+            'pagination': pagination_info(pagination, page, per_page)
         }), 200
+    except InvalidCursor as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
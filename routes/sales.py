@@ -5,6 +5,7 @@ from models.database import db
 from models.sale import Sale
 from models.product import Product
 from routes.auth import require_auth
+from utils.http_cache import http_cached
 from datetime import date, datetime
 from sqlalchemy import or_
 import json
@@ -12,6 +13,7 @@ import json
 sales_bp = Blueprint('sales', __name__)
 
 @sales_bp.route('/active', methods=['GET'])
+@http_cached('sales')
 def get_active_sales():
     """Get all currently active sales.
     Sales stay active until manually deactivated (is_active=False).
@@ -7,8 +7,8 @@ from utils.shipping import ShippingService
 from utils.guest_cart import get_guest_cart
 from models.cart import CartItem
 from models.user import User
+from utils.cart_pricer import CartPricer
 from routes.auth import get_current_user_optional
-from decimal import Decimal
 import logging
 
 logger = logging.getLogger(__name__)
@@ -52,30 +52,17 @@ def calculate_shipping_rates():
         if not all([destination.get('city'), destination.get('state'), destination.get('zip')]):
             return jsonify({'error': 'Destination city, state, and zip are required'}), 400
         
-        # Get user and cart items
+        # Get user and price cart lines in one pass (sale prices)
         user = get_current_user_optional()
-        cart_items = []
-        
         if user:
             # Authenticated user cart
-            cart_items_db = CartItem.query.filter_by(user_id=user.id).all()
-            for item in cart_items_db:
-                if item.product:
-                    cart_items.append({
-                        'product': item.product.to_dict() if hasattr(item.product, 'to_dict') else {},
-                        'quantity': item.quantity
-                    })
+            pricer = CartPricer.for_cart_items(CartItem.query.filter_by(user_id=user.id).all(), active_only=False)
         else:
             # Guest cart
-            from models.product import Product
-            guest_cart = get_guest_cart()
-            for cart_item in guest_cart:
-                product = Product.query.get(cart_item['product_id'])
-                if product:
-                    cart_items.append({
-                        'product': product.to_dict() if hasattr(product, 'to_dict') else {},
-                        'quantity': cart_item['quantity']
-                    })
+            pricer = CartPricer.for_guest_cart(get_guest_cart(), active_only=False)
+        cart_items = [
+            {'product': {'id': line.product.id}, 'quantity': line.quantity} for line in pricer.lines
+        ]
         
         # Initialize shipping service
         shipping_service = ShippingService()
@@ -90,14 +77,7 @@ def calculate_shipping_rates():
             dimensions = shipping_service.calculate_package_dimensions(cart_items)
         
         # Calculate total value (optional, for insurance)
-        total_value = None
-        if cart_items:
-            total_value = Decimal('0.00')
-            for item in cart_items:
-                product = item.get('product', {})
-                price = Decimal(str(product.get('price', 0)))
-                quantity = item.get('quantity', 1)
-                total_value += price * quantity
+        total_value = pricer.subtotal if cart_items else None
         
         # Calculate rates
         rates = shipping_service.calculate_rates(
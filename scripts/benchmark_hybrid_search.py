@@ -0,0 +1,138 @@
+"""
+Benchmark: lexical-only, vector-only and hybrid (reciprocal-rank fusion) AI product search.
+
+Replays the SEARCH_PRODUCTS decisions logged in docs/ai_debug.csv against the app database and
+vector index - no LLM calls. A product counts as relevant when it satisfies the logged filters and,
+if the decision had a search term, contains every term token in its name, description, type,
+color, category, fabric or occasion. --judgments replaces that with hand labels: a JSON object
+{"<message>": [relevant product ids]}. Reports precision@k, recall@k, nDCG@k, MRR and median latency.
+
+Usage: python scripts/benchmark_hybrid_search.py [--csv docs/ai_debug.csv] [--k 10] [--judgments labels.json] [--json]
+"""
+
+import sys
+import os
+import argparse
+import csv
+import json
+import math
+import statistics
+import time
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import app
+from models.product import Product
+from utils.ai_action_executor import (
+    _build_criteria, _build_vector_query_from_criteria, _filter_products_by_criteria,
+    _normalize_action, _search_products_by_criteria,
+)
+from utils.hybrid_search import _vector_ids, hybrid_search, load_products
+from utils.product_serializer import ProductSerializer
+from utils.search_index import tokenize
+
+TEXT_FIELDS = ('name', 'description', 'clothing_type', 'color', 'category', 'fabric', 'occasion')
+
+
+def load_queries(path):
+    """(message, parameters) for each distinct message the AI answered with SEARCH_PRODUCTS."""
+    queries, seen = [], set()
+    with open(path, newline='', encoding='utf-8') as f:
+        for row in csv.DictReader(f):
+            try:
+                decision = json.loads(row.get('action_json') or '')
+            except ValueError:
+                continue
+            message = (row.get('message') or '').strip()
+            if not isinstance(decision, dict) or _normalize_action(decision.get('action')) != 'SEARCH_PRODUCTS':
+                continue
+            if not message or message.lower() in seen:
+                continue
+            seen.add(message.lower())
+            queries.append((message, decision.get('parameters') or {}))
+    return queries
+
+
+def relevant_ids(catalog, criteria):
+    """Ids of catalog products matching criteria (and every search token, when there is a term)."""
+    matches = _filter_products_by_criteria(catalog, criteria)
+    tokens = tokenize(criteria.get('search'))
+    if tokens:
+        text = lambda p: ' '.join(str(p.get(f) or '') for f in TEXT_FIELDS).lower()
+        matches = [p for p in matches if all(t in text(p) for t in tokens)]
+    return {p['id'] for p in matches}
+
+
+def metrics(ranked, relevant, k):
+    top = ranked[:k]
+    hits = [1 if pid in relevant else 0 for pid in top]
+    dcg = sum(h / math.log2(i + 2) for i, h in enumerate(hits))
+    ideal = sum(1 / math.log2(i + 2) for i in range(min(k, len(relevant))))
+    first = next((i for i, pid in enumerate(ranked) if pid in relevant), None)
+    return {
+        'precision': sum(hits) / k,
+        'recall': sum(hits) / min(k, len(relevant)),
+        'ndcg': dcg / ideal,
+        'mrr': 0.0 if first is None else 1 / (first + 1),
+    }
+
+
+def strategies(criteria, query):
+    """Ranked id lists of each strategy for one query (criteria as the search action builds them)."""
+    def vector():
+        if not query:
+            return []
+        ids = _vector_ids(query, criteria, 30)
+        return [p['id'] for p in _filter_products_by_criteria(load_products(ids), criteria)]
+
+    return {
+        'lexical': lambda: [p['id'] for p in _search_products_by_criteria(criteria)],
+        'vector': vector,
+        'hybrid': lambda: [p['id'] for p in hybrid_search(criteria, query)[0]],
+    }
+
+
+def run(csv_path, k, judgments=None):
+    queries = load_queries(csv_path)
+    totals, latencies, skipped = {}, {}, 0
+    with app.app_context():
+        catalog = ProductSerializer.serialize_many(Product.query.filter_by(is_active=True).all())
+        for message, parameters in queries:
+            criteria = _build_criteria(parameters)
+            relevant = set(judgments[message]) if judgments and message in judgments else relevant_ids(catalog, criteria)
+            if not relevant:
+                skipped += 1
+                continue
+            query = criteria.get('search') or _build_vector_query_from_criteria(criteria)
+            for name, search in strategies(criteria, query).items():
+                start = time.perf_counter()
+                ranked = search()
+                latencies.setdefault(name, []).append((time.perf_counter() - start) * 1000)
+                for metric, value in metrics(ranked, relevant, k).items():
+                    totals.setdefault(name, {}).setdefault(metric, []).append(value)
+    report = {
+        name: dict({metric: round(statistics.mean(values), 4) for metric, values in by_metric.items()},
+                   median_ms=round(statistics.median(latencies[name]), 2))
+        for name, by_metric in totals.items()
+    }
+    return {'queries': len(queries), 'judged': len(queries) - skipped, 'k': k, 'strategies': report}
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--csv', default=os.path.join('docs', 'ai_debug.csv'), help='AI debug log with logged decisions')
+    parser.add_argument('--k', type=int, default=10, help='Cut-off for precision/recall/nDCG')
+    parser.add_argument('--judgments', help='JSON file {"<message>": [relevant product ids]}')
+    parser.add_argument('--json', action='store_true', help='Print the report as JSON')
+    args = parser.parse_args()
+    labels = None
+    if args.judgments:
+        with open(args.judgments, encoding='utf-8') as f:
+            labels = json.load(f)
+    result = run(args.csv, args.k, labels)
+    if args.json:
+        print(json.dumps(result, indent=2))
+    else:
+        print(f"{result['judged']} of {result['queries']} logged searches have relevant products in the catalog")
+        print(f"{'strategy':>9} {'P@k':>7} {'R@k':>7} {'nDCG@k':>7} {'MRR':>7} {'median':>9}")
+        for name, m in result['strategies'].items():
+            print(f"{name:>9} {m['precision']:>7.3f} {m['recall']:>7.3f} {m['ndcg']:>7.3f} {m['mrr']:>7.3f} {m['median_ms']:>7.1f}ms")
@@ -0,0 +1,122 @@
+"""
+Benchmark: ProductSerializer.serialize_many vs the per-product to_dict() loop used by listing endpoints.
+
+The legacy loop runs one Sale query per product (as Product.get_sale_price did before the sale engine)
+plus a separate variation-stock aggregate. Runs against an in-memory SQLite database seeded with
+synthetic products, so it does not touch the app database.
+
+Usage: python scripts/benchmark_product_serializer.py [--sizes 20,100,1000] [--repeat 5]
+"""
+
+import sys
+import os
+import argparse
+import json
+import time
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import Flask
+from datetime import date, timedelta
+from sqlalchemy import func
+from models.database import db
+from models.product import Product
+from models.product_variation import ProductVariation
+from models.sale import Sale
+from utils.product_serializer import ProductSerializer, CARD_FIELDS
+from utils.sale_engine import invalidate_sale_cache
+
+app = Flask(__name__)
+app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///:memory:'
+app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+db.init_app(app)
+
+COLORS = ['Red', 'Blue', 'Black', 'White', 'Green']
+SIZES = ['XS', 'S', 'M', 'L', 'XL']
+CATEGORIES = ['men', 'women', 'kids']
+
+
+def seed(count):
+    """Create count products (each with 3 variations) and a few filter-based sales."""
+    db.session.remove()
+    db.drop_all()
+    db.create_all()
+    for i in range(count):
+        color = COLORS[i % len(COLORS)]
+        p = Product(
+            name=f'Product {i}', description='Benchmark product ' * 10, price=20 + (i % 80),
+            category=CATEGORIES[i % len(CATEGORIES)], color=color, size='M',
+            available_colors=json.dumps(COLORS), available_sizes=json.dumps(SIZES),
+            size_stock=json.dumps({s: 5 for s in SIZES}),
+            images_by_color=json.dumps({c: [f'/img/{i}_{c}.jpg'] for c in COLORS}),
+            clothing_type='Dress' if i % 2 else 'T-Shirt', stock_quantity=10, is_active=True,
+        )
+        db.session.add(p)
+        db.session.flush()
+        for s in SIZES[:3]:
+            db.session.add(ProductVariation(product_id=p.id, size=s, color=color, stock_quantity=4))
+    today = date.today()
+    for filters, pct in (({'category': 'women'}, 20), ({'color': 'red'}, 15), ({'clothing_type': 'Dress'}, 30)):
+        db.session.add(Sale(name=f'Sale {pct}', discount_percentage=pct, start_date=today - timedelta(days=1),
+                            end_date=today + timedelta(days=7), product_filters=json.dumps(filters), is_active=True))
+    db.session.commit()
+    invalidate_sale_cache()
+
+
+def legacy_serialize(products):
+    """The pre-engine listing loop: aggregate, then to_dict() with one Sale query per product."""
+    var_totals = db.session.query(
+        ProductVariation.product_id,
+        func.coalesce(func.sum(ProductVariation.stock_quantity), 0).label('total_stock')
+    ).filter(ProductVariation.product_id.in_([p.id for p in products])).group_by(ProductVariation.product_id).all()
+    var_stock = {r.product_id: int(r.total_stock) for r in var_totals}
+    result = []
+    for p in products:
+        sale_data = None
+        best = 0.0
+        for sale in Sale.query.filter_by(is_active=True).all():
+            if sale.is_currently_active() and sale.matches_product(p):
+                discount = float(sale.discount_percentage)
+                if discount > best:
+                    best = discount
+                    sale_data = {
+                        'original_price': float(p.price),
+                        'sale_price': round(float(p.price) * (1 - discount / 100), 2),
+                        'discount_percentage': discount,
+                        'sale': sale.to_dict(),
+                    }
+        d = p.to_dict({p.id: sale_data})
+        if p.id in var_stock:
+            d['stock_quantity'] = var_stock[p.id]
+        result.append(d)
+    return result
+
+
+def timed(fn, repeat):
+    """Best-of-repeat wall time in milliseconds."""
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        elapsed = (time.perf_counter() - start) * 1000
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def run(sizes, repeat):
+    print(f"{'products':>9} {'legacy loop':>13} {'serialize_many':>15} {'card fields':>12} {'speedup':>8}")
+    with app.app_context():
+        for n in sizes:
+            seed(n)
+            products = Product.query.order_by(Product.id).all()
+            legacy = timed(lambda: legacy_serialize(products), repeat)
+            batch = timed(lambda: ProductSerializer.serialize_many(products), repeat)
+            card = timed(lambda: ProductSerializer.serialize_many(products, fields=CARD_FIELDS), repeat)
+            print(f"{n:>9} {legacy:>11.1f}ms {batch:>13.1f}ms {card:>10.1f}ms {legacy / batch:>7.1f}x")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--sizes', default='20,100,1000', help='Comma-separated product counts')
+    parser.add_argument('--repeat', type=int, default=5, help='Runs per measurement (best is reported)')
+    args = parser.parse_args()
+    run([int(s) for s in args.sizes.split(',') if s.strip()], args.repeat)
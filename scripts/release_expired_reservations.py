@@ -0,0 +1,33 @@
+"""
+Release cart holds (inventory reservations) that expired and return their variation stock.
+Safe to run from cron while app workers run their own background sweeper: only one sweep runs
+at a time (advisory lock) and each reservation is released at most once.
+
+Usage: python scripts/release_expired_reservations.py [--batch-size N]
+"""
+
+import sys
+import os
+import argparse
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import app
+from utils.reservation_sweeper import release_expired_reservations
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--batch-size', type=int, default=500, help='Reservations released per transaction')
+    args = parser.parse_args()
+    with app.app_context():
+        report = release_expired_reservations(batch_size=args.batch_size)
+        if not report['ran']:
+            print("Another sweep is running; nothing done.")
+            return
+        print(f"Released {report['units']} unit(s) from {report['reservations']} expired reservation(s).")
+        for variation_id, units in sorted(report['variations'].items()):
+            print(f"  variation {variation_id}: {units}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,35 @@
+"""
+Daily price rollover: recompute the materialized Product.effective_price, discount_percentage and
+sale_source for today. The app's background reprice worker does the same every
+REPRICE_INTERVAL_SECONDS; run this from cron when that worker is off. Until a row is repriced,
+listings compute its price in the query.
+
+Usage: python scripts/reprice_products.py [--all]
+"""
+
+import sys
+import os
+import argparse
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import app
+from models.database import db
+from models.product import Product
+from utils.sale_engine import reprice_stale
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--all', action='store_true', help='Reprice every product, not only stale rows')
+    args = parser.parse_args()
+    with app.app_context():
+        if args.all:
+            Product.query.update({Product.priced_on: None, Product.updated_at: Product.updated_at},
+                                 synchronize_session=False)
+            db.session.commit()
+        repriced = reprice_stale()
+        print(f"Repriced {repriced} product(s).")
+
+
+if __name__ == '__main__':
+    main()
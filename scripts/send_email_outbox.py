@@ -0,0 +1,30 @@
+"""
+Send the queued outbound email (email_outbox rows) that is due.
+Safe to run from cron alongside the app workers' own outbox worker: rows are claimed with a
+conditional UPDATE, so each message is sent by one process only.
+For local testing point SMTP_DEBUG_SERVER at a debugging SMTP server, e.g.
+    python -m aiosmtpd -n -l localhost:1025   and   SMTP_DEBUG_SERVER=localhost:1025
+
+Usage: python scripts/send_email_outbox.py [--batch-size N]
+"""
+
+import sys
+import os
+import argparse
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import app
+from utils.email_outbox import deliver_outbox
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--batch-size', type=int, default=50, help='Messages claimed per batch')
+    args = parser.parse_args()
+    with app.app_context():
+        report = deliver_outbox(batch_size=args.batch_size)
+        print(f"Sent {report['sent']}, retrying {report['retrying']}, failed {report['failed']}.")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,85 @@
+"""Tests for admin statistics and the daily_stats rollup (utils/admin_stats.py)."""
+import pytest
+from datetime import datetime
+from app import app
+from models.database import db
+from models.user import User
+from models.order import Order
+from models.product import Product
+from models.review import Review
+from models.daily_stat import DailyStat
+from utils.admin_stats import get_statistics, get_timeseries, rebuild_daily_stats
+
+@pytest.fixture
+def client():
+    """Create a test client."""
+    app.config['TESTING'] = True
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///:memory:'
+    app.config['JWT_SECRET'] = 'test-secret-key-for-testing-only-min-32-chars'
+
+    with app.test_client() as client:
+        with app.app_context():
+            # Start empty: app start-up seeds users (and their rollup rows) into the test database
+            db.drop_all()
+            db.create_all()
+            yield client
+            db.drop_all()
+
+@pytest.fixture
+def activity(client):
+    """Two users, two orders (one cancelled) and a review, all created today."""
+    users = [User(email=f'stats{i}@example.com', first_name='S', last_name=str(i)) for i in range(2)]
+    db.session.add_all(users)
+    product = Product(name='Stat Tee', price=20, category='men', stock_quantity=0, is_active=True)
+    db.session.add(product)
+    db.session.commit()
+    for total, status in ((50, 'pending'), (30, 'cancelled')):
+        db.session.add(Order(user_id=users[0].id, shipping_name='S', shipping_address='1 St',
+                             shipping_city='C', shipping_state='S', shipping_zip='1',
+                             subtotal=total, total=total, status=status))
+    db.session.add(Review(product_id=product.id, user_id=users[1].id, rating=4))
+    db.session.commit()
+
+def test_rollup_maintained_on_writes(client, activity):
+    """Order, review and user inserts update today's daily_stats row."""
+    row = db.session.get(DailyStat, datetime.utcnow().date())
+    assert (row.orders_count, float(row.revenue), row.reviews_count, row.users_count) == (2, 80.0, 1, 2)
+    order = Order.query.filter_by(status='cancelled').first()
+    order.total = 40
+    db.session.commit()
+    db.session.refresh(row)
+    assert float(row.revenue) == 90.0
+
+def test_rebuild_matches_incremental_rollup(client, activity):
+    """Rebuilding from source tables gives the same rows as the incremental events."""
+    before = [r.to_dict() for r in DailyStat.query.order_by(DailyStat.day).all()]
+    assert rebuild_daily_stats() == 1
+    assert [r.to_dict() for r in DailyStat.query.order_by(DailyStat.day).all()] == before
+
+def test_statistics_from_grouped_queries(client, activity):
+    """Dashboard statistics combine grouped aggregates with rollup windows."""
+    stats = get_statistics(refresh=True)
+    assert stats['users']['total'] == 2
+    assert stats['products']['out_of_stock'] == 1
+    assert stats['orders']['pending'] == 1 and stats['orders']['cancelled'] == 1
+    assert stats['orders']['today'] == 2 and stats['orders']['this_month'] == 2
+    assert stats['reviews'] == {'total': 1, 'today': 1}
+    assert stats['revenue']['total'] == 80.0 and stats['revenue']['this_week'] == 80.0
+    series = get_timeseries(7)
+    assert len(series) == 7 and series[-1]['orders'] == 2 and series[0]['orders'] == 0
+
+def test_rollup_failure_is_rolled_back_to_a_savepoint(client):
+    """A failed rollup statement is undone alone; the triggering write still commits."""
+    from sqlalchemy import event
+    DailyStat.__table__.drop(db.engine)
+    statements = []
+    listener = lambda *args: statements.append(args[2])
+    event.listen(db.engine, 'before_cursor_execute', listener)
+    try:
+        db.session.add(User(email='no-rollup@example.com', first_name='N', last_name='R'))
+        db.session.commit()
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', listener)
+    assert User.query.filter_by(email='no-rollup@example.com').count() == 1
+    assert any(s.startswith('SAVEPOINT') for s in statements)
+    assert any(s.startswith('ROLLBACK TO SAVEPOINT') for s in statements)
@@ -0,0 +1,92 @@
+"""Tests for one-pass cart pricing (utils/cart_pricer.py)."""
+import pytest
+import json
+from datetime import date, timedelta
+from decimal import Decimal
+from app import app
+from models.database import db
+from models.product import Product
+from models.sale import Sale
+from utils.cart_pricer import CartPricer
+from utils.sale_engine import invalidate_sale_cache
+
+@pytest.fixture
+def client():
+    """Create a test client."""
+    app.config['TESTING'] = True
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///:memory:'
+    app.config['JWT_SECRET'] = 'test-secret-key-for-testing-only-min-32-chars'
+
+    with app.test_client() as client:
+        with app.app_context():
+            db.create_all()
+            invalidate_sale_cache()
+            yield client
+            db.drop_all()
+            invalidate_sale_cache()
+
+@pytest.fixture
+def cart_products(client):
+    """A dress under a 25% global sale, a shirt at list price and an inactive product."""
+    today = date.today()
+    products = [
+        Product(name='Pricer Dress', price=19.99, category='women', clothing_type='Dress',
+                stock_quantity=5, is_active=True),
+        Product(name='Pricer Shirt', price=10.10, category='men', clothing_type='Shirt',
+                stock_quantity=5, is_active=True),
+        Product(name='Pricer Retired', price=50.00, category='men', clothing_type='Shirt',
+                stock_quantity=5, is_active=False),
+    ]
+    db.session.add_all(products)
+    db.session.add(Sale(
+        name='Pricer Dresses', discount_percentage=25, start_date=today - timedelta(days=1),
+        end_date=today + timedelta(days=1), is_active=True,
+        product_filters=json.dumps({'category': 'women', 'clothing_type': 'Dress'})
+    ))
+    db.session.commit()
+    return products
+
+def test_lines_and_totals_are_decimal(client, cart_products):
+    """Line prices come from the sale engine; totals are exact Decimals."""
+    dress, shirt, retired = cart_products
+    pricer = CartPricer([('a', dress, 2), ('b', shirt, 3), ('c', retired, 1), ('d', None, 1)])
+    assert len(pricer.lines) == 2
+    dress_line = pricer.line_for('a')
+    assert dress_line.unit_price == Decimal('14.99')
+    assert dress_line.original_price == Decimal('19.99')
+    assert dress_line.discount == Decimal('10.00')
+    assert dress_line.on_sale
+    assert pricer.line_for('b').subtotal == Decimal('30.30')
+    assert pricer.line_for('c') is None
+
+    totals = pricer.totals()
+    assert totals['subtotal'] == Decimal('60.28')
+    assert totals['discount'] == Decimal('10.00')
+    assert totals['tax'] == Decimal('4.82')
+    assert totals['shipping'] == Decimal('0.00')
+    assert totals['total'] == Decimal('65.10')
+
+def test_shipping_rules(client, cart_products):
+    """Flat $5 under $50, free over, and an explicit carrier rate wins."""
+    shirt = cart_products[1]
+    pricer = CartPricer([('b', shirt, 1)])
+    assert pricer.shipping() == Decimal('5.00')
+    assert pricer.shipping(12.5) == Decimal('12.50')
+    assert CartPricer([]).totals()['total'] == Decimal('5.00')
+
+def test_guest_cart_total(client, cart_products):
+    """Guest cart GET totals match the pricer (sale price applied, inactive product skipped)."""
+    dress, shirt, retired = cart_products
+    with client.session_transaction() as sess:
+        sess['guest_cart'] = [
+            {'product_id': dress.id, 'quantity': 1},
+            {'product_id': shirt.id, 'quantity': 2},
+            {'product_id': retired.id, 'quantity': 1},
+        ]
+    response = client.get('/api/cart')
+    assert response.status_code == 200
+    data = json.loads(response.data)
+    assert data['is_guest'] is True
+    assert len(data['items']) == 2
+    assert data['items'][0]['subtotal'] == 14.99
+    assert data['total'] == 35.19
@@ -0,0 +1,96 @@
+"""Tests for streaming chat (/api/ai/chat/stream) and utils/llm_stream.py."""
+import pytest
+import json
+from unittest.mock import patch
+from app import app
+from models.database import db
+from utils.llm_cache import decision_cache
+from utils.llm_stream import DecisionStreamParser
+
+@pytest.fixture
+def client():
+    """Create a test client."""
+    app.config['TESTING'] = True
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///:memory:'
+    app.config['JWT_SECRET'] = 'test-secret-key-for-testing-only-min-32-chars'
+
+    with app.test_client() as client:
+        with app.app_context():
+            db.create_all()
+            decision_cache.clear()
+            yield client
+            db.session.remove()
+            db.drop_all()
+
+class _Config:
+    def to_internal_dict(self):
+        return {'provider': 'openai', 'model_id': 'gpt-4o-mini', 'api_key': 'test', 'is_enabled': True}
+
+def _chunks(text, size=7):
+    return [text[i:i + size] for i in range(0, len(text), size)]
+
+def _events(response):
+    events = []
+    for block in response.get_data(as_text=True).split('\n\n'):
+        if block.strip():
+            name, data = block.split('\n', 1)
+            events.append((name[len('event: '):], json.loads(data[len('data: '):])))
+    return events
+
+def test_parser_emits_head_then_message_deltas():
+    reply = '```json\n{"action": "SEARCH_PRODUCTS", "parameters": {"search": "message", "color": "red"}, ' \
+            '"message": "Here are \\"red\\" dresses \\u00e9\\ud83d\\ude00\\nEnjoy", "confidence": 0.9}\n```'
+    parser = DecisionStreamParser()
+    heads, text = [], ''
+    for piece in _chunks(reply, 3):
+        head, delta = parser.feed(piece)
+        if head:
+            heads.append(head)
+        text += delta
+    assert heads == [{'action': 'SEARCH_PRODUCTS', 'parameters': {'search': 'message', 'color': 'red'}}]
+    assert text == json.loads(reply.split('```json\n')[1].rstrip('`\n'))['message']
+
+def test_stream_events_and_final_message_json(client):
+    reply = json.dumps({'action': 'RESPONSE', 'parameters': {}, 'message': 'Linen breathes well in summer.', 'confidence': 0.9})
+    with patch('routes.ai_agent.get_active_ai_config', return_value=_Config()), \
+            patch('routes.ai_agent.stream_llm', side_effect=lambda *a, **k: iter(_chunks(reply))):
+        response = client.post('/api/ai/chat/stream', json={'message': 'what fabric for summer?'})
+        events = _events(response)
+        cached = client.post('/api/ai/chat/stream', json={'message': 'What fabric for  summer?'})
+    assert response.mimetype == 'text/event-stream'
+    names = [name for name, _ in events]
+    assert names[0] == 'decision' and names[-1] == 'done' and 'token' in names
+    assert ''.join(data['text'] for name, data in events if name == 'token') == 'Linen breathes well in summer.'
+    done = events[-1][1]
+    assert done['response'] == 'Linen breathes well in summer.'
+    assert done['message_json']['permission'] is True and done['message_json']['respond'] == done['response']
+    assert cached.headers['X-AI-Cache'] == 'hit'
+    assert _events(cached)[-1][1]['message_json'] == done['message_json']
+
+def test_stream_searches_once_and_sends_products_before_text(client):
+    reply = json.dumps({'action': 'SEARCH_PRODUCTS', 'parameters': {'color': 'red'}, 'confidence': 0.95, 'message': 'Here you go.'})
+    found = {'success': True, 'data': {'products': [{'id': 7, 'name': 'Red Dress'}]}}
+    with patch('routes.ai_agent.get_active_ai_config', return_value=_Config()), \
+            patch('routes.ai_agent.stream_llm', side_effect=lambda *a, **k: iter(_chunks(reply))), \
+            patch('utils.ai_action_executor.execute_action', return_value=found) as search:
+        events = _events(client.post('/api/ai/chat/stream', json={'message': 'show me red dresses'}))
+    names = [name for name, _ in events]
+    assert names.index('decision') < names.index('products') < names.index('token') < names.index('done')
+    assert search.call_count == 1
+    assert events[-1][1]['suggested_product_ids'] == [7]
+
+@pytest.mark.parametrize('confidence, searched', [(0.95, True), (0.6, False)])
+def test_stream_holds_search_until_confidence_is_known(client, confidence, searched):
+    reply = json.dumps({'action': 'SEARCH_PRODUCTS', 'parameters': {'color': 'red'}, 'message': 'Here you go.',
+                        'confidence': confidence})  # Confidence after the message: unknown while the text streams
+    found = {'success': True, 'data': {'products': [{'id': 7, 'name': 'Red Dress'}]}}
+    with patch('routes.ai_agent.get_active_ai_config', return_value=_Config()), \
+            patch('routes.ai_agent.stream_llm', side_effect=lambda *a, **k: iter(_chunks(reply))), \
+            patch('utils.ai_action_executor.execute_action', return_value=found) as search:
+        events = _events(client.post('/api/ai/chat/stream', json={'message': 'show me red dresses'}))
+    names = [name for name, _ in events]
+    assert search.call_count == (1 if searched else 0)
+    if searched:
+        assert names.index('token') < names.index('products') < names.index('done')
+    else:
+        assert 'products' not in names and events[-1][1]['suggested_product_ids'] == []
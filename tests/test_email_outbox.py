@@ -0,0 +1,120 @@
+"""Tests for the outbound email queue (utils/email_outbox.py) against a local SMTP stand-in."""
+import pytest
+import socketserver
+import threading
+from datetime import datetime, timedelta
+from app import app
+from models.database import db
+from models.email_outbox import EmailOutbox
+import utils.email
+from utils.email import SmtpConnection
+from utils.email_outbox import deliver_outbox, queue_email
+
+
+class _SmtpHandler(socketserver.StreamRequestHandler):
+    """Just enough SMTP to accept messages; records each connection and message."""
+
+    def reply(self, line):
+        self.wfile.write(line.encode('ascii') + b'\r\n')
+
+    def handle(self):
+        self.server.connections += 1
+        self.reply('220 localhost stand-in')
+        while True:
+            line = self.rfile.readline().decode('utf-8').strip()
+            if not line:
+                return
+            command = line.split(' ', 1)[0].upper()
+            if command == 'DATA':
+                self.reply('354 End data with <CR><LF>.<CR><LF>')
+                lines = []
+                while True:
+                    data = self.rfile.readline().decode('utf-8')
+                    if data in ('.\r\n', ''):
+                        break
+                    lines.append(data)
+                self.server.messages.append(''.join(lines))
+                self.reply('250 OK')
+            elif command == 'QUIT':
+                self.reply('221 Bye')
+                return
+            elif command == 'EHLO':
+                self.reply('250 localhost')
+            else:
+                self.reply('250 OK')
+
+
+@pytest.fixture
+def smtp_server(monkeypatch):
+    """Local debugging SMTP server wired in through SMTP_DEBUG_SERVER, with a fresh shared connection."""
+    server = socketserver.ThreadingTCPServer(('127.0.0.1', 0), _SmtpHandler)
+    server.daemon_threads = True
+    server.connections, server.messages = 0, []
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    monkeypatch.setattr(utils.email, 'SMTP_DEBUG_SERVER', f'127.0.0.1:{server.server_address[1]}')
+    monkeypatch.setattr(utils.email, 'USE_WORKMAIL', True)
+    monkeypatch.setattr(utils.email, 'smtp_connection', SmtpConnection())
+    yield server
+    utils.email.smtp_connection.close()
+    server.shutdown()
+    server.server_close()
+
+@pytest.fixture
+def client():
+    """Create a test client."""
+    app.config['TESTING'] = True
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///:memory:'
+    app.config['JWT_SECRET'] = 'test-secret-key-for-testing-only-min-32-chars'
+
+    with app.test_client() as client:
+        with app.app_context():
+            db.create_all()
+            yield client
+            db.session.remove()
+            db.drop_all()
+
+def test_outbox_sends_batch_over_one_connection(client, smtp_server):
+    """Queued messages go out once, in one batch, over a single reused SMTP connection."""
+    for i in range(3):
+        queue_email(f'user{i}@example.com', f'Hello {i}', f'<p>Hello {i}</p>', f'Hello {i}')
+    db.session.commit()
+
+    assert deliver_outbox() == {'sent': 3, 'retrying': 0, 'failed': 0}
+    assert len(smtp_server.messages) == 3
+    assert smtp_server.connections == 1
+    rows = EmailOutbox.query.all()
+    assert all(row.status == 'sent' and row.attempts == 1 and row.sent_at for row in rows)
+    assert deliver_outbox() == {'sent': 0, 'retrying': 0, 'failed': 0}
+
+def test_outbox_retries_with_backoff(client, monkeypatch):
+    """A failed send is rescheduled with exponential backoff and marked failed after the last attempt."""
+    monkeypatch.setattr(utils.email, 'send_email', lambda *args, **kwargs: False)
+    monkeypatch.setattr('config.Config.EMAIL_MAX_ATTEMPTS', 2)
+    monkeypatch.setattr('config.Config.EMAIL_RETRY_BASE_SECONDS', 60)
+    row = queue_email('user@example.com', 'Hello', '<p>Hello</p>')
+    db.session.commit()
+    now = datetime.utcnow()
+
+    assert deliver_outbox(now) == {'sent': 0, 'retrying': 1, 'failed': 0}
+    assert row.status == 'pending' and row.attempts == 1 and row.last_error
+    assert row.next_attempt_at == now + timedelta(seconds=60)
+    assert deliver_outbox(now + timedelta(seconds=30))['retrying'] == 0  # Not due yet
+    assert deliver_outbox(now + timedelta(seconds=61)) == {'sent': 0, 'retrying': 0, 'failed': 1}
+    assert row.status == 'failed' and row.attempts == 2
+
+def test_checkout_queues_confirmation(client):
+    """Checkout commits the confirmation email to the outbox instead of sending it inline."""
+    from models.product import Product
+    product = Product(name='Mail Tee', price=20.00, category='men', stock_quantity=5, is_active=True)
+    db.session.add(product)
+    db.session.commit()
+    client.post('/api/cart', json={'product_id': product.id, 'quantity': 1})
+    response = client.post('/api/orders', json={
+        'email': 'guest@example.com', 'shipping_name': 'Guest', 'shipping_address': '1 Main St',
+        'shipping_city': 'City', 'shipping_state': 'CA', 'shipping_zip': '12345',
+    })
+    assert response.status_code == 201
+    assert response.get_json()['email_queued'] is True and 'email_sent' not in response.get_json()
+    row = EmailOutbox.query.one()
+    assert row.to_address == 'guest@example.com' and row.status == 'pending'
+    assert row.subject.startswith('Order Confirmation - ORD-') and 'Mail Tee' in row.html_body
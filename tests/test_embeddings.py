@@ -0,0 +1,91 @@
+"""Tests for the embedding layer and its caches (utils/embeddings.py)."""
+import numpy as np
+from unittest.mock import patch
+import utils.vector_db as vector_db
+from utils.embeddings import DocumentEmbeddingCache, Embedder
+
+class FakeEncoder:
+    """Deterministic 4-d vectors; records every batch it is asked to encode."""
+
+    def __init__(self):
+        self.batches = []
+
+    def __call__(self, texts):
+        self.batches.append(list(texts))
+        return [[float(len(t)), float(t.count('a')), 1.0, 0.5] for t in texts]
+
+    @property
+    def encoded(self):
+        return [t for batch in self.batches for t in batch]
+
+def test_documents_are_encoded_once_in_batches(tmp_path):
+    encoder = FakeEncoder()
+    embedder = Embedder(encoder, 'test-model', str(tmp_path), batch_size=2)
+    vectors = embedder.embed_documents(['red dress', 'blue jeans', 'red dress', 'black tee'])
+    assert encoder.batches == [['red dress', 'blue jeans'], ['black tee']]
+    assert np.array_equal(vectors[0], vectors[2])
+    embedder.embed_documents(['black tee', 'green scarf'])
+    assert encoder.encoded[-1] == 'green scarf' and len(encoder.encoded) == 4
+
+def test_document_cache_persists_and_trims_partial_writes(tmp_path):
+    first = Embedder(FakeEncoder(), 'test-model', str(tmp_path))
+    expected = first.embed_documents(['linen shirt', 'wool coat'])
+    with open(tmp_path / 'vectors.f32', 'ab') as f:
+        f.write(np.zeros(4, dtype=np.float32).tobytes())  # Row whose hash was never written
+    encoder = FakeEncoder()
+    second = Embedder(encoder, 'test-model', str(tmp_path))
+    assert len(second.documents) == 2
+    assert all(np.array_equal(a, b) for a, b in zip(second.embed_documents(['linen shirt', 'wool coat']), expected))
+    assert encoder.batches == []
+    other_model = Embedder(FakeEncoder(), 'other-model', str(tmp_path))
+    assert len(other_model.documents) == 0
+
+def test_query_lru(tmp_path):
+    encoder = FakeEncoder()
+    embedder = Embedder(encoder, 'test-model', str(tmp_path), query_cache_size=2)
+    embedder.embed_query('Black  Jeans')
+    embedder.embed_query('black jeans')
+    embedder.embed_query('red dress')
+    embedder.embed_query('blue tee')  # Evicts "black jeans"
+    embedder.embed_query('black jeans')
+    assert encoder.encoded == ['black jeans', 'red dress', 'blue tee', 'black jeans']
+    assert embedder.stats()['query_hits'] == 1
+
+class RecordingCollection:
+    def __init__(self):
+        self.calls = []
+
+    def upsert(self, **kwargs):
+        self.calls.append(('upsert', kwargs))
+
+    def query(self, **kwargs):
+        self.calls.append(('query', kwargs))
+        return {'ids': [['product_3']]}
+
+def test_vector_db_sends_precomputed_vectors(tmp_path):
+    encoder = FakeEncoder()
+    embedder = Embedder(encoder, 'test-model', str(tmp_path))
+    collection = RecordingCollection()
+    with patch('utils.embeddings.get_embedder', return_value=embedder), \
+            patch.object(vector_db, 'collection', collection), \
+            patch.object(vector_db, 'chromadb', object()), \
+            patch.object(vector_db, '_commit_tracking'):
+        assert vector_db.add_product_to_vector_db(3, {'name': 'Black Jeans', 'price': 40})
+        assert vector_db.search_products_vector('black jeans') == [3]
+        assert vector_db.search_products_vector('Black jeans') == [3]
+    upsert, query = collection.calls[0][1], collection.calls[1][1]
+    assert len(upsert['embeddings'][0]) == 4
+    assert 'query_texts' not in query and len(query['query_embeddings'][0]) == 4
+    assert encoder.encoded.count('black jeans') == 1
+
+def test_document_cache_shared_by_two_processes(tmp_path):
+    first = DocumentEmbeddingCache(str(tmp_path), 'test-model')
+    second = DocumentEmbeddingCache(str(tmp_path), 'test-model')
+    first.put_many([('h0', [0.0, 0.0, 0.0, 0.0])])
+    second.put_many([('hb', [2.0, 2.0, 2.0, 2.0])])
+    first.put_many([('ha', [1.0, 1.0, 1.0, 1.0])])  # Row 2 on disk, though `first` only wrote row 0
+    assert first.get_many(['ha'])['ha'].tolist() == [1.0] * 4
+    assert second.get_many(['ha', 'hb'])['ha'].tolist() == [1.0] * 4
+    assert first.get_many(['hb'])['hb'].tolist() == [2.0] * 4
+    reopened = DocumentEmbeddingCache(str(tmp_path), 'test-model')
+    assert {h: v[0] for h, v in reopened.get_many(['h0', 'ha', 'hb']).items()} == {'h0': 0.0, 'ha': 1.0, 'hb': 2.0}
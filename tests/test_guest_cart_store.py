@@ -0,0 +1,79 @@
+"""Tests for the server-side guest cart (utils/guest_cart.py, utils/guest_cart_store.py)."""
+import pytest
+import json
+from datetime import datetime, timedelta
+from app import app
+from models.database import db
+from models.product import Product
+from models.guest_cart_line import GuestCartLine
+from utils.guest_cart_store import MemoryGuestCartStore, SqlGuestCartStore, line_key
+
+@pytest.fixture
+def client():
+    """Create a test client."""
+    app.config['TESTING'] = True
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///:memory:'
+    app.config['JWT_SECRET'] = 'test-secret-key-for-testing-only-min-32-chars'
+
+    with app.test_client() as client:
+        with app.app_context():
+            db.create_all()
+            yield client
+            db.session.remove()
+            db.drop_all()
+
+@pytest.fixture
+def product_id(client):
+    product = Product(name='Cart Tee', price=20.00, category='men', stock_quantity=10, is_active=True)
+    db.session.add(product)
+    db.session.commit()
+    return product.id
+
+@pytest.mark.parametrize('store_class', [MemoryGuestCartStore, SqlGuestCartStore])
+def test_store_lines_by_key_and_expiry(client, product_id, store_class):
+    """Lines are replaced by key, kept in insertion order and dropped with the expired cart."""
+    store = store_class()
+    blue, red = line_key(product_id, 'Blue', 'M'), line_key(product_id, 'Red', None)
+    store.put_line('tok', blue, {'product_id': product_id, 'quantity': 1, 'selected_color': 'Blue', 'selected_size': 'M'})
+    store.put_line('tok', red, {'product_id': product_id, 'quantity': 2, 'selected_color': 'Red', 'selected_size': ''})
+    store.put_line('tok', blue, {'product_id': product_id, 'quantity': 3, 'selected_color': 'Blue', 'selected_size': 'M'})
+    assert [line['quantity'] for line in store.lines('tok')] == [3, 2]
+    assert store.get_line('tok', red)['selected_size'] in (None, '')
+    assert store.lines('other') == []
+
+    store.delete_line('tok', red)
+    assert store.get_line('tok', red) is None
+    assert store.purge_expired() == 0
+    assert store.purge_expired(datetime.utcnow() + timedelta(days=365)) == 1
+    assert store.lines('tok') == []
+
+def test_session_keeps_only_the_token(client, product_id):
+    """Cart lines live in guest_cart_lines; legacy session carts are moved there on first read."""
+    client.post('/api/cart', json={'product_id': product_id, 'quantity': 2})
+    client.post('/api/cart', json={'product_id': product_id, 'quantity': 1})
+    with client.session_transaction() as sess:
+        assert 'guest_cart' not in sess
+        token = sess['guest_cart_token']
+        sess['guest_cart'] = [{'product_id': product_id, 'quantity': 1, 'selected_color': 'Red'}]
+    lines = GuestCartLine.query.filter_by(cart_token=token).all()
+    assert [(line.quantity, line.selected_color) for line in lines] == [(3, None)]
+
+    data = json.loads(client.get('/api/cart').data)
+    assert sorted(i['quantity'] for i in data['items']) == [1, 3]
+    assert GuestCartLine.query.filter_by(cart_token=token).count() == 2
+
+    GuestCartLine.query.update({GuestCartLine.expires_at: datetime.utcnow() - timedelta(minutes=1)})
+    db.session.commit()
+    assert json.loads(client.get('/api/cart').data)['items'] == []
+
+def test_sql_store_leaves_the_commit_to_the_caller(client, product_id):
+    """Store writes join the caller's transaction: a rollback undoes them with the caller's own pending work."""
+    store = SqlGuestCartStore()
+    store.put_line('tok', line_key(product_id), {'product_id': product_id, 'quantity': 1})
+    db.session.commit()
+    db.session.add(Product(name='Pending', price=5.00, category='men', stock_quantity=1, is_active=True))
+    store.put_line('tok', line_key(product_id, 'Red'), {'product_id': product_id, 'quantity': 1, 'selected_color': 'Red'})
+    store.clear('tok')
+    db.session.rollback()
+    assert Product.query.filter_by(name='Pending').count() == 0
+    assert [line['quantity'] for line in store.lines('tok')] == [1]
@@ -0,0 +1,66 @@
+"""Tests for hybrid lexical + vector product search (utils/hybrid_search.py)."""
+import pytest
+import threading
+from unittest.mock import patch
+from app import app
+from models.database import db
+from models.product import Product
+from utils.ai_action_executor import execute_action
+from utils.hybrid_search import fuse
+
+@pytest.fixture
+def client():
+    """Create a test client."""
+    app.config['TESTING'] = True
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///:memory:'
+    app.config['JWT_SECRET'] = 'test-secret-key-for-testing-only-min-32-chars'
+
+    with app.test_client() as client:
+        with app.app_context():
+            db.drop_all()
+            db.create_all()
+            yield client
+            db.session.remove()
+            db.drop_all()
+
+def _product(pid, **fields):
+    return dict({'id': pid, 'rating': 0.0, 'stock_quantity': 0, 'on_sale': False}, **fields)
+
+def test_fusion_prefers_products_both_retrievers_found():
+    products = {pid: _product(pid) for pid in (1, 2, 3, 4)}
+    ordered, ranking = fuse({'lexical': [1, 2, 3], 'vector': [4, 3]}, products, k=60)
+    assert [p['id'] for p in ordered] == [3, 1, 4, 2]
+    assert ranking[0]['ranks'] == {'lexical': 3, 'vector': 2}
+    assert ranking[0]['rrf'] == round(1 / 63 + 1 / 62, 6)
+    assert ranking[1]['ranks'] == {'lexical': 1, 'vector': None}
+
+def test_boosts_break_ties_between_equal_ranks():
+    products = {1: _product(1), 2: _product(2, rating=4.5, stock_quantity=3, on_sale=True)}
+    ordered, ranking = fuse({'lexical': [1], 'vector': [2]}, products)
+    assert [p['id'] for p in ordered] == [2, 1]
+    assert ranking[0]['boosts'] == {'rating': 0.0036, 'stock': 0.003, 'on_sale': 0.002}
+    assert ranking[0]['score'] == round(ranking[0]['rrf'] + 0.0086, 6)
+
+def test_search_fuses_sql_and_vector_results(client):
+    linen = Product(name='Linen Shirt', price=40, category='men', color='White', clothing_type='Shirt',
+                    stock_quantity=4, is_active=True)
+    breezy = Product(name='Breezy Summer Top', description='Light and airy', price=35, category='men',
+                     color='White', clothing_type='Shirt', stock_quantity=2, is_active=True)
+    women = Product(name='Airy Blouse', price=30, category='women', color='White', clothing_type='Blouse',
+                    stock_quantity=2, is_active=True)
+    db.session.add_all([linen, breezy, women])
+    db.session.commit()
+    vector_ids, threads = [breezy.id, women.id, linen.id], []
+
+    def vector(query, n_results=10, where=None):
+        threads.append(threading.current_thread().name)
+        return vector_ids
+
+    with patch('utils.vector_db.search_products_vector', side_effect=vector):
+        result = execute_action('SEARCH_PRODUCTS', {'search': 'linen', 'category': 'men'})
+    data = result['data']
+    # Linen Shirt is found by both; the women's blouse fails the category re-check
+    assert [p['id'] for p in data['products']] == [linen.id, breezy.id]
+    assert [r['id'] for r in data['ranking']] == [linen.id, breezy.id]
+    assert data['ranking'][0]['ranks'] == {'lexical': 1, 'vector': 2}
+    assert threads and threads[0].startswith('hybrid-search')
@@ -0,0 +1,241 @@
+"""Tests for atomic stock changes and cart reservations (utils/inventory.py)."""
+import pytest
+import json
+from app import app
+from models.database import db
+from models.product import Product
+from models.product_variation import ProductVariation
+from models.inventory_reservation import InventoryReservation
+from utils.inventory import InsufficientStock, take_stock, return_stock
+
+@pytest.fixture
+def client():
+    """Create a test client."""
+    app.config['TESTING'] = True
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///:memory:'
+    app.config['JWT_SECRET'] = 'test-secret-key-for-testing-only-min-32-chars'
+
+    with app.test_client() as client:
+        with app.app_context():
+            db.create_all()
+            yield client
+            db.session.remove()
+            db.drop_all()
+
+@pytest.fixture
+def stocked(client):
+    """A product (stock 10) with an M/Blue variation (stock 3) and an L/Blue variation (stock 1)."""
+    product = Product(name='Stock Tee', price=20.00, category='men', stock_quantity=10, is_active=True)
+    db.session.add(product)
+    db.session.commit()
+    variations = [
+        ProductVariation(product_id=product.id, size='M', color='Blue', stock_quantity=3),
+        ProductVariation(product_id=product.id, size='L', color='Blue', stock_quantity=1),
+    ]
+    db.session.add_all(variations)
+    db.session.commit()
+    return product.id, variations[0].id, variations[1].id
+
+def _stock(model, row_id):
+    return db.session.get(model, row_id).stock_quantity
+
+def test_take_stock_is_all_or_nothing(client, stocked):
+    """One short line fails the whole batch and leaves every row untouched."""
+    product_id, medium_id, large_id = stocked
+    with pytest.raises(InsufficientStock) as exc:
+        take_stock(variations={medium_id: 2, large_id: 2}, products={product_id: 1})
+    assert exc.value.variation_ids == [large_id]
+    assert _stock(ProductVariation, medium_id) == 3
+    assert _stock(ProductVariation, large_id) == 1
+    assert _stock(Product, product_id) == 10
+
+    take_stock(variations={medium_id: 2, large_id: 1}, products={product_id: 3})
+    assert _stock(ProductVariation, medium_id) == 1
+    assert _stock(ProductVariation, large_id) == 0
+    assert _stock(Product, product_id) == 7
+    return_stock(variations={large_id: 1})
+    assert _stock(ProductVariation, large_id) == 1
+
+def test_guest_cart_holds_and_releases_stock(client, stocked):
+    """Adding to the cart holds variation stock in a reservation; clearing the cart returns it."""
+    product_id, medium_id, _ = stocked
+    response = client.post('/api/cart', json={'product_id': product_id, 'variation_id': medium_id, 'quantity': 2})
+    assert response.status_code == 200
+    assert json.loads(response.data)['remaining_stock'] == 1
+    reservation = InventoryReservation.query.filter_by(variation_id=medium_id).one()
+    assert reservation.status == 'held' and reservation.quantity == 2 and reservation.cart_token
+
+    response = client.post('/api/cart', json={'product_id': product_id, 'variation_id': medium_id, 'quantity': 2})
+    assert response.status_code == 400
+    assert _stock(ProductVariation, medium_id) == 1
+
+    assert client.delete('/api/cart/clear').status_code == 200
+    db.session.expire_all()
+    assert _stock(ProductVariation, medium_id) == 3
+    assert InventoryReservation.query.filter_by(variation_id=medium_id).one().status == 'released'
+
+def test_order_commits_held_stock(client, stocked):
+    """Checkout turns the cart's hold into sold stock and takes product stock in the same batch."""
+    product_id, medium_id, _ = stocked
+    client.post('/api/cart', json={'product_id': product_id, 'variation_id': medium_id, 'quantity': 2})
+    response = client.post('/api/orders', json={
+        'email': 'guest@example.com', 'shipping_name': 'Guest', 'shipping_address': '1 Main St',
+        'shipping_city': 'City', 'shipping_state': 'CA', 'shipping_zip': '12345',
+    })
+    assert response.status_code == 201
+    db.session.expire_all()
+    reservation = InventoryReservation.query.filter_by(variation_id=medium_id).one()
+    assert reservation.status == 'committed'
+    assert reservation.order_id == json.loads(response.data)['order']['id']
+    assert _stock(ProductVariation, medium_id) == 1
+    assert _stock(Product, product_id) == 8
+
+def test_sweeper_releases_expired_holds(client, stocked):
+    """Expired holds go back to stock once; live holds are kept."""
+    from datetime import datetime, timedelta
+    from utils.reservation_sweeper import release_expired_reservations
+    product_id, medium_id, large_id = stocked
+    client.post('/api/cart', json={'product_id': product_id, 'variation_id': medium_id, 'quantity': 2})
+    client.post('/api/cart', json={'product_id': product_id, 'variation_id': large_id, 'quantity': 1})
+    stale = InventoryReservation.query.filter_by(variation_id=medium_id).one()
+    stale.expires_at = datetime.utcnow() - timedelta(minutes=1)
+    db.session.commit()
+
+    report = release_expired_reservations()
+    assert report['ran'] is True
+    assert report['reservations'] == 1
+    assert report['variations'] == {medium_id: 2}
+    db.session.expire_all()
+    assert _stock(ProductVariation, medium_id) == 3
+    assert _stock(ProductVariation, large_id) == 0
+    assert InventoryReservation.query.filter_by(variation_id=large_id).one().status == 'held'
+    assert release_expired_reservations()['units'] == 0
+
+def test_login_merge_moves_lines_and_holds(client, stocked):
+    """Guest lines merge into the user's cart in one pass; variation holds move to the user."""
+    import bcrypt
+    from models.user import User
+    from models.cart import CartItem
+    product_id, medium_id, _ = stocked
+    plain = Product(name='Plain Cap', price=10.00, category='men', stock_quantity=2, is_active=True)
+    user = User(email='merge@example.com', first_name='M', last_name='U',
+                password_hash=bcrypt.hashpw(b'password123', bcrypt.gensalt()).decode('utf-8'))
+    user.is_verified = True
+    db.session.add_all([plain, user])
+    db.session.commit()
+    plain_id, user_id = plain.id, user.id
+    db.session.add(CartItem(user_id=user_id, product_id=plain_id, quantity=1))
+    db.session.commit()
+
+    client.post('/api/cart', json={'product_id': product_id, 'variation_id': medium_id, 'quantity': 2})
+    client.post('/api/cart', json={'product_id': plain_id, 'quantity': 2})
+    token = json.loads(client.post('/api/auth/login', json={
+        'email': 'merge@example.com', 'password': 'password123'
+    }).data)['token']
+    data = json.loads(client.get('/api/cart', headers={'Authorization': f'Bearer {token}'}).data)
+
+    assert data['merge'] == {'added': 1, 'merged': 1, 'skipped': []}
+    quantities = {i['product_id']: i['quantity'] for i in data['items']}
+    assert quantities == {product_id: 2, plain_id: 2}  # Plain line capped at its stock
+    db.session.expire_all()
+    reservation = InventoryReservation.query.filter_by(variation_id=medium_id).one()
+    assert reservation.user_id == user_id and reservation.cart_token is None
+    assert _stock(ProductVariation, medium_id) == 1
+    assert json.loads(client.get('/api/cart', headers={'Authorization': f'Bearer {token}'}).data).get('merge') is None
+
+def test_transfer_merges_into_existing_user_hold(client, stocked):
+    """A guest hold on a variation the user already holds is added to the user's row, not duplicated."""
+    from utils.inventory import hold_stock, release_holds, transfer_holds
+    _, medium_id, _ = stocked
+    variation = db.session.get(ProductVariation, medium_id)
+    hold_stock(variation, 1, user_id=42)
+    hold_stock(variation, 1, cart_token='guest-token')
+    assert transfer_holds('guest-token', 42) == 1
+    hold_stock(variation, 1, user_id=42)
+    db.session.commit()
+    held = InventoryReservation.query.filter_by(user_id=42, status='held').all()
+    assert [(r.variation_id, r.quantity) for r in held] == [(medium_id, 3)]
+    assert _stock(ProductVariation, medium_id) == 0
+    assert release_holds(user_id=42) == {medium_id: 3}
+    db.session.commit()
+    db.session.expire_all()
+    assert _stock(ProductVariation, medium_id) == 3
+
+def test_login_merge_onto_existing_hold_keeps_stock_exact(client, stocked):
+    """Guest and user hold the same variation: one merged hold, and clearing the cart returns exactly what was taken."""
+    import bcrypt
+    from models.user import User
+    product_id, medium_id, _ = stocked
+    user = User(email='held@example.com', first_name='H', last_name='U',
+                password_hash=bcrypt.hashpw(b'password123', bcrypt.gensalt()).decode('utf-8'))
+    user.is_verified = True
+    db.session.add(user)
+    db.session.commit()
+    user_id = user.id
+    token = json.loads(client.post('/api/auth/login', json={
+        'email': 'held@example.com', 'password': 'password123'
+    }).data)['token']
+    headers = {'Authorization': f'Bearer {token}'}
+    client.post('/api/cart', json={'product_id': product_id, 'variation_id': medium_id, 'quantity': 1}, headers=headers)
+
+    client.post('/api/cart', json={'product_id': product_id, 'variation_id': medium_id, 'quantity': 1})
+    client.post('/api/auth/login', json={'email': 'held@example.com', 'password': 'password123'})
+    data = json.loads(client.get('/api/cart', headers=headers).data)
+    assert [i['quantity'] for i in data['items']] == [2]
+    client.post('/api/cart', json={'product_id': product_id, 'variation_id': medium_id, 'quantity': 1}, headers=headers)
+    db.session.expire_all()
+    held = InventoryReservation.query.filter_by(user_id=user_id, status='held').all()
+    assert [r.quantity for r in held] == [3]
+    assert _stock(ProductVariation, medium_id) == 0
+
+    client.delete('/api/cart/clear', headers=headers)
+    db.session.expire_all()
+    assert _stock(ProductVariation, medium_id) == 3
+
+def test_changing_size_moves_the_hold(client, stocked):
+    """A guest line changed from M to L releases the M hold, holds L and points at the L variation."""
+    from utils.guest_cart import get_guest_cart
+    product_id, medium_id, large_id = stocked
+    client.post('/api/cart', json={'product_id': product_id, 'variation_id': medium_id, 'quantity': 2})
+    change = {'quantity': 2, 'selected_color': 'Blue', 'selected_size': 'L', 'old_color': 'Blue', 'old_size': 'M'}
+    assert client.put(f'/api/cart/guest_{product_id}', json=change).status_code == 400  # Only one L
+    db.session.expire_all()
+    assert _stock(ProductVariation, medium_id) == 1 and _stock(ProductVariation, large_id) == 1
+
+    assert client.put(f'/api/cart/guest_{product_id}', json=dict(change, quantity=1)).status_code == 200
+    db.session.expire_all()
+    assert _stock(ProductVariation, medium_id) == 3 and _stock(ProductVariation, large_id) == 0
+    held = InventoryReservation.query.filter_by(status='held').all()
+    assert [(r.variation_id, r.quantity) for r in held] == [(large_id, 1)]
+    with client.session_transaction() as flask_session:
+        token = flask_session['guest_cart_token']
+    with app.test_request_context():
+        from flask import session
+        session['guest_cart_token'] = token
+        assert [(l['variation_id'], l['selected_size'], l['quantity']) for l in get_guest_cart()] == [(large_id, 'L', 1)]
+
+def test_changing_size_moves_the_users_hold(client, stocked):
+    """Same for a signed-in user's cart item."""
+    import bcrypt
+    from models.user import User
+    from models.cart import CartItem
+    product_id, medium_id, large_id = stocked
+    user = User(email='size@example.com', first_name='S', last_name='U',
+                password_hash=bcrypt.hashpw(b'password123', bcrypt.gensalt()).decode('utf-8'))
+    user.is_verified = True
+    db.session.add(user)
+    db.session.commit()
+    token = json.loads(client.post('/api/auth/login', json={
+        'email': 'size@example.com', 'password': 'password123'
+    }).data)['token']
+    headers = {'Authorization': f'Bearer {token}'}
+    client.post('/api/cart', json={'product_id': product_id, 'variation_id': medium_id, 'quantity': 2}, headers=headers)
+    item_id = CartItem.query.one().id
+    response = client.put(f'/api/cart/{item_id}', json={'quantity': 1, 'selected_size': 'L'}, headers=headers)
+    assert response.status_code == 200
+    db.session.expire_all()
+    item = CartItem.query.one()
+    assert (item.variation_id, item.selected_size, item.quantity) == (large_id, 'L', 1)
+    assert _stock(ProductVariation, medium_id) == 3 and _stock(ProductVariation, large_id) == 0
+    held = InventoryReservation.query.filter_by(status='held').all()
+    assert [(r.variation_id, r.quantity) for r in held] == [(large_id, 1)]
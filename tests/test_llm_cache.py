@@ -0,0 +1,92 @@
+"""Tests for the decision-engine response cache (utils/llm_cache.py)."""
+import pytest
+import json
+import threading
+import time
+from unittest.mock import patch
+from app import app
+from models.database import db
+from utils.llm_cache import LLMResponseCache, decision_cache, decision_cache_key
+
+@pytest.fixture
+def client():
+    """Create a test client."""
+    app.config['TESTING'] = True
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///:memory:'
+    app.config['JWT_SECRET'] = 'test-secret-key-for-testing-only-min-32-chars'
+
+    with app.test_client() as client:
+        with app.app_context():
+            db.create_all()
+            decision_cache.clear()
+            decision_cache.reset_stats()
+            yield client
+            db.session.remove()
+            db.drop_all()
+
+def test_cache_lru_ttl_and_cacheable():
+    cache = LLMResponseCache(max_entries=2, ttl_seconds=60)
+    assert cache.get_or_compute('a', lambda: 1) == (1, 'miss')
+    assert cache.get_or_compute('b', lambda: 2) == (2, 'miss')
+    assert cache.get_or_compute('a', lambda: 0) == (1, 'hit')
+    cache.get_or_compute('c', lambda: 3)  # Evicts b, the least recently used
+    assert cache.get_or_compute('b', lambda: 4) == (4, 'miss')
+    assert cache.get_or_compute('x', lambda: None, cacheable=lambda v: v is not None) == (None, 'miss')
+    assert cache.get_or_compute('x', lambda: 5) == (5, 'miss')
+    assert cache.get_or_compute('x', lambda: 6, bypass=True) == (6, 'bypass')
+    cache.ttl_seconds = 0.01
+    cache.get_or_compute('t', lambda: 7)
+    time.sleep(0.02)
+    assert cache.get_or_compute('t', lambda: 8) == (8, 'miss')
+    stats = cache.stats()
+    assert stats['evictions'] >= 1 and stats['expired'] == 1 and stats['bypassed'] == 1
+
+def test_concurrent_identical_requests_are_coalesced():
+    cache = LLMResponseCache(max_entries=10, ttl_seconds=60)
+    calls = []
+    started = threading.Event()
+
+    def slow():
+        calls.append(1)
+        started.set()
+        time.sleep(0.2)
+        return {'action': 'SEARCH_PRODUCTS'}
+
+    results = []
+    leader = threading.Thread(target=lambda: results.append(cache.get_or_compute('k', slow)))
+    leader.start()
+    started.wait(1)
+    followers = [threading.Thread(target=lambda: results.append(cache.get_or_compute('k', slow))) for _ in range(3)]
+    for t in followers:
+        t.start()
+    for t in [leader] + followers:
+        t.join()
+    assert len(calls) == 1
+    assert sorted(status for _, status in results) == ['coalesced', 'coalesced', 'coalesced', 'miss']
+
+def test_key_normalizes_message_and_tracks_context():
+    base = decision_cache_key('Show me  red dresses', {'color': 'red', 'size': ''}, [], 'openai', 'gpt-4o-mini', 'v1', 0.2)
+    assert base == decision_cache_key(' show me red DRESSES', {'color': 'red'}, [], 'openai', 'gpt-4o-mini', 'v1', 0.2)
+    assert base != decision_cache_key('show me red dresses', {'color': 'blue'}, [], 'openai', 'gpt-4o-mini', 'v1', 0.2)
+    assert base != decision_cache_key('show me red dresses', {'color': 'red'}, ['hi'], 'openai', 'gpt-4o-mini', 'v1', 0.2)
+    assert base != decision_cache_key('show me red dresses', {'color': 'red'}, [], 'gemini', 'gpt-4o-mini', 'v1', 0.2)
+    assert base != decision_cache_key('show me red dresses', {'color': 'red'}, [], 'openai', 'gpt-4o-mini', 'v2', 0.2)
+
+class _Config:
+    def to_internal_dict(self):
+        return {'provider': 'openai', 'model_id': 'gpt-4o-mini', 'api_key': 'test', 'is_enabled': True}
+
+def test_chat_reuses_cached_decision(client):
+    """Repeated chat messages hit the cache; X-AI-Cache: bypass forces an upstream call."""
+    reply = {'content': json.dumps({'action': 'RESPONSE', 'parameters': {}, 'message': 'Hello!', 'confidence': 0.9})}
+    with patch('routes.ai_agent.get_active_ai_config', return_value=_Config()), \
+            patch('routes.ai_agent.call_llm', return_value=reply) as llm:
+        first = client.post('/api/ai/chat', json={'message': 'hello there', 'history': []})
+        second = client.post('/api/ai/chat', json={'message': 'Hello  there', 'history': []})
+        bypassed = client.post('/api/ai/chat', json={'message': 'hello there'}, headers={'X-AI-Cache': 'bypass'})
+    assert first.headers['X-AI-Cache'] == 'miss'
+    assert second.headers['X-AI-Cache'] == 'hit'
+    assert bypassed.headers['X-AI-Cache'] == 'bypass'
+    assert json.loads(second.data)['message_json'] == json.loads(first.data)['message_json']
+    assert llm.call_count == 2
+    assert decision_cache.stats()['hits'] == 1
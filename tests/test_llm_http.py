@@ -0,0 +1,55 @@
+"""Tests for the pooled LLM provider HTTP client (utils/llm_http.py)."""
+import http.server
+import json
+import threading
+import pytest
+from utils import llm_http
+
+
+class _Handler(http.server.BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'  # Keep-alive
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get('Content-Length') or 0))
+        self.server.ports.add(self.client_address[1])
+        body = json.dumps({'ok': True}).encode('utf-8')
+        self.send_response(500 if self.path == '/fail' else 200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    httpd = http.server.ThreadingHTTPServer(('127.0.0.1', 0), _Handler)
+    httpd.ports = set()
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    llm_http.reset_llm_latency_stats()
+    yield httpd
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def test_calls_reuse_one_connection_and_record_latency(server):
+    url = f'http://127.0.0.1:{server.server_address[1]}'
+    for _ in range(3):
+        assert llm_http.post('test-provider', url + '/ok', json={'prompt': 'hi'}).json() == {'ok': True}
+    assert llm_http.post('test-provider', url + '/fail', json={}).status_code == 500
+    assert len(server.ports) == 1  # Every call went over the same keep-alive connection
+
+    stats = llm_http.get_llm_latency_stats()['test-provider']
+    assert stats['count'] == 4 and stats['errors'] == 1
+    assert stats['buckets_ms']['+Inf'] == 4
+
+
+def test_provider_timeouts(monkeypatch):
+    monkeypatch.setenv('LLM_TIMEOUT_GEMINI', '15')
+    monkeypatch.setattr('config.Config.LLM_CONNECT_TIMEOUT_SECONDS', 3)
+    monkeypatch.setattr('config.Config.LLM_TIMEOUT_SECONDS', 45)
+    assert llm_http.provider_timeout('gemini') == (3, 15)
+    assert llm_http.provider_timeout('openai') == (3, 45)
+    assert llm_http.provider_timeout('openai', 90) == (3, 90)
@@ -124,3 +124,35 @@ def test_get_member_dashboard_unauthorized(client):
     response = client.get('/api/members/dashboard')
     assert response.status_code == 401
 
+
+def test_member_dashboard_statistics_and_summaries(client, auth_token, test_user):
+    """Statistics come from aggregates over every order; recent orders are item-less summaries."""
+    from models.order import OrderItem
+    product = Product(name='Summary Tee', price=25.00, category='men', stock_quantity=10, is_active=True)
+    db.session.add(product)
+    orders = []
+    for i, status in enumerate(['pending', 'processing', 'delivered', 'cancelled', 'delivered', 'pending']):
+        order = Order(user_id=test_user['id'], shipping_name='Test User', shipping_address='123 Test St',
+                      shipping_city='Test City', shipping_state='CA', shipping_zip='12345',
+                      subtotal=25.00, tax=0, shipping_cost=0, total=25.00, status=status)
+        orders.append(order)
+    db.session.add_all(orders)
+    db.session.flush()
+    db.session.add_all([OrderItem(order_id=o.id, product_id=product.id, quantity=2, price=12.50) for o in orders])
+    db.session.add_all([
+        Payment(order_id=orders[2].id, payment_method='stripe', amount=25.00, status='completed'),
+        Payment(order_id=orders[4].id, payment_method='stripe', amount=30.00, status='completed'),
+        Payment(order_id=orders[0].id, payment_method='stripe', amount=25.00, status='failed'),
+    ])
+    db.session.commit()
+
+    response = client.get('/api/members/dashboard', headers={'Authorization': f'Bearer {auth_token}'})
+    assert response.status_code == 200
+    data = json.loads(response.data)
+    assert data['statistics'] == {'total_orders': 6, 'pending_orders': 3, 'total_spent': 55.0, 'completed_orders': 2}
+    assert len(data['recent_orders']) == 5
+    assert all('items' not in o and o['item_count'] == 2 for o in data['recent_orders'])
+    assert len(data['recent_payments']) == 3
+
+    data = json.loads(client.get('/api/members/orders', headers={'Authorization': f'Bearer {auth_token}'}).data)
+    assert [i['product']['name'] for i in data['orders'][0]['items']] == ['Summary Tee']
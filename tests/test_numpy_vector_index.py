@@ -0,0 +1,103 @@
+"""Tests for the NumPy vector index fallback (utils/numpy_vector_index.py) and its use by utils/vector_db.py."""
+import pytest
+import hashlib
+import os
+import re
+import numpy as np
+from unittest.mock import patch
+from app import app
+from config import Config
+from models.database import db
+from models.product import Product
+from utils.embeddings import Embedder
+from utils.numpy_vector_index import NumpyVectorIndex
+from utils.vector_db import _product_to_document_and_metadata, metadata_filter
+import utils.vector_db as vector_db
+
+@pytest.fixture
+def client():
+    """Create a test client."""
+    app.config['TESTING'] = True
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///:memory:'
+    app.config['JWT_SECRET'] = 'test-secret-key-for-testing-only-min-32-chars'
+
+    with app.test_client() as client:
+        with app.app_context():
+            db.drop_all()
+            db.create_all()
+            yield client
+            db.session.remove()
+            db.drop_all()
+
+def _encode(texts):
+    """Bag-of-words vectors: texts sharing words are close."""
+    vectors = np.zeros((len(texts), 32), dtype=np.float32)
+    for i, text in enumerate(texts):
+        for word in re.findall(r'[a-z]+', text.lower()):
+            vectors[i, int(hashlib.md5(word.encode()).hexdigest(), 16) % 32] += 1
+    return vectors
+
+def _add(index, items):
+    texts = [text for _, text, _ in items]
+    index.upsert(ids=[doc_id for doc_id, _, _ in items], embeddings=_encode(texts),
+                 metadatas=[meta for _, _, meta in items], documents=texts)
+
+def test_top_k_by_cosine_similarity(tmp_path):
+    index = NumpyVectorIndex(str(tmp_path), 'bow')
+    _add(index, [('a', 'red linen dress', {}), ('b', 'blue denim jacket', {}), ('c', 'red silk dress', {})])
+    result = index.query(query_embeddings=_encode(['red dress']), n_results=2)
+    assert sorted(result['ids'][0]) == ['a', 'c']
+    assert 0 <= result['distances'][0][0] <= result['distances'][0][1] < 1
+    _add(index, [('a', 'green wool coat', {})])
+    index.delete(['c'])
+    assert index.count() == 2
+    assert sorted(index.query(query_embeddings=_encode(['red dress']), n_results=5)['ids'][0]) == ['a', 'b']
+    assert index.query(query_embeddings=_encode(['wool coat']), n_results=1)['ids'] == [['a']]
+
+def test_where_clauses_match_chroma_filters(tmp_path):
+    index = NumpyVectorIndex(str(tmp_path), 'bow')
+    products = [
+        (1, {'name': 'Navy Oxford Shirt', 'category': 'Men', 'color': 'Navy Blue', 'clothing_type': 'Dress Shirt',
+             'available_sizes': ['M', 'XL'], 'price': 40, 'on_sale': True}),
+        (2, {'name': 'Navy Polo Shirt', 'category': 'Men', 'color': 'Navy Blue', 'clothing_type': 'Polo',
+             'available_sizes': ['XL'], 'price': 25, 'on_sale': True}),
+        (3, {'name': 'Navy Blouse', 'category': 'Women', 'color': 'Navy Blue', 'clothing_type': 'Blouse',
+             'clothing_category': 'shirts', 'available_sizes': ['XL'], 'price': 45, 'on_sale': False}),
+    ]
+    for pid, data in products:
+        text, meta = _product_to_document_and_metadata(pid, data)
+        index.upsert(ids=[f'product_{pid}'], embeddings=_encode([text]), metadatas=[meta])
+    query = _encode(['navy shirt'])
+    where = metadata_filter({'color': 'navy blue', 'clothing_type': 'shirt', 'size': 'XL'})
+    assert sorted(index.query(query_embeddings=query, n_results=10, where=where)['ids'][0]) == ['product_1', 'product_3']
+    where = {'$and': [{'category': 'men'}, {'on_sale': 'true'}, {'price': {'$gte': 30}}]}
+    assert index.query(query_embeddings=query, n_results=10, where=where)['ids'][0] == ['product_1']
+
+def test_index_persists_and_recovers_from_partial_writes(tmp_path):
+    index = NumpyVectorIndex(str(tmp_path), 'bow')
+    _add(index, [('a', 'red dress', {'color_red': True}), ('b', 'blue jacket', {})])
+    index.delete(['b'])
+    with open(os.path.join(str(tmp_path), 'records.jsonl'), 'a') as f:
+        f.write('{"id":"z","row":9,"metadata":{}}\n{"id":"y","ro')  # Record without a vector, torn line
+    reopened = NumpyVectorIndex(str(tmp_path), 'bow')
+    assert reopened.count() == 1
+    assert reopened.query(query_embeddings=_encode(['red']), n_results=3, where={'color_red': True})['ids'] == [['a']]
+    assert NumpyVectorIndex(str(tmp_path), 'other-model').count() == 0
+
+def test_vector_db_falls_back_to_numpy_index(client, tmp_path):
+    product = Product(name='Linen Summer Dress', description='Breezy linen', price=50, category='women',
+                      color='White', clothing_type='Dress', stock_quantity=3, is_active=True)
+    other = Product(name='Wool Winter Coat', price=120, category='men', color='Grey',
+                    clothing_type='Coat', stock_quantity=3, is_active=True)
+    db.session.add_all([product, other])
+    db.session.commit()
+    embedder = Embedder(_encode, 'bow', str(tmp_path / 'embedding_cache'))
+    with patch.object(vector_db, 'chromadb', None), patch.object(vector_db, 'collection', None), \
+            patch.object(vector_db, 'vector_backend', None), patch.object(Config, 'VECTOR_DB_PATH', str(tmp_path)), \
+            patch('utils.embeddings.get_embedder', return_value=embedder):
+        assert vector_db.sync_all_products_from_sql(app) == (2, True)
+        assert vector_db.get_vector_backend() == 'numpy'
+        assert vector_db.search_products_vector('linen dress', n_results=1) == [product.id]
+        assert vector_db.search_products_vector('linen dress', where={'category': 'men'}) == [other.id]
+        vector_db.delete_product_from_vector_db(other.id)
+        assert vector_db.search_products_vector('coat', n_results=5) == [product.id]
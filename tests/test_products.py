@@ -337,3 +337,120 @@ def test_search_products_with_reviews_keyword(client, test_products):
     # Should return products sorted by rating
     assert len(data['products']) >= 1
 
+
+def test_get_products_card_fields(client, test_products):
+    """Test that ?fields=card drops description/meta fields but keeps card fields."""
+    response = client.get('/api/products?fields=card')
+    assert response.status_code == 200
+    data = json.loads(response.data)
+    product = data['products'][0]
+    assert 'description' not in product
+    assert 'meta_title' not in product
+    assert 'images_by_color' not in product
+    for key in ('id', 'name', 'price', 'original_price', 'on_sale', 'stock_quantity', 'image_url'):
+        assert key in product
+
+def test_serialize_many_matches_to_dict(client, test_products):
+    """Test that batch serialization returns the same dicts as Product.to_dict."""
+    from utils.product_serializer import ProductSerializer
+    with app.app_context():
+        products = Product.query.order_by(Product.id).all()
+        assert ProductSerializer.serialize_many(products) == [p.to_dict() for p in products]
+
+def test_get_facets_counts_and_etag(client, test_products):
+    """Facets endpoint returns counts for the selection and honours If-None-Match."""
+    response = client.get('/api/products/facets?category=men')
+    assert response.status_code == 200
+    data = json.loads(response.data)
+    # Category facet ignores its own selection so other categories stay visible
+    assert {c['value']: c['count'] for c in data['category']} == {'men': 1, 'women': 1, 'kids': 1}
+    assert data['color'] == [{'value': 'Blue', 'count': 1}]
+    assert data['total'] == 1
+    etag = response.headers['ETag']
+    response = client.get('/api/products/facets?category=men', headers={'If-None-Match': etag})
+    assert response.status_code == 304
+
+def test_facet_cache_invalidated_on_product_write(client, test_products):
+    """Product writes invalidate the cached facets."""
+    response = client.get('/api/products/colors')
+    assert 'Green' not in json.loads(response.data)['colors']
+    product = Product.query.filter_by(category='kids').first()
+    product.color = 'Green'
+    db.session.commit()
+    response = client.get('/api/products/colors')
+    assert 'Green' in json.loads(response.data)['colors']
+
+def test_facet_cache_invalidated_only_when_the_write_commits(client, test_products):
+    """Flushed writes do not invalidate the facets; a commit does, a rollback does not."""
+    from utils.catalog_cache import get_catalog_version
+    version = get_catalog_version()
+    product = Product.query.filter_by(category='kids').first()
+    product.color = 'Purple'
+    db.session.flush()
+    assert get_catalog_version() == version
+    db.session.rollback()
+    assert get_catalog_version() == version
+    product = Product.query.filter_by(category='kids').first()
+    product.color = 'Purple'
+    db.session.commit()
+    assert get_catalog_version() == version + 1
+    assert 'Purple' in json.loads(client.get('/api/products/colors').data)['colors']
+
+def test_product_detail_etag_304(client, test_products):
+    """Product detail honours If-None-Match and sets Cache-Control."""
+    product_id = Product.query.filter_by(name='Test T-Shirt Men').first().id
+    response = client.get(f'/api/products/{product_id}')
+    assert response.status_code == 200
+    assert 'public' in response.headers['Cache-Control']
+    etag = response.headers['ETag']
+    response = client.get(f'/api/products/{product_id}', headers={'If-None-Match': etag})
+    assert response.status_code == 304
+    assert response.data == b''
+
+def test_listing_etag_changes_after_product_write(client, test_products):
+    """A product write changes the listing ETag so clients get fresh data."""
+    from utils.http_cache import get_http_cache_stats
+    response = client.get('/api/products')
+    etag = response.headers['ETag']
+    assert client.get('/api/products', headers={'If-None-Match': etag}).status_code == 304
+    product = Product.query.filter_by(name='Test T-Shirt Men').first()
+    product.price = 30.00
+    db.session.commit()
+    response = client.get('/api/products', headers={'If-None-Match': etag})
+    assert response.status_code == 200
+    assert response.headers['ETag'] != etag
+    stats = get_http_cache_stats()['endpoints']['products.get_products']
+    assert stats['hits'] >= 1 and stats['misses'] >= 2
+
+def test_etag_survives_max_age_and_other_processes(client, test_products):
+    """Without writes, a revalidation after max-age (or in a fresh process) still gets a 304."""
+    from unittest.mock import patch
+    from utils import http_cache
+    response = client.get('/api/products?category=men')
+    etag, last_modified = response.headers['ETag'], response.headers['Last-Modified']
+    assert client.get('/api/products?category=men', headers={'If-Modified-Since': last_modified}).status_code == 304
+    later = http_cache.time.time() + 10 * max(app.config.get('HTTP_CACHE_MAX_AGE', 60), 60)
+    with patch.object(http_cache.time, 'time', return_value=later):
+        http_cache._validators.clear()  # As in another worker, or after a restart
+        response = client.get('/api/products?category=men', headers={'If-None-Match': etag})
+        assert response.status_code == 304 and response.headers['ETag'] == etag
+
+def test_get_products_cursor_pagination(client, test_products):
+    """?cursor= walks the listing with keyset pagination until has_more is false."""
+    seen = []
+    cursor = ''
+    while True:
+        response = client.get(f'/api/products?per_page=2&cursor={cursor}')
+        assert response.status_code == 200
+        data = json.loads(response.data)
+        seen.extend(p['id'] for p in data['products'])
+        assert data['total'] == 3 and data['total_is_approximate'] is True
+        if not data['has_more']:
+            break
+        cursor = data['next_cursor']
+    assert len(seen) == 3 and seen == sorted(seen)
+
+def test_get_products_invalid_cursor(client, test_products):
+    """A malformed cursor is rejected with 400."""
+    response = client.get('/api/products?cursor=not-a-cursor')
+    assert response.status_code == 400
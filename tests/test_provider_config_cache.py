@@ -0,0 +1,88 @@
+"""Tests for the cached AI provider configuration (routes/ai_agent.py)."""
+import pytest
+from unittest.mock import patch
+from flask_jwt_extended import create_access_token
+from sqlalchemy import event
+from app import app
+from models.database import db
+from models.user import User
+from models.ai_assistant_config import AiAssistantConfig, AISelectedProvider
+from routes.ai_agent import get_effective_provider_config, get_selected_provider, invalidate_provider_config
+
+@pytest.fixture
+def client():
+    """Create a test client."""
+    app.config['TESTING'] = True
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///:memory:'
+    app.config['JWT_SECRET'] = 'test-secret-key-for-testing-only-min-32-chars'
+
+    with app.test_client() as client:
+        with app.app_context():
+            db.create_all()
+            AISelectedProvider.query.delete()
+            AiAssistantConfig.query.delete()
+            db.session.add(AISelectedProvider(id=1, provider='openai'))
+            for provider in ('openai', 'anthropic'):
+                db.session.add(AiAssistantConfig(provider=provider, name=provider, source='admin',
+                                                 api_key=f'sk-stored-{provider}', is_valid=True, is_enabled=True))
+            db.session.commit()
+            invalidate_provider_config()
+            yield client
+            db.session.remove()
+            db.drop_all()
+            invalidate_provider_config()
+
+@pytest.fixture
+def admin_headers(client):
+    admin = User.query.filter_by(email='cache-admin@example.com').first()
+    if not admin:
+        admin = User(email='cache-admin@example.com', first_name='Cache', last_name='Admin')
+        admin.is_verified = True
+        admin.is_superadmin = True
+        db.session.add(admin)
+        db.session.commit()
+    return {'Authorization': f'Bearer {create_access_token(identity=str(admin.id))}'}
+
+def test_hot_path_runs_no_queries_and_no_decrypts(client):
+    assert get_effective_provider_config()['api_key'] == 'sk-stored-openai'
+    statements = []
+    listener = lambda *args: statements.append(args[2])
+    event.listen(db.engine, 'before_cursor_execute', listener)
+    try:
+        with patch('utils.secret_storage.decrypt_ciphertext') as decrypt:
+            for _ in range(5):
+                assert get_effective_provider_config()['provider'] == 'openai'
+                assert get_selected_provider() == 'openai'
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', listener)
+    assert statements == []
+    assert decrypt.call_count == 0
+
+def test_admin_changes_invalidate_cache(client, admin_headers):
+    assert get_effective_provider_config()['provider'] == 'openai'
+    response = client.put('/api/admin/ai-assistant/selected-provider', json={'provider': 'anthropic'}, headers=admin_headers)
+    assert response.status_code == 200
+    assert get_selected_provider() == 'anthropic'
+    assert get_effective_provider_config()['api_key'] == 'sk-stored-anthropic'
+    response = client.patch('/api/admin/ai-assistant/providers/anthropic', json={'is_enabled': False}, headers=admin_headers)
+    assert response.status_code == 200
+    assert get_effective_provider_config() is None
+
+def test_returned_config_is_a_copy(client):
+    get_effective_provider_config()['api_key'] = 'tampered'
+    assert get_effective_provider_config()['api_key'] == 'sk-stored-openai'
+
+def test_keys_resolved_only_for_used_providers_and_kept_across_rebuilds(client):
+    import routes.ai_agent as ai_agent
+    AISelectedProvider.query.first().provider = 'auto'
+    AiAssistantConfig.query.filter_by(provider='openai').first().is_enabled = False
+    db.session.commit()
+    invalidate_provider_config()
+    with patch('utils.secrets_loader.load_into_env') as load_into_env, \
+            patch('utils.secrets_loader.get_gemini_api_key_from_aws') as aws, \
+            patch('utils.secret_storage.decrypt_ciphertext', side_effect=lambda value: value) as decrypt:
+        for _ in range(3):
+            assert get_effective_provider_config()['api_key'] == 'sk-stored-anthropic'
+            ai_agent._provider_config_snapshot = None  # As after AI_PROVIDER_CONFIG_TTL_SECONDS
+    assert load_into_env.call_count == 0 and aws.call_count == 0  # Gemini is not enabled
+    assert [call.args for call in decrypt.call_args_list] == [('sk-stored-anthropic',)]
@@ -0,0 +1,173 @@
+"""Tests for the compiled sale pricing engine (utils/sale_engine.py)."""
+import pytest
+import json
+from datetime import date, timedelta
+from app import app
+from models.database import db
+from models.product import Product
+from models.sale import Sale
+from utils.sale_engine import (
+    get_active_sales, invalidate_sale_cache, price_products, on_sale_clause, reprice_stale,
+    price_range_clause
+)
+
+@pytest.fixture
+def client():
+    """Create a test client."""
+    app.config['TESTING'] = True
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///:memory:'
+    app.config['JWT_SECRET'] = 'test-secret-key-for-testing-only-min-32-chars'
+
+    with app.test_client() as client:
+        with app.app_context():
+            db.create_all()
+            invalidate_sale_cache()
+            yield client
+            db.drop_all()
+            invalidate_sale_cache()
+
+@pytest.fixture
+def sale_products(client):
+    """Create a women's dress, a men's shirt with its own sale, and a kids item."""
+    today = date.today()
+    products = [
+        Product(name='Red Dress', price=100.00, category='women', color='Red',
+                clothing_type='Dress', stock_quantity=5, is_active=True),
+        Product(name='Blue Shirt', price=40.00, category='men', color='Blue',
+                clothing_type='Shirt', stock_quantity=5, is_active=True,
+                sale_enabled=True, sale_start=today - timedelta(days=1),
+                sale_end=today + timedelta(days=1), sale_percentage=10),
+        Product(name='Kids Hoodie', price=30.00, category='kids', color='Green',
+                clothing_type='Hoodie', stock_quantity=5, is_active=True),
+    ]
+    db.session.add_all(products)
+    db.session.add(Sale(
+        name='Women Dresses', discount_percentage=25, start_date=today - timedelta(days=2),
+        end_date=today + timedelta(days=5), is_active=True,
+        product_filters=json.dumps({'category': 'women', 'clothing_type': 'Dress'})
+    ))
+    db.session.commit()
+    return products
+
+def test_global_sale_matches_filters(client, sale_products):
+    """Global sale applies only to products matching its filters."""
+    prices = price_products(sale_products)
+    dress, shirt, hoodie = sale_products
+    assert prices[dress.id]['sale_price'] == 75.0
+    assert prices[dress.id]['sale']['name'] == 'Women Dresses'
+    assert prices[hoodie.id] is None
+
+def test_product_level_sale_takes_precedence(client, sale_products):
+    """Product-level sale wins over global sales and has no Sale row."""
+    shirt = sale_products[1]
+    data = price_products([shirt])[shirt.id]
+    assert data['discount_percentage'] == 10.0
+    assert data['sale'] is None
+
+def test_batch_matches_get_sale_price(client, sale_products):
+    """price_products returns the same data as Product.get_sale_price for each product."""
+    prices = price_products(sale_products)
+    for p in sale_products:
+        assert prices[p.id] == p.get_sale_price()
+
+def test_sales_are_cached_until_sale_write(client, sale_products):
+    """Compiled sales are reused until a sale is written, then reloaded."""
+    first = get_active_sales()
+    assert get_active_sales() is first
+    sale = Sale.query.first()
+    sale.discount_percentage = 50
+    db.session.commit()
+    reloaded = get_active_sales()
+    assert reloaded is not first
+    dress = sale_products[0]
+    assert price_products([dress])[dress.id]['sale_price'] == 50.0
+
+def test_sale_cache_invalidated_only_when_the_write_commits(client, sale_products):
+    """A flushed Sale write keeps the compiled sales; the commit drops them, a rollback does not."""
+    from utils.sale_engine import get_sale_version
+    first = get_active_sales()
+    version = get_sale_version()
+    Sale.query.first().discount_percentage = 50
+    db.session.flush()
+    assert get_sale_version() == version and get_active_sales() is first
+    db.session.rollback()
+    assert get_sale_version() == version
+    Sale.query.first().discount_percentage = 50
+    db.session.commit()
+    assert get_sale_version() == version + 1 and get_active_sales() is not first
+
+def test_listing_uses_sale_price(client, sale_products):
+    """Product listing reports the global sale price."""
+    response = client.get('/api/products?category=women')
+    assert response.status_code == 200
+    data = json.loads(response.data)
+    assert data['products'][0]['on_sale'] is True
+    assert data['products'][0]['price'] == 75.0
+
+def test_on_sale_clause_matches_price_products(client, sale_products):
+    """SQL on-sale filter selects exactly the products price_products puts on sale."""
+    prices = price_products(sale_products)
+    expected = {pid for pid, data in prices.items() if data}
+    selected = {p.id for p in Product.query.filter(on_sale_clause()).all()}
+    assert selected == expected
+
+def test_on_sale_listing_includes_global_sales(client, sale_products):
+    """on_sale listing and special offers include products discounted by a global Sale."""
+    dress, shirt, hoodie = sale_products
+    response = client.get('/api/products?on_sale=1')
+    assert response.status_code == 200
+    data = json.loads(response.data)
+    assert {p['id'] for p in data['products']} == {dress.id, shirt.id}
+    assert data['total'] == 2
+    response = client.get('/api/products/special-offers')
+    assert {p['id'] for p in json.loads(response.data)['products']} == {dress.id, shirt.id}
+
+def test_effective_price_materialized_on_write(client, sale_products):
+    """Product writes store the current sale price; Sale writes reprice the affected products."""
+    dress, shirt, hoodie = sale_products
+    reprice_stale()
+    assert float(dress.effective_price) == 75.0
+    assert dress.sale_source.startswith('sale:')
+    assert float(shirt.effective_price) == 36.0 and shirt.sale_source == 'product'
+    assert float(hoodie.effective_price) == 30.0 and hoodie.discount_percentage is None
+    sale = Sale.query.first()
+    sale.discount_percentage = 50
+    db.session.commit()
+    db.session.refresh(dress)
+    assert float(dress.effective_price) == 50.0
+
+def test_daily_rollover_reprices_stale_rows(client, sale_products):
+    """Rows priced for another date are repriced; product sale windows follow the date."""
+    shirt = sale_products[1]
+    tomorrow_plus = date.today() + timedelta(days=3)
+    assert reprice_stale(tomorrow_plus) == 3
+    db.session.refresh(shirt)
+    assert shirt.priced_on == tomorrow_plus
+    assert float(shirt.effective_price) == 40.0
+    assert reprice_stale(tomorrow_plus) == 0
+
+def test_price_filters_use_sale_price(client, sale_products):
+    """min/max price filters and /price-range use the discounted price."""
+    response = client.get('/api/products?max_price=80')
+    ids = {p['id'] for p in json.loads(response.data)['products']}
+    assert sale_products[0].id in ids  # $100 dress at 25% off
+    response = client.get('/api/products/price-range')
+    data = json.loads(response.data)
+    assert data['min'] == 30.0 and data['max'] == 75.0
+
+def test_sale_write_reprices_on_commit(client, sale_products):
+    """A committed Sale write reprices its products at once; repricing leaves updated_at alone."""
+    dress, shirt, hoodie = sale_products
+    reprice_stale()
+    updated_at = dress.updated_at
+    sale = Sale.query.first()
+    sale.discount_percentage = 50
+    db.session.commit()
+    db.session.refresh(dress)
+    assert float(dress.effective_price) == 50.0 and dress.priced_on == date.today()
+    assert dress.updated_at == updated_at
+    assert reprice_stale() == 0
+    ids = {p['id'] for p in json.loads(client.get('/api/products?max_price=60').data)['products']}
+    assert ids == {dress.id, shirt.id, hoodie.id}
+    assert {p.id for p in Product.query.filter(price_range_clause(35, 60))} == {dress.id, shirt.id}
+    assert [p.id for p in Product.query.order_by(Product.effective_price.desc())] == [dress.id, shirt.id, hoodie.id]
@@ -0,0 +1,60 @@
+"""Tests for the full-text product search index (utils/search_index.py)."""
+import pytest
+from app import app
+from models.database import db
+from models.product import Product
+from utils.search_index import apply_text_search, get_search_backend
+
+@pytest.fixture
+def client():
+    """Create a test client."""
+    app.config['TESTING'] = True
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///:memory:'
+    app.config['JWT_SECRET'] = 'test-secret-key-for-testing-only-min-32-chars'
+
+    with app.test_client() as client:
+        with app.app_context():
+            db.create_all()
+            yield client
+            db.drop_all()
+
+@pytest.fixture
+def search_products(client):
+    """Products with overlapping words in name, type and description."""
+    products = [
+        Product(name='Blue Denim Jacket', description='Classic jacket', price=80, category='men',
+                color='Blue', clothing_type='Jacket', stock_quantity=5, is_active=True),
+        Product(name='Summer Dress', description='Light dress with blue flowers', price=60,
+                category='women', color='Yellow', clothing_type='Dress', stock_quantity=5, is_active=True),
+        Product(name='Basic Tee', description='Cotton t-shirt', price=15, category='men',
+                color='White', clothing_type='T-Shirt', stock_quantity=5, is_active=True),
+    ]
+    db.session.add_all(products)
+    db.session.commit()
+    return products
+
+def test_sqlite_uses_fts5(client):
+    """On SQLite the FTS5 backend is used once the products table exists."""
+    assert get_search_backend().name == 'fts5'
+
+def test_prefix_match_and_ranking(client, search_products):
+    """Tokens match as prefixes and name hits rank above description hits."""
+    names = [p.name for p in apply_text_search(Product.query, 'blu').all()]
+    assert names == ['Blue Denim Jacket', 'Summer Dress']
+    assert [p.name for p in apply_text_search(Product.query, 'shirt').all()] == ['Basic Tee']
+
+def test_index_follows_product_writes(client, search_products):
+    """Triggers keep the index in sync with updates and deletes."""
+    tee = Product.query.filter_by(name='Basic Tee').first()
+    tee.name = 'Linen Tee'
+    db.session.commit()
+    assert apply_text_search(Product.query, 'basic').count() == 0
+    assert apply_text_search(Product.query, 'linen').count() == 1
+    db.session.delete(tee)
+    db.session.commit()
+    assert apply_text_search(Product.query, 'linen').count() == 0
+
+def test_column_restriction_and_match_any(client, search_products):
+    """Searches can be limited to some columns and match any token."""
+    assert apply_text_search(Product.query, 'blue', columns=('name',)).count() == 1
+    assert apply_text_search(Product.query, 'denim summer', columns=('name',), match_any=True).count() == 2
@@ -0,0 +1,70 @@
+"""Tests for metadata-filtered vector search (utils/vector_db.metadata_filter and the AI search action)."""
+import pytest
+import json
+from unittest.mock import patch
+from app import app
+from models.database import db
+from models.product import Product
+from utils.ai_action_executor import execute_action
+from utils.vector_db import _product_to_document_and_metadata, metadata_filter
+
+@pytest.fixture
+def client():
+    """Create a test client."""
+    app.config['TESTING'] = True
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///:memory:'
+    app.config['JWT_SECRET'] = 'test-secret-key-for-testing-only-min-32-chars'
+
+    with app.test_client() as client:
+        with app.app_context():
+            db.drop_all()
+            db.create_all()
+            yield client
+            db.session.remove()
+            db.drop_all()
+
+def test_metadata_carries_filterable_fields():
+    _, meta = _product_to_document_and_metadata(4, {
+        'name': 'Slim Jeans', 'category': 'Men', 'color': 'Navy Blue', 'size': '32', 'price': 49.5,
+        'available_sizes': ['30', '32', 'XL'], 'fabric': 'Denim', 'clothing_type': 'Jeans',
+        'clothing_category': 'pants', 'occasion': 'casual', 'on_sale': True,
+    })
+    assert meta['price'] == 49.5 and meta['category'] == 'men' and meta['on_sale'] == 'true'
+    assert meta['color_navy'] and meta['color_blue'] and meta['type_jeans']
+    assert meta['size_30'] and meta['size_xl'] and meta['sizes'] == '30|32|XL'
+    assert all(isinstance(v, (str, int, float, bool)) for v in meta.values())
+
+def test_criteria_become_where_clause():
+    assert metadata_filter({'search': 'jeans'}) is None
+    assert metadata_filter({'category': 'Women'}) == {'category': 'women'}
+    where = metadata_filter({'color': 'navy blue', 'clothing_type': 'shirt', 'size': 'XL',
+                             'min_price': 10, 'max_price': 50, 'on_sale': True})
+    assert where == {'$and': [
+        {'color_navy': True}, {'color_blue': True},
+        {'$or': [{'type_shirt': True}, {'clothing_category': {'$in': ['shirts', 't_shirts']}}]},
+        {'size_xl': True},
+    ]}  # Price and sale status are only checked in SQL (the index can hold stale values)
+
+def test_search_pushes_criteria_into_vector_query(client):
+    products = [Product(name=f'Red Dress {i}', price=30 + i, category='women', color='Red',
+                        clothing_type='Dress', stock_quantity=3, is_active=True) for i in range(3)]
+    db.session.add_all(products)
+    db.session.commit()
+    ids = [p.id for p in products]
+    with patch('utils.vector_db.search_products_vector', return_value=ids) as search:
+        result = execute_action('SEARCH_PRODUCTS', {'search': 'party dress', 'color': 'red', 'max_price': 40})
+    assert search.call_args.kwargs['where'] == {'color_red': True}
+    assert [p['id'] for p in result['data']['products']] == ids
+
+def test_size_criterion_matches_available_sizes_in_sql(client):
+    shirt = Product(name='Oxford Shirt', price=40, category='men', color='White', clothing_type='Shirt', size='M',
+                    available_sizes=json.dumps(['M', 'XL']), stock_quantity=3, is_active=True)
+    polo = Product(name='Polo Shirt', price=30, category='men', color='White', clothing_type='Shirt', size='xl',
+                   stock_quantity=3, is_active=True)
+    tee = Product(name='Basic Tee', price=20, category='men', color='White', clothing_type='Shirt', size='S',
+                  available_sizes=json.dumps(['S', 'XXL']), stock_quantity=3, is_active=True)
+    db.session.add_all([shirt, polo, tee])
+    db.session.commit()
+    with patch('utils.vector_db.search_products_vector', return_value=[]):
+        result = execute_action('SEARCH_PRODUCTS', {'category': 'men', 'size': 'XL'})
+    assert {p['id'] for p in result['data']['products']} == {shirt.id, polo.id}
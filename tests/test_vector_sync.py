@@ -0,0 +1,148 @@
+"""Tests for the incremental product vector index sync (utils/vector_db.py)."""
+import pytest
+import json
+from datetime import date, datetime, timedelta
+from unittest.mock import patch
+from app import app
+from models.database import db
+from models.product import Product
+from models.sale import Sale
+from models.vector_index import VectorIndexEntry, VectorSyncState
+import utils.vector_db as vector_db
+
+class _Interrupted(BaseException):
+    """Stands in for the process dying mid-sync."""
+
+class FakeCollection:
+    """In-memory stand-in for a Chroma collection."""
+
+    def __init__(self, crash_after=None):
+        self.docs = {}
+        self.upserted = []
+        self.crash_after = crash_after
+
+    def upsert(self, ids, documents, metadatas):
+        if self.crash_after is not None and len(self.upserted) >= self.crash_after:
+            raise _Interrupted()
+        self.upserted.extend(ids)
+        self.docs.update(zip(ids, documents))
+
+    def delete(self, ids):
+        for doc_id in ids:
+            self.docs.pop(doc_id, None)
+
+    def count(self):
+        return len(self.docs)
+
+@pytest.fixture
+def client():
+    """Create a test client."""
+    app.config['TESTING'] = True
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///:memory:'
+    app.config['JWT_SECRET'] = 'test-secret-key-for-testing-only-min-32-chars'
+
+    with app.test_client() as client:
+        with app.app_context():
+            db.drop_all()
+            db.create_all()
+            yield client
+            db.session.remove()
+            db.drop_all()
+
+@pytest.fixture
+def catalog(client):
+    products = [Product(name=f'Tee {i}', description='Cotton tee', price=10 + i, category='men',
+                        color='White', stock_quantity=5, is_active=True) for i in range(5)]
+    db.session.add_all(products)
+    db.session.commit()
+    return products
+
+def _sync(fake, **kwargs):
+    with patch.object(vector_db, 'chromadb', object()), \
+            patch.object(vector_db, 'init_vector_db', return_value=True), \
+            patch.object(vector_db, 'collection', fake):
+        return vector_db.sync_all_products_from_sql(app, **kwargs)
+
+def test_only_changed_products_are_embedded(client, catalog):
+    fake = FakeCollection()
+    assert _sync(fake) == (5, True)
+    fake.upserted.clear()
+    assert _sync(fake) == (0, True)
+    catalog[1].name = 'Linen Tee'
+    db.session.commit()
+    assert _sync(fake) == (1, True)
+    assert fake.upserted == [f'product_{catalog[1].id}']
+    assert 'Linen Tee' in fake.docs[f'product_{catalog[1].id}']
+
+def test_deactivated_and_deleted_products_are_removed(client, catalog):
+    fake = FakeCollection()
+    _sync(fake)
+    catalog[0].is_active = False
+    db.session.delete(catalog[4])
+    db.session.commit()
+    _sync(fake)
+    assert set(fake.docs) == {f'product_{p.id}' for p in catalog[1:4]}
+    assert VectorIndexEntry.query.count() == 3
+
+def test_interrupted_sync_resumes_from_watermark(client, catalog):
+    with pytest.raises(_Interrupted):
+        _sync(FakeCollection(crash_after=2), batch_size=2)
+    db.session.rollback()
+    assert db.session.get(VectorSyncState, 1).watermark_product_id == catalog[1].id
+    fake = FakeCollection()
+    fake.docs = {f'product_{p.id}': '' for p in catalog[:2]}
+    assert _sync(fake, batch_size=2) == (3, True)
+    assert fake.upserted == [f'product_{p.id}' for p in catalog[2:]]
+
+def test_lost_index_is_rebuilt(client, catalog):
+    _sync(FakeCollection())
+    fresh = FakeCollection()
+    assert _sync(fresh) == (5, True)
+    assert fresh.count() == 5
+
+def test_single_product_writes_record_their_hash(client, catalog):
+    fake = FakeCollection()
+    product = catalog[2]
+    with patch.object(vector_db, 'collection', fake), patch.object(vector_db, 'chromadb', object()):
+        assert vector_db.add_product_to_vector_db(product.id, product.to_dict())
+        assert db.session.get(VectorIndexEntry, product.id) is not None
+        vector_db.delete_product_from_vector_db(product.id)
+    assert db.session.get(VectorIndexEntry, product.id) is None
+
+def test_admin_write_and_sync_hash_the_same_document(client, catalog):
+    fake = FakeCollection()
+    product = catalog[3]
+    with patch.object(vector_db, 'collection', fake), patch.object(vector_db, 'chromadb', object()):
+        vector_db.add_product_to_vector_db(product.id, product.to_dict())
+    fake.upserted.clear()
+    _sync(fake)
+    assert f'product_{product.id}' not in fake.upserted
+
+def test_starting_a_sale_re_embeds_its_products(client, catalog):
+    fake = FakeCollection()
+    # Products last written well before the sync watermark's overlap window
+    Product.query.update({Product.updated_at: datetime.utcnow() - timedelta(days=1)})
+    db.session.commit()
+    _sync(fake)
+    fake.upserted.clear()
+    db.session.add(Sale(name='Tee Week', discount_percentage=20, start_date=date.today(),
+                        end_date=date.today() + timedelta(days=7), is_active=True,
+                        product_filters=json.dumps({'category': 'men'})))
+    db.session.commit()
+    assert _sync(fake) == (5, True)
+    assert 'On sale. 20.0% off.' in fake.docs[f'product_{catalog[0].id}']
+    assert Product.query.filter(Product.index_dirty_at.isnot(None)).count() == 0
+    fake.upserted.clear()
+    assert _sync(fake) == (0, True)
+
+def test_index_built_with_another_layout_is_rebuilt(client, catalog):
+    fake = FakeCollection()
+    Product.query.update({Product.updated_at: datetime.utcnow() - timedelta(days=1)})
+    db.session.commit()
+    _sync(fake)
+    db.session.get(VectorSyncState, 1).index_version = vector_db.INDEX_SCHEMA_VERSION - 1
+    db.session.commit()
+    fake.upserted.clear()
+    assert _sync(fake) == (5, True)
+    assert db.session.get(VectorSyncState, 1).index_version == vector_db.INDEX_SCHEMA_VERSION
+    assert _sync(fake) == (0, True)
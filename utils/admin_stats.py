@@ -0,0 +1,258 @@
+"""
+Admin dashboard statistics.
+Totals come from one grouped conditional-aggregate query per table. Today / week / month windows
+and chart series read the daily_stats rollup, which Order, Review and User write events keep up
+to date. compute_statistics() results are cached for ADMIN_STATS_TTL_SECONDS.
+"""
+import threading
+import time
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+
+ADMIN_STATS_TTL_SECONDS = 30
+MAX_TIMESERIES_DAYS = 366
+
+_lock = threading.Lock()
+_cache = None  # (computed_at, stats)
+
+
+def _to_date(value):
+    """created_at / func.date() value to a date (SQLite returns 'YYYY-MM-DD' strings)."""
+    if value is None:
+        return None
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    return date.fromisoformat(str(value)[:10])
+
+
+def record_daily_stat(connection, day, orders=0, revenue=0, reviews=0, users=0):
+    """
+    Add deltas to the daily_stats row for day. Runs on the flush connection of the triggering
+    write (same transaction); an atomic upsert on SQLite/PostgreSQL, update-then-insert elsewhere.
+    The statements run in a SAVEPOINT, so a failure (e.g. daily_stats not created yet) is rolled
+    back alone and the order, review or user write still commits - a failed statement would
+    otherwise abort the whole transaction on PostgreSQL. rebuild_daily_stats() repairs the counts.
+    """
+    from sqlalchemy import insert, update
+    from models.daily_stat import DailyStat
+    if day is None:
+        return
+    table = DailyStat.__table__
+    revenue = Decimal(str(revenue or 0))
+    now = datetime.utcnow()
+    increments = {
+        'orders_count': table.c.orders_count + orders,
+        'revenue': table.c.revenue + revenue,
+        'reviews_count': table.c.reviews_count + reviews,
+        'users_count': table.c.users_count + users,
+        'updated_at': now,
+    }
+    values = {
+        'day': day, 'orders_count': orders, 'revenue': revenue,
+        'reviews_count': reviews, 'users_count': users, 'updated_at': now,
+    }
+    try:
+        with connection.begin_nested():
+            dialect = connection.dialect.name
+            if dialect in ('sqlite', 'postgresql'):
+                if dialect == 'sqlite':
+                    from sqlalchemy.dialects.sqlite import insert as dialect_insert
+                else:
+                    from sqlalchemy.dialects.postgresql import insert as dialect_insert
+                stmt = dialect_insert(table).values(**values).on_conflict_do_update(
+                    index_elements=['day'], set_=increments
+                )
+                connection.execute(stmt)
+            else:
+                result = connection.execute(update(table).where(table.c.day == day).values(**increments))
+                if result.rowcount == 0:
+                    connection.execute(insert(table).values(**values))
+    except Exception as e:
+        print(f"[Admin stats] Could not update daily_stats for {day}: {e}")
+
+
+def rebuild_daily_stats():
+    """Recompute daily_stats from orders, reviews and users (one grouped query each). Returns day count."""
+    from sqlalchemy import func
+    from models.database import db
+    from models.daily_stat import DailyStat
+    from models.order import Order
+    from models.review import Review
+    from models.user import User
+
+    days = {}
+
+    def row_for(day):
+        return days.setdefault(day, {'orders_count': 0, 'revenue': Decimal('0'), 'reviews_count': 0, 'users_count': 0})
+
+    for day, count, revenue in db.session.query(
+        func.date(Order.created_at), func.count(Order.id), func.coalesce(func.sum(Order.total), 0)
+    ).group_by(func.date(Order.created_at)).all():
+        row = row_for(_to_date(day))
+        row['orders_count'] = int(count)
+        row['revenue'] = Decimal(str(revenue))
+    for day, count in db.session.query(
+        func.date(Review.created_at), func.count(Review.id)
+    ).group_by(func.date(Review.created_at)).all():
+        row_for(_to_date(day))['reviews_count'] = int(count)
+    for day, count in db.session.query(
+        func.date(User.created_at), func.count(User.id)
+    ).group_by(func.date(User.created_at)).all():
+        row_for(_to_date(day))['users_count'] = int(count)
+
+    DailyStat.query.delete()
+    for day, values in days.items():
+        if day is not None:
+            db.session.add(DailyStat(day=day, **values))
+    db.session.commit()
+    invalidate_statistics_cache()
+    return len(days)
+
+
+def get_timeseries(days=30, end=None):
+    """Per-day orders, revenue, reviews and new users for the last `days` days (UTC), zero-filled."""
+    from models.daily_stat import DailyStat
+    days = max(1, min(int(days), MAX_TIMESERIES_DAYS))
+    end = end or datetime.utcnow().date()
+    start = end - timedelta(days=days - 1)
+    rows = {r.day: r for r in DailyStat.query.filter(DailyStat.day >= start, DailyStat.day <= end).all()}
+    series = []
+    for i in range(days):
+        day = start + timedelta(days=i)
+        row = rows.get(day)
+        series.append(row.to_dict() if row else {
+            'date': day.isoformat(), 'orders': 0, 'revenue': 0.0, 'reviews': 0, 'new_users': 0
+        })
+    return series
+
+
+def _count_if(condition):
+    from sqlalchemy import case, func
+    return func.coalesce(func.sum(case((condition, 1), else_=0)), 0)
+
+
+def _window_totals():
+    """Orders, revenue and reviews for today, the last 7 days and the last 30 days (UTC days)."""
+    today = datetime.utcnow().date()
+    series = get_timeseries(30, end=today)
+    windows = {'today': series[-1:], 'this_week': series[-7:], 'this_month': series}
+    return {
+        name: {
+            'orders': sum(d['orders'] for d in rows),
+            'revenue': round(sum(d['revenue'] for d in rows), 2),
+            'reviews': sum(d['reviews'] for d in rows),
+        }
+        for name, rows in windows.items()
+    }
+
+
+def compute_statistics():
+    """Dashboard statistics (same shape as before the rollup); each section falls back to zeros."""
+    from sqlalchemy import func
+    from models.database import db
+    from models.user import User
+    from models.product import Product
+    from models.order import Order
+    from models.sale import Sale
+    from models.review import Review
+
+    stats = {}
+
+    try:
+        total, admins, superadmins, active = db.session.query(
+            func.count(User.id),
+            _count_if(User.is_admin == True),
+            _count_if(User.is_superadmin == True),
+            _count_if(User.is_verified == True),
+        ).one()
+        stats['users'] = {'total': total, 'admins': int(admins), 'superadmins': int(superadmins), 'active': int(active)}
+    except Exception:
+        db.session.rollback()
+        stats['users'] = {'total': 0, 'admins': 0, 'superadmins': 0, 'active': 0}
+
+    try:
+        total, active, inactive, low_stock, out_of_stock = db.session.query(
+            func.count(Product.id),
+            _count_if(Product.is_active == True),
+            _count_if(Product.is_active == False),
+            _count_if(Product.stock_quantity < 10),
+            _count_if(Product.stock_quantity == 0),
+        ).one()
+        stats['products'] = {
+            'total': total, 'active': int(active), 'inactive': int(inactive),
+            'low_stock': int(low_stock), 'out_of_stock': int(out_of_stock)
+        }
+    except Exception:
+        db.session.rollback()
+        stats['products'] = {'total': 0, 'active': 0, 'inactive': 0, 'low_stock': 0, 'out_of_stock': 0}
+
+    try:
+        windows = _window_totals()
+    except Exception:
+        db.session.rollback()
+        windows = {name: {'orders': 0, 'revenue': 0.0, 'reviews': 0} for name in ('today', 'this_week', 'this_month')}
+
+    statuses = ('pending', 'processing', 'shipped', 'delivered', 'cancelled')
+    try:
+        row = db.session.query(
+            func.count(Order.id),
+            func.coalesce(func.sum(Order.total), 0),
+            *[_count_if(Order.status == s) for s in statuses]
+        ).one()
+        stats['orders'] = {'total': row[0]}
+        stats['orders'].update({s: int(row[2 + i]) for i, s in enumerate(statuses)})
+        stats['orders'].update({name: windows[name]['orders'] for name in ('today', 'this_week', 'this_month')})
+        revenue_total = float(row[1] or 0)
+    except Exception:
+        db.session.rollback()
+        stats['orders'] = {
+            'total': 0, 'pending': 0, 'processing': 0, 'shipped': 0, 'delivered': 0,
+            'cancelled': 0, 'today': 0, 'this_week': 0, 'this_month': 0
+        }
+        revenue_total = 0.0
+
+    try:
+        total, active, inactive = db.session.query(
+            func.count(Sale.id), _count_if(Sale.is_active == True), _count_if(Sale.is_active == False)
+        ).one()
+        stats['sales'] = {'total': total, 'active': int(active), 'inactive': int(inactive)}
+    except Exception:
+        db.session.rollback()
+        stats['sales'] = {'total': 0, 'active': 0, 'inactive': 0}
+
+    try:
+        stats['reviews'] = {
+            'total': db.session.query(func.count(Review.id)).scalar() or 0,
+            'today': windows['today']['reviews']
+        }
+    except Exception:
+        db.session.rollback()
+        stats['reviews'] = {'total': 0, 'today': 0}
+
+    stats['revenue'] = {
+        'total': revenue_total,
+        'today': windows['today']['revenue'],
+        'this_week': windows['this_week']['revenue'],
+        'this_month': windows['this_month']['revenue']
+    }
+    return stats
+
+
+def get_statistics(refresh=False):
+    """Cached compute_statistics(); refresh=True bypasses the TTL cache."""
+    global _cache
+    cached = _cache
+    if not refresh and cached is not None and time.time() - cached[0] < ADMIN_STATS_TTL_SECONDS:
+        return cached[1]
+    stats = compute_statistics()
+    with _lock:
+        _cache = (time.time(), stats)
+    return stats
+
+
+def invalidate_statistics_cache():
+    global _cache
+    with _lock:
+        _cache = None
@@ -25,10 +25,24 @@ def _WishlistItem():
     from models.wishlist import WishlistItem
     return WishlistItem
 
+def _price_products(products):
+    from utils.sale_engine import price_products
+    return price_products(products)
+
+def _size_clause(size):
+    """SQL match for a size criterion: the primary size or any entry of available_sizes (JSON array), case-insensitive."""
+    import json
+    from sqlalchemy import func, or_
+    Product = _Product()
+    want = str(size).strip().lower()
+    return or_(
+        func.lower(func.trim(func.coalesce(Product.size, ''))) == want,
+        func.lower(func.coalesce(Product.available_sizes, '')).contains(json.dumps(want), autoescape=True),
+    )
+
 def _search_products_by_criteria(criteria):
     """Search products by criteria (in-executor to avoid circular import). Case-insensitive; color uses substring match."""
-    from sqlalchemy import or_, and_
-    from datetime import date
+    from sqlalchemy import or_
     Product = _Product()
     query = Product.query.filter_by(is_active=True)
     if criteria.get('category'):
@@ -37,7 +51,7 @@ def _search_products_by_criteria(criteria):
         # Substring match so "blue" matches "Light Blue", "Sky Blue", etc.
         query = query.filter(Product.color.ilike(f'%{criteria["color"]}%'))
     if criteria.get('size'):
-        query = query.filter_by(size=criteria['size'])
+        query = query.filter(_size_clause(criteria['size']))
     if criteria.get('fabric'):
         query = query.filter_by(fabric=criteria['fabric'])
     if criteria.get('clothing_type'):
@@ -56,62 +70,28 @@ def _search_products_by_criteria(criteria):
         query = query.filter_by(occasion=criteria['occasion'])
     if criteria.get('age_group'):
         query = query.filter_by(age_group=criteria['age_group'])
-    if criteria.get('min_price') is not None:
-        query = query.filter(Product.price >= float(criteria['min_price']))
-    if criteria.get('max_price') is not None:
-        query = query.filter(Product.price <= float(criteria['max_price']))
+    if criteria.get('min_price') is not None or criteria.get('max_price') is not None:
+        from utils.sale_engine import price_range_clause
+        query = query.filter(price_range_clause(
+            float(criteria['min_price']) if criteria.get('min_price') is not None else None,
+            float(criteria['max_price']) if criteria.get('max_price') is not None else None,
+        ))
     if criteria.get('search'):
-        search_term = criteria['search']
-        query = query.filter(
-            or_(
-                Product.name.ilike(f'%{search_term}%'),
-                Product.description.ilike(f'%{search_term}%'),
-                Product.clothing_type.ilike(f'%{search_term}%'),
-            )
-        )
+        from utils.search_index import apply_text_search
+        query = apply_text_search(query, criteria['search'], columns=('name', 'description', 'clothing_type'))
 
     if criteria.get('on_sale'):
-        today = date.today()
-        # 1) Product-level sale
-        query_sale = query.filter(
-            and_(
-                Product.sale_enabled == True,
-                Product.sale_start.isnot(None),
-                Product.sale_end.isnot(None),
-                Product.sale_percentage.isnot(None),
-                Product.sale_start <= today,
-                Product.sale_end >= today,
-            )
-        )
-        products_product_sale = query_sale.limit(50).all()
-        ids_seen = {p.id for p in products_product_sale}
-        # 2) Global Sale table: products matching criteria that are in an active Sale
-        try:
-            from models.sale import Sale
-            active_sales = Sale.query.filter_by(is_active=True).all()
-        except Exception:
-            active_sales = []
-        candidates = query.limit(100).all()
-        extra = []
-        for p in candidates:
-            if p.id in ids_seen:
-                continue
-            if getattr(p, '_is_product_sale_active', None) and p._is_product_sale_active(today):
-                extra.append(p)
-                ids_seen.add(p.id)
-                continue
-            for s in active_sales:
-                if s.is_currently_active(today) and s.matches_product(p):
-                    extra.append(p)
-                    ids_seen.add(p.id)
-                    break
-        combined = list(products_product_sale) + extra
-        return [p.to_dict() for p in combined[:50]]
-    return [p.to_dict() for p in query.limit(50).all()]
-
-def _search_products_vector(query, n_results=20):
-    from utils.vector_db import search_products_vector
-    return search_products_vector(query, n_results=n_results)
+        from utils.sale_engine import on_sale_clause
+        # Product-level and global Sale rules are both applied in SQL
+        query = query.filter(on_sale_clause())
+    products = query.limit(50).all()
+    sale_prices = _price_products(products)
+    return [p.to_dict(sale_prices) for p in products]
+
+def _search_products_vector(query, n_results=20, criteria=None):
+    """Nearest products for query; criteria are applied inside the vector index (metadata filter)."""
+    from utils.vector_db import metadata_filter, search_products_vector
+    return search_products_vector(query, n_results=n_results, where=metadata_filter(criteria))
 
 def _normalize_category(val):
     try:
@@ -455,8 +435,11 @@ def _filter_products_by_criteria(product_dicts: list, criteria: dict) -> list:
             want_color = (criteria["color"] or "").strip().lower()
             if want_color not in prod_color:
                 continue
-        if criteria.get("size") and (p.get("size") or "").strip() != (criteria["size"] or "").strip():
-            continue
+        if criteria.get("size"):
+            sizes = {str(s).strip().lower() for s in (p.get("available_sizes") or []) if s is not None}
+            sizes.add((p.get("size") or "").strip().lower())
+            if (criteria["size"] or "").strip().lower() not in sizes:
+                continue
         if criteria.get("fabric") and (p.get("fabric") or "").strip() != (criteria["fabric"] or "").strip():
             continue
         if criteria.get("clothing_type"):
@@ -492,67 +475,29 @@ def _filter_products_by_criteria(product_dicts: list, criteria: dict) -> list:
 
 
 def _execute_search_products(parameters: dict) -> dict:
-    """Always returns { success: True, data: { products: list, count: int } }. Products is always a list (never None)."""
+    """
+    Always returns { success: True, data: { products: list, count: int, ranking: list } }. Products is always a list
+    (never None). Full-text and vector candidates are fused into one ranking (utils/hybrid_search.py); ranking holds the
+    score breakdown of each product, in the same order.
+    """
     try:
+        from utils.hybrid_search import hybrid_search, load_products
         criteria = _build_criteria(parameters)
-        search_term = criteria.get("search")
-        Product = _Product()
-
-        # 1) Explicit search term: use vector search first, then apply criteria filter for precision
-        if search_term:
-            try:
-                product_ids = _search_products_vector(search_term, n_results=30)
-                if product_ids:
-                    products = Product.query.filter(
-                        Product.id.in_(product_ids),
-                        Product.is_active == True
-                    ).all()
-                    by_id = {p.id: p for p in products}
-                    ordered = [by_id[pid].to_dict() for pid in product_ids if pid in by_id]
-                    # When we have other criteria (category, color, on_sale, etc.), filter so results match ALL criteria
-                    if any(criteria.get(k) for k in ('category', 'color', 'clothing_type', 'on_sale', 'min_price', 'max_price', 'size', 'fabric', 'occasion')):
-                        ordered = _filter_products_by_criteria(ordered, criteria)
-                    if ordered:
-                        return {"success": True, "data": {"products": ordered, "count": len(ordered)}}
-            except Exception:
-                pass
-            # Vector failed or returned nothing (or filter matched nothing) — fall back to criteria
-            products = _search_products_by_criteria(criteria)
-            return {"success": True, "data": {"products": list(products) if products else [], "count": len(products) if products else 0}}
-
-        # 2) No search term but we have filters: try SQL first (reliable for category/color/clothing_type), then vector if SQL returns nothing
-        vector_query = _build_vector_query_from_criteria(criteria)
-        if vector_query:
-            # Prefer SQL when we have structured filters so "blue shirts for women" matches reliably
-            sql_products = _search_products_by_criteria(criteria)
-            if sql_products:
-                return {"success": True, "data": {"products": sql_products, "count": len(sql_products)}}
+        # Explicit search term, else the structured filters phrased as a query ("blue shirt women")
+        vector_query = criteria.get("search") or _build_vector_query_from_criteria(criteria)
+        products, ranking = hybrid_search(criteria, vector_query)
+        if not products and vector_query and not criteria.get("search"):
+            # Nothing matches the filters: show near-matches (unfiltered vector results) rather than nothing
             try:
-                product_ids = _search_products_vector(vector_query, n_results=40)
-                if product_ids:
-                    products = Product.query.filter(
-                        Product.id.in_(product_ids),
-                        Product.is_active == True
-                    ).all()
-                    by_id = {p.id: p for p in products}
-                    ordered_raw = [by_id[pid].to_dict() for pid in product_ids if pid in by_id]
-                    # Filter by criteria so we only return products that match (vector can return near-matches)
-                    filtered = _filter_products_by_criteria(ordered_raw, criteria)
-                    if filtered:
-                        return {"success": True, "data": {"products": filtered, "count": len(filtered)}}
-                    # When filter removes all, return unfiltered vector results so user sees something (better than empty)
-                    if ordered_raw:
-                        return {"success": True, "data": {"products": ordered_raw, "count": len(ordered_raw)}}
+                products = load_products(_search_products_vector(vector_query, n_results=40))
+                ranking = []
             except Exception:
-                pass
-
-        # 3) Fallback: criteria-only SQL search (no vector or vector returned nothing / filter matched nothing)
-        products = _search_products_by_criteria(criteria)
-        return {"success": True, "data": {"products": list(products) if products else [], "count": len(products) if products else 0}}
+                products = []
+        return {"success": True, "data": {"products": products, "count": len(products), "ranking": ranking}}
     except Exception as e:
         import traceback
         traceback.print_exc()
-        return {"success": True, "data": {"products": [], "count": 0}}
+        return {"success": True, "data": {"products": [], "count": 0, "ranking": []}}
 
 
 def _execute_add_to_cart(
@@ -582,43 +527,83 @@ def _execute_add_to_cart(
     product = Product.query.get(product_id)
     if not product or not product.is_active:
         return {"success": False, "error": "Product not found"}
-    if (product.stock_quantity or 0) < quantity:
+    # Products with variations keep stock per (size, color): hold it like the cart route does
+    from models.product_variation import ProductVariation
+    from utils.inventory import InsufficientStock, hold_stock
+    variation = None
+    if ProductVariation.query.filter_by(product_id=product_id).count() > 0:
+        if selected_size and selected_color:
+            variation = ProductVariation.query.filter_by(
+                product_id=product_id, size=str(selected_size).strip(), color=str(selected_color).strip()
+            ).first()
+        if not variation:
+            return {"success": False, "error": "Please choose an available size and color for this product."}
+        selected_size, selected_color = variation.size, variation.color
+    elif (product.stock_quantity or 0) < quantity:
         return {"success": False, "error": "Insufficient stock"}
 
     if current_user:
         CartItem = _CartItem()
         db = _db()
-        existing = CartItem.query.filter_by(
-            user_id=current_user.id,
-            product_id=product_id,
-            selected_color=selected_color,
-            selected_size=selected_size,
-        ).first()
-        if existing:
-            new_qty = min(existing.quantity + quantity, product.stock_quantity)
-            existing.quantity = new_qty
+        if variation:
+            existing = CartItem.query.filter_by(
+                user_id=current_user.id, product_id=product_id, variation_id=variation.id,
+            ).first()
         else:
-            db.session.add(CartItem(
+            existing = CartItem.query.filter_by(
                 user_id=current_user.id,
                 product_id=product_id,
-                quantity=min(quantity, product.stock_quantity),
                 selected_color=selected_color,
                 selected_size=selected_size,
-            ))
+            ).first()
+            if existing:
+                quantity = max(0, min(quantity, product.stock_quantity - existing.quantity))
         try:
+            if variation:
+                hold_stock(variation, quantity, user_id=current_user.id)
+            if existing:
+                existing.quantity += quantity
+            else:
+                db.session.add(CartItem(
+                    user_id=current_user.id,
+                    product_id=product_id,
+                    variation_id=variation.id if variation else None,
+                    quantity=quantity,
+                    selected_color=selected_color,
+                    selected_size=selected_size,
+                ))
             db.session.commit()
+        except InsufficientStock:
+            db.session.rollback()
+            return {"success": False, "error": "Insufficient stock"}
         except Exception as e:
             db.session.rollback()
             return {"success": False, "error": str(e)}
         return {"success": True, "message_override": f"I've added {quantity} item(s) to your cart."}
 
     if flask_request:
-        from utils.guest_cart import add_to_guest_cart
-        add_to_guest_cart(product_id, quantity, selected_color, selected_size)
+        from utils.guest_cart import add_to_guest_cart, get_guest_cart_token
+        db = _db()
+        if variation:
+            try:
+                hold_stock(variation, quantity, cart_token=get_guest_cart_token())
+            except InsufficientStock:
+                db.session.rollback()
+                return {"success": False, "error": "Insufficient stock"}
+        add_to_guest_cart(product_id, quantity, selected_color, selected_size,
+                          variation_id=variation.id if variation else None)
+        db.session.commit()
         return {"success": True, "message_override": f"I've added {quantity} item(s) to your cart."}
     return {"success": False, "error": "Please sign in or use the site to add items to your cart."}
 
 
+def _release_cart_item_hold(item, user) -> None:
+    """Return the variation stock a user's cart line holds (before the line is deleted)."""
+    if item.variation_id:
+        from utils.inventory import release_hold
+        release_hold(item.variation_id, item.quantity, user_id=user.id)
+
+
 def _execute_remove_from_cart(
     parameters: dict,
     *,
@@ -635,6 +620,7 @@ def _execute_remove_from_cart(
             db = _db()
             item = CartItem.query.filter_by(id=int(item_id), user_id=current_user.id).first()
             if item:
+                _release_cart_item_hold(item, current_user)
                 db.session.delete(item)
                 db.session.commit()
                 return {"success": True, "message_override": "Item removed from your cart."}
@@ -660,13 +646,29 @@ def _execute_remove_from_cart(
             q = q.filter_by(selected_size=selected_size)
         item = q.first()
         if item:
+            _release_cart_item_hold(item, current_user)
             db.session.delete(item)
             db.session.commit()
             return {"success": True, "message_override": "Item removed from your cart."}
         return {"success": False, "error": "Item not found in cart."}
     if flask_request:
-        from utils.guest_cart import remove_from_guest_cart
-        ok = remove_from_guest_cart(product_id, selected_color, selected_size)
+        from utils.guest_cart import get_guest_cart, get_guest_cart_token, remove_from_guest_cart
+        from utils.inventory import release_hold
+        line = next((
+            g for g in get_guest_cart()
+            if g.get("product_id") == product_id
+            and (not selected_color or g.get("selected_color") == selected_color)
+            and (not selected_size or g.get("selected_size") == selected_size)
+        ), None)
+        db = _db()
+        try:
+            ok = remove_from_guest_cart(product_id, selected_color, selected_size)
+            if ok and line and line.get("variation_id"):
+                release_hold(line["variation_id"], ok, cart_token=get_guest_cart_token())
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            return {"success": False, "error": str(e)}
         return {"success": True, "message_override": "Item removed from your cart."} if ok else {"success": False, "error": "Item not found in cart."}
     return {"success": False, "error": "Please sign in or use the site to update your cart."}
 
@@ -694,9 +696,17 @@ def _execute_update_cart_item(
             item = CartItem.query.filter_by(id=int(item_id), user_id=current_user.id).first()
             if not item:
                 return {"success": False, "error": "Cart item not found."}
-            product = Product.query.get(item.product_id)
-            if product and product.stock_quantity < quantity:
-                return {"success": False, "error": "Insufficient stock."}
+            if item.variation_id and item.variation is not None:
+                from utils.inventory import InsufficientStock, set_hold
+                try:
+                    set_hold(item.variation, quantity, user_id=current_user.id)
+                except InsufficientStock:
+                    db.session.rollback()
+                    return {"success": False, "error": "Insufficient stock."}
+            else:
+                product = Product.query.get(item.product_id)
+                if product and product.stock_quantity < quantity:
+                    return {"success": False, "error": "Insufficient stock."}
             item.quantity = quantity
             if selected_color is not None:
                 item.selected_color = selected_color
@@ -721,6 +731,7 @@ def _execute_update_cart_item(
                 selected_color=selected_color, selected_size=selected_size,
                 old_color=parameters.get("old_color"), old_size=parameters.get("old_size"),
             )
+            _db().session.commit()
             return {"success": True, "message_override": "Cart updated."} if ok else {"success": False, "error": "Cart item not found."}
     return {"success": False, "error": "item_id or product_id required."}
 
@@ -731,8 +742,10 @@ def _execute_clear_cart(
     flask_request: Optional[Any] = None,
 ) -> dict:
     if current_user:
+        from utils.inventory import release_holds
         CartItem = _CartItem()
         db = _db()
+        release_holds(user_id=current_user.id)
         CartItem.query.filter_by(user_id=current_user.id).delete()
         try:
             db.session.commit()
@@ -741,8 +754,16 @@ def _execute_clear_cart(
             return {"success": False, "error": str(e)}
         return {"success": True, "message_override": "Your cart is now empty."}
     if flask_request:
-        from utils.guest_cart import clear_guest_cart
-        clear_guest_cart()
+        from utils.guest_cart import clear_guest_cart, get_guest_cart_token
+        from utils.inventory import release_holds
+        db = _db()
+        try:
+            release_holds(cart_token=get_guest_cart_token())
+            clear_guest_cart()
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            return {"success": False, "error": str(e)}
         return {"success": True, "message_override": "Your cart is now empty."}
     return {"success": False, "error": "Please sign in or use the site to clear your cart."}
 
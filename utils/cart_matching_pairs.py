@@ -5,7 +5,7 @@ Uses fashion knowledge base, product relations, and fashion match rules.
 
 from models.database import db
 from models.product import Product
-from sqlalchemy import or_, and_
+from sqlalchemy import and_
 
 try:
     from models.product_relation import ProductRelation
@@ -15,12 +15,13 @@ except ImportError:
 from utils.fashion_kb import get_color_matching_advice, get_outfit_formula
 from utils.fashion_match_rules import find_matching_products, get_match_explanation
 from utils.product_relations import get_related_clothing_types
+from utils.search_index import apply_text_search
 
 
 def _resolve_matched_name_to_products(matched_name, exclude_ids, limit=3):
     """
     Resolve a matched product name (e.g. 'Brown Leather Loafers') to actual Product rows.
-    Tries: name ilike, then clothing_type from keywords.
+    Full-text match on the product name (any of the key words), best matches first.
     """
     if not matched_name or not exclude_ids:
         return []
@@ -29,15 +30,15 @@ def _resolve_matched_name_to_products(matched_name, exclude_ids, limit=3):
     parts = [w for w in name_lower.replace("/", " ").replace("-", " ").split() if len(w) > 2]
     if not parts:
         return []
-    queries = [Product.name.ilike(f"%{p}%") for p in parts[:3]]  # first 3 meaningful words
     q = Product.query.filter(
         and_(
             Product.is_active == True,
             ~Product.id.in_(exclude_ids),
-            or_(*queries)
         )
-    ).limit(limit)
-    return q.all()
+    )
+    # Name contains any of the first 3 meaningful words, best matches first
+    q = apply_text_search(q, " ".join(parts[:3]), columns=("name",), match_any=True)
+    return q.limit(limit).all()
 
 
 def _get_products_by_clothing_types(clothing_types, exclude_ids, color_hint=None, limit=5):
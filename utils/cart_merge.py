@@ -0,0 +1,104 @@
+"""
+Guest cart merge on login.
+merge_guest_cart() folds the guest cart into a user's cart with three IN-queries (products,
+their variations, the user's existing lines for those products), computes the merged lines in
+memory and writes them with one bulk INSERT and one bulk UPDATE. The stock held by the guest
+cart's lines moves to the user (utils.inventory.transfer_holds): a variation the user already holds
+is added to the user's reservation, so the merged line has one hold covering its whole quantity.
+"""
+
+
+def _clean(value):
+    value = (value or '').strip() if isinstance(value, str) else value
+    return value or None
+
+
+def merge_guest_cart(user_id, guest_cart, cart_token=None):
+    """
+    Merge guest cart lines into user_id's cart in the current transaction (caller commits).
+    Returns a report: {'added': new lines, 'merged': lines folded into existing ones,
+    'skipped': [{'product_id', 'reason'}]}.
+    """
+    from sqlalchemy import insert, update
+    from models.database import db
+    from models.cart import CartItem
+    from models.product import Product
+    from models.product_variation import ProductVariation
+    from utils.inventory import transfer_holds
+
+    report = {'added': 0, 'merged': 0, 'skipped': []}
+    lines = []
+    for g in guest_cart or []:
+        try:
+            product_id = int(g.get('product_id'))
+            quantity = int(g.get('quantity', 1))
+        except (TypeError, ValueError):
+            continue
+        if quantity < 1:
+            report['skipped'].append({'product_id': product_id, 'reason': 'invalid quantity'})
+            continue
+        lines.append((g, product_id, quantity))
+    if not lines:
+        return report
+
+    product_ids = {product_id for _, product_id, _ in lines}
+    products = {p.id: p for p in Product.query.filter(Product.id.in_(product_ids)).all()}
+    variations_by_id = {}
+    variations_by_key = {}
+    for v in ProductVariation.query.filter(ProductVariation.product_id.in_(product_ids)).all():
+        variations_by_id[v.id] = v
+        variations_by_key[(v.product_id, v.size, v.color)] = v
+    existing = {}
+    for item in CartItem.query.filter(CartItem.user_id == user_id, CartItem.product_id.in_(product_ids)).all():
+        if item.variation_id:
+            existing.setdefault(('variation', item.variation_id), item)
+        else:
+            existing.setdefault(('product', item.product_id, item.selected_color, item.selected_size), item)
+
+    quantities = {}  # line key -> merged quantity
+    new_lines = {}   # line key -> CartItem values for lines the user does not have yet
+    for g, product_id, quantity in lines:
+        product = products.get(product_id)
+        if not product or not product.is_active:
+            report['skipped'].append({'product_id': product_id, 'reason': 'unavailable'})
+            continue
+        selected_color = _clean(g.get('selected_color'))
+        selected_size = _clean(g.get('selected_size'))
+        variation = variations_by_id.get(g.get('variation_id'))
+        if variation is not None and variation.product_id != product_id:
+            variation = None
+        if variation is None and (selected_size or selected_color):
+            variation = variations_by_key.get((product_id, selected_size or '', selected_color or ''))
+
+        if variation is not None:
+            # The guest line's stock is held by its reservation, which moves to the user below
+            key = ('variation', variation.id)
+            item = existing.get(key)
+            quantities[key] = quantities.get(key, item.quantity if item else 0) + quantity
+            values = {'variation_id': variation.id, 'selected_color': variation.color, 'selected_size': variation.size}
+        else:
+            key = ('product', product_id, selected_color, selected_size)
+            item = existing.get(key)
+            current = quantities.get(key, item.quantity if item else 0)
+            merged = min(current + quantity, product.stock_quantity or 0)
+            if merged <= current:
+                report['skipped'].append({'product_id': product_id, 'reason': 'insufficient stock'})
+                continue
+            quantities[key] = merged
+            values = {'variation_id': None, 'selected_color': selected_color, 'selected_size': selected_size}
+        if item is None:
+            new_lines.setdefault(key, dict(values, user_id=user_id, product_id=product_id))
+
+    inserts = [dict(values, quantity=quantities[key]) for key, values in new_lines.items()]
+    updates = [
+        {'id': existing[key].id, 'quantity': quantity}
+        for key, quantity in quantities.items() if key not in new_lines
+    ]
+    if inserts:
+        db.session.execute(insert(CartItem), inserts)
+    if updates:
+        db.session.execute(update(CartItem), updates)
+    transfer_holds(cart_token, user_id)
+    report['added'] = len(inserts)
+    report['merged'] = len(updates)
+    return report
@@ -0,0 +1,129 @@
+"""
+Cart pricing in one pass.
+CartPricer prices every line of a cart (user CartItems or the guest session cart) with a single
+price_products() call through the sale engine, without serializing products, and returns line
+subtotals, discounts, tax, shipping and total as Decimals. Cart GET, order creation, the admin
+cart listing and shipping rates all read totals from here so they cannot disagree.
+"""
+from decimal import Decimal, ROUND_HALF_UP
+
+TAX_RATE = Decimal('0.08')
+FREE_SHIPPING_THRESHOLD = Decimal('50.00')
+FLAT_SHIPPING_COST = Decimal('5.00')
+
+_CENT = Decimal('0.01')
+
+
+def to_money(value):
+    """Decimal rounded to cents (floats go through str() so 19.99 stays 19.99)."""
+    if value is None:
+        return Decimal('0.00')
+    if not isinstance(value, Decimal):
+        value = Decimal(str(value))
+    return value.quantize(_CENT, rounding=ROUND_HALF_UP)
+
+
+class PricedLine:
+    """One priced cart line. source is the CartItem or guest cart dict it came from."""
+    __slots__ = ('source', 'product', 'quantity', 'unit_price', 'original_price',
+                 'discount_percentage', 'subtotal', 'discount')
+
+    def __init__(self, source, product, quantity, unit_price, original_price, discount_percentage):
+        self.source = source
+        self.product = product
+        self.quantity = quantity
+        self.unit_price = unit_price
+        self.original_price = original_price
+        self.discount_percentage = discount_percentage
+        self.subtotal = unit_price * quantity
+        self.discount = (original_price - unit_price) * quantity
+
+    @property
+    def on_sale(self):
+        return self.discount_percentage is not None
+
+
+class CartPricer:
+    """
+    Prices (source, product, quantity) lines. Lines without a product (or with an inactive one
+    when active_only) are dropped. sale_prices is the price_products() map, reusable for
+    serializing the same products with Product.to_dict(sale_prices).
+    """
+
+    def __init__(self, lines, on_date=None, active_only=True):
+        from utils.sale_engine import price_products
+        lines = [
+            (source, product, int(quantity or 0)) for source, product, quantity in lines
+            if product is not None and (product.is_active or not active_only)
+        ]
+        try:
+            self.sale_prices = price_products({p.id: p for _, p, _ in lines}.values(), on_date)
+        except Exception as e:
+            print(f"[Cart pricer] Sale pricing failed, using list prices: {e}")
+            self.sale_prices = {}
+
+        self.lines = []
+        for source, product, quantity in lines:
+            original_price = to_money(product.price)
+            sale_data = self.sale_prices.get(product.id)
+            if sale_data:
+                unit_price = to_money(sale_data['sale_price'])
+                discount_percentage = sale_data['discount_percentage']
+            else:
+                unit_price = original_price
+                discount_percentage = None
+            self.lines.append(PricedLine(source, product, quantity, unit_price, original_price, discount_percentage))
+        self._by_source = {id(line.source): line for line in self.lines}
+
+    @classmethod
+    def for_cart_items(cls, cart_items, on_date=None, active_only=True):
+        """Pricer for CartItem rows (products are already joined-loaded)."""
+        return cls([(item, item.product, item.quantity) for item in cart_items], on_date, active_only)
+
+    @classmethod
+    def for_guest_cart(cls, guest_cart, on_date=None, active_only=True):
+        """Pricer for the guest session cart; products are loaded with one IN query."""
+        from models.product import Product
+        product_ids = {c['product_id'] for c in guest_cart if c.get('product_id')}
+        products_by_id = {
+            p.id: p for p in Product.query.filter(Product.id.in_(product_ids)).all()
+        } if product_ids else {}
+        return cls(
+            [(c, products_by_id.get(c.get('product_id')), c.get('quantity', 1)) for c in guest_cart],
+            on_date, active_only
+        )
+
+    def line_for(self, source):
+        """PricedLine for a CartItem / guest dict, or None if the line was dropped."""
+        return self._by_source.get(id(source))
+
+    @property
+    def subtotal(self):
+        return sum((line.subtotal for line in self.lines), Decimal('0.00'))
+
+    @property
+    def discount_total(self):
+        return sum((line.discount for line in self.lines), Decimal('0.00'))
+
+    @property
+    def tax(self):
+        return to_money(self.subtotal * TAX_RATE)
+
+    def shipping(self, shipping_cost=None):
+        """shipping_cost (e.g. a carrier rate) when given, else free over $50 and $5 otherwise."""
+        if shipping_cost is not None:
+            return to_money(shipping_cost)
+        return Decimal('0.00') if self.subtotal >= FREE_SHIPPING_THRESHOLD else FLAT_SHIPPING_COST
+
+    def totals(self, shipping_cost=None):
+        """{'subtotal', 'discount', 'tax', 'shipping', 'total'} as Decimals."""
+        subtotal = self.subtotal
+        tax = self.tax
+        shipping = self.shipping(shipping_cost)
+        return {
+            'subtotal': subtotal,
+            'discount': self.discount_total,
+            'tax': tax,
+            'shipping': shipping,
+            'total': subtotal + tax + shipping,
+        }
@@ -0,0 +1,153 @@
+"""
+Process-local catalog facet cache.
+All storefront facets (categories, colors, sizes, fabrics, seasons, clothing categories, price
+range) are built from one grouped query over products and cached until the catalog version
+changes (any committed Product / ProductVariation write in this process) or FACET_CACHE_TTL_SECONDS pass
+(writes made by other workers). Per-facet counts for a filter selection are computed from the
+cached rows, so faceted navigation does not query the database either.
+"""
+import threading
+import time
+
+FACET_CACHE_TTL_SECONDS = 300
+
+# Facets that can be selected and counted, in the order of the grouped query columns
+FACET_FIELDS = ('category', 'color', 'size', 'fabric', 'season', 'clothing_category')
+
+_MAX_SELECTIONS = 256  # Facet results memoized per snapshot (one per distinct filter selection)
+
+_lock = threading.Lock()
+_catalog_version = 0
+_snapshot = None
+
+
+def get_catalog_version():
+    """Counter bumped on every catalog write in this process."""
+    return _catalog_version
+
+
+def bump_catalog_version():
+    """Invalidate the facet cache (queued by Product / ProductVariation write events, run after commit)."""
+    global _catalog_version, _snapshot
+    with _lock:
+        _catalog_version += 1
+        _snapshot = None
+
+
+class FacetSnapshot:
+    """
+    Grouped catalog rows: (is_active, listable, on_sale, category, color, size, fabric, season,
+    clothing_category, effective_price, count). listable = shown by /api/products (no variations
+    or at least one variation in stock).
+    """
+
+    def __init__(self, version, rows):
+        self.version = version
+        self.built_at = time.time()
+        self.rows = rows
+        self._selections = {}
+
+    def distinct(self, field, active_only=True):
+        """Sorted distinct non-empty values of a facet field."""
+        idx = 3 + FACET_FIELDS.index(field)
+        values = {r[idx] for r in self.rows if r[idx] and (r[0] or not active_only)}
+        return sorted(values)
+
+    def price_range(self):
+        """(min, max) effective price of active products; (None, None) when there are none."""
+        prices = [r[9] for r in self.rows if r[0] and r[9] is not None]
+        if not prices:
+            return None, None
+        return float(min(prices)), float(max(prices))
+
+    def facets(self, selection=None):
+        """
+        Counts per facet value for listable active products matching the selection. Each facet
+        ignores its own selected value (so other options stay visible), like most storefront
+        faceted navigation. selection: {field: value, 'min_price': float, 'max_price': float, 'on_sale': bool}.
+        """
+        selection = {k: v for k, v in (selection or {}).items() if v not in (None, '', False)}
+        key = tuple(sorted(selection.items()))
+        cached = self._selections.get(key)
+        if cached is not None:
+            return cached
+
+        min_price = selection.get('min_price')
+        max_price = selection.get('max_price')
+
+        def base_match(r):
+            if not (r[0] and r[1]):
+                return False
+            if selection.get('on_sale') and not r[2]:
+                return False
+            price = float(r[9]) if r[9] is not None else None
+            if min_price is not None and (price is None or price < min_price):
+                return False
+            if max_price is not None and (price is None or price > max_price):
+                return False
+            return True
+
+        rows = [r for r in self.rows if base_match(r)]
+        selected = [(3 + i, f, selection[f]) for i, f in enumerate(FACET_FIELDS) if f in selection]
+
+        result = {}
+        for i, field in enumerate(FACET_FIELDS):
+            idx = 3 + i
+            counts = {}
+            for r in rows:
+                if not r[idx]:
+                    continue
+                if any(r[j] != value for j, f, value in selected if f != field):
+                    continue
+                counts[r[idx]] = counts.get(r[idx], 0) + r[10]
+            result[field] = [{'value': v, 'count': counts[v]} for v in sorted(counts)]
+
+        matching = [r for r in rows if all(r[j] == value for j, f, value in selected)]
+        prices = [float(r[9]) for r in matching if r[9] is not None]
+        result['price'] = {'min': min(prices) if prices else None, 'max': max(prices) if prices else None}
+        result['on_sale'] = sum(r[10] for r in matching if r[2])
+        result['total'] = sum(r[10] for r in matching)
+
+        if len(self._selections) >= _MAX_SELECTIONS:
+            self._selections.clear()
+        self._selections[key] = result
+        return result
+
+
+def _build_snapshot(version):
+    """One grouped query over products for all facets."""
+    from sqlalchemy import case, exists, or_
+    from models.database import db
+    from models.product import Product
+    from models.product_variation import ProductVariation
+    from utils.sale_engine import on_sale_clause
+
+    listable = case((or_(
+        ~exists().where(ProductVariation.product_id == Product.id),
+        exists().where(ProductVariation.product_id == Product.id, ProductVariation.stock_quantity > 0),
+    ), 1), else_=0)
+    on_sale = case((on_sale_clause(), 1), else_=0)
+    group = [
+        Product.is_active, listable, on_sale,
+        Product.category, Product.color, Product.size, Product.fabric, Product.season,
+        Product.clothing_category, Product.effective_price,
+    ]
+    rows = db.session.query(*group, db.func.count(Product.id)).group_by(*group).all()
+    return FacetSnapshot(version, [
+        (bool(r[0]), bool(r[1]), bool(r[2])) + tuple(r[3:10]) + (int(r[10]),) for r in rows
+    ])
+
+
+def get_facet_snapshot():
+    """Cached FacetSnapshot for the current catalog version (rebuilt when stale)."""
+    global _snapshot
+    snapshot = _snapshot
+    if snapshot is not None and snapshot.version == _catalog_version \
+            and time.time() - snapshot.built_at < FACET_CACHE_TTL_SECONDS:
+        return snapshot
+    version = _catalog_version
+    snapshot = _build_snapshot(version)
+    with _lock:
+        if version == _catalog_version:
+            _snapshot = snapshot
+    return snapshot
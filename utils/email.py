@@ -4,6 +4,9 @@ from config import Config
 from datetime import datetime
 import html
 import smtplib
+import socket
+import threading
+import time
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 from email.utils import formataddr, make_msgid, formatdate
@@ -17,14 +20,80 @@ WORKMAIL_SMTP_PORT = int(os.getenv('WORKMAIL_SMTP_PORT', '465'))
 WORKMAIL_SMTP_USERNAME = os.getenv('WORKMAIL_SMTP_USERNAME', '')
 WORKMAIL_SMTP_PASSWORD = os.getenv('WORKMAIL_SMTP_PASSWORD', '')
 USE_WORKMAIL = os.getenv('USE_WORKMAIL', 'true').lower() == 'true'
+# host:port of a local debugging SMTP server (plain SMTP, no TLS or login) used instead of WorkMail
+SMTP_DEBUG_SERVER = os.getenv('SMTP_DEBUG_SERVER', '')
+# A kept-open SMTP connection idle longer than this is re-opened before use (servers drop idle clients)
+SMTP_IDLE_TIMEOUT_SECONDS = int(os.getenv('SMTP_IDLE_TIMEOUT_SECONDS', '60'))
 
 def escape_html(text: str) -> str:
     """Escape HTML characters."""
     return html.escape(str(text))
 
+class SmtpConnection:
+    """
+    One logged-in SMTP connection kept open and reused across messages, so a send costs the
+    message round trips only, not a TCP + TLS handshake and login. Sends are serialized by a lock;
+    the connection is re-opened when the server dropped it or it sat idle too long.
+    """
+
+    def __init__(self, idle_timeout=SMTP_IDLE_TIMEOUT_SECONDS):
+        self.idle_timeout = idle_timeout
+        self._lock = threading.Lock()
+        self._server = None
+        self._last_used = 0.0
+        self.connections_opened = 0
+
+    def _open(self):
+        if SMTP_DEBUG_SERVER:
+            host, _, port = SMTP_DEBUG_SERVER.rpartition(':')
+            server = smtplib.SMTP(host or 'localhost', int(port), timeout=30)
+        else:
+            if WORKMAIL_SMTP_PORT == 465:
+                server = smtplib.SMTP_SSL(WORKMAIL_SMTP_SERVER, WORKMAIL_SMTP_PORT, timeout=30)
+            else:
+                server = smtplib.SMTP(WORKMAIL_SMTP_SERVER, WORKMAIL_SMTP_PORT, timeout=30)
+                server.starttls()
+            server.login(WORKMAIL_SMTP_USERNAME, WORKMAIL_SMTP_PASSWORD)
+        self.connections_opened += 1
+        return server
+
+    def _close(self):
+        server, self._server = self._server, None
+        if server is not None:
+            try:
+                server.quit()
+            except Exception:
+                pass
+
+    def send(self, msg):
+        """Send msg, opening or re-opening the connection as needed (one retry on a dropped connection)."""
+        with self._lock:
+            for attempt in range(2):
+                if self._server is not None and time.monotonic() - self._last_used > self.idle_timeout:
+                    self._close()
+                if self._server is None:
+                    self._server = self._open()
+                try:
+                    self._server.send_message(msg)
+                    self._last_used = time.monotonic()
+                    return
+                except (smtplib.SMTPServerDisconnected, ConnectionError, socket.timeout):
+                    self._close()
+                    if attempt:
+                        raise
+                except Exception:
+                    self._close()
+                    raise
+
+    def close(self):
+        with self._lock:
+            self._close()
+
+smtp_connection = SmtpConnection()
+
 def send_email_via_workmail(to: str, subject: str, html_body: str, text_body: str = None, reply_to: str = None) -> bool:
-    """Send email via WorkMail SMTP."""
-    if not WORKMAIL_SMTP_PASSWORD:
+    """Send email via WorkMail SMTP (or SMTP_DEBUG_SERVER) over the shared, reused connection."""
+    if not WORKMAIL_SMTP_PASSWORD and not SMTP_DEBUG_SERVER:
         print("ERROR: WORKMAIL_SMTP_PASSWORD not set in environment variables")
         return False
     
@@ -44,15 +113,7 @@ def send_email_via_workmail(to: str, subject: str, html_body: str, text_body: st
         html_part = MIMEText(html_body, 'html', 'utf-8')
         msg.attach(html_part)
         
-        if WORKMAIL_SMTP_PORT == 465:
-            server = smtplib.SMTP_SSL(WORKMAIL_SMTP_SERVER, WORKMAIL_SMTP_PORT)
-        else:
-            server = smtplib.SMTP(WORKMAIL_SMTP_SERVER, WORKMAIL_SMTP_PORT)
-            server.starttls()
-        
-        server.login(WORKMAIL_SMTP_USERNAME, WORKMAIL_SMTP_PASSWORD)
-        server.send_message(msg)
-        server.quit()
+        smtp_connection.send(msg)
         
         print(f'Email sent successfully via WorkMail to {to}')
         return True
@@ -111,8 +172,8 @@ def send_email(to: str, subject: str, html_body: str, text_body: str = None, rep
     else:
         return send_email_via_ses(to, subject, html_body, text_body, reply_to)
 
-def send_order_confirmation_email(email: str, name: str, order) -> bool:
-    """Send order confirmation email with receipt."""
+def render_order_confirmation_email(name: str, order) -> tuple:
+    """Order confirmation with receipt as (subject, html_body, text_body)."""
     order_items_html = ''
     order_items_text = ''
     
@@ -246,10 +307,14 @@ If you have any questions, please contact us at {Config.ADMIN_EMAIL}
 Sent at: {datetime.now().strftime('%Y-%m-%d %H:%M:%S %Z')}
     """.strip()
     
-    return send_email(email, f'Order Confirmation - {order.order_number}', html_body, text_body)
+    return f'Order Confirmation - {order.order_number}', html_body, text_body
 
-def send_activation_email(email: str, first_name: str, activation_token: str) -> bool:
-    """Send account activation email."""
+def send_order_confirmation_email(email: str, name: str, order) -> bool:
+    """Send order confirmation email with receipt."""
+    return send_email(email, *render_order_confirmation_email(name, order))
+
+def render_activation_email(first_name: str, activation_token: str) -> tuple:
+    """Account activation email as (subject, html_body, text_body)."""
     activation_link = f"{Config.BASE_URL}/activation?verify={activation_token}"
     
     html_body = f"""
@@ -306,4 +371,8 @@ This email was sent from InsightShop
 Sent at: {datetime.now().strftime('%Y-%m-%d %H:%M:%S %Z')}
     """.strip()
     
-    return send_email(email, 'Activate Your Account - InsightShop', html_body, text_body)
+    return 'Activate Your Account - InsightShop', html_body, text_body
+
+def send_activation_email(email: str, first_name: str, activation_token: str) -> bool:
+    """Send account activation email."""
+    return send_email(email, *render_activation_email(first_name, activation_token))
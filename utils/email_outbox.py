@@ -0,0 +1,150 @@
+"""
+Outbound email queue.
+Requests do not talk to the mail server: queue_email() adds an email_outbox row in the caller's
+transaction, so the message exists exactly when the order (or account) it belongs to was committed,
+and the request returns without waiting for SMTP. A background worker (start_email_worker, woken
+by notify_email_worker after a commit) claims due rows with a conditional UPDATE - so several
+gunicorn workers never send the same row - and sends them over the shared SMTP connection of
+utils.email. Failed sends are retried with exponential backoff (EMAIL_RETRY_BASE_SECONDS * 2**n)
+until EMAIL_MAX_ATTEMPTS, and every row records its delivery status.
+"""
+import threading
+from datetime import datetime, timedelta
+
+from config import Config
+
+# A row left 'sending' this long (worker died mid-send) is claimed again
+STALE_CLAIM_MINUTES = 10
+
+_wake = threading.Event()
+_thread = None
+
+
+def queue_email(to, subject, html_body, text_body=None, reply_to=None):
+    """Add a message to the outbox in the current transaction; it is sent once the caller commits."""
+    from models.database import db
+    from models.email_outbox import EmailOutbox, EMAIL_PENDING
+    row = EmailOutbox(
+        to_address=to,
+        subject=subject,
+        html_body=html_body,
+        text_body=text_body,
+        reply_to=reply_to,
+        status=EMAIL_PENDING,
+        next_attempt_at=datetime.utcnow(),
+    )
+    db.session.add(row)
+    return row
+
+
+def queue_order_confirmation_email(email, name, order):
+    """Queue the order confirmation / receipt (rendered now, from the order as committed)."""
+    from utils.email import render_order_confirmation_email
+    return queue_email(email, *render_order_confirmation_email(name, order))
+
+
+def queue_activation_email(email, first_name, activation_token):
+    from utils.email import render_activation_email
+    return queue_email(email, *render_activation_email(first_name, activation_token))
+
+
+def notify_email_worker():
+    """Wake this process's worker to send newly committed messages now rather than at its next tick."""
+    _wake.set()
+
+
+def retry_delay(attempts):
+    """Backoff before retry number attempts (1-based)."""
+    return timedelta(seconds=Config.EMAIL_RETRY_BASE_SECONDS * 2 ** max(attempts - 1, 0))
+
+
+def _claim_batch(now, batch_size):
+    """Move up to batch_size due rows to 'sending' and return them; rows claimed elsewhere are skipped."""
+    from sqlalchemy import and_, or_, update
+    from models.database import db
+    from models.email_outbox import EmailOutbox, EMAIL_PENDING, EMAIL_SENDING
+    due = or_(
+        and_(EmailOutbox.status == EMAIL_PENDING, EmailOutbox.next_attempt_at <= now),
+        and_(EmailOutbox.status == EMAIL_SENDING,
+             EmailOutbox.updated_at < now - timedelta(minutes=STALE_CLAIM_MINUTES)),
+    )
+    ids = [row[0] for row in db.session.query(EmailOutbox.id).filter(due)
+           .order_by(EmailOutbox.next_attempt_at).limit(batch_size).all()]
+    if not ids:
+        return []
+    table = EmailOutbox.__table__
+    stmt = update(table).where(table.c.id.in_(ids), due).values(status=EMAIL_SENDING, updated_at=now)
+    if db.engine.dialect.update_returning:
+        claimed = [row[0] for row in db.session.execute(stmt.returning(table.c.id))]
+    else:
+        claimed = [row_id for row_id in ids if db.session.execute(stmt.where(table.c.id == row_id)).rowcount]
+    db.session.commit()
+    if not claimed:
+        return []
+    return EmailOutbox.query.filter(EmailOutbox.id.in_(claimed)).order_by(EmailOutbox.id).all()
+
+
+def deliver_outbox(now=None, batch_size=50):
+    """
+    Send every due message. Each result is committed as soon as it is known (a crash re-sends at
+    most the message in flight). Returns a report: {'sent', 'retrying', 'failed'}.
+    """
+    from models.database import db
+    from models.email_outbox import EMAIL_FAILED, EMAIL_PENDING, EMAIL_SENT
+    from utils.email import send_email
+
+    now = now or datetime.utcnow()
+    report = {'sent': 0, 'retrying': 0, 'failed': 0}
+    while True:
+        batch = _claim_batch(now, batch_size)
+        for row in batch:
+            try:
+                sent = send_email(row.to_address, row.subject, row.html_body, row.text_body, row.reply_to)
+                error = None if sent else 'Delivery failed via WorkMail and SES'
+            except Exception as e:
+                sent, error = False, str(e)
+            row.attempts = (row.attempts or 0) + 1
+            if sent:
+                row.status = EMAIL_SENT
+                row.sent_at = datetime.utcnow()
+                row.last_error = None
+                report['sent'] += 1
+            elif row.attempts >= Config.EMAIL_MAX_ATTEMPTS:
+                row.status = EMAIL_FAILED
+                row.last_error = error
+                report['failed'] += 1
+            else:
+                row.status = EMAIL_PENDING
+                row.next_attempt_at = now + retry_delay(row.attempts)
+                row.last_error = error
+                report['retrying'] += 1
+            db.session.commit()
+        if len(batch) < batch_size:
+            break
+    if any(report.values()):
+        print(f"[Email outbox] Sent {report['sent']}, retrying {report['retrying']}, failed {report['failed']}")
+    return report
+
+
+def start_email_worker(app, interval=None):
+    """Run deliver_outbox every interval seconds, or when notified, in a daemon thread (once per process)."""
+    global _thread
+    interval = Config.EMAIL_WORKER_INTERVAL_SECONDS if interval is None else interval
+    if interval <= 0 or (_thread is not None and _thread.is_alive()):
+        return None
+
+    def run():
+        while True:
+            _wake.wait(interval)
+            _wake.clear()
+            if app.config.get('TESTING'):
+                continue  # Test runs import the app before setting TESTING; never mail from them
+            try:
+                with app.app_context():
+                    deliver_outbox()
+            except Exception as e:
+                print(f"[Email outbox] Delivery run failed: {e}")
+
+    _thread = threading.Thread(target=run, name='email-outbox-worker', daemon=True)
+    _thread.start()
+    return _thread
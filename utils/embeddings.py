@@ -0,0 +1,295 @@
+"""
+Embedding layer for the product vector index.
+Product documents and shopper queries are embedded here, not inside Chroma, so vectors can be
+reused: document embeddings are kept on disk under the document text's hash (an append-only
+float32 matrix, memory-mapped for reads, plus a hash -> row index), and query embeddings in an
+in-process LRU. Index sync, single-product upserts and searches all go through get_embedder(), and
+misses are encoded in batches of EMBEDDING_BATCH_SIZE. The model is Config.EMBEDDING_MODEL - the
+default all-MiniLM-L6-v2 runs through Chroma's own ONNX function, so vectors match documents Chroma
+embedded before; other models (and MiniLM without Chroma) need sentence-transformers. Without a model,
+get_embedder() returns None: Chroma embeds as before, and the NumPy fallback index cannot be used.
+"""
+import hashlib
+import json
+import os
+import re
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+
+import numpy as np
+
+from config import Config
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+try:
+    import msvcrt
+except ImportError:
+    msvcrt = None
+
+_lock = threading.Lock()
+_embedder = None
+_embedder_loaded = False
+
+
+def text_hash(model_name, text):
+    """Cache key of a document: the model and the exact text it embeds."""
+    return hashlib.sha256(f"{model_name}\n{text or ''}".encode('utf-8')).hexdigest()
+
+
+@contextmanager
+def _file_lock(path):
+    """Exclusive lock on path across processes (workers, the admin sync, scripts)."""
+    with open(path, 'a+b') as f:
+        if fcntl is not None:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        elif msvcrt is not None:
+            f.seek(0)
+            msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+            elif msvcrt is not None:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+class DocumentEmbeddingCache:
+    """
+    Persistent hash -> float32 vector store: vectors.f32 holds the rows back to back, hashes.txt one
+    "hash row" line per row, meta.json the model and dimension. Several processes share the files:
+    appends hold an exclusive file lock and take their row numbers from the file size, and the
+    vectors are written before their hashes, so a hash only ever points at its own, complete row.
+    Hashes appended by other processes are picked up on the next miss.
+    """
+
+    def __init__(self, directory, model_name):
+        self.directory = directory
+        self.model_name = model_name
+        self._lock = threading.Lock()
+        self._index = {}
+        self._dim = None
+        self._hashes_read = 0  # Bytes of hashes.txt already in _index
+        self._hash_lines = 0  # Lines read; a bare-hash line (older format) is the row at its line number
+        self._matrix = None  # Read-only memmap of the first _mapped_rows rows
+        self._mapped_rows = 0
+        os.makedirs(self.directory, exist_ok=True)
+        with _file_lock(self._path('.lock')):
+            self._load()
+
+    def _path(self, name):
+        return os.path.join(self.directory, name)
+
+    def _read_meta(self):
+        if not os.path.exists(self._path('meta.json')):
+            return {}
+        try:
+            with open(self._path('meta.json'), 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except Exception:
+            return {}
+
+    def _load(self):
+        """(Under the file lock.) Reset files of another model, drop a torn trailing row, read the hashes."""
+        meta = self._read_meta()
+        if meta and meta.get('model') != self.model_name:
+            self._reset()
+            return
+        self._dim = int(meta['dim']) if meta.get('dim') else None
+        if self._dim and os.path.exists(self._path('vectors.f32')):
+            size = os.path.getsize(self._path('vectors.f32'))
+            if size % (self._dim * 4):
+                with open(self._path('vectors.f32'), 'ab') as f:
+                    f.truncate(size - size % (self._dim * 4))
+        self._read_new_hashes()
+
+    def _reset(self):
+        for name in ('vectors.f32', 'hashes.txt', 'meta.json'):
+            if os.path.exists(self._path(name)):
+                os.remove(self._path(name))
+        self._index, self._dim, self._hashes_read, self._hash_lines = {}, None, 0, 0
+        self._matrix, self._mapped_rows = None, 0
+
+    def _rows_on_disk(self):
+        if not self._dim or not os.path.exists(self._path('vectors.f32')):
+            return 0
+        return os.path.getsize(self._path('vectors.f32')) // (self._dim * 4)
+
+    def _read_new_hashes(self):
+        """Index hash lines appended since the last read (by this or another process)."""
+        if not os.path.exists(self._path('hashes.txt')):
+            return
+        if self._dim is None:
+            self._dim = int(self._read_meta().get('dim') or 0) or None
+        rows = self._rows_on_disk()
+        with open(self._path('hashes.txt'), 'rb') as f:
+            f.seek(self._hashes_read)
+            data = f.read()
+        complete = data[:data.rfind(b'\n') + 1]  # A torn last line is left for later
+        self._hashes_read += len(complete)
+        for line in complete.decode('ascii', errors='replace').splitlines():
+            parts = line.split()
+            row = self._hash_lines if len(parts) == 1 else int(parts[1]) if len(parts) == 2 and parts[1].isdigit() else None
+            self._hash_lines += 1
+            if row is not None and row < rows:
+                self._index[parts[0]] = row
+
+    def __len__(self):
+        return len(self._index)
+
+    def get_many(self, hashes):
+        """{hash: vector} for the hashes that are cached."""
+        with self._lock:
+            if any(h not in self._index for h in hashes):
+                self._read_new_hashes()
+            rows = {h: self._index[h] for h in hashes if h in self._index}
+            if not rows:
+                return {}
+            needed = max(rows.values()) + 1
+            if self._matrix is None or self._mapped_rows < needed:
+                self._mapped_rows = self._rows_on_disk()
+                self._matrix = np.memmap(self._path('vectors.f32'), dtype=np.float32, mode='r',
+                                         shape=(self._mapped_rows, self._dim))
+            return {h: np.array(self._matrix[i]) for h, i in rows.items()}
+
+    def put_many(self, items):
+        """Append (hash, vector) pairs that are not cached yet."""
+        with self._lock, _file_lock(self._path('.lock')):
+            if self._read_meta().get('model') not in (None, self.model_name):
+                self._reset()
+            self._read_new_hashes()
+            new, seen = [], set()
+            for h, vector in items:
+                if h not in self._index and h not in seen:
+                    seen.add(h)
+                    new.append((h, np.asarray(vector, dtype=np.float32).reshape(-1)))
+            if not new:
+                return
+            if self._dim is None:
+                self._dim = new[0][1].shape[0]
+                with open(self._path('meta.json'), 'w', encoding='utf-8') as f:
+                    json.dump({'model': self.model_name, 'dim': self._dim}, f)
+            new = [(h, v) for h, v in new if v.shape[0] == self._dim]
+            if not new:
+                return
+            first_row = self._rows_on_disk()
+            with open(self._path('vectors.f32'), 'ab') as f:
+                f.truncate(first_row * self._dim * 4)  # Drop a torn row left by a crashed writer
+                f.write(np.stack([v for _, v in new]).astype(np.float32).tobytes())
+            lines = ''.join(f"{h} {first_row + i}\n" for i, (h, _) in enumerate(new))
+            with open(self._path('hashes.txt'), 'ab') as f:
+                if f.tell() and self._ends_torn():
+                    lines = '\n' + lines
+                f.write(lines.encode('ascii'))
+            self._read_new_hashes()
+
+    def _ends_torn(self):
+        with open(self._path('hashes.txt'), 'rb') as f:
+            f.seek(-1, os.SEEK_END)
+            return f.read(1) != b'\n'
+
+
+class Embedder:
+    """Embeds documents (disk cache) and queries (LRU) with one encode function."""
+
+    def __init__(self, encode, model_name, cache_dir, query_cache_size=1024, batch_size=64):
+        self._encode = encode
+        self.model_name = model_name
+        self.batch_size = max(1, batch_size)
+        self.documents = DocumentEmbeddingCache(cache_dir, model_name)
+        self.query_cache_size = query_cache_size
+        self._queries = OrderedDict()
+        self._query_lock = threading.Lock()  # Also guards _stats
+        self._stats = {'document_hits': 0, 'document_misses': 0, 'query_hits': 0, 'query_misses': 0}
+
+    def _encode_batched(self, texts):
+        vectors = []
+        for i in range(0, len(texts), self.batch_size):
+            vectors.extend(np.asarray(v, dtype=np.float32) for v in self._encode(texts[i:i + self.batch_size]))
+        return vectors
+
+    def embed_documents(self, texts):
+        """One float32 vector per text; only texts not embedded before are encoded."""
+        hashes = [text_hash(self.model_name, t) for t in texts]
+        found = self.documents.get_many(hashes)
+        missing = list(OrderedDict((h, t) for h, t in zip(hashes, texts) if h not in found).items())
+        if missing:
+            encoded = self._encode_batched([t for _, t in missing])
+            fresh = list(zip([h for h, _ in missing], encoded))
+            self.documents.put_many(fresh)
+            found.update(fresh)
+        with self._query_lock:
+            self._stats['document_hits'] += len(texts) - len(missing)
+            self._stats['document_misses'] += len(missing)
+        return [found[h] for h in hashes]
+
+    def embed_query(self, text):
+        """Vector for a search query; repeated queries (case and spacing aside) are served from the LRU."""
+        key = re.sub(r'\s+', ' ', (text or '').strip()).casefold()
+        with self._query_lock:
+            vector = self._queries.get(key)
+            if vector is not None:
+                self._queries.move_to_end(key)
+                self._stats['query_hits'] += 1
+                return vector
+        vector = self._encode_batched([key])[0]
+        with self._query_lock:
+            self._stats['query_misses'] += 1
+            if self.query_cache_size > 0:
+                self._queries[key] = vector
+                while len(self._queries) > self.query_cache_size:
+                    self._queries.popitem(last=False)
+        return vector
+
+    def stats(self):
+        return dict(self._stats, cached_documents=len(self.documents), cached_queries=len(self._queries),
+                    model=self.model_name)
+
+
+def _load_encoder(model_name):
+    """Encode function for the model, or None when no backend for it is installed."""
+    if model_name == 'all-MiniLM-L6-v2':
+        try:
+            from chromadb.utils import embedding_functions
+            fn = embedding_functions.DefaultEmbeddingFunction()
+            return lambda texts: fn(list(texts))
+        except Exception:
+            pass
+    try:
+        from sentence_transformers import SentenceTransformer
+        model = SentenceTransformer(model_name)
+        return lambda texts: model.encode(list(texts))
+    except Exception as e:
+        print(f"[Embeddings] No embedding backend for {model_name}: {e}")
+        return None
+
+
+def get_embedder():
+    """This process's Embedder, or None when no embedding model is available (Chroma then embeds itself)."""
+    global _embedder, _embedder_loaded
+    if not _embedder_loaded:
+        with _lock:
+            if not _embedder_loaded:
+                from utils.vector_db import _get_vector_db_path
+                encode = _load_encoder(Config.EMBEDDING_MODEL)
+                if encode is not None:
+                    _embedder = Embedder(
+                        encode,
+                        Config.EMBEDDING_MODEL,
+                        os.path.join(_get_vector_db_path(), 'embedding_cache'),
+                        query_cache_size=Config.EMBEDDING_QUERY_CACHE_SIZE,
+                        batch_size=Config.EMBEDDING_BATCH_SIZE,
+                    )
+                _embedder_loaded = True
+    return _embedder
+
+
+def get_embedding_stats():
+    """Cache counters for this process (does not load the model)."""
+    embedder = _embedder
+    return embedder.stats() if embedder else {'model': None}
@@ -1,125 +1,141 @@
-"""Guest cart management using session."""
+"""
+Guest cart management.
+The session only carries an opaque cart token; the lines live server-side in the guest cart store
+(utils.guest_cart_store), indexed by (product_id, color, size) and expiring GUEST_CART_TTL_HOURS
+after the last change. Writes join the request's transaction: the route commits. Carts saved by older versions as a list in the session are moved into the
+store on first access.
+"""
 from flask import session
-import json
+import uuid
 
-GUEST_CART_SESSION_KEY = 'guest_cart'
+from utils.guest_cart_store import get_guest_cart_store, line_key, normalize_value
+
+GUEST_CART_SESSION_KEY = 'guest_cart'  # Legacy: whole cart in the session cookie
+GUEST_CART_TOKEN_SESSION_KEY = 'guest_cart_token'
+
+def get_guest_cart_token():
+    """Opaque id of this session's guest cart (owner of its lines and inventory reservations)."""
+    token = session.get(GUEST_CART_TOKEN_SESSION_KEY)
+    if not token:
+        token = uuid.uuid4().hex
+        session[GUEST_CART_TOKEN_SESSION_KEY] = token
+        session.modified = True
+    return token
+
+def _migrate_session_cart():
+    """
+    Move a cart kept in the session by older versions into the store. Committed here (once per
+    legacy session), since it also runs on read-only requests; the store itself never commits.
+    """
+    from models.database import db
+    legacy = session.pop(GUEST_CART_SESSION_KEY, None)
+    if legacy is None:
+        return
+    session.modified = True
+    for item in legacy:
+        try:
+            add_to_guest_cart(int(item['product_id']), int(item.get('quantity', 1)),
+                              item.get('selected_color'), item.get('selected_size'),
+                              variation_id=item.get('variation_id'))
+        except (KeyError, TypeError, ValueError):
+            continue
+    db.session.commit()
+
+def _current_token():
+    """Token of this session's guest cart, or None when it has none (reading does not create one)."""
+    _migrate_session_cart()
+    return session.get(GUEST_CART_TOKEN_SESSION_KEY)
+
+def _find_line(token, product_id, selected_color=None, selected_size=None):
+    """
+    (key, line) of the first line for product_id matching color/size; None matches any value.
+    Fully specified lookups are a single keyed read.
+    """
+    store = get_guest_cart_store()
+    selected_color = normalize_value(selected_color)
+    selected_size = normalize_value(selected_size)
+    if selected_color is not None and selected_size is not None:
+        key = line_key(product_id, selected_color, selected_size)
+        line = store.get_line(token, key)
+        return (key, line) if line is not None else (None, None)
+    for line in store.lines(token):
+        if line['product_id'] != product_id:
+            continue
+        if selected_color is not None and normalize_value(line.get('selected_color')) != selected_color:
+            continue
+        if selected_size is not None and normalize_value(line.get('selected_size')) != selected_size:
+            continue
+        return line_key(product_id, line.get('selected_color'), line.get('selected_size')), line
+    return None, None
 
 def get_guest_cart():
-    """Get guest cart from session."""
-    cart = session.get(GUEST_CART_SESSION_KEY, [])
-    # Ensure backward compatibility
-    for item in cart:
-        if 'selected_color' not in item:
-            item['selected_color'] = None
-        if 'selected_size' not in item:
-            item['selected_size'] = None
-    return cart
+    """Get the guest cart lines (product_id, variation_id, quantity, selected_color, selected_size)."""
+    token = _current_token()
+    return get_guest_cart_store().lines(token) if token else []
 
 def add_to_guest_cart(product_id, quantity, selected_color=None, selected_size=None, variation_id=None):
     """Add item to guest cart. Optionally store variation_id for variation-based stock."""
-    cart = get_guest_cart()
-    
-    # Check if same product with same color/size (or same variation_id) already exists
-    for item in cart:
-        if variation_id is not None and item.get('variation_id') == variation_id:
-            item['quantity'] += quantity
-            session[GUEST_CART_SESSION_KEY] = cart
-            session.modified = True
-            return True
-        if (item['product_id'] == product_id and 
-            item.get('selected_color') == selected_color and 
-            item.get('selected_size') == selected_size):
-            item['quantity'] += quantity
-            if variation_id is not None:
-                item['variation_id'] = variation_id
-            session[GUEST_CART_SESSION_KEY] = cart
-            session.modified = True
-            return True
-    
-    # Add new item
-    new_item = {
-        'product_id': product_id,
-        'quantity': quantity,
-        'selected_color': selected_color,
-        'selected_size': selected_size
-    }
-    if variation_id is not None:
-        new_item['variation_id'] = variation_id
-    cart.append(new_item)
-    session[GUEST_CART_SESSION_KEY] = cart
-    session.modified = True
+    _migrate_session_cart()
+    token = get_guest_cart_token()
+    store = get_guest_cart_store()
+    selected_color = normalize_value(selected_color)
+    selected_size = normalize_value(selected_size)
+    key = line_key(product_id, selected_color, selected_size)
+    line = store.get_line(token, key)
+    if line is not None:
+        line['quantity'] += quantity
+        if variation_id is not None:
+            line['variation_id'] = variation_id
+    else:
+        line = {
+            'product_id': product_id,
+            'variation_id': variation_id,
+            'quantity': quantity,
+            'selected_color': selected_color,
+            'selected_size': selected_size
+        }
+    store.put_line(token, key, line)
     return True
 
-def update_guest_cart_item(product_id, quantity, selected_color=None, selected_size=None, old_color=None, old_size=None):
-    """Update guest cart item. Finds item by product_id and old color/size, then updates to new color/size."""
-    cart = get_guest_cart()
-    
-    # Normalize None values for comparison
-    def normalize_value(val):
-        if val is None or val == '':
-            return None
-        return val
-    
+def update_guest_cart_item(product_id, quantity, selected_color=None, selected_size=None, old_color=None, old_size=None,
+                           variation_id=None):
+    """
+    Update guest cart item. Finds item by product_id and old color/size, then updates to new color/size
+    (variation_id: the new color/size's variation; the caller moves its stock hold).
+    """
+    token = _current_token()
+    if not token:
+        return False
+    store = get_guest_cart_store()
+
     # Use old_color/old_size to find the item, or use selected_color/selected_size if old not provided
-    search_color = normalize_value(old_color) if old_color is not None else normalize_value(selected_color)
-    search_size = normalize_value(old_size) if old_size is not None else normalize_value(selected_size)
-    
-    new_color = normalize_value(selected_color)
-    new_size = normalize_value(selected_size)
-    
-    # First, check if an item with the NEW color/size already exists
-    existing_item = None
-    for item in cart:
-        item_product_id = item.get('product_id')
-        item_color = normalize_value(item.get('selected_color'))
-        item_size = normalize_value(item.get('selected_size'))
-        
-        if (item_product_id == product_id and 
-            item_color == new_color and 
-            item_size == new_size):
-            existing_item = item
-            break
-    
-    # Find the item to update (by old color/size or current color/size)
-    item_to_update = None
-    for item in cart:
-        item_product_id = item.get('product_id')
-        item_color = normalize_value(item.get('selected_color'))
-        item_size = normalize_value(item.get('selected_size'))
-        
-        # Check if product_id matches
-        if item_product_id == product_id:
-            # Match by old color/size if provided, otherwise by current color/size
-            color_match = (search_color is None) or (item_color == search_color)
-            size_match = (search_size is None) or (item_size == search_size)
-            
-            if color_match and size_match:
-                item_to_update = item
-                break
-    
-    if item_to_update:
-        # If we're changing to a variant that already exists, merge quantities
-        if existing_item and existing_item != item_to_update:
-            # Merge: add quantity to existing item, remove old item
-            existing_item['quantity'] = existing_item.get('quantity', 0) + quantity
-            cart.remove(item_to_update)
-        else:
-            # Update the item
-            if quantity <= 0:
-                cart.remove(item_to_update)
-            else:
-                item_to_update['quantity'] = quantity
-                # Update color/size if provided and different
-                if selected_color is not None:
-                    item_to_update['selected_color'] = selected_color
-                if selected_size is not None:
-                    item_to_update['selected_size'] = selected_size
-        
-        session[GUEST_CART_SESSION_KEY] = cart
-        session.modified = True  # Force Flask to save the session
-        return True
-    
-    return False
+    search_color = old_color if old_color is not None else selected_color
+    search_size = old_size if old_size is not None else selected_size
+    key, line = _find_line(token, product_id, search_color, search_size)
+    if line is None:
+        return False
+
+    new_color = normalize_value(selected_color) if selected_color is not None else line.get('selected_color')
+    new_size = normalize_value(selected_size) if selected_size is not None else line.get('selected_size')
+    new_key = line_key(product_id, new_color, new_size)
+    existing = store.get_line(token, new_key) if new_key != key else None
+    if existing is not None:
+        # Changing to a variant that is already in the cart: merge quantities
+        existing['quantity'] = existing.get('quantity', 0) + quantity
+        if variation_id is not None:
+            existing['variation_id'] = variation_id
+        store.put_line(token, new_key, existing)
+        store.delete_line(token, key)
+    elif quantity <= 0:
+        store.delete_line(token, key)
+    else:
+        line.update(quantity=quantity, selected_color=new_color, selected_size=new_size)
+        if variation_id is not None:
+            line['variation_id'] = variation_id
+        if new_key != key:
+            store.delete_line(token, key)
+        store.put_line(token, new_key, line)
+    return True
 
 def remove_from_guest_cart(product_id, selected_color=None, selected_size=None, quantity=None):
     """
@@ -128,49 +144,29 @@ def remove_from_guest_cart(product_id, selected_color=None, selected_size=None,
     If quantity is None, remove the entire matching line (all units).
     Returns the number of units removed (0 if no match). Truthy when something was removed (for backward compat).
     """
-    cart = get_guest_cart()
-
-    def normalize_value(val):
-        if val is None or val == '':
-            return None
-        return val
-
-    normalized_selected_color = normalize_value(selected_color)
-    normalized_selected_size = normalize_value(selected_size)
+    token = _current_token()
+    if not token:
+        return 0
+    key, line = _find_line(token, product_id, selected_color, selected_size)
+    if line is None:
+        return 0
 
-    for i, item in enumerate(cart):
-        item_product_id = item.get('product_id')
-        item_color = normalize_value(item.get('selected_color'))
-        item_size = normalize_value(item.get('selected_size'))
-
-        product_match = item_product_id == product_id
-        if not product_match:
-            continue
-        color_match = (normalized_selected_color is None) or (item_color == normalized_selected_color)
-        size_match = (normalized_selected_size is None) or (item_size == normalized_selected_size)
-        if not (color_match and size_match):
-            continue
-
-        current_qty = int(item.get('quantity', 1))
-        if quantity is None or quantity >= current_qty:
-            # Remove entire line
-            cart.pop(i)
-            session[GUEST_CART_SESSION_KEY] = cart
-            session.modified = True
-            return current_qty
-        # Reduce quantity by quantity
-        new_qty = current_qty - quantity
-        item['quantity'] = new_qty
-        session[GUEST_CART_SESSION_KEY] = cart
-        session.modified = True
-        return quantity
-
-    return 0
+    store = get_guest_cart_store()
+    current_qty = int(line.get('quantity', 1))
+    if quantity is None or quantity >= current_qty:
+        # Remove entire line
+        store.delete_line(token, key)
+        return current_qty
+    line['quantity'] = current_qty - quantity
+    store.put_line(token, key, line)
+    return quantity
 
 def clear_guest_cart():
     """Clear guest cart."""
     if GUEST_CART_SESSION_KEY in session:
         del session[GUEST_CART_SESSION_KEY]
         session.modified = True  # Force Flask to save the session
+    token = session.get(GUEST_CART_TOKEN_SESSION_KEY)
+    if token:
+        get_guest_cart_store().clear(token)
     return True
-
@@ -0,0 +1,182 @@
+"""
+Server-side guest cart storage.
+A guest cart is a set of lines under an opaque cart token (kept in the session cookie). Lines are
+indexed by line_key(product_id, color, size) - one line per product variation - so adding,
+updating or removing a line touches that line only. Backends (Config.GUEST_CART_BACKEND):
+- 'sql': guest_cart_lines table, shared by every worker (default)
+- 'memory': process-local dict, a stand-in for single-process and development setups
+A cart expires GUEST_CART_TTL_HOURS after its last change; purge_expired() drops expired carts.
+The SQL store only flushes its writes: they commit with the caller's transaction, so a cart line
+and the stock hold or order written in the same request succeed or fail together.
+"""
+import threading
+from collections import OrderedDict
+from datetime import datetime, timedelta
+
+from config import Config
+
+
+def normalize_value(value):
+    """'' and None both mean "not selected"."""
+    if value is None or value == '':
+        return None
+    return value
+
+
+def line_key(product_id, selected_color=None, selected_size=None):
+    """Index key of a cart line (a variation is exactly one product + size + color)."""
+    return f"{int(product_id)}|{normalize_value(selected_color) or ''}|{normalize_value(selected_size) or ''}"
+
+
+def _expiry(now=None):
+    return (now or datetime.utcnow()) + timedelta(hours=Config.GUEST_CART_TTL_HOURS)
+
+
+class MemoryGuestCartStore:
+    """Process-local carts: token -> [expires_at, OrderedDict(line_key -> line)]."""
+    name = 'memory'
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._carts = {}
+
+    def _cart(self, token, now=None):
+        entry = self._carts.get(token)
+        if entry is not None and entry[0] <= (now or datetime.utcnow()):
+            del self._carts[token]
+            return None
+        return entry
+
+    def lines(self, token):
+        with self._lock:
+            entry = self._cart(token)
+            return [dict(line) for line in entry[1].values()] if entry else []
+
+    def get_line(self, token, key):
+        with self._lock:
+            entry = self._cart(token)
+            line = entry[1].get(key) if entry else None
+            return dict(line) if line is not None else None
+
+    def put_line(self, token, key, line):
+        with self._lock:
+            entry = self._cart(token)
+            if entry is None:
+                entry = self._carts[token] = [None, OrderedDict()]
+            entry[1][key] = dict(line)
+            entry[0] = _expiry()
+
+    def delete_line(self, token, key):
+        with self._lock:
+            entry = self._cart(token)
+            if entry is not None:
+                entry[1].pop(key, None)
+                entry[0] = _expiry()
+
+    def clear(self, token):
+        with self._lock:
+            self._carts.pop(token, None)
+
+    def purge_expired(self, now=None):
+        now = now or datetime.utcnow()
+        with self._lock:
+            expired = [token for token, entry in self._carts.items() if entry[0] <= now]
+            for token in expired:
+                del self._carts[token]
+        return len(expired)
+
+
+class SqlGuestCartStore:
+    """guest_cart_lines rows; every change refreshes the expiry of all the cart's lines (caller commits)."""
+    name = 'sql'
+
+    def _touch(self, token, now):
+        """Drop the cart if it already expired, then extend the expiry of its lines."""
+        from models.database import db
+        from models.guest_cart_line import GuestCartLine
+        GuestCartLine.query.filter(
+            GuestCartLine.cart_token == token, GuestCartLine.expires_at <= now
+        ).delete(synchronize_session=False)
+        db.session.flush()
+        GuestCartLine.query.filter(GuestCartLine.cart_token == token).update(
+            {GuestCartLine.expires_at: _expiry(now)}, synchronize_session=False
+        )
+
+    def lines(self, token):
+        from models.guest_cart_line import GuestCartLine
+        rows = GuestCartLine.query.filter(
+            GuestCartLine.cart_token == token, GuestCartLine.expires_at > datetime.utcnow()
+        ).order_by(GuestCartLine.id).all()
+        return [row.to_line() for row in rows]
+
+    def _row(self, token, key):
+        from models.guest_cart_line import GuestCartLine
+        return GuestCartLine.query.filter_by(cart_token=token, line_key=key).first()
+
+    def get_line(self, token, key):
+        row = self._row(token, key)
+        if row is None or row.expires_at <= datetime.utcnow():
+            return None
+        return row.to_line()
+
+    def put_line(self, token, key, line):
+        from sqlalchemy.exc import IntegrityError
+        from models.database import db
+        from models.guest_cart_line import GuestCartLine
+        now = datetime.utcnow()
+        for attempt in range(2):
+            try:
+                # Savepoint: a lost insert race rolls back this line only, not the caller's work
+                with db.session.begin_nested():
+                    self._touch(token, now)
+                    row = self._row(token, key)
+                    if row is None:
+                        row = GuestCartLine(cart_token=token, line_key=key, expires_at=_expiry(now))
+                        db.session.add(row)
+                    row.product_id = line['product_id']
+                    row.variation_id = line.get('variation_id')
+                    row.quantity = line['quantity']
+                    row.selected_color = normalize_value(line.get('selected_color'))
+                    row.selected_size = normalize_value(line.get('selected_size'))
+                return
+            except IntegrityError:
+                # Another request inserted the same line first: retry as an update
+                if attempt:
+                    raise
+
+    def delete_line(self, token, key):
+        from models.database import db
+        from models.guest_cart_line import GuestCartLine
+        GuestCartLine.query.filter_by(cart_token=token, line_key=key).delete(synchronize_session=False)
+        self._touch(token, datetime.utcnow())
+        db.session.flush()
+
+    def clear(self, token):
+        from models.database import db
+        from models.guest_cart_line import GuestCartLine
+        GuestCartLine.query.filter_by(cart_token=token).delete(synchronize_session=False)
+        db.session.flush()
+
+    def purge_expired(self, now=None):
+        from models.database import db
+        from models.guest_cart_line import GuestCartLine
+        deleted = GuestCartLine.query.filter(
+            GuestCartLine.expires_at <= (now or datetime.utcnow())
+        ).delete(synchronize_session=False)
+        db.session.flush()
+        return deleted
+
+
+_BACKENDS = {'sql': SqlGuestCartStore, 'memory': MemoryGuestCartStore}
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+def get_guest_cart_store():
+    """Store for Config.GUEST_CART_BACKEND (one instance per backend per process)."""
+    name = Config.GUEST_CART_BACKEND if Config.GUEST_CART_BACKEND in _BACKENDS else 'sql'
+    store = _stores.get(name)
+    if store is None:
+        with _stores_lock:
+            store = _stores.setdefault(name, _BACKENDS[name]())
+    return store
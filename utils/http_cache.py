@@ -0,0 +1,142 @@
+"""
+Conditional GET support for public catalog endpoints.
+@http_cached('catalog', 'sales') sends a strong ETag - the SHA-1 of the response body - and a
+Last-Modified header (when this process first served that body), and answers If-None-Match /
+If-Modified-Since with 304. Because the validator depends only on what is served, it stays the same
+across time, restarts and workers until the content changes, so revalidations after max-age keep
+getting 304s. Each process remembers the ETag per URL together with the version counters of the
+given scopes (bumped after commit by model write events): while those are unchanged and the entry is
+younger than HTTP_CACHE_MAX_AGE, a matching revalidation is answered without running the view. Other
+workers' writes do not bump this process's counters, so after that the view runs and the body is hashed.
+"""
+import hashlib
+import threading
+import time
+from datetime import date, datetime, timezone
+from functools import wraps
+
+from flask import request, make_response
+
+from config import Config
+
+_MAX_VALIDATORS = 4096  # URLs whose ETag is remembered per process
+
+_lock = threading.Lock()
+_review_version = 0
+_stats = {}  # endpoint -> {'hits': int, 'misses': int}
+_validators = {}  # full path -> (scope versions, etag, last_modified, checked_at)
+
+
+def bump_review_version():
+    """Invalidate cached review responses (queued by Review write events, run after commit)."""
+    global _review_version
+    with _lock:
+        _review_version += 1
+
+
+def _scope_versions(scopes):
+    from utils.catalog_cache import get_catalog_version
+    from utils.sale_engine import get_sale_version
+    versions = {
+        'catalog': get_catalog_version(),
+        'sales': get_sale_version(),
+        'reviews': _review_version,
+    }
+    # Sale windows and computed prices follow the date
+    return (date.today().isoformat(),) + tuple(versions[scope] for scope in scopes)
+
+
+def compute_etag(body):
+    """Strong ETag for a response body."""
+    return hashlib.sha1(body).hexdigest()
+
+
+def _remember(path, versions, etag):
+    """Store the validator for path; Last-Modified is kept while the ETag stays the same."""
+    now = time.time()
+    with _lock:
+        previous = _validators.get(path)
+        if previous is not None and previous[1] == etag:
+            last_modified = previous[2]
+        else:
+            last_modified = datetime.fromtimestamp(int(now), tz=timezone.utc)
+        if previous is None and len(_validators) >= _MAX_VALIDATORS:
+            _validators.clear()
+        _validators[path] = (versions, etag, last_modified, now)
+    return last_modified
+
+
+def _not_modified(etag, last_modified):
+    """RFC 9110: If-None-Match decides when present, otherwise If-Modified-Since."""
+    if 'If-None-Match' in request.headers:
+        return etag in request.if_none_match
+    since = request.if_modified_since
+    return since is not None and last_modified <= since
+
+
+def _record(endpoint, hit):
+    with _lock:
+        entry = _stats.setdefault(endpoint, {'hits': 0, 'misses': 0})
+        entry['hits' if hit else 'misses'] += 1
+
+
+def get_http_cache_stats():
+    """Per-endpoint 304 hits / full responses and hit ratio, plus totals."""
+    with _lock:
+        stats = {name: dict(entry) for name, entry in _stats.items()}
+    hits = sum(e['hits'] for e in stats.values())
+    misses = sum(e['misses'] for e in stats.values())
+    for entry in stats.values():
+        total = entry['hits'] + entry['misses']
+        entry['hit_ratio'] = round(entry['hits'] / total, 4) if total else 0.0
+    return {
+        'endpoints': stats,
+        'hits': hits,
+        'misses': misses,
+        'hit_ratio': round(hits / (hits + misses), 4) if hits + misses else 0.0,
+    }
+
+
+def reset_http_cache_stats():
+    with _lock:
+        _stats.clear()
+        _validators.clear()
+
+
+def http_cached(*scopes):
+    """
+    Decorator for public GET views: sets ETag, Last-Modified and Cache-Control on 200 responses and
+    returns 304 Not Modified when the client's copy is current. scopes: 'catalog', 'sales' and/or 'reviews'.
+    """
+    def decorator(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            cache_control = f'public, max-age={Config.HTTP_CACHE_MAX_AGE}'
+            path = request.full_path
+            versions = _scope_versions(scopes)
+
+            def not_modified(etag):
+                _record(request.endpoint, True)
+                response = make_response('', 304)
+                response.set_etag(etag)
+                response.headers['Cache-Control'] = cache_control
+                return response
+
+            known = _validators.get(path)
+            if known is not None and known[0] == versions \
+                    and time.time() - known[3] < Config.HTTP_CACHE_MAX_AGE and _not_modified(known[1], known[2]):
+                return not_modified(known[1])
+            response = make_response(f(*args, **kwargs))
+            if response.status_code != 200:
+                return response
+            etag = compute_etag(response.get_data())
+            last_modified = _remember(path, versions, etag)
+            if _not_modified(etag, last_modified):
+                return not_modified(etag)
+            _record(request.endpoint, False)
+            response.set_etag(etag)
+            response.last_modified = last_modified
+            response.headers['Cache-Control'] = cache_control
+            return response
+        return decorated_function
+    return decorator
@@ -0,0 +1,114 @@
+"""
+Hybrid product retrieval for the AI search action.
+Two candidate lists are fetched side by side: lexical (SQL filters plus the full-text match,
+ranked by utils.search_index) on the calling thread, and semantic (the vector index, with the
+criteria pushed down as a metadata filter) on a pool thread. The vector query does not touch the
+database, so the worker needs no app context. The lists are fused with reciprocal-rank fusion -
+every list a product appears in adds 1 / (HYBRID_RRF_K + rank) - and small boosts for rating,
+stock and an active sale order products that ranked alike. The result is one de-duplicated list
+plus a score breakdown per product. scripts/benchmark_hybrid_search.py compares the strategies.
+"""
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from config import Config
+
+# Added to the fused score. A top RRF term is ~0.016 (k=60), so the boosts reorder neighbours but
+# do not lift a product above one that both retrievers ranked highly
+RATING_BOOST = 0.004  # Scaled by rating / 5
+STOCK_BOOST = 0.003
+SALE_BOOST = 0.002
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _pool():
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=Config.HYBRID_SEARCH_WORKERS,
+                                               thread_name_prefix='hybrid-search')
+    return _executor
+
+
+def load_products(product_ids):
+    """Active products for the ids as priced dicts, in id order (ids no longer active are dropped)."""
+    from models.product import Product
+    from utils.sale_engine import price_products
+    if not product_ids:
+        return []
+    products = Product.query.filter(Product.id.in_(product_ids), Product.is_active == True).all()
+    by_id = {p.id: p for p in products}
+    sale_prices = price_products(products)
+    return [by_id[pid].to_dict(sale_prices) for pid in product_ids if pid in by_id]
+
+
+def _vector_ids(query, criteria, n_results):
+    from utils.ai_action_executor import _search_products_vector
+    try:
+        return _search_products_vector(query, n_results=n_results, criteria=criteria)
+    except Exception as e:
+        print(f"[Hybrid search] Vector retrieval failed: {e}")
+        return []
+
+
+def retrieve(criteria, query, n_results=30):
+    """
+    Run both retrievers. Returns ({'lexical': [ids], 'vector': [ids]}, {id: product dict}) where
+    every product satisfies criteria; vector hits are re-checked against SQL (the index can lag).
+    """
+    from utils.ai_action_executor import _filter_products_by_criteria, _search_products_by_criteria
+    future = _pool().submit(_vector_ids, query, criteria, n_results) if query else None
+    lexical = _search_products_by_criteria(criteria)
+    vector_ids = future.result() if future else []
+
+    products = {p['id']: p for p in lexical}
+    missing = [pid for pid in dict.fromkeys(vector_ids) if pid not in products]
+    for p in _filter_products_by_criteria(load_products(missing), criteria):
+        products[p['id']] = p
+    rankings = {
+        'lexical': [p['id'] for p in lexical],
+        'vector': [pid for pid in dict.fromkeys(vector_ids) if pid in products],
+    }
+    return rankings, products
+
+
+def fuse(rankings, products, k=None):
+    """
+    Reciprocal-rank fusion of rankings ({source: [ids]}) plus rating/stock/sale boosts.
+    Returns (ordered product dicts, breakdowns) with one breakdown per product, in the same order.
+    """
+    k = Config.HYBRID_RRF_K if k is None else k
+    ranks = {}
+    for source, ids in rankings.items():
+        for rank, pid in enumerate(ids, start=1):
+            if pid in products:
+                ranks.setdefault(pid, {}).setdefault(source, rank)
+
+    scored = []
+    for pid, by_source in ranks.items():
+        p = products[pid]
+        rrf = sum(1.0 / (k + rank) for rank in by_source.values())
+        boosts = {
+            'rating': RATING_BOOST * min(max(float(p.get('rating') or 0), 0.0), 5.0) / 5.0,
+            'stock': STOCK_BOOST if (p.get('stock_quantity') or 0) > 0 else 0.0,
+            'on_sale': SALE_BOOST if p.get('on_sale') else 0.0,
+        }
+        breakdown = {
+            'id': pid,
+            'score': round(rrf + sum(boosts.values()), 6),
+            'rrf': round(rrf, 6),
+            'ranks': {source: by_source.get(source) for source in rankings},
+            'boosts': {name: round(value, 6) for name, value in boosts.items()},
+        }
+        scored.append((breakdown['score'], -min(by_source.values()), -pid, breakdown))
+    scored.sort(key=lambda item: item[:3], reverse=True)
+    return [products[b['id']] for *_, b in scored], [b for *_, b in scored]
+
+
+def hybrid_search(criteria, query, n_results=30):
+    """Lexical + semantic search fused into one ranked list. Returns (products, breakdowns)."""
+    rankings, products = retrieve(criteria, query, n_results=n_results)
+    return fuse(rankings, products)
@@ -0,0 +1,340 @@
+"""
+Inventory service: atomic stock changes and cart reservations.
+Stock is never read-modified-written in Python. take_stock() takes every line of a cart or
+order with one conditional UPDATE per table:
+    UPDATE ... SET stock_quantity = stock_quantity - <qty for id>
+    WHERE id IN (...) AND stock_quantity >= <qty for id>
+and compares the rows updated with the rows asked for; return_stock() is the matching increment.
+Variation stock put in a cart is recorded in inventory_reservations (one held row per cart owner
+and variation) with an expiry, so stock held by abandoned carts can be given back. Functions run
+in db.session's transaction: callers commit, and roll back when InsufficientStock is raised.
+"""
+from datetime import datetime, timedelta
+
+from config import Config
+
+
+class InsufficientStock(Exception):
+    """Not enough stock for some lines; variation_ids / product_ids are the rows that were short."""
+
+    def __init__(self, variation_ids=(), product_ids=()):
+        self.variation_ids = sorted(variation_ids)
+        self.product_ids = sorted(product_ids)
+        super().__init__('Insufficient stock')
+
+
+def reservation_expiry(now=None):
+    """Expiry for a hold made or refreshed now (CART_RESERVATION_TTL_MINUTES)."""
+    return (now or datetime.utcnow()) + timedelta(minutes=Config.CART_RESERVATION_TTL_MINUTES)
+
+
+def _quantities(quantities):
+    """{id: qty} with ids as ints and only positive quantities."""
+    return {int(k): int(v) for k, v in (quantities or {}).items() if k is not None and v and int(v) > 0}
+
+
+def _expire_loaded(model, ids):
+    """Drop the cached stock_quantity of rows this session has loaded (they were changed in SQL)."""
+    from models.database import db
+    for row_id in ids:
+        obj = db.session.identity_map.get(db.session.identity_key(model, row_id))
+        if obj is not None:
+            db.session.expire(obj, ['stock_quantity'])
+
+
+def _change_stock(model, quantities, take):
+    """
+    One UPDATE adding or (conditionally) subtracting quantities[id] for every id. Returns the set
+    of ids updated when the database supports UPDATE ... RETURNING, else the row count.
+    """
+    from sqlalchemy import case, update
+    from models.database import db
+    table = model.__table__
+    delta = case(quantities, value=table.c.id)
+    stmt = update(table).where(table.c.id.in_(list(quantities)))
+    if take:
+        stmt = stmt.where(table.c.stock_quantity >= delta).values(stock_quantity=table.c.stock_quantity - delta)
+    else:
+        stmt = stmt.values(stock_quantity=table.c.stock_quantity + delta)
+    returning = take and db.engine.dialect.update_returning
+    if returning:
+        stmt = stmt.returning(table.c.id)
+    result = db.session.execute(stmt)
+    updated = {row[0] for row in result} if returning else result.rowcount
+    _expire_loaded(model, quantities)
+    return updated
+
+
+def _take(model, quantities):
+    updated = _change_stock(model, quantities, take=True)
+    if isinstance(updated, set):
+        if len(updated) == len(quantities):
+            return
+        # Give back the rows that were taken so the call has no effect
+        taken = {i: quantities[i] for i in updated}
+        if taken:
+            _change_stock(model, taken, take=False)
+        raise InsufficientStock(**{_ids_arg(model): set(quantities) - updated})
+    if updated != len(quantities):
+        raise InsufficientStock(**{_ids_arg(model): set(quantities)})
+
+
+def _ids_arg(model):
+    from models.product_variation import ProductVariation
+    return 'variation_ids' if model is ProductVariation else 'product_ids'
+
+
+def _catalog_changed():
+    """Stock decides which products are listed; SQL updates skip the model write events."""
+    from models.database import call_after_commit, db
+    from utils.catalog_cache import bump_catalog_version
+    call_after_commit(db.session, bump_catalog_version)
+
+
+def take_stock(variations=None, products=None):
+    """
+    Take {variation_id: qty} and {product_id: qty} atomically: one conditional UPDATE per table.
+    Raises InsufficientStock (nothing is taken where UPDATE ... RETURNING is available).
+    """
+    from models.product import Product
+    from models.product_variation import ProductVariation
+    taken = []
+    try:
+        for model, quantities in ((ProductVariation, variations), (Product, products)):
+            quantities = _quantities(quantities)
+            if quantities:
+                _take(model, quantities)
+                taken.append((model, quantities))
+    except InsufficientStock:
+        for model, quantities in taken:
+            _change_stock(model, quantities, take=False)
+        raise
+    finally:
+        if taken:
+            _catalog_changed()
+
+
+def return_stock(variations=None, products=None):
+    """Add {variation_id: qty} / {product_id: qty} back to stock (one UPDATE per table)."""
+    from models.product import Product
+    from models.product_variation import ProductVariation
+    changed = False
+    for model, quantities in ((ProductVariation, variations), (Product, products)):
+        quantities = _quantities(quantities)
+        if quantities:
+            _change_stock(model, quantities, take=False)
+            changed = True
+    if changed:
+        _catalog_changed()
+
+
+def _owner_clause(user_id=None, cart_token=None):
+    from models.inventory_reservation import InventoryReservation
+    if user_id is not None:
+        return InventoryReservation.user_id == user_id
+    if cart_token:
+        return InventoryReservation.cart_token == cart_token
+    raise ValueError('user_id or cart_token is required')
+
+
+def _held_rows(owner, variation_ids=None):
+    """(id, variation_id, quantity) of the owner's held reservations."""
+    from models.database import db
+    from models.inventory_reservation import InventoryReservation, RESERVATION_HELD
+    query = db.session.query(
+        InventoryReservation.id, InventoryReservation.variation_id, InventoryReservation.quantity
+    ).filter(owner, InventoryReservation.status == RESERVATION_HELD)
+    if variation_ids is not None:
+        query = query.filter(InventoryReservation.variation_id.in_(list(variation_ids)))
+    return query.all()
+
+
+def transition_reservations(rows, status, order_id=None):
+    """
+    Move held reservation rows [(id, variation_id, quantity)] to status with one conditional
+    UPDATE (rows another request already moved are skipped). Returns {variation_id: qty} moved.
+    """
+    from sqlalchemy import case, update
+    from models.database import db
+    from models.inventory_reservation import InventoryReservation, RESERVATION_HELD
+    if not rows:
+        return {}
+    table = InventoryReservation.__table__
+    values = {'status': status, 'updated_at': datetime.utcnow()}
+    if order_id is not None:
+        values['order_id'] = order_id
+    by_id = {r[0]: r for r in rows}
+    # Quantity must still be what was read, so a concurrent top-up is not moved unaccounted
+    read_quantity = case({r[0]: r[2] for r in rows}, value=table.c.id)
+    stmt = update(table).where(
+        table.c.id.in_(list(by_id)), table.c.status == RESERVATION_HELD, table.c.quantity == read_quantity
+    ).values(**values)
+    if db.engine.dialect.update_returning:
+        moved_ids = {row[0] for row in db.session.execute(stmt.returning(table.c.id))}
+    else:
+        moved_ids = set()
+        for row_id in by_id:
+            if db.session.execute(stmt.where(table.c.id == row_id)).rowcount:
+                moved_ids.add(row_id)
+    moved = {}
+    for row_id in moved_ids:
+        _, variation_id, quantity = by_id[row_id]
+        moved[variation_id] = moved.get(variation_id, 0) + quantity
+    return moved
+
+
+def held_quantities(user_id=None, cart_token=None):
+    """{variation_id: qty} currently held for a cart owner."""
+    held = {}
+    for _, variation_id, quantity in _held_rows(_owner_clause(user_id, cart_token)):
+        held[variation_id] = held.get(variation_id, 0) + quantity
+    return held
+
+
+def hold_stock(variation, quantity, user_id=None, cart_token=None):
+    """
+    Take quantity of a variation into a cart owner's hold and refresh the hold's expiry.
+    Raises InsufficientStock.
+    """
+    from sqlalchemy import update
+    from models.database import db
+    from models.inventory_reservation import InventoryReservation, RESERVATION_HELD
+    quantity = int(quantity)
+    if quantity <= 0:
+        return
+    owner = _owner_clause(user_id, cart_token)
+    take_stock(variations={variation.id: quantity})
+    table = InventoryReservation.__table__
+    now = datetime.utcnow()
+    # One held row per owner and variation: top up that row only
+    rows = _held_rows(owner, [variation.id])
+    result = None
+    if rows:
+        result = db.session.execute(
+            update(table)
+            .where(table.c.id == min(r[0] for r in rows), table.c.status == RESERVATION_HELD)
+            .values(quantity=table.c.quantity + quantity, expires_at=reservation_expiry(now), updated_at=now)
+        )
+    if result is None or not result.rowcount:
+        db.session.add(InventoryReservation(
+            variation_id=variation.id,
+            product_id=variation.product_id,
+            user_id=user_id,
+            cart_token=None if user_id is not None else cart_token,
+            quantity=quantity,
+            status=RESERVATION_HELD,
+            expires_at=reservation_expiry(now),
+        ))
+
+
+def release_hold(variation_id, quantity=None, user_id=None, cart_token=None):
+    """
+    Return up to quantity (all when None) of an owner's held stock for a variation.
+    Returns the quantity released (0 when nothing is held, e.g. the hold already expired).
+    """
+    from sqlalchemy import update
+    from models.database import db
+    from models.inventory_reservation import InventoryReservation, RESERVATION_HELD, RESERVATION_RELEASED
+    rows = _held_rows(_owner_clause(user_id, cart_token), [variation_id])
+    if quantity is None:
+        released = transition_reservations(rows, RESERVATION_RELEASED).get(variation_id, 0)
+    else:
+        table = InventoryReservation.__table__
+        remaining = int(quantity)
+        released = 0
+        for row_id, _, held in rows:
+            if remaining <= 0:
+                break
+            if held <= remaining:
+                taken = transition_reservations([(row_id, variation_id, held)], RESERVATION_RELEASED).get(variation_id, 0)
+            else:
+                result = db.session.execute(
+                    update(table)
+                    .where(table.c.id == row_id, table.c.status == RESERVATION_HELD, table.c.quantity >= remaining)
+                    .values(quantity=table.c.quantity - remaining, updated_at=datetime.utcnow())
+                )
+                taken = remaining if result.rowcount else 0
+            released += taken
+            remaining -= taken
+    return_stock(variations={variation_id: released})
+    return released
+
+
+def set_hold(variation, quantity, user_id=None, cart_token=None):
+    """Make the owner's hold on a variation exactly quantity (takes or returns the difference)."""
+    held = held_quantities(user_id, cart_token).get(variation.id, 0)
+    if quantity > held:
+        hold_stock(variation, quantity - held, user_id, cart_token)
+    elif quantity < held:
+        release_hold(variation.id, held - quantity, user_id, cart_token)
+
+
+def release_holds(user_id=None, cart_token=None):
+    """Return everything a cart owner holds (cart cleared). Returns {variation_id: qty} released."""
+    from models.inventory_reservation import RESERVATION_RELEASED
+    released = transition_reservations(_held_rows(_owner_clause(user_id, cart_token)), RESERVATION_RELEASED)
+    return_stock(variations=released)
+    return released
+
+
+def transfer_holds(cart_token, user_id):
+    """
+    Give a guest cart's holds to the user it logged in as. A variation the user already holds is
+    added to the user's row (the guest row becomes 'merged', its stock stays held), so there is one
+    held row per owner and variation; the other rows are re-owned with one UPDATE. Returns rows moved.
+    """
+    from sqlalchemy import update
+    from models.database import db
+    from models.inventory_reservation import InventoryReservation, RESERVATION_HELD, RESERVATION_MERGED
+    if not cart_token:
+        return 0
+    guest_rows = _held_rows(_owner_clause(cart_token=cart_token))
+    if not guest_rows:
+        return 0
+    user_rows = {}
+    for row_id, variation_id, _ in _held_rows(_owner_clause(user_id=user_id), {r[1] for r in guest_rows}):
+        user_rows[variation_id] = min(row_id, user_rows.get(variation_id, row_id))
+    table = InventoryReservation.__table__
+    now = datetime.utcnow()
+    merged = transition_reservations([r for r in guest_rows if r[1] in user_rows], RESERVATION_MERGED)
+    for variation_id, quantity in merged.items():
+        result = db.session.execute(
+            update(table)
+            .where(table.c.id == user_rows[variation_id], table.c.status == RESERVATION_HELD)
+            .values(quantity=table.c.quantity + quantity, expires_at=reservation_expiry(now), updated_at=now)
+        )
+        if not result.rowcount:
+            # The user's row expired meanwhile: keep the guest's stock held in a new row
+            product_id = db.session.query(InventoryReservation.product_id).filter(
+                InventoryReservation.id == user_rows[variation_id]).scalar()
+            db.session.add(InventoryReservation(
+                variation_id=variation_id, product_id=product_id, user_id=user_id, quantity=quantity,
+                status=RESERVATION_HELD, expires_at=reservation_expiry(now),
+            ))
+    moved = 0
+    others = [r[0] for r in guest_rows if r[1] not in user_rows]
+    if others:
+        moved = db.session.execute(
+            update(table)
+            .where(table.c.id.in_(others), table.c.status == RESERVATION_HELD)
+            .values(user_id=user_id, cart_token=None, expires_at=reservation_expiry(now), updated_at=now)
+        ).rowcount
+    return moved + len([r for r in guest_rows if r[1] in merged])
+
+
+def checkout_stock(variations=None, products=None, user_id=None, cart_token=None, order_id=None):
+    """
+    Take the stock for an order in one batch. The owner's holds on the ordered variations become
+    committed; stock not covered by a hold (e.g. the hold expired) is taken now together with the
+    product stock, and any surplus hold is returned. Raises InsufficientStock (roll back).
+    """
+    from models.inventory_reservation import RESERVATION_COMMITTED
+    variations = _quantities(variations)
+    committed = {}
+    if variations and (user_id is not None or cart_token):
+        rows = _held_rows(_owner_clause(user_id, cart_token), variations)
+        committed = transition_reservations(rows, RESERVATION_COMMITTED, order_id)
+    shortfall = {v: q - committed.get(v, 0) for v, q in variations.items()}
+    surplus = {v: q - variations.get(v, 0) for v, q in committed.items()}
+    take_stock(variations=shortfall, products=products)
+    return_stock(variations=surplus)
@@ -0,0 +1,167 @@
+"""
+Process-local cache for LLM decision-engine results.
+Many shoppers send the same message ("show me red dresses") with the same context; the decision
+engine's answer for it only depends on the normalized message, the previous filters, the recent
+user messages, the provider/model and the prompt. decision_cache keeps parsed answers under a hash
+of exactly those inputs for LLM_CACHE_TTL_SECONDS, evicting least recently used entries beyond
+LLM_CACHE_MAX_ENTRIES. Identical requests that arrive while one is already upstream wait for it
+instead of sending their own (coalescing). Only successfully parsed answers are cached.
+"""
+import copy
+import hashlib
+import json
+import re
+import threading
+import time
+from collections import OrderedDict
+
+from config import Config
+
+# Request header that skips the cache (read and write) for debugging: X-AI-Cache: bypass
+BYPASS_HEADER = 'X-AI-Cache'
+BYPASS_VALUES = ('bypass', 'no-cache')
+
+# A coalesced request waits this long for the in-flight call before calling upstream itself
+COALESCE_WAIT_SECONDS = 120
+
+
+def normalize_message(text):
+    """Case-folded, whitespace-collapsed message used for cache keys."""
+    return re.sub(r'\s+', ' ', (text or '').strip()).casefold()
+
+
+def prompt_version(system_prompt):
+    """Short hash of a system prompt, so editing the prompt invalidates cached answers."""
+    return hashlib.sha1((system_prompt or '').encode('utf-8')).hexdigest()[:12]
+
+
+def decision_cache_key(message, last_filters, recent_messages, provider, model_id, version, temperature):
+    """Cache key for one decision-engine call."""
+    filters = {k: v for k, v in (last_filters or {}).items() if v is not None and v != ''} if isinstance(last_filters, dict) else {}
+    history = hashlib.sha1('\n'.join(normalize_message(m) for m in recent_messages or []).encode('utf-8')).hexdigest()
+    raw = json.dumps([
+        version, (provider or '').lower(), model_id or '', temperature,
+        normalize_message(message), filters, history,
+    ], sort_keys=True, default=str)
+    return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+
+class _InFlight:
+    __slots__ = ('done', 'value', 'ok')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.ok = False
+
+
+class LLMResponseCache:
+    """TTL + LRU cache with coalescing of concurrent identical computations."""
+
+    def __init__(self, max_entries=1000, ttl_seconds=600):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # key -> (expires_at, value)
+        self._in_flight = {}
+        self._stats = {'hits': 0, 'misses': 0, 'coalesced': 0, 'bypassed': 0, 'evictions': 0, 'expired': 0}
+
+    def _count(self, name):
+        self._stats[name] += 1
+
+    def _lookup(self, key, now):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry[0] <= now:
+            del self._entries[key]
+            self._count('expired')
+            return None
+        self._entries.move_to_end(key)
+        return entry
+
+    def get_or_compute(self, key, compute, cacheable=None, bypass=False):
+        """
+        Return (value, status) where status is 'hit', 'miss', 'coalesced' or 'bypass'. compute() is
+        called at most once per key at a time; its value is stored when cacheable(value) is true.
+        """
+        if bypass or self.max_entries <= 0 or self.ttl_seconds <= 0:
+            with self._lock:
+                self._count('bypassed')
+            return compute(), 'bypass'
+
+        with self._lock:
+            entry = self._lookup(key, time.monotonic())
+            if entry is not None:
+                self._count('hits')
+                return copy.deepcopy(entry[1]), 'hit'
+            flight = self._in_flight.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._in_flight[key] = _InFlight()
+                self._count('misses')
+
+        if not leader:
+            if flight.done.wait(COALESCE_WAIT_SECONDS) and flight.ok:
+                with self._lock:
+                    self._count('coalesced')
+                return copy.deepcopy(flight.value), 'coalesced'
+            with self._lock:
+                self._count('misses')
+            return compute(), 'miss'
+
+        try:
+            value = compute()
+            flight.value, flight.ok = value, True
+            if cacheable is None or cacheable(value):
+                self.put(key, value)
+            return value, 'miss'
+        finally:
+            with self._lock:
+                self._in_flight.pop(key, None)
+            flight.done.set()
+
+    def get(self, key):
+        """Cached value or None, counted as a hit or miss (for callers that compute incrementally, e.g. streaming)."""
+        if self.max_entries <= 0 or self.ttl_seconds <= 0:
+            return None
+        with self._lock:
+            entry = self._lookup(key, time.monotonic())
+            self._count('hits' if entry is not None else 'misses')
+            return copy.deepcopy(entry[1]) if entry is not None else None
+
+    def put(self, key, value):
+        if self.max_entries <= 0 or self.ttl_seconds <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl_seconds, copy.deepcopy(value))
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._count('evictions')
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        """Counters plus size and hit ratio (hits and coalesced requests both avoided a call)."""
+        with self._lock:
+            stats = dict(self._stats, size=len(self._entries), max_entries=self.max_entries,
+                         ttl_seconds=self.ttl_seconds)
+        served = stats['hits'] + stats['coalesced']
+        total = served + stats['misses']
+        stats['hit_ratio'] = round(served / total, 4) if total else 0.0
+        return stats
+
+    def reset_stats(self):
+        with self._lock:
+            for name in self._stats:
+                self._stats[name] = 0
+
+
+decision_cache = LLMResponseCache(Config.LLM_CACHE_MAX_ENTRIES, Config.LLM_CACHE_TTL_SECONDS)
+
+
+def get_llm_cache_stats():
+    return decision_cache.stats()
@@ -0,0 +1,99 @@
+"""
+Pooled HTTP clients for LLM provider APIs.
+Each provider gets one requests.Session per process whose connection pool holds
+LLM_HTTP_POOL_SIZE keep-alive connections (size it to the gunicorn thread count), so a chat turn
+reuses an open TLS connection instead of paying a TCP + TLS handshake to the provider.
+post() applies the provider's timeouts - LLM_CONNECT_TIMEOUT_SECONDS to connect, then
+LLM_TIMEOUT_<PROVIDER> (default LLM_TIMEOUT_SECONDS) to read - and records the call's latency in
+a per-provider histogram (get_llm_latency_stats, served at /api/admin/ai-assistant/latency).
+requests speaks HTTP/1.1 only; connection reuse is where the per-request saving comes from.
+"""
+import os
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from config import Config
+
+# Upper bounds (ms) of the latency histogram buckets; slower calls land in '+Inf'
+LATENCY_BUCKETS_MS = (100, 250, 500, 1000, 2500, 5000, 10000, 30000, 60000)
+
+_lock = threading.Lock()
+_sessions = {}
+_latency = {}  # provider -> {'count', 'errors', 'sum_ms', 'buckets': [n per bucket + inf]}
+
+
+def provider_timeout(provider, read_timeout=None):
+    """(connect, read) timeout for a provider; read_timeout overrides the configured read timeout."""
+    if read_timeout is None:
+        read_timeout = int(os.getenv(f'LLM_TIMEOUT_{(provider or "").upper()}', Config.LLM_TIMEOUT_SECONDS))
+    return (Config.LLM_CONNECT_TIMEOUT_SECONDS, read_timeout)
+
+
+def get_session(provider):
+    """This process's pooled keep-alive session for a provider."""
+    session = _sessions.get(provider)
+    if session is None:
+        with _lock:
+            session = _sessions.get(provider)
+            if session is None:
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=4, pool_maxsize=Config.LLM_HTTP_POOL_SIZE)
+                session.mount('https://', adapter)
+                session.mount('http://', adapter)
+                _sessions[provider] = session
+    return session
+
+
+def _record(provider, elapsed_ms, error):
+    with _lock:
+        entry = _latency.setdefault(provider, {
+            'count': 0, 'errors': 0, 'sum_ms': 0.0, 'buckets': [0] * (len(LATENCY_BUCKETS_MS) + 1),
+        })
+        entry['count'] += 1
+        entry['sum_ms'] += elapsed_ms
+        if error:
+            entry['errors'] += 1
+        index = next((i for i, bound in enumerate(LATENCY_BUCKETS_MS) if elapsed_ms <= bound), len(LATENCY_BUCKETS_MS))
+        entry['buckets'][index] += 1
+
+
+def post(provider, url, timeout=None, **kwargs):
+    """
+    POST to a provider API over its pooled session. timeout: read timeout in seconds (default the
+    provider's). HTTP error statuses are returned, not raised, like requests.post.
+    """
+    start = time.perf_counter()
+    error = True
+    try:
+        response = get_session(provider).post(url, timeout=provider_timeout(provider, timeout), **kwargs)
+        error = response.status_code >= 400
+        return response
+    finally:
+        _record(provider, (time.perf_counter() - start) * 1000, error)
+
+
+def get_llm_latency_stats():
+    """Per-provider call count, errors, mean latency and cumulative histogram buckets (ms)."""
+    with _lock:
+        snapshot = {p: dict(e, buckets=list(e['buckets'])) for p, e in _latency.items()}
+    stats = {}
+    for provider, entry in snapshot.items():
+        cumulative, buckets = 0, {}
+        for bound, n in zip([str(b) for b in LATENCY_BUCKETS_MS] + ['+Inf'], entry['buckets']):
+            cumulative += n
+            buckets[bound] = cumulative
+        stats[provider] = {
+            'count': entry['count'],
+            'errors': entry['errors'],
+            'mean_ms': round(entry['sum_ms'] / entry['count'], 1) if entry['count'] else 0.0,
+            'buckets_ms': buckets,
+        }
+    return stats
+
+
+def reset_llm_latency_stats():
+    with _lock:
+        _latency.clear()
@@ -0,0 +1,101 @@
+"""
+Helpers for streaming chat (/api/ai/chat/stream).
+The decision engine answers with one JSON object whose keys come in prompt order - action,
+parameters, confidence, message. DecisionStreamParser reads that object while it streams: as soon
+as the "message" key arrives, everything before it (action, parameters and, when the model kept the
+order, confidence) is complete and is returned as the head, so the route can announce the decision
+and run a confident search before the assistant text is written; the message string is then
+decoded piece by piece as its characters arrive. The full reply is still parsed at the end (parse_llm_json_response) and that result is
+authoritative.
+"""
+import json
+import re
+
+_MESSAGE_KEY = re.compile(r'"message"\s*:\s*"')
+
+
+def sse_event(event, data):
+    """One server-sent event with a JSON payload."""
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+
+class DecisionStreamParser:
+    """Incremental reader for a streamed decision-engine JSON reply."""
+
+    def __init__(self):
+        self.text = ''
+        self.head = None
+        self._message_start = None  # Offset in text of the message string's first character
+        self._scanned = 0  # Characters of the message string already decoded
+        self._message_done = False
+
+    def feed(self, chunk):
+        """Add streamed text. Returns (head, message_delta); head is returned once, when it first parses."""
+        self.text += chunk or ''
+        head = None
+        if self._message_start is None:
+            head = self._read_head()
+        if self._message_start is None or self._message_done:
+            return head, ''
+        return head, self._read_message()
+
+    def _read_head(self):
+        start = self.text.find('{')
+        if start < 0:
+            return None
+        for match in _MESSAGE_KEY.finditer(self.text, start):
+            # "message" can also occur inside a parameter value; only a prefix that closes into an object counts
+            prefix = self.text[start:match.start()].rstrip().rstrip(',')
+            try:
+                parsed = json.loads(prefix + '}', strict=False)
+            except ValueError:
+                continue
+            if not isinstance(parsed, dict):
+                continue
+            self._message_start = match.end()
+            if isinstance(parsed.get('action'), str):
+                parameters = parsed.get('parameters')
+                self.head = {'action': parsed['action'], 'parameters': parameters if isinstance(parameters, dict) else {}}
+                if 'confidence' in parsed:
+                    self.head['confidence'] = parsed['confidence']
+            return self.head
+        return None
+
+    def _read_message(self):
+        """Decode the newly arrived, complete part of the message string (never splitting an escape)."""
+        value = self.text[self._message_start:]
+        i = self._scanned
+        end = i
+        while i < len(value):
+            ch = value[i]
+            if ch == '"':
+                self._message_done = True
+                break
+            if ch != '\\':
+                i += 1
+                end = i
+                continue
+            if i + 1 >= len(value):
+                break
+            if value[i + 1] != 'u':
+                i += 2
+                end = i
+                continue
+            if i + 6 > len(value):
+                break
+            # Keep a surrogate pair together so each delta is valid text
+            if value[i + 2:i + 4].lower() in ('d8', 'd9', 'da', 'db'):
+                if i + 12 > len(value):
+                    break
+                i += 12
+            else:
+                i += 6
+            end = i
+        segment = value[self._scanned:end]
+        self._scanned = end
+        if not segment:
+            return ''
+        try:
+            return json.loads('"' + segment + '"', strict=False)
+        except ValueError:
+            return ''
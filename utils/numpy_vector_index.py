@@ -0,0 +1,269 @@
+"""
+In-process product vector index on NumPy, used by utils/vector_db.py when ChromaDB cannot be imported.
+It implements the part of the Chroma collection API that vector_db calls (upsert / delete / query /
+count / peek), so add, update, delete, sync and search work unchanged on either backend.
+Vectors are L2-normalized float32 rows in vectors.f32, memory-mapped for search. A query is one dot
+product per row, computed in blocks of SEARCH_BLOCK_ROWS with argpartition top-k per block. Row ids and
+metadata are kept in records.jsonl, an append-only log replayed on load and compacted when mostly stale.
+A vector is written before its record, so a crash leaves at most an unreferenced row. `where` filters
+(utils.vector_db.metadata_filter) are evaluated in Python, one boolean mask per clause, and the masks
+are cached until the next write. Documents are not stored. Embeddings must be passed in (utils.embeddings).
+Use one writer process at a time (the sync); other processes pick up its writes on their next call.
+"""
+import json
+import os
+import threading
+
+import numpy as np
+
+# Rows scored per matrix-vector product; bounds the temporary score buffer for large catalogs
+SEARCH_BLOCK_ROWS = 65536
+
+_OPERATORS = {
+    '$eq': lambda v, x: v == x,
+    '$ne': lambda v, x: v != x,
+    '$gt': lambda v, x: v > x,
+    '$gte': lambda v, x: v >= x,
+    '$lt': lambda v, x: v < x,
+    '$lte': lambda v, x: v <= x,
+    '$in': lambda v, x: v in x,
+    '$nin': lambda v, x: v not in x,
+}
+
+
+def _normalize(vectors):
+    vectors = np.asarray(vectors, dtype=np.float32)
+    if vectors.ndim == 1:
+        vectors = vectors.reshape(1, -1)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+class NumpyVectorIndex:
+    """Cosine-similarity index over normalized float32 rows, with Chroma-style metadata filters."""
+
+    def __init__(self, directory, model_name=None):
+        self.directory = directory
+        self.model_name = model_name
+        self._lock = threading.RLock()
+        self._load()
+
+    def _path(self, name):
+        return os.path.join(self.directory, name)
+
+    def _load(self):
+        os.makedirs(self.directory, exist_ok=True)
+        meta = {}
+        if os.path.exists(self._path('meta.json')):
+            try:
+                with open(self._path('meta.json'), 'r', encoding='utf-8') as f:
+                    meta = json.load(f)
+            except Exception:
+                meta = {}
+        self._dim = int(meta['dim']) if meta.get('dim') else None
+        if meta.get('model') != self.model_name:
+            self._reset()
+            return
+        self._rows_in_file = 0
+        if self._dim and os.path.exists(self._path('vectors.f32')):
+            self._rows_in_file = os.path.getsize(self._path('vectors.f32')) // (self._dim * 4)
+        self._rows, self._metadata, self._ids_by_row, self._log_lines = {}, {}, {}, 0
+        if os.path.exists(self._path('records.jsonl')):
+            with open(self._path('records.jsonl'), 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        continue  # Torn last line
+                    self._log_lines += 1
+                    self._apply(record)
+        self._log_size = os.path.getsize(self._path('records.jsonl')) if os.path.exists(self._path('records.jsonl')) else 0
+        # Records pointing past the vectors file (crash between the two writes) are dropped
+        for doc_id in [d for d, row in self._rows.items() if row >= self._rows_in_file]:
+            self._apply({'id': doc_id, 'row': self._rows[doc_id], 'deleted': True})
+        self._matrix = None
+        self._after_write()
+
+    def _reset(self):
+        for name in ('vectors.f32', 'records.jsonl', 'meta.json'):
+            if os.path.exists(self._path(name)):
+                os.remove(self._path(name))
+        self._dim, self._rows_in_file, self._log_size, self._log_lines = None, 0, 0, 0
+        self._rows, self._metadata, self._ids_by_row = {}, {}, {}
+        self._matrix = None
+        self._after_write()
+
+    def _apply(self, record):
+        doc_id, row = record['id'], record['row']
+        previous = self._rows.get(doc_id)
+        if previous is not None and previous != row:
+            self._metadata.pop(previous, None)
+            self._ids_by_row.pop(previous, None)
+        if record.get('deleted'):
+            self._rows.pop(doc_id, None)
+            self._metadata.pop(row, None)
+            self._ids_by_row.pop(row, None)
+        else:
+            self._rows[doc_id] = row
+            self._metadata[row] = record.get('metadata') or {}
+            self._ids_by_row[row] = doc_id
+
+    def _after_write(self):
+        """Drop filter state derived from rows and metadata (rebuilt on the next search)."""
+        self._alive = None
+        self._masks = {}
+
+    def _alive_mask(self):
+        if self._alive is None:
+            self._alive = np.zeros(self._rows_in_file, dtype=bool)
+            if self._rows:
+                self._alive[np.fromiter(self._ids_by_row, dtype=np.int64, count=len(self._ids_by_row))] = True
+        return self._alive
+
+    def _refresh(self):
+        """Reload when another process appended to the log since this one last read it."""
+        size = os.path.getsize(self._path('records.jsonl')) if os.path.exists(self._path('records.jsonl')) else 0
+        if size != self._log_size:
+            self._load()
+
+    def _append_records(self, records):
+        with open(self._path('records.jsonl'), 'a', encoding='utf-8') as f:
+            f.write(''.join(json.dumps(r, separators=(',', ':')) + '\n' for r in records))
+        self._log_size = os.path.getsize(self._path('records.jsonl'))
+        self._log_lines += len(records)
+        if self._log_lines > 2 * len(self._rows) + 1000:
+            self._compact()
+
+    def _compact(self):
+        """Rewrite the log with one record per live id (vector rows stay where they are)."""
+        tmp = self._path('records.jsonl.tmp')
+        with open(tmp, 'w', encoding='utf-8') as f:
+            for doc_id, row in self._rows.items():
+                f.write(json.dumps({'id': doc_id, 'row': row, 'metadata': self._metadata.get(row) or {}},
+                                   separators=(',', ':')) + '\n')
+        os.replace(tmp, self._path('records.jsonl'))
+        self._log_size = os.path.getsize(self._path('records.jsonl'))
+        self._log_lines = len(self._rows)
+
+    def count(self):
+        with self._lock:
+            self._refresh()
+            return len(self._rows)
+
+    def peek(self, limit=10):
+        with self._lock:
+            self._refresh()
+            return {'ids': list(self._rows)[:limit]}
+
+    def upsert(self, ids, embeddings=None, metadatas=None, documents=None):
+        """Insert or overwrite rows; embeddings are required (documents are accepted and not stored)."""
+        if embeddings is None:
+            raise ValueError("NumpyVectorIndex needs precomputed embeddings (no embedding model available)")
+        vectors = _normalize(embeddings)
+        if len(vectors) != len(ids):
+            raise ValueError("ids and embeddings differ in length")
+        metadatas = metadatas or [{} for _ in ids]
+        with self._lock:
+            self._refresh()
+            if self._dim is None:
+                self._dim = vectors.shape[1]
+                with open(self._path('meta.json'), 'w', encoding='utf-8') as f:
+                    json.dump({'model': self.model_name, 'dim': self._dim}, f)
+            if vectors.shape[1] != self._dim:
+                raise ValueError(f"Embedding dimension {vectors.shape[1]} does not match the index ({self._dim})")
+            free = list(np.flatnonzero(~self._alive_mask())[::-1])
+            records, appended = [], []
+            with open(self._path('vectors.f32'), 'r+b' if os.path.exists(self._path('vectors.f32')) else 'w+b') as f:
+                for doc_id, vector, metadata in zip(ids, vectors, metadatas):
+                    row = self._rows.get(doc_id)
+                    if row is None:
+                        row = int(free.pop()) if free else self._rows_in_file + len(appended)
+                    if row >= self._rows_in_file:
+                        appended.append(row)
+                    f.seek(row * self._dim * 4)
+                    f.write(vector.tobytes())
+                    record = {'id': doc_id, 'row': row, 'metadata': metadata or {}}
+                    self._apply(record)
+                    records.append(record)
+            self._rows_in_file += len(appended)
+            self._append_records(records)
+            self._after_write()
+
+    def delete(self, ids):
+        with self._lock:
+            self._refresh()
+            records = [{'id': doc_id, 'row': self._rows[doc_id], 'deleted': True} for doc_id in ids if doc_id in self._rows]
+            if not records:
+                return
+            for record in records:
+                self._apply(record)
+            self._append_records(records)
+            self._after_write()
+
+    def _clause_mask(self, clause):
+        """Boolean row mask for a where clause ($and / $or, field: value, field: {op: value})."""
+        key = json.dumps(clause, sort_keys=True, default=str)
+        mask = self._masks.get(key)
+        if mask is not None:
+            return mask
+        if '$and' in clause or '$or' in clause:
+            parts = [self._clause_mask(c) for c in clause.get('$and') or clause.get('$or')]
+            mask = np.logical_and.reduce(parts) if '$and' in clause else np.logical_or.reduce(parts)
+        else:
+            mask = self._alive_mask().copy()
+            for field, condition in clause.items():
+                if not isinstance(condition, dict):
+                    condition = {'$eq': condition}
+                for op, want in condition.items():
+                    test = _OPERATORS[op]
+                    matched = np.zeros(self._rows_in_file, dtype=bool)
+                    for row, metadata in self._metadata.items():
+                        value = metadata.get(field)
+                        # Like Chroma, a row without the field never matches
+                        if value is not None and test(value, want):
+                            matched[row] = True
+                    mask &= matched
+        self._masks[key] = mask
+        return mask
+
+    def _matrix_view(self):
+        if self._matrix is None or self._matrix.shape[0] != self._rows_in_file:
+            self._matrix = np.memmap(self._path('vectors.f32'), dtype=np.float32, mode='r',
+                                     shape=(self._rows_in_file, self._dim))
+        return self._matrix
+
+    def _top_k(self, vector, allowed, k):
+        matrix = self._matrix_view()
+        best_rows, best_scores = [], []
+        for start in range(0, self._rows_in_file, SEARCH_BLOCK_ROWS):
+            scores = matrix[start:start + SEARCH_BLOCK_ROWS] @ vector
+            scores[~allowed[start:start + SEARCH_BLOCK_ROWS]] = -np.inf
+            top = np.argpartition(-scores, k - 1)[:k] if k < len(scores) else np.arange(len(scores))
+            best_rows.append(top + start)
+            best_scores.append(scores[top])
+        rows, scores = np.concatenate(best_rows), np.concatenate(best_scores)
+        order = np.argsort(-scores, kind='stable')[:k]
+        return [(int(rows[i]), float(scores[i])) for i in order if np.isfinite(scores[i])]
+
+    def query(self, query_embeddings=None, n_results=10, where=None, query_texts=None, **kwargs):
+        """Chroma-shaped result: {'ids': [[...]], 'distances': [[...]], 'metadatas': [[...]]} per query."""
+        if query_embeddings is None:
+            raise ValueError("NumpyVectorIndex needs query embeddings (no embedding model available)")
+        with self._lock:
+            self._refresh()
+            result = {'ids': [], 'distances': [], 'metadatas': []}
+            queries = _normalize(query_embeddings)
+            if not self._rows or n_results <= 0:
+                for key in result:
+                    result[key] = [[] for _ in queries]
+                return result
+            if queries.shape[1] != self._dim:
+                raise ValueError(f"Query dimension {queries.shape[1]} does not match the index ({self._dim})")
+            allowed = self._clause_mask(where) if where else self._alive_mask()
+            for vector in queries:
+                hits = self._top_k(vector, allowed, n_results)
+                result['ids'].append([self._ids_by_row[row] for row, _ in hits])
+                result['distances'].append([1.0 - score for _, score in hits])
+                result['metadatas'].append([self._metadata[row] for row, _ in hits])
+            return result
@@ -0,0 +1,140 @@
+"""
+Keyset (cursor) pagination for listings.
+keyset_paginate() pages on (sort_key, id) with a WHERE on the last row seen instead of OFFSET,
+so every page costs the same however deep it is. The total is a cached COUNT(*) per filter set
+(refreshed after COUNT_CACHE_TTL_SECONDS), reported as approximate. Routes opt in when the
+request has a ?cursor= parameter (empty for the first page) and keep page/per_page otherwise.
+"""
+import base64
+import json
+import threading
+import time
+from datetime import date, datetime
+from decimal import Decimal
+
+COUNT_CACHE_TTL_SECONDS = 60
+_COUNT_CACHE_MAX = 512
+
+_lock = threading.Lock()
+_count_cache = {}  # (sql, params) -> (count, computed_at)
+
+
+class InvalidCursor(ValueError):
+    """The cursor parameter could not be decoded."""
+
+
+def _encode_value(value):
+    if isinstance(value, datetime):
+        return {'dt': value.isoformat()}
+    if isinstance(value, date):
+        return {'d': value.isoformat()}
+    if isinstance(value, Decimal):
+        return {'n': str(value)}
+    return value
+
+
+def _decode_value(value):
+    if isinstance(value, dict):
+        if 'dt' in value:
+            return datetime.fromisoformat(value['dt'])
+        if 'd' in value:
+            return date.fromisoformat(value['d'])
+        if 'n' in value:
+            return Decimal(value['n'])
+    return value
+
+
+def encode_cursor(sort_value, row_id):
+    """Opaque URL-safe cursor for the row after which the next page starts."""
+    raw = json.dumps([_encode_value(sort_value), row_id], separators=(',', ':'))
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor):
+    """(sort_value, id) from a cursor; raises InvalidCursor."""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        sort_value, row_id = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+        return _decode_value(sort_value), int(row_id)
+    except Exception:
+        raise InvalidCursor('Invalid cursor')
+
+
+def cached_count(query):
+    """COUNT(*) of a query, cached per SQL + parameters for COUNT_CACHE_TTL_SECONDS."""
+    count_query = query.order_by(None)
+    compiled = count_query.statement.compile()
+    key = (str(compiled), repr(sorted(compiled.params.items())))
+    cached = _count_cache.get(key)
+    if cached is not None and time.time() - cached[1] < COUNT_CACHE_TTL_SECONDS:
+        return cached[0]
+    count = count_query.count()
+    with _lock:
+        if len(_count_cache) >= _COUNT_CACHE_MAX:
+            _count_cache.clear()
+        _count_cache[key] = (count, time.time())
+    return count
+
+
+class KeysetPage:
+    """One page of a keyset listing (items, next_cursor, has_more, approximate total)."""
+
+    def __init__(self, items, per_page, next_cursor, total):
+        self.items = items
+        self.per_page = per_page
+        self.next_cursor = next_cursor
+        self.has_more = next_cursor is not None
+        self.total = total
+
+    def to_dict(self):
+        return {
+            'per_page': self.per_page,
+            'next_cursor': self.next_cursor,
+            'has_more': self.has_more,
+            'total': self.total,
+            'total_is_approximate': True,
+        }
+
+
+def keyset_paginate(query, id_column, cursor, per_page, sort_column=None, descending=True):
+    """
+    Page query on (sort_column, id_column), newest/highest first when descending. cursor is the
+    value from a previous page's next_cursor ('' or None for the first page). Any existing
+    ORDER BY on query is replaced.
+    """
+    from sqlalchemy import and_, or_
+    per_page = max(1, min(int(per_page), 100))
+    total = cached_count(query)
+
+    if cursor:
+        last_sort, last_id = decode_cursor(cursor)
+        id_after = id_column < last_id if descending else id_column > last_id
+        if sort_column is None:
+            query = query.filter(id_after)
+        else:
+            sort_after = sort_column < last_sort if descending else sort_column > last_sort
+            query = query.filter(or_(sort_after, and_(sort_column == last_sort, id_after)))
+
+    order = [sort_column, id_column] if sort_column is not None else [id_column]
+    query = query.order_by(None).order_by(*[c.desc() if descending else c.asc() for c in order])
+    rows = query.limit(per_page + 1).all()
+
+    next_cursor = None
+    if len(rows) > per_page:
+        rows = rows[:per_page]
+        last = rows[-1]
+        sort_value = getattr(last, sort_column.key) if sort_column is not None else None
+        next_cursor = encode_cursor(sort_value, getattr(last, id_column.key))
+    return KeysetPage(rows, per_page, next_cursor, total)
+
+
+def pagination_info(pagination, page, per_page):
+    """Response 'pagination' block for either a Flask-SQLAlchemy Pagination or a KeysetPage."""
+    if isinstance(pagination, KeysetPage):
+        return pagination.to_dict()
+    return {
+        'page': page,
+        'per_page': per_page,
+        'total': pagination.total,
+        'pages': pagination.pages
+    }
@@ -0,0 +1,199 @@
+"""
+Batch product serialization for listing endpoints.
+ProductSerializer.serialize_many runs one variation-stock aggregate and one sale-engine pass
+for the whole list, decodes each JSON column at most once per product and can project to a
+subset of fields (e.g. CARD_FIELDS for product grids).
+"""
+import json
+
+# Fields used by product cards/grids: skips description, meta_*, images_by_color and admin sale fields
+CARD_FIELDS = frozenset({
+    'id', 'name', 'price', 'original_price', 'on_sale', 'discount_percentage', 'sale',
+    'category', 'color', 'size', 'available_colors', 'available_sizes', 'size_stock',
+    'clothing_category', 'season', 'brand', 'display_brand', 'image_url',
+    'stock_quantity', 'is_active', 'rating', 'review_count', 'slug',
+})
+
+# Named projections accepted by parse_fields (e.g. ?fields=card)
+FIELD_SETS = {
+    'card': CARD_FIELDS,
+}
+
+# Fields only present on the result when the product is on sale
+_SALE_ONLY_FIELDS = ('discount_percentage', 'sale')
+
+
+def _decode_json(raw):
+    """Decode a JSON text column; returns None when empty or malformed."""
+    if not raw:
+        return None
+    if not isinstance(raw, str):
+        return raw
+    try:
+        return json.loads(raw)
+    except (TypeError, ValueError):
+        return None
+
+
+def parse_fields(value):
+    """Parse a ?fields= query value: a named set ('card') or comma-separated names. None = all fields."""
+    value = (value or '').strip()
+    if not value:
+        return None
+    if value in FIELD_SETS:
+        return FIELD_SETS[value]
+    names = frozenset(f.strip() for f in value.split(',') if f.strip())
+    return (names | {'id'}) if names else None
+
+
+class ProductSerializer:
+    """Serialize Product rows to the dict shape of Product.to_dict(), one at a time or in batch."""
+
+    @staticmethod
+    def variation_stock_totals(product_ids):
+        """Sum of variation stock per product, in one grouped query. Products without variations are absent."""
+        product_ids = list(product_ids)
+        if not product_ids:
+            return {}
+        from sqlalchemy import func
+        from models.database import db
+        from models.product_variation import ProductVariation
+        rows = db.session.query(
+            ProductVariation.product_id,
+            func.coalesce(func.sum(ProductVariation.stock_quantity), 0).label('total_stock')
+        ).filter(ProductVariation.product_id.in_(product_ids)).group_by(ProductVariation.product_id).all()
+        return {r.product_id: int(r.total_stock) for r in rows}
+
+    @staticmethod
+    def serialize(product, sale_prices=None, fields=None, variation_stock=None):
+        """
+        Serialize one product. sale_prices: {product_id: sale_data} from price_products (computed
+        for this product when missing). fields: optional set of keys to keep. variation_stock:
+        optional {product_id: total} overriding stock_quantity for variable products.
+        """
+        def want(name):
+            return fields is None or name in fields
+
+        p = product
+        original_price = float(p.price) if p.price else 0.0
+
+        sale_data = None
+        if any(want(f) for f in ('price', 'on_sale') + _SALE_ONLY_FIELDS):
+            try:
+                if sale_prices is not None and p.id in sale_prices:
+                    sale_data = sale_prices[p.id]
+                else:
+                    sale_data = p.get_sale_price()
+            except Exception:
+                # If pricing fails (e.g., Sale table doesn't exist), continue without sale
+                sale_data = None
+        current_price = sale_data['sale_price'] if sale_data else original_price
+
+        result = {
+            'id': p.id,
+            'name': p.name,
+            'description': p.description,
+            'price': current_price,  # Current price (sale price if on sale)
+            'original_price': original_price,  # Always include original price
+            'category': p.category,
+            'color': p.color,
+            'size': p.size,
+        }
+        if want('available_colors'):
+            colors = _decode_json(p.available_colors)
+            result['available_colors'] = colors if colors else ([p.color] if p.color else [])
+        if want('available_sizes'):
+            sizes = _decode_json(p.available_sizes)
+            result['available_sizes'] = sizes if sizes else ([p.size] if p.size else [])
+        if want('size_stock'):
+            size_stock = _decode_json(p.size_stock)
+            result['size_stock'] = size_stock if isinstance(size_stock, dict) and size_stock else None
+        result.update({
+            'fabric': p.fabric,
+            'clothing_type': p.clothing_type,
+            'clothing_category': p.clothing_category or 'other',
+            'dress_style': p.dress_style,
+            'occasion': p.occasion,
+            'age_group': p.age_group,
+            'season': p.season or 'all_season',
+            'brand': p.brand or 'other',
+            'brand_other': p.brand_other,
+            'display_brand': p.get_display_brand(),
+            'image_url': p._resolved_image_url(),
+        })
+        if want('images_by_color'):
+            images = _decode_json(p.images_by_color)
+            result['images_by_color'] = images if isinstance(images, dict) and images else None
+        stock = int(p.stock_quantity) if p.stock_quantity is not None else 0
+        if variation_stock is not None and p.id in variation_stock:
+            stock = variation_stock[p.id]
+        result.update({
+            'stock_quantity': stock,
+            'is_active': p.is_active,
+            'rating': float(p.rating) if p.rating else 0.0,
+            'review_count': p.review_count,
+            'slug': p.slug,
+            'meta_title': p.meta_title,
+            'meta_description': p.meta_description,
+            'created_at': p.created_at.isoformat() if p.created_at else None,
+        })
+
+        # Add sale information if on sale
+        if sale_data and isinstance(sale_data, dict):
+            result['on_sale'] = True
+            result['discount_percentage'] = sale_data.get('discount_percentage', 0)
+            result['sale'] = sale_data.get('sale')
+        else:
+            result['on_sale'] = False
+
+        # Per-product sale fields (for admin CRUD)
+        result['sale_enabled'] = bool(p.sale_enabled)
+        result['sale_start'] = p.sale_start.isoformat() if p.sale_start else None
+        result['sale_end'] = p.sale_end.isoformat() if p.sale_end else None
+        result['sale_percentage'] = float(p.sale_percentage) if p.sale_percentage is not None else None
+
+        if fields is not None:
+            result = {k: v for k, v in result.items() if k in fields}
+        return result
+
+    @classmethod
+    def serialize_many(cls, products, fields=None, include_variation_stock=True, sale_prices=None, on_date=None):
+        """
+        Serialize a list of products with one variation-stock aggregate and one sale-engine pass
+        (skipped when the caller already has sale_prices). Products that fail to serialize fall
+        back to basic fields so one bad row does not break a listing.
+        """
+        from utils.sale_engine import price_products
+        products = list(products)
+        if not products:
+            return []
+        variation_stock = cls.variation_stock_totals(p.id for p in products) if include_variation_stock else None
+        if sale_prices is None:
+            try:
+                sale_prices = price_products(products, on_date)
+            except Exception:
+                sale_prices = None
+        result = []
+        for p in products:
+            try:
+                result.append(cls.serialize(p, sale_prices, fields, variation_stock))
+            except Exception as e:
+                print(f"Error serializing product {p.id}: {e}")
+                fallback = {
+                    'id': p.id,
+                    'name': p.name,
+                    'description': p.description,
+                    'price': float(p.price) if p.price else 0.0,
+                    'original_price': float(p.price) if p.price else 0.0,
+                    'on_sale': False,
+                    'category': p.category,
+                    'color': p.color,
+                    'season': getattr(p, 'season', None),
+                    'clothing_category': getattr(p, 'clothing_category', 'other'),
+                    'image_url': p.image_url,
+                    'is_active': p.is_active
+                }
+                if variation_stock and p.id in variation_stock:
+                    fallback['stock_quantity'] = variation_stock[p.id]
+                result.append(fallback)
+        return result
@@ -0,0 +1,127 @@
+"""
+Returns stock held by abandoned carts.
+Cart holds (inventory_reservations) expire CART_RESERVATION_TTL_MINUTES after the cart line was
+last changed. release_expired_reservations() releases expired holds in batches: one UPDATE moves a
+batch of reservations to 'released' and one UPDATE adds their quantities back to variation stock.
+Every gunicorn worker may run the background sweeper (start_reservation_sweeper) or the script
+scripts/release_expired_reservations.py; a non-blocking advisory lock lets only one sweep run at a
+time, and the conditional status UPDATE releases each reservation at most once regardless.
+The background sweeper also drops expired server-side guest carts (utils.guest_cart_store).
+"""
+import threading
+import time
+import zlib
+from contextlib import contextmanager
+from datetime import datetime
+
+from config import Config
+
+SWEEPER_LOCK_NAME = 'insightshop:reservation-sweeper'
+
+_local_lock = threading.Lock()
+_thread = None
+
+
+@contextmanager
+def advisory_lock(name):
+    """
+    Non-blocking cross-process lock; yields True when acquired. PostgreSQL pg_try_advisory_lock,
+    MySQL GET_LOCK; other databases (SQLite) only lock within this process.
+    """
+    from sqlalchemy import text
+    from models.database import db
+    engine = db.engine
+    dialect = engine.dialect.name
+    if dialect not in ('postgresql', 'mysql'):
+        acquired = _local_lock.acquire(blocking=False)
+        try:
+            yield acquired
+        finally:
+            if acquired:
+                _local_lock.release()
+        return
+
+    with engine.connect() as conn:
+        if dialect == 'postgresql':
+            key = zlib.crc32(name.encode('utf-8'))
+            acquired = bool(conn.execute(text("SELECT pg_try_advisory_lock(:key)"), {'key': key}).scalar())
+        else:
+            acquired = conn.execute(text("SELECT GET_LOCK(:name, 0)"), {'name': name}).scalar() == 1
+        try:
+            yield acquired
+        finally:
+            if acquired:
+                if dialect == 'postgresql':
+                    conn.execute(text("SELECT pg_advisory_unlock(:key)"), {'key': key})
+                else:
+                    conn.execute(text("SELECT RELEASE_LOCK(:name)"), {'name': name})
+            conn.rollback()
+
+
+def release_expired_reservations(now=None, batch_size=500):
+    """
+    Release every held reservation that expired before now and return its stock. Returns a report:
+    {'ran': False when another worker holds the lock, 'reservations', 'units', 'variations': {id: units}}.
+    """
+    from models.database import db
+    from models.inventory_reservation import InventoryReservation, RESERVATION_HELD, RESERVATION_RELEASED
+    from utils.inventory import return_stock, transition_reservations
+
+    now = now or datetime.utcnow()
+    report = {'ran': False, 'reservations': 0, 'units': 0, 'variations': {}}
+    with advisory_lock(SWEEPER_LOCK_NAME) as acquired:
+        if not acquired:
+            return report
+        report['ran'] = True
+        while True:
+            rows = db.session.query(
+                InventoryReservation.id, InventoryReservation.variation_id, InventoryReservation.quantity
+            ).filter(
+                InventoryReservation.status == RESERVATION_HELD,
+                InventoryReservation.expires_at < now,
+            ).order_by(InventoryReservation.expires_at).limit(batch_size).all()
+            if not rows:
+                break
+            released = transition_reservations(rows, RESERVATION_RELEASED)
+            return_stock(variations=released)
+            db.session.commit()
+            if not released:
+                break  # Rows changed under us (topped up or checked out); they are no longer expired holds
+            report['reservations'] += len(rows)
+            for variation_id, quantity in released.items():
+                report['variations'][variation_id] = report['variations'].get(variation_id, 0) + quantity
+                report['units'] += quantity
+            if len(rows) < batch_size:
+                break
+    if report['units']:
+        print(f"[Reservation sweeper] Released {report['units']} unit(s) from "
+              f"{report['reservations']} expired reservation(s)")
+    return report
+
+
+def start_reservation_sweeper(app, interval=None):
+    """
+    Run release_expired_reservations and the guest cart purge every interval seconds in a daemon
+    thread (once per process).
+    """
+    global _thread
+    interval = Config.RESERVATION_SWEEP_INTERVAL_SECONDS if interval is None else interval
+    if interval <= 0 or (_thread is not None and _thread.is_alive()):
+        return None
+
+    def run():
+        while True:
+            time.sleep(interval)
+            try:
+                with app.app_context():
+                    from models.database import db
+                    from utils.guest_cart_store import get_guest_cart_store
+                    release_expired_reservations()
+                    get_guest_cart_store().purge_expired()
+                    db.session.commit()
+            except Exception as e:
+                print(f"[Reservation sweeper] Sweep failed: {e}")
+
+    _thread = threading.Thread(target=run, name='reservation-sweeper', daemon=True)
+    _thread.start()
+    return _thread
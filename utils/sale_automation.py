@@ -4,6 +4,7 @@ from models.database import db
 from models.sale import Sale
 from datetime import date, timedelta
 from utils.seasonal_events import get_cyber_monday, get_thanksgiving, get_current_holidays_and_events
+from utils.sale_engine import invalidate_sale_cache, reprice_stale
 
 
 def auto_activate_sales():
@@ -34,6 +35,7 @@ def auto_activate_sales():
         
         if activated_count > 0:
             db.session.commit()
+            invalidate_sale_cache()
             print(f"Auto-activated {activated_count} sale(s)")
         
         return {
@@ -128,6 +130,7 @@ def sync_holiday_sales():
         
         if created_count > 0 or updated_count > 0:
             db.session.commit()
+            invalidate_sale_cache()
         
         return {
             'created': created_count,
@@ -146,6 +149,19 @@ def sync_holiday_sales():
         }
 
 
+def reprice_products_daily():
+    """
+    Daily rollover: recompute Product.effective_price / discount_percentage / sale_source for
+    today (sale windows start and end by date). Only rows not yet priced for today are touched.
+    """
+    try:
+        return reprice_stale(date.today())
+    except Exception as e:
+        db.session.rollback()
+        print(f"Error in reprice_products_daily: {e}")
+        return 0
+
+
 def run_sale_automation():
     """
     Main function to run all sale automation tasks.
@@ -154,6 +170,7 @@ def run_sale_automation():
     results = {
         'auto_activate': auto_activate_sales(),
         'sync_holidays': sync_holiday_sales(),
+        'repriced_products': reprice_products_daily(),
         'timestamp': date.today().isoformat()
     }
     return results
@@ -0,0 +1,400 @@
+"""
+Sale pricing engine: loads active Sale rows once, compiles their product_filters into
+predicates and prices products in batch (replaces one Sale query per Product.to_dict()).
+The compiled sales are cached per date and rebuilt when invalidated by a committed write to the
+sales table, when the date changes, or after SALE_CACHE_TTL_SECONDS (other workers' writes).
+on_sale_clause() turns the same rules into a SQL WHERE clause for "on sale" listings.
+
+Pricing is also materialized on products (effective_price, discount_percentage, sale_source,
+priced_on) so price filters, sorts and the price range run on the indexed effective_price. Product
+writes reprice the row; Sale writes mark the products they can affect stale and reprice them as
+soon as the write commits; the background worker (start_reprice_worker, also woken at midnight for
+the daily rollover), the sale automation job and scripts/reprice_products.py reprice every row whose
+priced_on is not today. Requests never reprice.
+"""
+import json
+import threading
+import time
+from datetime import date
+
+SALE_CACHE_TTL_SECONDS = 60
+
+_lock = threading.Lock()
+_version = 0
+_compiled = None  # (version, date, built_at, [CompiledSale])
+_reprice_thread = None
+
+REPRICE_LOCK_NAME = 'insightshop:reprice'
+
+
+class CompiledSale:
+    """An active Sale with its product_filters parsed into predicate functions."""
+    __slots__ = ('id', 'discount', 'start_date', 'filters', 'predicates', 'sale_dict')
+
+    def __init__(self, sale_id, discount, start_date, filters, predicates, sale_dict):
+        self.id = sale_id
+        self.discount = discount
+        self.start_date = start_date
+        self.filters = filters
+        self.predicates = predicates
+        self.sale_dict = sale_dict
+
+    def matches(self, product):
+        for predicate in self.predicates:
+            if not predicate(product):
+                return False
+        return True
+
+
+def _equals(attr, expected):
+    return lambda p: getattr(p, attr) == expected
+
+
+def _parse_filters(raw_filters):
+    """Parse Sale.product_filters to a dict. Empty or unparseable filters mean the sale applies to all."""
+    if not raw_filters:
+        return {}
+    try:
+        filters = json.loads(raw_filters) if isinstance(raw_filters, str) else raw_filters
+    except Exception:
+        return {}
+    return filters if isinstance(filters, dict) else {}
+
+
+def _compile_filters(filters):
+    """Turn parsed product_filters into predicates (same rules as Sale.matches_product)."""
+    predicates = []
+    if 'category' in filters:
+        predicates.append(_equals('category', filters['category']))
+    if 'color' in filters:
+        want_color = filters['color'].lower()
+        predicates.append(
+            lambda p: want_color in (p.color or '').lower() or want_color in (p.available_colors or '').lower()
+        )
+    if 'clothing_type' in filters:
+        predicates.append(_equals('clothing_type', filters['clothing_type']))
+    if 'fabric' in filters:
+        want_fabric = filters['fabric'].lower()
+        predicates.append(lambda p: want_fabric in (p.fabric or '').lower())
+    if 'occasion' in filters:
+        predicates.append(_equals('occasion', filters['occasion']))
+    if 'age_group' in filters:
+        predicates.append(_equals('age_group', filters['age_group']))
+    return predicates
+
+
+def _filters_to_sql(filters):
+    """SQL equivalent of _compile_filters for one sale: AND of the filter conditions (true() when none)."""
+    from sqlalchemy import and_, or_, func, true
+    from models.product import Product
+
+    def contains(column, value):
+        return func.lower(func.coalesce(column, '')).contains(value, autoescape=True)
+
+    conditions = []
+    if 'category' in filters:
+        conditions.append(Product.category == filters['category'])
+    if 'color' in filters:
+        want_color = filters['color'].lower()
+        conditions.append(or_(contains(Product.color, want_color), contains(Product.available_colors, want_color)))
+    if 'clothing_type' in filters:
+        conditions.append(Product.clothing_type == filters['clothing_type'])
+    if 'fabric' in filters:
+        conditions.append(contains(Product.fabric, filters['fabric'].lower()))
+    if 'occasion' in filters:
+        conditions.append(Product.occasion == filters['occasion'])
+    if 'age_group' in filters:
+        conditions.append(Product.age_group == filters['age_group'])
+    return and_(*conditions) if conditions else true()
+
+
+def _load_sales(on_date, session=None):
+    """Query sales active on on_date and compile them. Sales with malformed filters are skipped."""
+    from models.database import db
+    from models.sale import Sale
+    rows = (session or db.session).query(Sale).filter(Sale.is_active == True, Sale.start_date <= on_date).all()
+    compiled = []
+    for sale in rows:
+        try:
+            discount = float(sale.discount_percentage) if sale.discount_percentage else 0.0
+            if discount <= 0:
+                continue
+            filters = _parse_filters(sale.product_filters)
+            compiled.append(CompiledSale(
+                sale.id, discount, sale.start_date, filters,
+                _compile_filters(filters), sale.to_dict()
+            ))
+        except Exception as e:
+            print(f"[Sale engine] Skipping sale {sale.id}: {e}")
+    # Highest discount first so the first match is the best one
+    compiled.sort(key=lambda s: s.discount, reverse=True)
+    return compiled
+
+
+def get_sale_version():
+    """Counter bumped on every sale write (or explicit invalidation) in this process."""
+    return _version
+
+
+def invalidate_sale_cache():
+    """Drop the compiled sales; the next pricing call reloads them from the DB."""
+    global _version, _compiled
+    with _lock:
+        _version += 1
+        _compiled = None
+
+
+def get_active_sales(on_date=None, session=None):
+    """Return the compiled sales active on on_date (default today), best discount first; loads them on session (default db.session)."""
+    global _compiled
+    d = on_date or date.today()
+    cached = _compiled
+    if cached is not None and cached[1] == d and time.time() - cached[2] < SALE_CACHE_TTL_SECONDS:
+        return cached[3]
+    version = _version
+    try:
+        sales = _load_sales(d, session)
+    except Exception:
+        # Sales table missing or DB error: price without global sales, do not cache
+        return []
+    with _lock:
+        if version == _version:
+            _compiled = (version, d, time.time(), sales)
+    return sales
+
+
+def price_product(product, on_date=None, sales=None):
+    """
+    Sale pricing for one product, or None if it is not on sale. Product-level sale takes
+    precedence over global sales. Returns the same dict shape as Product.get_sale_price().
+    """
+    d = on_date or date.today()
+    original_price = float(product.price) if product.price else 0.0
+
+    if product._is_product_sale_active(d) and product.sale_percentage is not None:
+        try:
+            pct = float(product.sale_percentage)
+            if 0 < pct <= 100:
+                return {
+                    'original_price': original_price,
+                    'sale_price': round(original_price * (1 - pct / 100), 2),
+                    'discount_percentage': pct,
+                    'sale': None  # product-level, no Sale row
+                }
+        except (TypeError, ValueError):
+            pass
+
+    if sales is None:
+        sales = get_active_sales(d)
+    for sale in sales:
+        try:
+            if sale.matches(product):
+                return {
+                    'original_price': original_price,
+                    'sale_price': round(original_price * (1 - sale.discount / 100), 2),
+                    'discount_percentage': sale.discount,
+                    'sale': sale.sale_dict
+                }
+        except Exception:
+            continue
+    return None
+
+
+def price_products(products, on_date=None):
+    """Price many products with a single load of the active sales. Returns {product_id: sale_data or None}."""
+    d = on_date or date.today()
+    sales = get_active_sales(d)
+    return {p.id: price_product(p, d, sales) for p in products}
+
+
+def product_sale_clause(on_date=None):
+    """SQL condition: the product's own sale is active on on_date with a valid percentage."""
+    from sqlalchemy import and_
+    from models.product import Product
+    d = on_date or date.today()
+    return and_(
+        Product.sale_enabled == True,
+        Product.sale_start.isnot(None),
+        Product.sale_end.isnot(None),
+        Product.sale_start <= d,
+        Product.sale_end >= d,
+        Product.sale_percentage > 0,
+        Product.sale_percentage <= 100,
+    )
+
+
+def on_sale_clause(on_date=None):
+    """
+    SQL condition matching every product price_product() would put on sale: an active
+    product-level sale or any active global Sale whose filters match. Use it to filter and
+    paginate "on sale" listings in the database instead of pricing candidates in Python.
+    """
+    from sqlalchemy import or_
+    d = on_date or date.today()
+    clauses = [product_sale_clause(d)]
+    for sale in get_active_sales(d):
+        try:
+            clauses.append(_filters_to_sql(sale.filters))
+        except Exception as e:
+            print(f"[Sale engine] Sale {sale.id} filters not usable in SQL: {e}")
+    return or_(*clauses)
+
+
+def pricing_values(product, on_date=None, sales=None):
+    """The materialized pricing columns for the product on on_date, as {column: value}."""
+    from decimal import Decimal
+    d = on_date or date.today()
+    sale_data = price_product(product, d, sales)
+    if sale_data:
+        return {
+            'effective_price': Decimal(str(sale_data['sale_price'])).quantize(Decimal('0.01')),
+            'discount_percentage': Decimal(str(sale_data['discount_percentage'])).quantize(Decimal('0.01')),
+            'sale_source': f"sale:{sale_data['sale']['id']}" if sale_data.get('sale') else 'product',
+            'priced_on': d,
+        }
+    price = Decimal(str(product.price)).quantize(Decimal('0.01')) if product.price is not None else None
+    return {'effective_price': price, 'discount_percentage': None, 'sale_source': None, 'priced_on': d}
+
+
+def apply_pricing(product, on_date=None, sales=None):
+    """Set the product's materialized pricing columns for on_date. Returns True if any value changed."""
+    values = pricing_values(product, on_date, sales)
+    changed = any(getattr(product, column) != value for column, value in values.items())
+    if changed:
+        for column, value in values.items():
+            setattr(product, column, value)
+    return changed
+
+
+def price_range_clause(min_price=None, max_price=None):
+    """SQL condition min_price <= effective_price <= max_price (either bound optional), on the indexed column."""
+    from sqlalchemy import and_, true
+    from models.product import Product
+    conditions = []
+    if min_price is not None:
+        conditions.append(Product.effective_price >= min_price)
+    if max_price is not None:
+        conditions.append(Product.effective_price <= max_price)
+    return and_(*conditions) if conditions else true()
+
+
+def mark_sale_products_stale(connection, filter_sets):
+    """
+    Inside a Sale flush: clear priced_on for products matching any of the given product_filters
+    so the rollover reprices them (reads compute their price until then). Uses the flush
+    connection (same transaction) and leaves updated_at alone.
+    """
+    from sqlalchemy import or_, update
+    from models.product import Product
+    clauses = []
+    for raw in filter_sets:
+        try:
+            clauses.append(_filters_to_sql(_parse_filters(raw)))
+        except Exception:
+            # Filters not expressible in SQL: reprice everything
+            clauses = []
+            break
+    table = Product.__table__
+    stmt = update(table).values(priced_on=None, updated_at=table.c.updated_at)
+    if clauses:
+        stmt = stmt.where(or_(*clauses))
+    connection.execute(stmt)
+
+
+def reprice_stale(on_date=None, batch_size=500, session=None):
+    """
+    Reprice all products whose materialized pricing is not for on_date (new day, Sale changes,
+    rows written outside the ORM). Writes with a Core UPDATE that keeps updated_at; rows whose sale
+    price or discount changed get index_dirty_at so the vector index sync re-embeds them. Commits
+    per batch (on session, default db.session). Returns the number of rows repriced.
+    """
+    from datetime import datetime
+    from sqlalchemy import bindparam, or_, update
+    from models.database import db
+    from models.product import Product
+    session = session or db.session
+    d = on_date or date.today()
+    sales = get_active_sales(d, session)
+    table = Product.__table__
+    stmt = update(table).where(table.c.id == bindparam('product_id')).values(
+        effective_price=bindparam('effective_price'),
+        discount_percentage=bindparam('discount_percentage'),
+        sale_source=bindparam('sale_source'),
+        priced_on=bindparam('priced_on'),
+        index_dirty_at=bindparam('index_dirty_at'),
+        updated_at=table.c.updated_at,
+    )
+    repriced = 0
+    last_id = 0
+    while True:
+        batch = session.query(Product).filter(
+            Product.id > last_id,
+            or_(Product.priced_on.is_(None), Product.priced_on != d)
+        ).order_by(Product.id).limit(batch_size).all()
+        if not batch:
+            break
+        now = datetime.utcnow()
+        rows = []
+        for product in batch:
+            values = pricing_values(product, d, sales)
+            changed = any(getattr(product, column) != values[column]
+                          for column in ('effective_price', 'discount_percentage', 'sale_source'))
+            rows.append(dict(values, product_id=product.id,
+                             index_dirty_at=now if changed else product.index_dirty_at))
+        session.execute(stmt, rows)
+        session.commit()
+        repriced += len(batch)
+        last_id = batch[-1].id
+    return repriced
+
+
+def reprice_after_sale_write():
+    """
+    After a Sale write commits: reprice the products its flush marked stale, so listings filter and
+    sort on current prices right away. Runs in its own session (the committing one cannot emit SQL
+    from its after_commit hook).
+    """
+    from sqlalchemy.orm import Session
+    from models.database import db
+    try:
+        with Session(db.engine) as session:
+            reprice_stale(session=session)
+    except Exception as e:
+        # The rows stay stale; the background worker reprices them
+        print(f"[Sale engine] Could not reprice after sale write: {e}")
+
+
+def _seconds_until_tomorrow():
+    from datetime import datetime, timedelta
+    now = datetime.now()
+    return (datetime.combine(now.date() + timedelta(days=1), datetime.min.time()) - now).total_seconds()
+
+
+def start_reprice_worker(app, interval=None):
+    """
+    Run reprice_stale every interval seconds, and just after midnight, in a daemon thread (once per
+    process): the daily rollover and rows left stale. One worker reprices at a time (advisory lock).
+    """
+    global _reprice_thread
+    from config import Config
+    interval = Config.REPRICE_INTERVAL_SECONDS if interval is None else interval
+    if interval <= 0 or (_reprice_thread is not None and _reprice_thread.is_alive()):
+        return None
+
+    def run():
+        while True:
+            time.sleep(min(interval, _seconds_until_tomorrow() + 1))
+            try:
+                with app.app_context():
+                    from utils.reservation_sweeper import advisory_lock
+                    with advisory_lock(REPRICE_LOCK_NAME) as acquired:
+                        if acquired:
+                            repriced = reprice_stale()
+                            if repriced:
+                                print(f"[Sale engine] Repriced {repriced} product(s)")
+            except Exception as e:
+                print(f"[Sale engine] Repricing failed: {e}")
+
+    _reprice_thread = threading.Thread(target=run, name='reprice-worker', daemon=True)
+    _reprice_thread.start()
+    return _reprice_thread
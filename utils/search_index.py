@@ -0,0 +1,207 @@
+"""
+Full-text product search backends.
+apply_text_search(query, term) filters (and optionally ranks) a Product query using the best
+index available for the database:
+- SQLite: FTS5 external-content table products_fts, kept in sync by triggers, ranked by bm25()
+- PostgreSQL: generated tsvector column products.search_vector with a GIN index, ranked by ts_rank()
+- otherwise (or when the index is missing): ILIKE per token, no ranking
+Terms are split into tokens; each token matches as a prefix ("shirt" finds "T-Shirt", "shirts").
+The index is created with the products table (DDL events) and by init_db for existing databases.
+"""
+import re
+import threading
+
+# Indexed columns; weights: name > clothing_type > color > description
+SEARCH_COLUMNS = ('name', 'description', 'clothing_type', 'color')
+_BM25_WEIGHTS = {'name': 10.0, 'description': 1.0, 'clothing_type': 5.0, 'color': 3.0}
+_TSVECTOR_WEIGHTS = {'name': 'A', 'clothing_type': 'B', 'color': 'C', 'description': 'D'}
+
+_TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+_MAX_TOKENS = 8
+
+_lock = threading.Lock()
+_index_available = {}  # engine url -> bool (reset by DDL events on the products table)
+
+_SQLITE_DDL = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS products_fts USING fts5("
+    "name, description, clothing_type, color, content='products', content_rowid='id', "
+    "tokenize='unicode61 remove_diacritics 2')",
+    "CREATE TRIGGER IF NOT EXISTS products_fts_ai AFTER INSERT ON products BEGIN "
+    "INSERT INTO products_fts(rowid, name, description, clothing_type, color) "
+    "VALUES (new.id, new.name, new.description, new.clothing_type, new.color); END",
+    "CREATE TRIGGER IF NOT EXISTS products_fts_ad AFTER DELETE ON products BEGIN "
+    "INSERT INTO products_fts(products_fts, rowid, name, description, clothing_type, color) "
+    "VALUES ('delete', old.id, old.name, old.description, old.clothing_type, old.color); END",
+    "CREATE TRIGGER IF NOT EXISTS products_fts_au AFTER UPDATE OF name, description, clothing_type, color "
+    "ON products BEGIN "
+    "INSERT INTO products_fts(products_fts, rowid, name, description, clothing_type, color) "
+    "VALUES ('delete', old.id, old.name, old.description, old.clothing_type, old.color); "
+    "INSERT INTO products_fts(rowid, name, description, clothing_type, color) "
+    "VALUES (new.id, new.name, new.description, new.clothing_type, new.color); END",
+    "INSERT INTO products_fts(products_fts, rank) VALUES ('rank', 'bm25({})')".format(
+        ', '.join(str(_BM25_WEIGHTS[c]) for c in SEARCH_COLUMNS)
+    ),
+]
+
+_POSTGRES_DDL = [
+    "ALTER TABLE products ADD COLUMN IF NOT EXISTS search_vector tsvector GENERATED ALWAYS AS ("
+    + " || ".join(
+        f"setweight(to_tsvector('simple', coalesce({c}, '')), '{_TSVECTOR_WEIGHTS[c]}')" for c in SEARCH_COLUMNS
+    )
+    + ") STORED",
+    "CREATE INDEX IF NOT EXISTS idx_products_search_vector ON products USING GIN (search_vector)",
+]
+
+
+def tokenize(term):
+    """Lowercase word tokens of a search term (at most _MAX_TOKENS)."""
+    return _TOKEN_RE.findall((term or '').lower())[:_MAX_TOKENS]
+
+
+def ensure_search_index(connection):
+    """
+    Create the full-text index for the connection's dialect if missing. Returns True when the
+    index is usable. On SQLite an index created over existing rows is rebuilt from products.
+    """
+    from sqlalchemy import text
+    dialect = connection.dialect.name
+    try:
+        if dialect == 'sqlite':
+            existed = connection.execute(text(
+                "SELECT 1 FROM sqlite_master WHERE type='table' AND name='products_fts'"
+            )).first() is not None
+            for stmt in _SQLITE_DDL:
+                connection.execute(text(stmt))
+            if not existed:
+                connection.execute(text("INSERT INTO products_fts(products_fts) VALUES ('rebuild')"))
+        elif dialect == 'postgresql':
+            for stmt in _POSTGRES_DDL:
+                connection.execute(text(stmt))
+        else:
+            return False
+    except Exception as e:
+        print(f"[Search index] Full-text index unavailable ({dialect}): {e}")
+        _set_available(connection.engine, False)
+        return False
+    _set_available(connection.engine, True)
+    return True
+
+
+def drop_search_index(connection):
+    """Drop the SQLite FTS table (its triggers go with the products table)."""
+    from sqlalchemy import text
+    if connection.dialect.name == 'sqlite':
+        connection.execute(text("DROP TABLE IF EXISTS products_fts"))
+    _set_available(connection.engine, None)
+
+
+def _set_available(engine, value):
+    with _lock:
+        if value is None:
+            _index_available.pop(str(engine.url), None)
+        else:
+            _index_available[str(engine.url)] = value
+
+
+def _is_available(engine):
+    """Whether the full-text index exists (checked once per engine, then cached)."""
+    key = str(engine.url)
+    available = _index_available.get(key)
+    if available is not None:
+        return available
+    from sqlalchemy import text
+    try:
+        with engine.connect() as conn:
+            if engine.dialect.name == 'sqlite':
+                available = conn.execute(text(
+                    "SELECT 1 FROM sqlite_master WHERE type='table' AND name='products_fts'"
+                )).first() is not None
+            elif engine.dialect.name == 'postgresql':
+                available = conn.execute(text(
+                    "SELECT 1 FROM information_schema.columns "
+                    "WHERE table_name = 'products' AND column_name = 'search_vector'"
+                )).first() is not None
+            else:
+                available = False
+    except Exception:
+        available = False
+    with _lock:
+        _index_available[key] = available
+    return available
+
+
+class LikeSearchBackend:
+    """Fallback: every token must appear (ILIKE '%token%') in one of the columns. No ranking."""
+    name = 'like'
+
+    def apply(self, query, tokens, columns, match_any, rank):
+        from sqlalchemy import and_, or_
+        from models.product import Product
+        conditions = [
+            or_(*[getattr(Product, c).ilike(f'%{t}%') for c in columns]) for t in tokens
+        ]
+        return query.filter(or_(*conditions) if match_any else and_(*conditions))
+
+
+class SqliteFtsBackend:
+    """SQLite FTS5 MATCH on products_fts, ordered by bm25 rank (lower is better)."""
+    name = 'fts5'
+
+    def apply(self, query, tokens, columns, match_any, rank):
+        from sqlalchemy import column, select, table, text
+        from models.product import Product
+        expr = (' OR ' if match_any else ' ').join(f'"{t}"*' for t in tokens)
+        if tuple(columns) != SEARCH_COLUMNS:
+            expr = '{%s} : (%s)' % (' '.join(columns), expr)
+        fts = table('products_fts', column('rowid'), column('rank'))
+        hits = select(fts.c.rowid.label('product_id'), fts.c.rank.label('score')).where(
+            text('products_fts MATCH :fts_match').bindparams(fts_match=expr)
+        ).subquery('fts_hits')
+        query = query.join(hits, hits.c.product_id == Product.id)
+        if rank:
+            query = query.order_by(hits.c.score)
+        return query
+
+
+class PostgresTsvectorBackend:
+    """PostgreSQL tsvector @@ tsquery on products.search_vector (GIN), ordered by ts_rank."""
+    name = 'tsvector'
+
+    def apply(self, query, tokens, columns, match_any, rank):
+        from sqlalchemy import func, literal_column
+        weights = '' if tuple(columns) == SEARCH_COLUMNS else ''.join(_TSVECTOR_WEIGHTS[c] for c in columns)
+        expr = (' | ' if match_any else ' & ').join(f'{t}:*{weights}' for t in tokens)
+        vector = literal_column('products.search_vector')
+        tsquery = func.to_tsquery('simple', expr)
+        query = query.filter(vector.op('@@')(tsquery))
+        if rank:
+            query = query.order_by(func.ts_rank(vector, tsquery).desc())
+        return query
+
+
+_BACKENDS = {
+    'sqlite': SqliteFtsBackend(),
+    'postgresql': PostgresTsvectorBackend(),
+}
+_LIKE_BACKEND = LikeSearchBackend()
+
+
+def get_search_backend():
+    """Backend for the current database (LIKE fallback when no full-text index exists)."""
+    from models.database import db
+    engine = db.engine
+    backend = _BACKENDS.get(engine.dialect.name)
+    if backend is None or not _is_available(engine):
+        return _LIKE_BACKEND
+    return backend
+
+
+def apply_text_search(query, term, columns=SEARCH_COLUMNS, match_any=False, rank=True):
+    """
+    Restrict a Product query to rows matching term. match_any: any token instead of all.
+    rank: order by relevance (added before any order_by the caller applies afterwards).
+    """
+    tokens = tokenize(term)
+    if not tokens:
+        return query
+    return get_search_backend().apply(query, tokens, columns, match_any, rank)
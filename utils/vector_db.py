@@ -1,4 +1,22 @@
+"""
+Product vector index (ChromaDB) for AI semantic search.
+Each indexed product's document text + metadata is hashed and recorded in vector_index_entries, so
+sync_all_products_from_sql only re-embeds products whose document changed (edits, sale-status
+flips) and removes deactivated or deleted ones. Sync walks products in (updated_at, id) order and
+saves its position (vector_sync_state) after every batch: an interrupted sync resumes where it
+stopped, and a restart only looks at products written since the last run. Repricing does not touch
+updated_at, so it flags the products whose sale price changed (products.index_dirty_at) and sync
+re-reads those too.
+Vectors come from utils.embeddings (cached per document text and per query) and are handed to
+Chroma precomputed; Chroma only embeds itself when no embedding model is available there.
+When chromadb cannot be imported, init_vector_db falls back to utils.numpy_vector_index (same
+collection calls, stored under VECTOR_DB_PATH/numpy_index); that backend needs an embedding model.
+"""
+import hashlib
+import json
 import os
+import re
+from datetime import datetime, timedelta
 from config import Config
 
 # Initialize ChromaDB client
@@ -6,6 +24,8 @@ vector_client = None
 collection = None
 chromadb = None
 chromadb_import_error = None  # Reason chromadb is unavailable (for diagnostics)
+vector_backend = None  # 'chromadb' or 'numpy' once a collection is open
+numpy_index_error = None  # Reason the NumPy fallback could not open (for diagnostics)
 
 try:
     import chromadb
@@ -15,9 +35,19 @@ except Exception as e:
     Settings = None
     chromadb_import_error = str(e)
     print(f"[Vector DB] ChromaDB import failed: {chromadb_import_error}")
-    print("  AI search will use keyword/filter only. Install: pip install numpy==1.26.4 chromadb==0.4.18")
+    print("  AI search will use the built-in NumPy vector index (needs an embedding model), else keyword/filter only.")
+    print("  For ChromaDB install: pip install numpy==1.26.4 chromadb==0.4.18")
     print("  (Use the same Python that runs the backend; restart the backend after installing.)")
 
+# A new sync pass starts this far before the saved watermark, so rows whose updated_at was set
+# before - but committed after - the previous pass read past it are not missed (re-hashing is cheap)
+SYNC_WATERMARK_OVERLAP = timedelta(minutes=5)
+# Version of what _product_to_document_and_metadata stores. Bump it when the document or metadata
+# layout changes: the incremental sync never re-reads rows behind its watermark, so an index built
+# with another version is rebuilt in full (recorded in vector_sync_state.index_version)
+INDEX_SCHEMA_VERSION = 2
+
+
 def _get_vector_db_path():
     """Resolve vector DB path to absolute so it is stable regardless of cwd."""
     path = Config.VECTOR_DB_PATH
@@ -28,13 +58,37 @@ def _get_vector_db_path():
     return os.path.join(_root, path)
 
 
+def _init_numpy_index():
+    """Open the NumPy vector index (chromadb unavailable). False when there is no embedding model."""
+    global collection, vector_backend, numpy_index_error
+    from utils.embeddings import get_embedder
+    from utils.numpy_vector_index import NumpyVectorIndex
+    embedder = get_embedder()
+    if embedder is None:
+        if numpy_index_error is None:
+            print("Warning: chromadb not installed and no embedding model available, vector search will be disabled")
+        numpy_index_error = f"No embedding model available for {Config.EMBEDDING_MODEL} (install sentence-transformers)"
+        return False
+    try:
+        collection = NumpyVectorIndex(os.path.join(_get_vector_db_path(), 'numpy_index'), embedder.model_name)
+        vector_backend = 'numpy'
+        numpy_index_error = None
+        print(f"Vector database initialized (NumPy index, {collection.count()} products)")
+        return True
+    except Exception as e:
+        numpy_index_error = str(e)
+        print(f"Error initializing NumPy vector index: {e}")
+        return False
+
+
 def init_vector_db():
     """Initialize the vector database for AI agent."""
-    global vector_client, collection
+    global vector_client, collection, vector_backend
 
     if chromadb is None:
-        print("Warning: chromadb not installed, vector search will be disabled")
-        return False
+        if collection is not None:
+            return True
+        return _init_numpy_index()
 
     try:
         vector_path = _get_vector_db_path()
@@ -52,6 +106,7 @@ def init_vector_db():
             name="insightshop_products",
             metadata={"hnsw:space": "cosine"}
         )
+        vector_backend = 'chromadb'
         
         print("Vector database initialized successfully!")
         return True
@@ -88,18 +143,140 @@ def _product_to_document_and_metadata(product_id, product_data):
     if on_sale and discount is not None:
         sale_part = f" On sale. {discount}% off." + sale_part
     text = f"{name} {desc} Category: {category} Color: {color} Size: {size} Price: ${price} Brand: {display_brand} Fabric: {fabric} Type: {clothing_type} Occasion: {occasion}{sale_part}"
+    try:
+        price_value = float(price or 0)
+    except (TypeError, ValueError):
+        price_value = 0.0
+    sizes = [_safe_utf8(s).strip() for s in (product_data.get("available_sizes") or []) if s not in (None, "")]
+    if size and size.strip() not in sizes:
+        sizes.append(size.strip())
     meta = {
         "product_id": product_id,
         "name": name[:255],
-        "category": category[:50],
+        "category": category.strip().lower()[:50],
         "color": (color or "")[:50],
-        "price": str(price),
+        "price": price_value,  # Price when indexed; not filtered on (stale until the next sync after a reprice)
         "brand": (display_brand or "")[:100],
         "on_sale": "true" if on_sale else "false",
+        "clothing_type": clothing_type[:100],
+        "clothing_category": _safe_utf8(product_data.get("clothing_category", "")).strip().lower()[:50],
+        "fabric": fabric.strip()[:100],
+        "occasion": occasion.strip()[:100],
+        "size": size.strip()[:20],
+        "sizes": "|".join(sizes)[:255],
     }
+    # Chroma metadata holds scalars only: word / size membership is stored as boolean flags
+    for token in _tokens(color):
+        meta[f"color_{token}"] = True
+    for token in _tokens(clothing_type):
+        meta[f"type_{token}"] = True
+    for s in sizes:
+        meta[_size_key(s)] = True
     return text, meta
 
 
+def _tokens(value):
+    return re.findall(r"[a-z0-9]+", (value or "").lower())
+
+
+def _size_key(size):
+    return "size_" + "_".join(_tokens(size))
+
+
+def metadata_filter(criteria):
+    """
+    Chroma `where` clause for search criteria (see utils.ai_action_executor._build_criteria), so
+    the nearest-neighbour query only returns matching products. None when there is nothing to filter.
+    Price and on_sale change without a product write (sale windows, Sale edits) and only reach the
+    index on the next sync, so they are left to the SQL re-check of the hits instead of filtering here.
+    """
+    criteria = criteria or {}
+    clauses = []
+    if criteria.get("category"):
+        clauses.append({"category": str(criteria["category"]).strip().lower()})
+    if criteria.get("color"):
+        clauses.extend({f"color_{token}": True} for token in _tokens(str(criteria["color"])))
+    if criteria.get("clothing_type"):
+        want = str(criteria["clothing_type"]).strip().lower()
+        if want == "shirt":
+            clauses.append({"$or": [{"type_shirt": True}, {"clothing_category": {"$in": ["shirts", "t_shirts"]}}]})
+        else:
+            clauses.extend({f"type_{token}": True} for token in _tokens(want))
+    if criteria.get("size") and _tokens(str(criteria["size"])):
+        clauses.append({_size_key(str(criteria["size"])): True})
+    for key in ("fabric", "occasion"):
+        if criteria.get(key):
+            clauses.append({key: str(criteria[key]).strip()})
+    if not clauses:
+        return None
+    return clauses[0] if len(clauses) == 1 else {"$and": clauses}
+
+
+def _document_hash(text, meta):
+    """Hash of exactly what is stored in the index for a product (document text and metadata)."""
+    raw = json.dumps([text, meta], sort_keys=True, default=str)
+    return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+
+def _embedding_kwargs(documents):
+    """{'embeddings': [...]} with cached / batch-encoded vectors for an upsert, or {} to let Chroma embed."""
+    from utils.embeddings import get_embedder
+    embedder = get_embedder()
+    if embedder is None:
+        return {}
+    try:
+        return {'embeddings': [v.tolist() for v in embedder.embed_documents(documents)]}
+    except Exception as e:
+        print(f"Warning: Could not embed documents, letting Chroma embed them: {e}")
+        return {}
+
+
+def _query_kwargs(query):
+    """{'query_embeddings': [...]} from the query LRU, or {'query_texts': [...]} to let Chroma embed."""
+    from utils.embeddings import get_embedder
+    embedder = get_embedder()
+    if embedder is not None:
+        try:
+            return {'query_embeddings': [embedder.embed_query(query).tolist()]}
+        except Exception as e:
+            print(f"Warning: Could not embed query, letting Chroma embed it: {e}")
+    return {'query_texts': [query]}
+
+
+def _record_indexed(hashes):
+    """Upsert vector_index_entries for {product_id: content_hash} (caller commits)."""
+    from models.database import db
+    from models.vector_index import VectorIndexEntry
+    if not hashes:
+        return
+    existing = {e.product_id: e for e in VectorIndexEntry.query.filter(VectorIndexEntry.product_id.in_(list(hashes))).all()}
+    now = datetime.utcnow()
+    for product_id, content_hash in hashes.items():
+        entry = existing.get(product_id)
+        if entry is None:
+            db.session.add(VectorIndexEntry(product_id=product_id, content_hash=content_hash, indexed_at=now))
+        else:
+            entry.content_hash = content_hash
+            entry.indexed_at = now
+
+
+def _forget_indexed(product_ids):
+    from models.vector_index import VectorIndexEntry
+    if product_ids:
+        VectorIndexEntry.query.filter(VectorIndexEntry.product_id.in_(list(product_ids))).delete(synchronize_session=False)
+
+
+def _commit_tracking(update):
+    """Apply a change-tracking update after a single-product index write; tracking is best effort."""
+    from models.database import db
+    try:
+        update()
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        print(f"Warning: Could not record vector index state: {e}")
+
+
 def add_product_to_vector_db(product_id, product_data):
     """Add or update a product in the vector database (upsert so duplicates are overwritten)."""
     global collection
@@ -117,8 +294,10 @@ def add_product_to_vector_db(product_id, product_data):
         collection.upsert(
             documents=[text],
             ids=[doc_id],
-            metadatas=[meta]
+            metadatas=[meta],
+            **_embedding_kwargs([text])
         )
+        _commit_tracking(lambda: _record_indexed({product_id: _document_hash(text, meta)}))
         return True
     except Exception as e:
         print(f"Error adding product to vector DB: {e}")
@@ -126,21 +305,21 @@ def add_product_to_vector_db(product_id, product_data):
         traceback.print_exc()
         return False
 
-def search_products_vector(query, n_results=10):
-    """Search products using vector similarity."""
+def search_products_vector(query, n_results=10, where=None):
+    """Search products using vector similarity. where: Chroma metadata filter (see metadata_filter)."""
     global collection
     
-    if chromadb is None:
-        return []
-    
     if not collection:
         init_vector_db()
     
     if collection:
         try:
+            query_kwargs = _query_kwargs(query)
+            if where:
+                query_kwargs['where'] = where
             results = collection.query(
-                query_texts=[query],
-                n_results=n_results
+                n_results=n_results,
+                **query_kwargs
             )
             
             # Extract product IDs from results
@@ -166,15 +345,13 @@ def delete_product_from_vector_db(product_id):
     """Remove a product from the vector database (e.g. when deactivated or deleted)."""
     global collection
 
-    if chromadb is None:
-        return True  # Nothing to do
-
     if not collection:
         init_vector_db()
 
     if collection:
         try:
             collection.delete(ids=[f"product_{product_id}"])
+            _commit_tracking(lambda: _forget_indexed([product_id]))
             return True
         except Exception as e:
             print(f"Error deleting product from vector DB: {e}")
@@ -185,7 +362,7 @@ def delete_product_from_vector_db(product_id):
 def is_vector_db_available():
     """Return True if the vector DB is initialized and usable."""
     global collection
-    if chromadb is None or not collection:
+    if not collection:
         return False
     try:
         collection.peek(limit=1)
@@ -203,54 +380,169 @@ def get_chromadb_status():
     return False, "ChromaDB not installed"
 
 
-def sync_all_products_from_sql(app=None, batch_size=50):
+def get_vector_backend():
+    """Backend serving vector search: 'chromadb', 'numpy' or None (keyword/filter search only)."""
+    if not collection:
+        init_vector_db()
+    return vector_backend if collection else None
+
+
+def _reset_sync_state():
+    """Forget what is indexed (the index was lost or a full rebuild was asked for)."""
+    from models.database import db
+    from models.vector_index import VectorIndexEntry, VectorSyncState
+    VectorIndexEntry.query.delete(synchronize_session=False)
+    VectorSyncState.query.delete(synchronize_session=False)
+    db.session.commit()
+
+
+def _sync_batch(products):
     """
-    Sync all active products from SQLite to ChromaDB so AI search is up to date.
+    Upsert changed active products and delete inactive ones from the index.
+    Returns (upserted, deleted, unchanged, failed).
+    """
+    from models.vector_index import VectorIndexEntry
+    from utils.product_serializer import ProductSerializer
+    known = dict(VectorIndexEntry.query.with_entities(VectorIndexEntry.product_id, VectorIndexEntry.content_hash)
+                 .filter(VectorIndexEntry.product_id.in_([p.id for p in products])).all())
+    active = [p for p in products if p.is_active]
+    removed = [p.id for p in products if not p.is_active and p.id in known]
+
+    ids, documents, metadatas, hashes = [], [], [], {}
+    for product, data in zip(active, ProductSerializer.serialize_many(active, include_variation_stock=False)):
+        text, meta = _product_to_document_and_metadata(product.id, data)
+        content_hash = _document_hash(text, meta)
+        if known.get(product.id) == content_hash:
+            continue
+        ids.append(f"product_{product.id}")
+        documents.append(text)
+        metadatas.append(meta)
+        hashes[product.id] = content_hash
+
+    if ids:
+        embedding_kwargs = _embedding_kwargs(documents)
+        try:
+            collection.upsert(ids=ids, documents=documents, metadatas=metadatas, **embedding_kwargs)
+        except Exception as e:
+            print(f"Error syncing batch to vector DB: {e}")
+            for i, doc_id in enumerate(ids):
+                try:
+                    one = {'embeddings': [embedding_kwargs['embeddings'][i]]} if embedding_kwargs else {}
+                    collection.upsert(ids=[doc_id], documents=[documents[i]], metadatas=[metadatas[i]], **one)
+                except Exception as e2:
+                    print(f"Error syncing {doc_id} to vector DB: {e2}")
+                    hashes.pop(int(doc_id[len('product_'):]), None)
+    if removed:
+        collection.delete(ids=[f"product_{product_id}" for product_id in removed])
+    _record_indexed(hashes)
+    _forget_indexed(removed)
+    return len(hashes), len(removed), len(active) - len(ids), len(ids) - len(hashes)
+
+
+def _delete_orphans():
+    """Remove index entries for products that no longer exist (hard deletes). Returns how many."""
+    from models.product import Product
+    from models.vector_index import VectorIndexEntry
+    orphan_ids = [row[0] for row in VectorIndexEntry.query.with_entities(VectorIndexEntry.product_id)
+                  .outerjoin(Product, Product.id == VectorIndexEntry.product_id)
+                  .filter(Product.id.is_(None)).all()]
+    if orphan_ids:
+        collection.delete(ids=[f"product_{product_id}" for product_id in orphan_ids])
+        _forget_indexed(orphan_ids)
+    return len(orphan_ids)
+
+
+def sync_all_products_from_sql(app=None, batch_size=500, full=False):
+    """
+    Bring the vector index (ChromaDB or the NumPy fallback) up to date with the products table so AI search is current.
+    Incremental: only products written since the saved watermark or repriced since the last sync
+    (index_dirty_at) are read, only those whose document hash changed are re-embedded, and
+    deactivated / deleted products are removed.
+    full=True forgets the recorded state and re-indexes every active product; so does an index built
+    with another INDEX_SCHEMA_VERSION.
     Call at startup with app, or from a request (no args) to use current app context.
-    Returns (synced_count, chromadb_available). When ChromaDB is not installed or
-    init fails, returns (0, False) so the app can keep working with keyword search.
+    Returns (synced_count, vector_db_available) where synced_count is the number of products
+    (re-)embedded. When neither ChromaDB nor the NumPy index can be opened, returns (0, False) so
+    the app can keep working with keyword search.
     """
-    if chromadb is None:
-        msg = chromadb_import_error or "chromadb not installed"
-        print(f"Vector DB not available ({msg}). AI search uses keyword/direct search.")
-        return 0, False
-
     if not init_vector_db() or not collection:
         print("Vector DB init failed. AI search uses keyword/direct search.")
         return 0, False
 
     def _run_sync():
+        from sqlalchemy import and_, or_, update
+        from models.database import db
         from models.product import Product
-        products = Product.query.filter_by(is_active=True).order_by(Product.id).all()
-        total = len(products)
-        if total == 0:
-            return 0
-
-        synced = 0
-        for i in range(0, total, batch_size):
-            batch = products[i : i + batch_size]
-            ids = []
-            documents = []
-            metadatas = []
-            for p in batch:
-                text, meta = _product_to_document_and_metadata(p.id, p.to_dict())
-                ids.append(f"product_{p.id}")
-                documents.append(text)
-                metadatas.append(meta)
-            try:
-                collection.upsert(ids=ids, documents=documents, metadatas=metadatas)
-                synced += len(batch)
-            except Exception as e:
-                print(f"Error syncing batch to vector DB: {e}")
-                for p in batch:
-                    try:
-                        add_product_to_vector_db(p.id, p.to_dict())
-                        synced += 1
-                    except Exception as e2:
-                        print(f"Error syncing product {p.id} to vector DB: {e2}")
-
-        print(f"Vector DB sync: {synced}/{total} active products indexed.")
-        return synced
+        from models.vector_index import VectorIndexEntry, VectorSyncState
+
+        state = db.session.get(VectorSyncState, 1)
+        if (full or collection.count() < VectorIndexEntry.query.count()
+                or (state is not None and state.index_version != INDEX_SCHEMA_VERSION)):
+            # Entries without index documents (the vector store was wiped or replaced), or documents
+            # built with another layout
+            if state is not None:
+                db.session.expunge(state)
+            _reset_sync_state()
+            state = None
+        if state is None:
+            state = VectorSyncState(id=1, watermark_product_id=0, index_version=INDEX_SCHEMA_VERSION)
+            db.session.add(state)
+            db.session.commit()
+        cursor_at, cursor_id = None, 0
+        if state.watermark_updated_at is not None:
+            cursor_at = state.watermark_updated_at - SYNC_WATERMARK_OVERLAP
+
+        upserted = deleted = unchanged = failed = 0
+        while True:
+            query = Product.query
+            if cursor_at is not None:
+                query = query.filter(or_(
+                    Product.updated_at > cursor_at,
+                    and_(Product.updated_at == cursor_at, Product.id > cursor_id),
+                ))
+            batch = query.order_by(Product.updated_at, Product.id).limit(batch_size).all()
+            if not batch:
+                break
+            counts = _sync_batch(batch)
+            upserted += counts[0]
+            deleted += counts[1]
+            unchanged += counts[2]
+            failed += counts[3]
+            cursor_at, cursor_id = batch[-1].updated_at, batch[-1].id
+            # Stop saving progress after a failed product so the next sync retries it; never move
+            # the saved watermark backwards (the overlap re-reads older rows)
+            if not failed and (state.watermark_updated_at is None
+                               or (cursor_at, cursor_id) > (state.watermark_updated_at, state.watermark_product_id)):
+                state.watermark_updated_at, state.watermark_product_id = cursor_at, cursor_id
+            db.session.commit()
+
+        # Repricing (Sale writes, the daily rollover) keeps updated_at and flags the rows instead;
+        # flags set after this point are left for the next sync
+        started_at = datetime.utcnow()
+        table = Product.__table__
+        last_id = 0
+        while True:
+            batch = Product.query.filter(Product.index_dirty_at.isnot(None), Product.id > last_id) \
+                .order_by(Product.id).limit(batch_size).all()
+            if not batch:
+                break
+            counts = _sync_batch(batch)
+            upserted += counts[0]
+            deleted += counts[1]
+            unchanged += counts[2]
+            failed += counts[3]
+            if not counts[3]:
+                db.session.execute(update(table).where(
+                    table.c.id.in_([p.id for p in batch]), table.c.index_dirty_at <= started_at
+                ).values(index_dirty_at=None, updated_at=table.c.updated_at))
+            db.session.commit()
+            last_id = batch[-1].id
+
+        deleted += _delete_orphans()
+        state.last_completed_at = datetime.utcnow()
+        db.session.commit()
+        print(f"Vector DB sync: {upserted} embedded, {unchanged} unchanged, {deleted} removed, {failed} failed.")
+        return upserted
 
     try:
         if app is not None:
@@ -263,4 +555,3 @@ def sync_all_products_from_sql(app=None, batch_size=50):
     except Exception as e:
         print(f"Vector DB sync error: {e}")
         return 0, False
-